@@ -0,0 +1,85 @@
+"""
+Benchmark the streaming average against avg_data.
+
+The input is 0.5 sec GMAG-like data (3 components, float32), averaged
+over 5 minutes, for several numbers of days:
+
+- avg_data: pyspedas.avg_data on a tplot variable.
+- avg_data_stream: the same, processed in chunks.
+- stream_avg: chunks generated on the fly, so the whole series is never
+  in memory.
+
+Run it with:
+    python -m benchmarks.bench_avg [--days 1,7,30] [--max-avg-data-days 7]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'avg.json')
+
+cadence = 0.5
+chunk_size = 2**18
+
+
+def make_chunk(i0, i1):
+    """Samples i0 to i1 of the synthetic series."""
+    t = i0 * cadence + cadence * np.arange(i1 - i0)
+    rng = np.random.default_rng(i0)
+    y = (np.sin(2 * np.pi * t / 300.0)[:, None]
+         + rng.standard_normal((i1 - i0, 3))).astype(np.float32)
+    return t, y
+
+
+def chunks(n):
+    for i0 in range(0, n, chunk_size):
+        yield make_chunk(i0, min(i0 + chunk_size, n))
+
+
+def add_arguments(parser):
+    parser.add_argument('--days', default='1,7,30',
+                        help='comma separated numbers of days')
+    parser.add_argument('--max-avg-data-days', type=float, default=7,
+                        help='longest series given to avg_data, which is '
+                             'quadratic in the number of samples')
+
+
+def run_all(args):
+    from pyspedas import avg_data, store_data
+    from pyspedas_examples.analysis.avg_data_stream import (avg_data_stream,
+                                                            stream_avg)
+
+    results = {}
+    for days in [float(d) for d in args.days.split(',')]:
+        n = int(days * 86400 / cadence)
+        print('Running {} days ({} samples)'.format(days, n), file=sys.stderr)
+
+        def run_stream():
+            for _ in stream_avg(chunks(n), 0.0, (n - 1) * cadence, res=300.0):
+                pass
+        results['stream_avg@{}d'.format(days)] = harness.measure(
+            run_stream, repeat=args.repeat)
+
+        t, y = make_chunk(0, n)
+        store_data('bench', data={'x': t, 'y': y})
+        del t, y
+        results['avg_data_stream@{}d'.format(days)] = harness.measure(
+            lambda: avg_data_stream('bench', res=300.0), repeat=args.repeat)
+        if days <= args.max_avg_data_days:
+            results['avg_data@{}d'.format(days)] = harness.measure(
+                lambda: avg_data('bench', res=300.0), repeat=args.repeat)
+
+    for key, m in sorted(results.items()):
+        days = float(key.split('@')[1][:-1])
+        print('{:<28} {:12.0f} samples/s'.format(
+            key, days * 86400 / cadence / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
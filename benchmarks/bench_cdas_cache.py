@@ -0,0 +1,85 @@
+"""
+Benchmark the CDAS catalog cache against a local stub server.
+
+The discovery calls of ex_cdasws (instrument types and observatory
+groups, the latter three times) are repeated --requests times against
+a stub CDAS server that answers after --latency seconds:
+
+- cdasws: a CdasWs instance without cache.
+- memory: cached_cdas with a warm CatalogCache.
+- disk: a new CatalogCache on a warm directory for each round, as a new
+  process would.
+
+The time per call is reported.
+
+Run it with:
+    python -m benchmarks.bench_cdas_cache [--latency 0.05] [--requests 20]
+"""
+import os
+import sys
+import tempfile
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'cdas_cache.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds before each answer of the server')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='rounds of discovery calls')
+
+
+def discovery(cdas):
+    """The catalog calls of ex_cdasws."""
+    cdas.get_instrument_types()
+    for _ in range(3):
+        cdas.get_observatory_groups()
+
+
+def run_all(args):
+    from cdasws import CdasWs
+    from pyspedas_examples.utilities.cdas_cache import (CatalogCache,
+                                                        cached_cdas)
+    from pyspedas_examples.utilities.stub_cdas import start_stub_cdas
+
+    server = start_stub_cdas(delay=args.latency)
+    directory = tempfile.mkdtemp()
+    results = {}
+    try:
+        cdas = CdasWs(endpoint=server.url, disable_cache=True)
+        results['cdasws'] = harness.measure(
+            lambda: [discovery(cdas) for _ in range(args.requests)],
+            repeat=args.repeat)
+
+        cache = CatalogCache(directory=directory)
+        cdas = cached_cdas(endpoint=server.url, cache=cache)
+        discovery(cdas)
+        results['memory'] = harness.measure(
+            lambda: [discovery(cdas) for _ in range(args.requests)],
+            repeat=args.repeat)
+        results['memory']['hit_rate'] = cache.hit_rate
+
+        def run_disk():
+            for _ in range(args.requests):
+                discovery(cached_cdas(
+                    endpoint=server.url,
+                    cache=CatalogCache(directory=directory)))
+        results['disk'] = harness.measure(run_disk, repeat=args.repeat)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for key, m in sorted(results.items()):
+        print('{:<28} {:10.1f} us per call{}'.format(
+            key, 1e6 * m['time'] / (4 * args.requests),
+            '  hit rate {:.2f}'.format(m['hit_rate']) if 'hit_rate' in m
+            else ''))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
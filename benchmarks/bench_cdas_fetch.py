@@ -0,0 +1,88 @@
+"""
+Benchmark fetch_datasets against a local stub CDAS server.
+
+A month of daily files of --datasets datasets is found and downloaded
+from a stub server that answers after --latency seconds:
+
+- workers@N: fetch_datasets with N workers, into an empty directory.
+  With one worker, the requests are made one at a time, as with
+  CDAWeb.get_filenames and cda_download.
+- reuse: fetch_datasets again, with all the files already downloaded,
+  so only the file lists are requested and the checksums verified.
+
+Run it with:
+    python -m benchmarks.bench_cdas_fetch [--datasets 20] [--workers 1,8,32]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'cdas_fetch.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--datasets', type=int, default=20,
+                        help='number of datasets')
+    parser.add_argument('--days', type=int, default=30,
+                        help='number of daily files per dataset')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds before each answer of the server')
+    parser.add_argument('--file-size', type=int, default=2**18,
+                        help='bytes per file')
+    parser.add_argument('--workers', default='1,8,32',
+                        help='comma separated numbers of workers')
+
+
+def run_all(args):
+    from datetime import datetime, timedelta
+    from pyspedas_examples.utilities.cdas_fetch import fetch_datasets
+    from pyspedas_examples.utilities.stub_cdas import start_stub_cdas
+
+    server = start_stub_cdas(delay=args.latency, file_size=args.file_size)
+    datasets = ['DS{:02d}_L2'.format(i) for i in range(args.datasets)]
+    t0 = datetime(2020, 1, 1)
+    trange = [t0.strftime('%Y-%m-%d'),
+              (t0 + timedelta(days=args.days - 1)).strftime('%Y-%m-%d')]
+    files = args.datasets * args.days
+    results = {}
+    try:
+        for workers in [int(w) for w in args.workers.split(',')]:
+            print('Running {} workers'.format(workers), file=sys.stderr)
+
+            def run_fetch():
+                directory = tempfile.mkdtemp()
+                try:
+                    fetch_datasets(datasets, trange, local_dir=directory,
+                                   workers=workers, endpoint=server.url)
+                finally:
+                    shutil.rmtree(directory)
+            results['workers@{}'.format(workers)] = harness.measure(
+                run_fetch, repeat=args.repeat)
+
+        directory = tempfile.mkdtemp()
+        try:
+            fetch_datasets(datasets, trange, local_dir=directory,
+                           workers=8, endpoint=server.url)
+            results['reuse'] = harness.measure(
+                lambda: fetch_datasets(datasets, trange,
+                                       local_dir=directory, workers=8,
+                                       endpoint=server.url),
+                repeat=args.repeat)
+        finally:
+            shutil.rmtree(directory)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    for key, m in sorted(results.items()):
+        print('{:<28} {:8.1f} files/s'.format(key, files / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,145 @@
+"""
+Benchmark the peak RSS of the ex_spikes workflow on long data.
+
+A variable of --rate samples per second (3 components) is written for
+1, 10 and 30 days in a ColumnStore. The ex_spikes workflow (add spikes,
+then clean them with sub_avg=True) runs on it, each case in a fresh
+interpreter so that its peak RSS is its own:
+
+- memory: the variable is loaded in a tplot variable, and cleaned with
+  clean_spikes_batch, as ex_spikes(batch=True).
+- mmap: the spikes are added in place in the memory-mapped store, the
+  variable is cleaned with clean_spikes_store, and one hour of the
+  result is stored in a tplot variable (to plot it).
+
+The memory case is skipped above --max-memory-samples samples.
+
+Run it with:
+    python -m benchmarks.bench_column_store [--days 1,10,30] [--rate 4]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'column_store.json')
+
+name = 'thg_mag_ccnv'
+t0 = 1174608000.0  # 2007-03-23
+
+
+def make_store(directory, days, rate, chunk_size=2**20):
+    """Write a GMAG-like variable in a ColumnStore, chunk by chunk."""
+    from pyspedas_examples.utilities.column_store import ColumnStore
+    store = ColumnStore(directory)
+    n = int(days * 86400 * rate)
+    store.create(name, n, (3,), np.float32)
+    rng = np.random.default_rng(0)
+    level = np.array([20000.0, 500.0, 50000.0])
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        x, y = store.window(name, start, stop, mode='r+')
+        x[:] = t0 + np.arange(start, stop) / rate
+        walk = rng.standard_normal((stop - start, 3)).cumsum(axis=0)
+        y[:] = level + 0.1 * walk
+        level = level + 0.1 * walk[-1]
+        del x, y
+    return store
+
+
+def spikes(data):
+    """Add the spikes of ex_spikes, with fixed signs."""
+    n = len(data)
+    for i in range(1, 16):
+        s = 1 if i % 2 else -1
+        p1 = int(i * n / 16)
+        data[p1, 0] = s * i * 40000
+        data[p1 + 2000, 1] = s * i * 30000
+        data[p1 + 4000, 2] = s * i * 20000
+
+
+def run_memory(directory):
+    import pyspedas
+    from pyspedas import store_data
+    from pyspedas_examples.analysis.clean_spikes_batch import (
+        clean_spikes_batch)
+    from pyspedas_examples.utilities.column_store import ColumnStore
+    x, y = ColumnStore(directory).get_data(name)
+    store_data(name, data={'x': np.array(x), 'y': np.array(y)})
+    del x, y
+    data = pyspedas.data_quants[name].values
+    spikes(data)
+    clean_spikes_batch(name, sub_avg=True)
+
+
+def run_mmap(directory):
+    from pyspedas_examples.analysis.clean_spikes_batch import (
+        clean_spikes_store)
+    from pyspedas_examples.utilities.column_store import ColumnStore
+    store = ColumnStore(directory)
+    _, y = store.get_data(name, mode='r+')
+    spikes(y)
+    y.flush()
+    del y
+    clean_spikes_store(store, name, sub_avg=True)
+    store.store(name + '-despike', trange=[t0, t0 + 3600.0])
+
+
+def run_case(case, directory, repeat):
+    """Run one case in this process and return its metrics."""
+    func = {'memory': run_memory, 'mmap': run_mmap}[case]
+    return harness.measure(lambda: func(directory), repeat=repeat)
+
+
+def add_arguments(parser):
+    parser.add_argument('--days', default='1,10,30',
+                        help='comma separated numbers of days')
+    parser.add_argument('--rate', type=float, default=4.0,
+                        help='samples per second')
+    parser.add_argument('--max-memory-samples', type=float, default=2e7,
+                        help='largest number of samples of the memory case')
+
+
+def run_all(args):
+    results = {}
+    for days in [int(d) for d in args.days.split(',')]:
+        samples = days * 86400 * args.rate
+        directory = tempfile.mkdtemp()
+        try:
+            make_store(directory, days, args.rate)
+            for case in ['memory', 'mmap']:
+                if case == 'memory' and samples > args.max_memory_samples:
+                    continue
+                key = '{}@{}d'.format(case, days)
+                print('Running ' + key, file=sys.stderr)
+                results[key] = harness.run_isolated(
+                    'benchmarks.bench_column_store',
+                    ['--case', case, '--directory', directory,
+                     '--repeat', str(args.repeat)])
+        finally:
+            shutil.rmtree(directory)
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--directory')
+        parser.add_argument('--repeat', type=int)
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.directory, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
@@ -0,0 +1,100 @@
+"""
+Benchmark cotrans_cached against cotrans.
+
+Several vectors on the same day of 1 sec data are transformed from GEI
+to GSE and to GSM:
+
+- cotrans: one pyspedas.cotrans call per vector.
+- cached: one cotrans_cached call per vector, starting from an empty
+  cache, so the matrices are built for the first vector only.
+- rotate: the matrices are taken from the cache and all the vectors are
+  rotated with one einsum.
+
+The hit rate of the cache is reported for the cached case.
+
+Run it with:
+    python -m benchmarks.bench_cotrans [--vectors 1,2,4] [--cadence 1]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'cotrans.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--vectors', default='1,2,4',
+                        help='comma separated numbers of vectors')
+    parser.add_argument('--cadence', type=float, default=1.0,
+                        help='seconds between samples (default 1)')
+    parser.add_argument('--coords', default='gse,gsm',
+                        help='comma separated output coordinates')
+
+
+def run_all(args):
+    import logging
+    from pyspedas import cotrans, store_data
+    from pyspedas_examples.analysis.cotrans_cache import (CotransCache,
+                                                          cotrans_cached,
+                                                          cotrans_matrices,
+                                                          rotate)
+    # cotrans logs every step of every call.
+    logging.disable(logging.INFO)
+
+    t = 1182556800.0 + np.arange(0.0, 86400.0, args.cadence)
+    rng = np.random.default_rng(0)
+    results = {}
+    for count in [int(v) for v in args.vectors.split(',')]:
+        names = ['vec{:02d}'.format(i) for i in range(count)]
+        data = [rng.standard_normal((len(t), 3)) * 1e4 for _ in names]
+        for name, d in zip(names, data):
+            store_data(name, data={'x': t, 'y': d})
+
+        for coord in args.coords.split(','):
+            key = '{}x{}'.format(coord, count)
+            print('Running ' + key, file=sys.stderr)
+
+            def run_cotrans():
+                for name in names:
+                    cotrans(name_in=name, name_out=name + '_out',
+                            coord_in='gei', coord_out=coord)
+            results['cotrans@' + key] = harness.measure(
+                run_cotrans, repeat=args.repeat)
+
+            caches = []
+
+            def run_cached():
+                caches.append(CotransCache())
+                for name in names:
+                    cotrans_cached(name_in=name, name_out=name + '_out',
+                                   coord_in='gei', coord_out=coord,
+                                   cache=caches[-1])
+            results['cached@' + key] = harness.measure(
+                run_cached, repeat=args.repeat)
+            results['cached@' + key]['hit_rate'] = caches[-1].hit_rate
+
+            warm = CotransCache()
+            cotrans_matrices(t, 'gei', coord, cache=warm)
+            results['rotate@' + key] = harness.measure(
+                lambda: rotate(cotrans_matrices(t, 'gei', coord,
+                                                cache=warm), data),
+                repeat=args.repeat)
+
+    for key, m in sorted(results.items()):
+        if key.startswith('cotrans@'):
+            continue
+        base = results['cotrans@' + key.split('@')[1]]
+        print('{:<28} speedup {:7.1f}{}'.format(
+            key, base['time'] / m['time'],
+            '  hit rate {:.2f}'.format(m['hit_rate']) if 'hit_rate' in m
+            else ''))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,95 @@
+"""
+Benchmark cotrans_batch against one cotrans call per variable.
+
+Each probe has four variables in GEI for one day: FGM and EFI on the
+same times, position and velocity on the same (slower) times. They are
+all transformed to GSM:
+
+- cotrans: one pyspedas.cotrans call per variable.
+- batch: one cotrans_batch call, with a matrix build per time array.
+- interp: one cotrans_batch call, interpolated to the FGM times.
+
+The time per variable shows the overhead as the number of probes grows.
+
+Run it with:
+    python -m benchmarks.bench_cotrans_batch [--probes 1,2,5]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'cotrans_batch.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--probes', default='1,2,5',
+                        help='comma separated numbers of probes')
+    parser.add_argument('--cadence', type=float, default=4.0,
+                        help='seconds between FGM and EFI samples')
+    parser.add_argument('--state-cadence', type=float, default=60.0,
+                        help='seconds between position samples')
+
+
+def store_probe(probe, cadence, state_cadence):
+    """Store the four GEI variables of a probe."""
+    from pyspedas import set_coords, store_data
+    t0 = 1182556800.0
+    rng = np.random.default_rng(ord(probe))
+    names = []
+    for var, dt in [('fgl', cadence), ('efs', cadence),
+                    ('pos', state_cadence), ('vel', state_cadence)]:
+        t = t0 + np.arange(0.0, 86400.0, dt)
+        name = 'th' + probe + '_' + var
+        store_data(name, data={'x': t, 'y': rng.standard_normal((len(t), 3))})
+        set_coords(name, 'GEI')
+        names.append(name)
+    return names
+
+
+def run_all(args):
+    import logging
+    from pyspedas import cotrans, get_data
+    from pyspedas_examples.analysis.cotrans_cache import (CotransCache,
+                                                          cotrans_batch)
+    # cotrans logs every step of every call.
+    logging.disable(logging.INFO)
+
+    results = {}
+    for count in [int(p) for p in args.probes.split(',')]:
+        names = []
+        for probe in 'abcdefghijklmnopqrstuvwxyz'[:count]:
+            names += store_probe(probe, args.cadence, args.state_cadence)
+        pairs = [(n, n + '_gsm') for n in names]
+        time_base = get_data(names[0])[0]
+        key = '{}p'.format(count)
+        print('Running ' + key, file=sys.stderr)
+
+        def run_cotrans():
+            for name_in, name_out in pairs:
+                cotrans(name_in=name_in, name_out=name_out, coord_out='gsm')
+        results['cotrans@' + key] = harness.measure(run_cotrans,
+                                                    repeat=args.repeat)
+        results['batch@' + key] = harness.measure(
+            lambda: cotrans_batch(pairs, coord_out='gsm',
+                                  cache=CotransCache()),
+            repeat=args.repeat)
+        results['interp@' + key] = harness.measure(
+            lambda: cotrans_batch(pairs, coord_out='gsm',
+                                  time_base=time_base,
+                                  cache=CotransCache()),
+            repeat=args.repeat)
+
+    for key, m in sorted(results.items()):
+        count = int(key.split('@')[1][:-1])
+        print('{:<28} {:8.4f} s per variable'.format(
+            key, m['time'] / (4 * count)))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
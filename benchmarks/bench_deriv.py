@@ -0,0 +1,121 @@
+"""
+Benchmark deriv_batch against deriv_data.
+
+--variables GMAG-like variables (3 components, float32, 0.5 s samples)
+with the same times are differentiated, for each length, each case in a
+fresh interpreter:
+
+- current: pyspedas.deriv_data, as ex_deriv (one call per variable).
+- batch: deriv_batch, all the variables in one call.
+- gaps: deriv_batch with gap=60 s, with a gap of 10 minutes every 10**5
+  samples.
+- savgol: deriv_batch with a Savitzky-Golay filter (window of 11
+  samples, order 3).
+
+The throughput is the number of samples of all the components per
+second.
+
+Run it with:
+    python -m benchmarks.bench_deriv [--lengths 1e6,1e7] [--variables 3]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'deriv.json')
+
+
+def make_variables(length, count, gaps):
+    from pyspedas import store_data
+    rng = np.random.default_rng(0)
+    t = 1174608000.0 + 0.5 * np.arange(length)
+    if gaps:
+        t += 600.0 * (np.arange(length) // 100000)
+    names = []
+    for i in range(count):
+        y = np.empty((length, 3), dtype=np.float32)
+        chunk = 2**22
+        level = np.array([20000.0, 500.0, 50000.0])
+        for start in range(0, length, chunk):
+            walk = rng.standard_normal((min(chunk, length - start), 3))
+            walk = walk.cumsum(axis=0)
+            y[start:start + len(walk)] = level + 0.1 * walk
+            level = level + 0.1 * walk[-1]
+        names.append('thg_mag_{:02d}'.format(i))
+        store_data(names[-1], data={'x': t, 'y': y})
+    return names
+
+
+def run_case(case, length, count, repeat):
+    """Run one case in this process and return its metrics."""
+    from pyspedas.analysis.deriv_data import deriv_data
+    from pyspedas_examples.analysis.deriv_batch import deriv_batch
+    names = make_variables(length, count, case == 'gaps')
+    if case == 'current':
+        def func():
+            for name in names:
+                deriv_data(name)
+    elif case == 'batch':
+        def func():
+            deriv_batch(names)
+    elif case == 'gaps':
+        def func():
+            deriv_batch(names, gap=60.0)
+    else:
+        def func():
+            deriv_batch(names, savgol=(11, 3))
+    metrics = harness.measure(func, repeat=repeat)
+    metrics['throughput'] = 3 * count * length / metrics['time']
+    return metrics
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='1e6,1e7',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--variables', type=int, default=3,
+                        help='number of variables')
+
+
+def run_all(args):
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        for case in ['current', 'batch', 'gaps', 'savgol']:
+            key = '{}@{:g}'.format(case, length)
+            print('Running ' + key, file=sys.stderr)
+            results[key] = harness.run_isolated(
+                'benchmarks.bench_deriv',
+                ['--case', case, '--length', str(length),
+                 '--variables', str(args.variables),
+                 '--repeat', str(args.repeat)])
+
+    for key in sorted(results, key=lambda k: (float(k.split('@')[1]), k)):
+        r = results[key]
+        if 'error' not in r:
+            print('{:<16} {:10.3g} samples/s, {:8.1f} MB RSS'.format(
+                key, r['throughput'], harness.megabytes(r['peak_rss'])))
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--length', type=int)
+        parser.add_argument('--variables', type=int)
+        parser.add_argument('--repeat', type=int)
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.length, args.variables,
+                           args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
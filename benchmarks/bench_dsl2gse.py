@@ -0,0 +1,99 @@
+"""
+Benchmark dsl2gse_batch against dsl2gse on 128 Hz data.
+
+Variables of a THEMIS probe at 128 Hz (like fgh) in DSL, with the spin
+axis attitude at 1 min, are transformed to GSE:
+
+- dsl2gse: one pyspedas dsl2gse call per variable. It is only run up to
+  --max-dsl2gse-hours, as it converts every time to a datetime.
+- batch: one dsl2gse_batch call with an empty cache.
+- cached: the same, with the spin axis directions already in dsl_cache.
+  It is only run up to --max-cached-hours.
+
+Run it with:
+    python -m benchmarks.bench_dsl2gse [--hours 1,24] [--variables 2]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'dsl2gse.json')
+
+t0 = 1490227200.0  # 2017-03-23
+
+
+def add_arguments(parser):
+    parser.add_argument('--hours', default='1,24',
+                        help='comma separated numbers of hours')
+    parser.add_argument('--rate', type=float, default=128.0,
+                        help='samples per second (default 128)')
+    parser.add_argument('--variables', type=int, default=2,
+                        help='number of variables on the same times')
+    parser.add_argument('--max-dsl2gse-hours', type=float, default=1.0,
+                        help='longest interval given to dsl2gse')
+    parser.add_argument('--max-cached-hours', type=float, default=24.0,
+                        help='longest interval with cached directions')
+
+
+def store_variables(hours, rate, count):
+    """Store the attitude and count DSL variables of probe a."""
+    from pyspedas import del_data, set_coords, store_data
+    del_data()
+    ta = t0 + np.arange(-60.0, hours * 3600.0 + 120.0, 60.0)
+    phase = 2 * np.pi * (ta - t0) / 86400.0
+    for suffix in ['', '_corrected']:
+        store_data('tha_spinras' + suffix,
+                   data={'x': ta, 'y': 60.0 + 5.0 * np.sin(phase)})
+        store_data('tha_spindec' + suffix,
+                   data={'x': ta, 'y': 30.0 + 5.0 * np.cos(phase)})
+    t = t0 + np.arange(int(hours * 3600 * rate)) / rate
+    rng = np.random.default_rng(0)
+    names = []
+    for i in range(count):
+        name = 'tha_v{:02d}_dsl'.format(i)
+        store_data(name, data={'x': t, 'y': rng.standard_normal((len(t), 3))})
+        set_coords(name, 'DSL')
+        names.append(name)
+    return names
+
+
+def run_all(args):
+    import logging
+    from pyspedas.projects.themis.cotrans.dsl2gse import dsl2gse
+    from pyspedas_examples.analysis.cotrans_cache import CotransCache
+    from pyspedas_examples.analysis.dsl2gse_cached import (dsl2gse_batch,
+                                                           dsl_cache)
+    logging.disable(logging.INFO)
+
+    results = {}
+    for hours in [float(h) for h in args.hours.split(',')]:
+        key = '{}h'.format(hours)
+        print('Running ' + key, file=sys.stderr)
+        names = store_variables(hours, args.rate, args.variables)
+        if hours <= args.max_dsl2gse_hours:
+            results['dsl2gse@' + key] = harness.measure(
+                lambda: [dsl2gse(n, n[:-3] + 'gse') for n in names],
+                repeat=args.repeat)
+        results['batch@' + key] = harness.measure(
+            lambda: dsl2gse_batch(names, cache=CotransCache()),
+            repeat=args.repeat)
+        if hours <= args.max_cached_hours:
+            dsl_cache.clear()
+            results['cached@' + key] = harness.measure(
+                lambda: dsl2gse_batch(names), repeat=args.repeat)
+            results['cached@' + key]['hit_rate'] = dsl_cache.hit_rate
+
+    for key, m in sorted(results.items()):
+        hours = float(key.split('@')[1][:-1])
+        print('{:<28} {:12.0f} samples/s'.format(
+            key, hours * 3600 * args.rate * args.variables / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,121 @@
+"""
+Benchmark dynamic_power against pyspedas.tdpwrspc.
+
+The dynamic power spectra of a GMAG-like variable (3 components,
+float32, 0.5 s samples, a random walk with a 20 s wave) of each length
+are computed with windows of --nboxpoints samples shifted by half a
+window, each case in a fresh interpreter:
+
+- current: pyspedas.tdpwrspc, one Python loop per component.
+- engine: dynamic_power, with one thread.
+- threads: dynamic_power, with --workers threads (default: CPUs).
+
+The throughput is the number of samples of all the components per
+second. The current case is skipped above --max-current-samples.
+
+Run it with:
+    python -m benchmarks.bench_dynamic_power [--lengths 1e5,1e6,1e7]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'dynamic_power.json')
+
+name = 'thg_mag_ccnv'
+
+
+def make_variable(length):
+    from pyspedas import store_data
+    rng = np.random.default_rng(0)
+    t = 0.5 * np.arange(length)
+    y = np.empty((length, 3), dtype=np.float32)
+    chunk = 2**22
+    level = np.array([20000.0, 500.0, 50000.0])
+    for start in range(0, length, chunk):
+        walk = rng.standard_normal((min(chunk, length - start), 3))
+        walk = walk.cumsum(axis=0)
+        wave = np.sin(2 * np.pi * t[start:start + len(walk)] / 20.0)
+        y[start:start + len(walk)] = level + 0.1 * walk + wave[:, None]
+        level = level + 0.1 * walk[-1]
+    store_data(name, data={'x': 1174608000.0 + t, 'y': y})
+
+
+def run_case(case, length, nboxpoints, workers, repeat):
+    """Run one case in this process and return its metrics."""
+    import pyspedas
+    from pyspedas_examples.analysis.dynamic_power import dynamic_power
+    make_variable(length)
+    if case == 'current':
+        def func():
+            pyspedas.tdpwrspc(name, nboxpoints=nboxpoints,
+                              nshiftpoints=nboxpoints // 2)
+    else:
+        def func():
+            dynamic_power(name, nboxpoints=nboxpoints,
+                          nshiftpoints=nboxpoints // 2,
+                          workers=1 if case == 'engine' else workers)
+    metrics = harness.measure(func, repeat=repeat)
+    metrics['throughput'] = 3 * length / metrics['time']
+    return metrics
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='1e5,1e6,1e7',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--nboxpoints', type=int, default=256,
+                        help='samples of each window')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='threads of the threads case (default: CPUs)')
+    parser.add_argument('--max-current-samples', type=float, default=1e7,
+                        help='largest length of the current case')
+
+
+def run_all(args):
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        for case in ['current', 'engine', 'threads']:
+            if case == 'current' and length > args.max_current_samples:
+                continue
+            key = '{}@{:g}'.format(case, length)
+            print('Running ' + key, file=sys.stderr)
+            options = ['--case', case, '--length', str(length),
+                       '--nboxpoints', str(args.nboxpoints),
+                       '--repeat', str(args.repeat)]
+            if args.workers is not None:
+                options += ['--workers', str(args.workers)]
+            results[key] = harness.run_isolated(
+                'benchmarks.bench_dynamic_power', options)
+
+    for key in sorted(results, key=lambda k: (float(k.split('@')[1]), k)):
+        r = results[key]
+        if 'error' not in r:
+            print('{:<16} {:10.3g} samples/s, {:8.1f} MB RSS'.format(
+                key, r['throughput'], harness.megabytes(r['peak_rss'])))
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--length', type=int)
+        parser.add_argument('--nboxpoints', type=int)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--repeat', type=int)
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.length, args.nboxpoints,
+                           args.workers, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
@@ -0,0 +1,121 @@
+"""
+Benchmark every example with plot=False on local synthetic data.
+
+Each example runs at several data sizes (the number of samples of the
+synthetic data is multiplied by each size factor). The time is broken
+out into load, transform and plot preparation, and the peak RSS and
+allocations are recorded. The results are compared to a JSON baseline.
+
+Run it with:
+    python -m benchmarks.bench_examples                # compare to baseline
+    python -m benchmarks.bench_examples --save         # save a new baseline
+    python -m benchmarks.bench_examples --sizes 1 --cases ex_avg,ex_gmag
+    python -m benchmarks.bench_examples --load-cache /tmp/loads
+
+With --load-cache, the loads go through a LoadCache in that directory,
+shared by all the cases (the store of each size has its own cache keys),
+and its hits and misses are reported.
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+from importlib import import_module
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'examples.json')
+
+# Example function: (module, uses the data store).
+# Examples that create their own data run at one size only.
+cases = {
+    'ex_analysis': ('ex_analysis', True),
+    'ex_avg': ('ex_avg', True),
+    'ex_avg2': ('ex_avg', False),
+    'ex_basic': ('ex_basic', True),
+    'ex_colors': ('ex_colors', True),
+    'ex_cotrans': ('ex_cotrans', True),
+    'ex_cotrans1': ('ex_cotrans', False),
+    'ex_deriv': ('ex_deriv', True),
+    'ex_deriv1': ('ex_deriv', False),
+    'ex_dsl2gse': ('ex_dsl2gse', True),
+    'ex_gmag': ('ex_gmag', True),
+    'ex_mpause_2': ('ex_mpause_2', False),
+    'ex_mpause_t96': ('ex_mpause_t96', True),
+    'ex_smooth': ('ex_smooth', False),
+    'ex_spectra': ('ex_spectra', True),
+    'ex_spikes': ('ex_spikes', True),
+    'ex_wavelet': ('ex_wavelet', False),
+}
+
+
+def add_arguments(parser):
+    parser.add_argument('--load-cache', default='',
+                        help='directory of a load cache shared by the cases')
+
+
+def run_case(name, size, repeat, load_cache=''):
+    """Run one example in this process and return its metrics."""
+    import contextlib
+    import io
+    from pyspedas_examples.utilities.data_provider import set_data_provider
+    from pyspedas_examples.utilities.load_cache import (LoadCache,
+                                                        set_load_cache)
+    from pyspedas_examples.utilities.synthetic import make_synthetic_store
+
+    set_data_provider(make_synthetic_store(scale=size))
+    cache = None
+    if load_cache:
+        cache = LoadCache(load_cache)
+    set_load_cache(cache)
+    module = import_module('pyspedas_examples.examples.' + cases[name][0])
+    func = getattr(module, name)
+    kwargs = {'plot': False} if 'plot' in inspect.signature(func).parameters \
+        else {}
+
+    # The examples print their results, which is not needed here.
+    with contextlib.redirect_stdout(io.StringIO()):
+        metrics = harness.measure(lambda: func(**kwargs), repeat=repeat,
+                                  module=module)
+    if cache is not None:
+        metrics['cache_hits'] = cache.hits
+        metrics['cache_misses'] = cache.misses
+    return metrics
+
+
+def run_all(args):
+    """Run the selected cases at every size, each in a fresh interpreter."""
+    results = {}
+    for name, (_, sized) in cases.items():
+        if args.cases and name not in args.cases:
+            continue
+        for size in (args.sizes if sized else [1.0]):
+            key = name + '@' + str(size)
+            print('Running ' + key, file=sys.stderr)
+            results[key] = harness.run_isolated(
+                'benchmarks.bench_examples',
+                ['--case', name, '--size', str(size),
+                 '--repeat', str(args.repeat),
+                 '--load-cache', args.load_cache])
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--size', type=float)
+        parser.add_argument('--repeat', type=int)
+        parser.add_argument('--load-cache', default='')
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.size, args.repeat,
+                           args.load_cache)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
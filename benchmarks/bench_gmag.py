@@ -0,0 +1,79 @@
+"""
+Benchmark parallel GMAG loading and detrending (gmag_parallel).
+
+A store with many synthetic stations is served with an added latency for
+each request, which stands in for the download time of a station.
+The stations are loaded with 1, 2, 4, ... workers.
+
+Run it with:
+    python -m benchmarks.bench_gmag [--stations 64] [--latency 0.2]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import harness
+from pyspedas_examples.utilities.data_provider import (LocalProvider,
+                                                       set_data_provider)
+from pyspedas_examples.utilities.gmag_parallel import gmag_parallel
+from pyspedas_examples.utilities.synthetic import add_gmag, write_store
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'gmag.json')
+
+
+class LatencyProvider(LocalProvider):
+    """Local provider that waits before each load, like a download."""
+
+    def __init__(self, path, latency):
+        super().__init__(path)
+        self.latency = latency
+
+    def load(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return super().load(*args, **kwargs)
+
+
+def add_arguments(parser):
+    parser.add_argument('--stations', type=int, default=32,
+                        help='number of stations')
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='seconds added to the load of each station')
+    parser.add_argument('--workers', default='1,2,4,8,16',
+                        help='comma separated numbers of workers')
+
+
+def run_all(args):
+    sites = ['s{:03d}'.format(i) for i in range(args.stations)]
+    path = os.path.join(tempfile.gettempdir(),
+                        'pyspedas_examples_gmag_' + str(args.stations))
+    if not os.path.exists(path):
+        store = {}
+        add_gmag(store, sites, ['2015-12-31'])
+        write_store(path, store)
+    set_data_provider(LatencyProvider(path, args.latency))
+
+    results = {}
+    try:
+        for workers in [int(w) for w in args.workers.split(',')]:
+            key = 'workers={}'.format(workers)
+            print('Running ' + key, file=sys.stderr)
+            results[key] = harness.measure(
+                lambda: gmag_parallel(sites, ['2015-12-31', '2015-12-31'],
+                                      workers=workers),
+                repeat=args.repeat)
+    finally:
+        set_data_provider(None)
+
+    serial = results.get('workers=1')
+    if serial is not None:
+        for key, m in results.items():
+            print('{:<12} speedup {:5.2f}'.format(
+                key, serial['time'] / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,113 @@
+"""
+Import-time regression benchmark.
+
+Each entry point is imported in a fresh interpreter started with
+``python -X importtime``, and the cumulative import time of everything
+imported after interpreter startup is compared against a budget.
+
+Run it with:
+    python -m benchmarks.bench_import [--scale 2.0]
+"""
+import argparse
+import subprocess
+import sys
+
+# Budget, in seconds, for each import statement.
+# Importing the package must not import pyspedas. Every example except
+# ex_cdagui imports pyspedas, which dominates their import time.
+budgets = {
+    'import pyspedas_examples': 0.25,
+    'from pyspedas_examples import ex_cdagui': 0.25,
+    'from pyspedas_examples import ex_smooth': 8.0,
+    'from pyspedas_examples import ex_avg': 8.0,
+    'from pyspedas_examples import ex_basic': 8.0,
+    'from pyspedas_examples import ex_cdasws': 8.0,
+    'from pyspedas_examples import ex_mpause_2': 8.0,
+}
+
+# Modules that must not be imported by a statement.
+forbidden = {
+    'import pyspedas_examples': ['pyspedas', 'pytplot', 'matplotlib', 'cdasws'],
+    'from pyspedas_examples import ex_cdagui': ['pyspedas', 'pytplot', 'matplotlib', 'cdasws'],
+}
+
+
+def import_time(statement):
+    """
+    Import time of a statement in a fresh interpreter.
+
+    Parameters
+    ----------
+    statement: str
+        Python import statement.
+
+    Returns
+    -------
+    seconds: float
+        Cumulative import time of the modules imported by the statement.
+    modules: list of str
+        Names of all modules imported by the statement.
+    """
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in res.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented by two spaces per level.
+        rows.append((int(cumulative), name[1:].rstrip()))
+
+    # Skip the modules imported during interpreter startup, which end with site.
+    start = 0
+    for i, (_, name) in enumerate(rows):
+        if name == 'site':
+            start = i + 1
+
+    total = 0
+    modules = []
+    for cumulative, name in rows[start:]:
+        if not name.startswith(' '):
+            total += cumulative
+        modules.append(name.strip())
+
+    return total / 1e6, modules
+
+
+def run(scale=1.0):
+    """
+    Check every import statement against its budget.
+
+    Parameters
+    ----------
+    scale: float, optional
+        Multiply all budgets by this factor (for slow machines).
+        Default is 1.0.
+
+    Returns
+    -------
+    failures: list of str
+        Description of each statement over its budget.
+    """
+    failures = []
+    for statement, budget in budgets.items():
+        seconds, modules = import_time(statement)
+        print('{:<45} {:8.3f} s  (budget {:.3f} s)'.format(statement, seconds, budget * scale))
+        if seconds > budget * scale:
+            failures.append(statement + ': ' + str(seconds) + ' s')
+        for name in forbidden.get(statement, []):
+            if name in modules:
+                failures.append(statement + ': imports ' + name)
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='multiply all budgets by this factor')
+    args = parser.parse_args()
+    failed = run(scale=args.scale)
+    for f in failed:
+        print('FAILED ' + f)
+    sys.exit(1 if failed else 0)
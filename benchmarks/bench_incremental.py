@@ -0,0 +1,118 @@
+"""
+Benchmark incremental analysis against batch recomputation.
+
+A day of GMAG data (synthetic, 0.5 s samples) arrives one minute at a
+time, as in a near-real-time feed. After each append, a refresh needs
+the median, the 5 minute averages, the derivative and the cleaned data
+of the day so far:
+
+- batch: nanmedian, avg_data, deriv_data and clean_spikes_batch on all
+  the samples so far, as a dashboard does after each load.
+- incremental: update and result of IncrementalMedian,
+  IncrementalAverage and IncrementalDerivative, and update and pending
+  of IncrementalSpikes.
+
+The time of a refresh is measured when the day is filled to each
+fraction. The incremental objects are filled up to a few minutes before
+it first, and each measured call appends one of these minutes.
+
+Run it with:
+    python -m benchmarks.bench_incremental [--fills 0.1,0.5,1]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'incremental.json')
+
+var = 'thg_mag_ccnv'
+minute = 120  # samples
+
+
+def add_arguments(parser):
+    parser.add_argument('--fills', default='0.1,0.5,1',
+                        help='comma separated fractions of the day')
+
+
+def batch(t, y):
+    from pyspedas import avg_data, store_data
+    from pyspedas.analysis.deriv_data import deriv_data
+    from pyspedas_examples.analysis.clean_spikes_batch import spike_mask
+    store_data('feed', data={'x': t, 'y': y})
+    np.nanmedian(y, axis=0)
+    avg_data('feed', res=5*60.)
+    deriv_data('feed')
+    y = y.copy()
+    y[spike_mask(y)] = np.nan
+
+
+def incremental(t, y, calls):
+    from pyspedas_examples.analysis.incremental import (
+        IncrementalAverage, IncrementalDerivative, IncrementalMedian,
+        IncrementalSpikes)
+    objects = [IncrementalAverage(res=5*60.), IncrementalDerivative()]
+    spikes = IncrementalSpikes()
+    median = IncrementalMedian(y.dtype)
+    starts = list(range(0, len(t), minute))
+    for s in starts[:-calls]:
+        median.update(y[s:s + minute])
+        spikes.update(t[s:s + minute], y[s:s + minute])
+        for i in objects:
+            i.update(t[s:s + minute], y[s:s + minute])
+    starts = iter(starts[-calls:])
+
+    def refresh():
+        # Each call appends the next minute, up to the fill.
+        s = next(starts)
+        median.update(y[s:s + minute])
+        median.median
+        spikes.update(t[s:s + minute], y[s:s + minute])
+        spikes.pending()
+        for i in objects:
+            i.update(t[s:s + minute], y[s:s + minute])
+            i.result()
+    return refresh
+
+
+def run_all(args):
+    import contextlib
+    import io
+    from pyspedas import del_data, get_data
+    from pyspedas_examples.utilities.data_provider import set_data_provider
+    from pyspedas_examples.utilities.load import gmag
+    from pyspedas_examples.utilities.synthetic import make_synthetic_store
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        set_data_provider(make_synthetic_store(scale=1))
+    del_data()
+    gmag(sites=['ccnv'], trange=['2007-03-23', '2007-03-23'],
+         varnames=[var])
+    t, y = get_data(var)
+    t, y = np.array(t), np.array(y)
+
+    results = {}
+    for fill in [float(f) for f in args.fills.split(',')]:
+        n = int(len(t) * fill)
+        print('Running fill ' + str(fill), file=sys.stderr)
+        results['batch@{}'.format(fill)] = harness.measure(
+            lambda: batch(t[:n], y[:n]), repeat=args.repeat)
+        results['incremental@{}'.format(fill)] = harness.measure(
+            incremental(t[:n], y[:n], args.repeat + 2),
+            repeat=args.repeat)
+
+    for key in sorted(results):
+        if not key.startswith('batch@'):
+            continue
+        b, i = results[key], results['incremental' + key[5:]]
+        print('refresh at fill {:<6} {:8.2f}x faster'.format(
+            key[6:], b['time'] / i['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
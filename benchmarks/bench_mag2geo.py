@@ -0,0 +1,80 @@
+"""
+Benchmark submag2geo_table against submag2geo.
+
+Random points at random times over a year are transformed from MAG to
+GEO:
+
+- submag2geo: the pyspedas function, which goes through the dipole
+  direction and a rotation for every point. It is only run on
+  --submag2geo-points points, and its time is scaled to the others.
+- table: submag2geo_table, with a daily table made by the call.
+- linear: submag2geo_table with a table at --cadence, made beforehand,
+  and linear interpolation of the dipole axis.
+
+Run it with:
+    python -m benchmarks.bench_mag2geo [--points 1e6,1e7]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'mag2geo.json')
+
+t0 = 1577836800.0  # 2020-01-01
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', default='1e6,1e7',
+                        help='comma separated numbers of points')
+    parser.add_argument('--submag2geo-points', type=int, default=2000,
+                        help='number of points given to submag2geo')
+    parser.add_argument('--cadence', type=float, default=6 * 3600.0,
+                        help='seconds between the nodes of the linear table')
+
+
+def make_points(count, seed=0):
+    """Sorted random times over a year, and random MAG vectors."""
+    rng = np.random.default_rng(seed)
+    t = np.sort(t0 + rng.uniform(0.0, 365 * 86400.0, count))
+    return t, rng.standard_normal((count, 3)) * 1e4
+
+
+def run_all(args):
+    import logging
+    from pyspedas.cotrans_tools.cotrans_lib import submag2geo
+    from pyspedas_examples.analysis.dipole_table import (DipoleTable,
+                                                         submag2geo_table)
+    logging.disable(logging.INFO)
+
+    results = {}
+    t, d = make_points(args.submag2geo_points)
+    m = harness.measure(lambda: submag2geo(list(t), d), repeat=args.repeat)
+    m['points'] = args.submag2geo_points
+    results['submag2geo@{}'.format(args.submag2geo_points)] = m
+
+    for count in [int(float(p)) for p in args.points.split(',')]:
+        key = '{:.0e}'.format(count)
+        print('Running ' + key, file=sys.stderr)
+        t, d = make_points(count)
+        results['table@' + key] = harness.measure(
+            lambda: submag2geo_table(t, d), repeat=args.repeat)
+        table = DipoleTable(t[0], t[-1], cadence=args.cadence)
+        results['linear@' + key] = harness.measure(
+            lambda: submag2geo_table(t, d, method='linear', table=table),
+            repeat=args.repeat)
+        for name in ['table', 'linear']:
+            results[name + '@' + key]['points'] = count
+
+    for key, m in sorted(results.items()):
+        print('{:<28} {:14.0f} points/s'.format(
+            key, m['points'] / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,112 @@
+"""
+Benchmark the median engine against subtract_average(median=1).
+
+A GMAG-like variable (3 components, float32, a random walk with 1% of
+NaN) of each length is detrended, each case in a fresh interpreter:
+
+- current: pyspedas.subtract_average(median=1), as ex_avg and ex_deriv.
+- engine: median.subtract_median, as ex_analysis(batch=True).
+- sliding: median.sliding_median, with a window of --width samples
+  (10 minutes of 0.5 s samples by default), for a moving baseline.
+
+Run it with:
+    python -m benchmarks.bench_median [--lengths 1e6,1e7] [--width 1201]
+
+--lengths 1e8 needs about 9 GB of memory (2.5 GB for 3e7).
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'median.json')
+
+name = 'thg_mag_ccnv'
+
+
+def make_variable(length):
+    from pyspedas import store_data
+    rng = np.random.default_rng(0)
+    y = np.empty((length, 3), dtype=np.float32)
+    chunk = 2**22
+    level = np.array([20000.0, 500.0, 50000.0])
+    for start in range(0, length, chunk):
+        walk = rng.standard_normal((min(chunk, length - start), 3))
+        walk = walk.cumsum(axis=0)
+        y[start:start + len(walk)] = level + 0.1 * walk
+        level = level + 0.1 * walk[-1]
+    y[rng.integers(0, length, length // 100), 1] = np.nan
+    store_data(name, data={'x': 1174608000.0 + 0.5 * np.arange(length),
+                           'y': y})
+
+
+def run_case(case, length, width, repeat):
+    """Run one case in this process and return its metrics."""
+    import pyspedas
+    from pyspedas_examples.analysis import median
+    make_variable(length)
+    if case == 'current':
+        def func():
+            pyspedas.subtract_average(name, median=1)
+    elif case == 'engine':
+        def func():
+            median.subtract_median(name)
+    else:
+        y = pyspedas.get_data(name)[1]
+        # Without NaN, as after interpolating the gaps.
+        y = np.nan_to_num(y, nan=y[0, 1])
+
+        def func():
+            median.sliding_median(y, width)
+    return harness.measure(func, repeat=repeat)
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='1e6,1e7',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--width', type=int, default=1201,
+                        help='samples of the sliding window')
+
+
+def run_all(args):
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        for case in ['current', 'engine', 'sliding']:
+            key = '{}@{:g}'.format(case, length)
+            print('Running ' + key, file=sys.stderr)
+            results[key] = harness.run_isolated(
+                'benchmarks.bench_median',
+                ['--case', case, '--length', str(length),
+                 '--width', str(args.width), '--repeat', str(args.repeat)])
+
+    for key in sorted(results):
+        if not key.startswith('current@'):
+            continue
+        c, e = results[key], results['engine' + key[7:]]
+        if 'error' not in c and 'error' not in e:
+            print('subtract median @{:<6} {:6.2f}x faster'.format(
+                key[8:], c['time'] / e['time']))
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--length', type=int)
+        parser.add_argument('--width', type=int)
+        parser.add_argument('--repeat', type=int)
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.length, args.width, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
@@ -0,0 +1,71 @@
+"""
+Benchmark mpause_t96_bulk against mpause_t96.
+
+Random points around the Earth are checked against the T96 magnetopause:
+
+- mpause_t96: the pyspedas function, with one pressure for all points
+  (it does not accept one pressure per point).
+- bulk: mpause_t96_bulk with one pressure per point, and the nearest
+  boundary points.
+- flags: the same, with the flags and distances only.
+
+Run it with:
+    python -m benchmarks.bench_mpause [--points 1e5,1e6,1e7]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'mpause.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--points', default='1e5,1e6,1e7',
+                        help='comma separated numbers of points')
+    parser.add_argument('--chunk-size', type=int, default=2**16,
+                        help='points per chunk of mpause_t96_bulk')
+
+
+def make_points(count, seed=0):
+    """Random positions in Earth radii, and pressures in nPa."""
+    rng = np.random.default_rng(seed)
+    pos = rng.uniform(-40.0, 40.0, (3, count))
+    pos[0] -= 20.0
+    return pos, rng.uniform(0.5, 10.0, count)
+
+
+def run_all(args):
+    from pyspedas import mpause_t96
+    from pyspedas_examples.analysis.mpause_bulk import mpause_t96_bulk
+
+    results = {}
+    for count in [int(float(p)) for p in args.points.split(',')]:
+        key = '{:.0e}'.format(count)
+        print('Running ' + key, file=sys.stderr)
+        (x, y, z), pd = make_points(count)
+        results['mpause_t96@' + key] = harness.measure(
+            lambda: mpause_t96(2.0, x, y, z), repeat=args.repeat)
+        results['bulk@' + key] = harness.measure(
+            lambda: mpause_t96_bulk(pd, x, y, z, boundary=True,
+                                    chunk_size=args.chunk_size),
+            repeat=args.repeat)
+        results['flags@' + key] = harness.measure(
+            lambda: mpause_t96_bulk(pd, x, y, z,
+                                    chunk_size=args.chunk_size),
+            repeat=args.repeat)
+        for name in ['mpause_t96', 'bulk', 'flags']:
+            results[name + '@' + key]['points'] = count
+
+    for key, m in sorted(results.items()):
+        print('{:<28} {:14.0f} points/s'.format(
+            key, m['points'] / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,89 @@
+"""
+Benchmark the cache of magnetopause boundaries.
+
+A plot job asks for the mpause_2 and mpause_t96 boundaries --requests
+times, for a few parameter sets (pressures for mpause_t96, xmp_max for
+mpause_2):
+
+- model: the pyspedas functions are called every time.
+- memory: the boundaries come from an in-process ModelCache.
+- disk: each request uses a new ModelCache on a directory where the
+  boundaries are already saved, as a new process would.
+
+Run it with:
+    python -m benchmarks.bench_mpause_cache [--requests 100] [--sets 1,10]
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'mpause_cache.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--requests', type=int, default=100,
+                        help='requests per parameter set')
+    parser.add_argument('--sets', default='1,10',
+                        help='comma separated numbers of parameter sets')
+
+
+def run_all(args):
+    from pyspedas import mpause_2, mpause_t96
+    from pyspedas_examples.analysis.mpause_cache import (ModelCache,
+                                                         mpause_2_cached,
+                                                         mpause_t96_boundary)
+
+    results = {}
+    directory = tempfile.mkdtemp()
+    for count in [int(s) for s in args.sets.split(',')]:
+        pressures = np.linspace(1.0, 5.0, count)
+        key = '{}x{}'.format(count, args.requests)
+        print('Running ' + key, file=sys.stderr)
+
+        def run_model():
+            for _ in range(args.requests):
+                for i, pd in enumerate(pressures):
+                    mpause_2(xmp_max=10.0 + i)
+                    mpause_t96(pd)
+        results['model@' + key] = harness.measure(run_model,
+                                                  repeat=args.repeat)
+
+        caches = []
+
+        def run_memory():
+            caches.append(ModelCache())
+            for _ in range(args.requests):
+                for i, pd in enumerate(pressures):
+                    mpause_2_cached(xmp_max=10.0 + i, cache=caches[-1])
+                    mpause_t96_boundary(pd, cache=caches[-1])
+        results['memory@' + key] = harness.measure(run_memory,
+                                                   repeat=args.repeat)
+        results['memory@' + key]['hit_rate'] = caches[-1].hit_rate
+
+        def run_disk():
+            for _ in range(args.requests):
+                caches.append(ModelCache(directory=directory))
+                for i, pd in enumerate(pressures):
+                    mpause_2_cached(xmp_max=10.0 + i, cache=caches[-1])
+                    mpause_t96_boundary(pd, cache=caches[-1])
+        results['disk@' + key] = harness.measure(run_disk,
+                                                 repeat=args.repeat)
+        results['disk@' + key]['hit_rate'] = caches[-1].hit_rate
+
+    for key, m in sorted(results.items()):
+        base = results['model@' + key.split('@')[1]]
+        print('{:<28} speedup {:7.1f}{}'.format(
+            key, base['time'] / m['time'],
+            '  hit rate {:.2f}'.format(m['hit_rate']) if 'hit_rate' in m
+            else ''))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,84 @@
+"""
+Benchmark a lazy Pipeline against the steps of ex_avg and ex_deriv.
+
+The GMAG variable of ex_avg and ex_deriv (synthetic, with the number of
+samples multiplied by each size factor) goes through their chains:
+
+- chain: subtract_average(median=1), then avg_data (res and width) and
+  deriv_data, as the two examples do. eager runs the pyspedas functions,
+  which store every intermediate variable, and lazy computes the three
+  results with a Pipeline.
+- deriv: subtract_average(median=1), then deriv_data, as ex_deriv. In the
+  Pipeline the median is subtracted chunk by chunk in the derivative.
+
+The memory saved (peak of the allocations) and the speedup are printed.
+
+Run it with:
+    python -m benchmarks.bench_pipeline [--sizes 1,4,16]
+"""
+import os
+import sys
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'pipeline.json')
+
+var = 'thg_mag_ccnv'
+
+
+def eager(deriv_only):
+    from pyspedas import avg_data, subtract_average
+    from pyspedas.analysis.deriv_data import deriv_data
+    subtract_average(var, median=1)
+    if not deriv_only:
+        avg_data(var + '-m', res=5*60.)
+        avg_data(var + '-m', width=5*60.*2., newname=var + '-m-avg2')
+    deriv_data(var + '-m')
+
+
+def lazy(deriv_only):
+    from pyspedas_examples.analysis.pipeline import Pipeline
+    p = Pipeline()
+    m = p.source(var).subtract_average(median=True)
+    outputs = [m.deriv_data()]
+    if not deriv_only:
+        outputs += [m.avg_data(res=5*60.),
+                    m.avg_data(width=5*60.*2., newname=m.name + '-avg2')]
+    p.compute(outputs)
+
+
+def run_all(args):
+    import contextlib
+    import io
+    from pyspedas import del_data
+    from pyspedas_examples.utilities.data_provider import set_data_provider
+    from pyspedas_examples.utilities.load import gmag
+    from pyspedas_examples.utilities.synthetic import make_synthetic_store
+
+    results = {}
+    for size in args.sizes:
+        print('Running size ' + str(size), file=sys.stderr)
+        with contextlib.redirect_stdout(io.StringIO()):
+            set_data_provider(make_synthetic_store(scale=size))
+        for chain, deriv_only in [('chain', False), ('deriv', True)]:
+            for mode, func in [('eager', eager), ('lazy', lazy)]:
+                del_data()
+                gmag(sites=['ccnv'], trange=['2007-03-23', '2007-03-23'],
+                     varnames=[var])
+                key = '{}-{}@{}'.format(chain, mode, size)
+                results[key] = harness.measure(
+                    lambda: func(deriv_only), repeat=args.repeat)
+
+    for key in sorted(results):
+        if '-eager@' not in key:
+            continue
+        e, z = results[key], results[key.replace('-eager@', '-lazy@')]
+        print('{:<28} {:6.2f}x faster, {:8.1f} MB less allocated'.format(
+            key.replace('-eager', ''), e['time'] / z['time'],
+            (e['alloc_peak'] - z['alloc_peak']) / 2**20))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path))
@@ -0,0 +1,147 @@
+"""
+Benchmark spec_render against plotting all the samples of a spectrogram.
+
+A spectrogram of --channels energies (float32, log spaced, with 1% of
+NaN) is drawn by tplot, in a figure of the default size, for each length
+and each case in a fresh interpreter:
+
+- tplot: tplot of the spectrogram (only up to --max-tplot-samples).
+- render: spec_render, with an empty cache, and tplot of the binned
+  spectrogram.
+- cached: the same with the binned spectrogram in the cache, as when a
+  plot is drawn again.
+- zoom: spec_render and tplot of the first hour, then of the whole day
+  again (from the cache).
+
+The times are in a day, so the columns are about 86 s wide.
+
+Run it with:
+    python -m benchmarks.bench_render [--lengths 1e5,1e6,3e6]
+        [--channels 32]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'render.json')
+
+name = 'tha_peif_en_eflux'
+
+
+def make_variable(length, channels):
+    from pyspedas import options, store_data
+    rng = np.random.default_rng(0)
+    t = 1451520000.0 + 86400.0 * np.arange(length) / length
+    energies = np.geomspace(5.0, 2.5e4, channels)
+    y = np.empty((length, channels), dtype=np.float32)
+    chunk = 2**20
+    for start in range(0, length, chunk):
+        stop = min(start + chunk, length)
+        level = 1.0 + 0.8 * np.sin(2 * np.pi * np.arange(start, stop)
+                                   / length)
+        y[start:stop] = (1e7 * level[:, None] * (energies / 5.0)**-1.5
+                         * rng.lognormal(0.0, 0.3, (stop - start, channels)))
+    y[rng.integers(0, length, length // 100),
+      rng.integers(0, channels, length // 100)] = np.nan
+    store_data(name, data={'x': t, 'y': y, 'v': energies})
+    options(name, 'spec', True)
+    options(name, 'ylog', True)
+    options(name, 'zlog', True)
+    return t
+
+
+def run_case(case, length, channels, repeat):
+    """Run one case in this process and return its metrics."""
+    import tempfile
+    import matplotlib.pyplot as plt
+    from pyspedas import tplot
+    from pyspedas_examples.analysis.spec_render import (RenderCache,
+                                                        spec_render)
+    t = make_variable(length, channels)
+    png = os.path.join(tempfile.gettempdir(), 'bench_render.png')
+
+    def draw(names):
+        tplot(names, display=False, save_png=png)
+        plt.close('all')
+
+    cache = RenderCache()
+    if case == 'tplot':
+        def func():
+            draw(name)
+    elif case == 'render':
+        def func():
+            cache.clear()
+            draw(spec_render(name, cache=cache))
+    elif case == 'cached':
+        def func():
+            draw(spec_render(name, cache=cache))
+    else:
+        def func():
+            cache.clear()
+            draw(spec_render(name, trange=[t[0], t[0] + 3600.0],
+                             cache=cache))
+            draw(spec_render(name, cache=cache))
+
+        # The whole day is in the cache, as after a first plot.
+        spec_render(name, cache=cache)
+
+    metrics = harness.measure(func, repeat=repeat)
+    metrics['throughput'] = channels * length / metrics['time']
+    return metrics
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='1e5,1e6,3e6',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--channels', type=int, default=32,
+                        help='number of energy channels')
+    parser.add_argument('--max-tplot-samples', type=float, default=1e5,
+                        help='largest length plotted by tplot')
+
+
+def run_all(args):
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        for case in ['tplot', 'render', 'cached', 'zoom']:
+            if case == 'tplot' and length > args.max_tplot_samples:
+                continue
+            key = '{}@{:g}'.format(case, length)
+            print('Running ' + key, file=sys.stderr)
+            results[key] = harness.run_isolated(
+                'benchmarks.bench_render',
+                ['--case', case, '--length', str(length),
+                 '--channels', str(args.channels),
+                 '--repeat', str(args.repeat)])
+
+    for key in sorted(results, key=lambda k: (float(k.split('@')[1]), k)):
+        r = results[key]
+        if 'error' not in r:
+            print('{:<16} {:8.3f} s, {:10.3g} cells/s, {:8.1f} MB RSS'.format(
+                key, r['time'], r['throughput'],
+                harness.megabytes(r['peak_rss'])))
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--length', type=int)
+        parser.add_argument('--channels', type=int)
+        parser.add_argument('--repeat', type=int)
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.length, args.channels,
+                           args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
@@ -0,0 +1,78 @@
+"""
+Benchmark tsmooth_cumsum against pyspedas.tsmooth.
+
+A variable of 3 components (float64, with 1% of NaN) is smoothed for each
+length and window width, with pyspedas.tsmooth and tsmooth_cumsum.
+
+tsmooth loops over the samples of each window in Python, so it is only
+run while the number of samples times the width is at most
+--max-tsmooth-work. The time of tsmooth_cumsum does not depend on the
+width.
+
+Run it with:
+    python -m benchmarks.bench_smooth [--lengths 1e4,1e5,1e6,1e7]
+        [--widths 5,101,1001,5001]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'smooth.json')
+
+name = 'thg_mag_ccnv'
+
+
+def make_variable(length):
+    from pyspedas import store_data
+    rng = np.random.default_rng(0)
+    y = 20000.0 + rng.standard_normal((length, 3)).cumsum(axis=0)
+    y[rng.integers(0, length, length // 100), 1] = np.nan
+    store_data(name, data={'x': 1174608000.0 + 0.5 * np.arange(length),
+                           'y': y})
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='1e4,1e5,1e6,1e7',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--widths', default='5,101,1001,5001',
+                        help='comma separated window widths')
+    parser.add_argument('--max-tsmooth-work', type=float, default=2e6,
+                        help='largest length times width given to tsmooth')
+
+
+def run_all(args):
+    from pyspedas import tsmooth
+    from pyspedas_examples.analysis.smooth_cumsum import tsmooth_cumsum
+
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        make_variable(length)
+        for width in [int(w) for w in args.widths.split(',')]:
+            if width >= length:
+                continue
+            print('Running {} samples, width {}'.format(length, width),
+                  file=sys.stderr)
+            key = '{:g}x{}'.format(length, width)
+            results['cumsum@' + key] = harness.measure(
+                lambda: tsmooth_cumsum(name, width=width),
+                repeat=args.repeat)
+            if length * width <= args.max_tsmooth_work:
+                results['tsmooth@' + key] = harness.measure(
+                    lambda: tsmooth(name, width=width),
+                    repeat=args.repeat)
+
+    for key in sorted(results, key=lambda k: (
+            [float(n) for n in k.split('@')[1].split('x')], k)):
+        length = float(key.split('@')[1].split('x')[0])
+        print('{:<24} {:12.0f} samples/s'.format(
+            key, length * 3 / results[key]['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
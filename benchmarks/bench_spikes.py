@@ -0,0 +1,82 @@
+"""
+Benchmark clean_spikes_batch against clean_spikes.
+
+Variables of 3 components with random spikes are cleaned with
+pyspedas.clean_spikes (one call per variable) and with one call of
+clean_spikes_batch, for several numbers of variables and lengths.
+
+clean_spikes loops over the samples in Python, so it is only run up to
+--max-clean-spikes samples in total.
+
+Run it with:
+    python -m benchmarks.bench_spikes [--variables 1,4,16]
+        [--lengths 10000,100000]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'spikes.json')
+
+
+def store_variables(count, length):
+    """Store count variables of length samples, with spikes."""
+    from pyspedas import del_data, store_data
+    del_data()
+    rng = np.random.default_rng(0)
+    names = []
+    for i in range(count):
+        y = (1000.0 + rng.standard_normal((length, 3))).astype(np.float32)
+        spikes = rng.integers(0, length, (length // 1000 + 1, 3))
+        for k in range(3):
+            y[spikes[:, k], k] *= 40.0
+        name = 'var{:03d}'.format(i)
+        store_data(name, data={'x': np.arange(length) * 0.5, 'y': y})
+        names.append(name)
+    return names
+
+
+def add_arguments(parser):
+    parser.add_argument('--variables', default='1,4,16',
+                        help='comma separated numbers of variables')
+    parser.add_argument('--lengths', default='10000,100000',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--max-clean-spikes', type=float, default=4e5,
+                        help='largest total number of samples given to '
+                             'clean_spikes')
+
+
+def run_all(args):
+    from pyspedas import clean_spikes
+    from pyspedas_examples.analysis.clean_spikes_batch import (
+        clean_spikes_batch)
+
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        for count in [int(v) for v in args.variables.split(',')]:
+            print('Running {} variables of {} samples'.format(count, length),
+                  file=sys.stderr)
+            names = store_variables(count, length)
+            key = '{}x{}'.format(count, length)
+            results['batch@' + key] = harness.measure(
+                lambda: clean_spikes_batch(names, sub_avg=True),
+                repeat=args.repeat)
+            if count * length <= args.max_clean_spikes:
+                results['clean_spikes@' + key] = harness.measure(
+                    lambda: [clean_spikes(n, sub_avg=True) for n in names],
+                    repeat=args.repeat)
+
+    for key, m in sorted(results.items()):
+        count, length = [int(n) for n in key.split('@')[1].split('x')]
+        print('{:<28} {:12.0f} samples/s'.format(
+            key, count * length * 3 / m['time']))
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,71 @@
+"""
+Benchmark lazy views against get_data/store_data round-trips.
+
+The derived panels of ex_basic (a vector in other units) and ex_dsl2gse
+(the third component of a vector) are made from a variable of 3
+components, for several lengths:
+
+- roundtrip: get_data, the NumPy operation and store_data, as the
+  examples do.
+- view: store_view, for a variable that is not plotted.
+- materialize: store_view, then materialize, for a variable that is
+  plotted.
+
+Run it with:
+    python -m benchmarks.bench_views [--lengths 100000,1000000,4000000]
+"""
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'views.json')
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='100000,1000000,4000000',
+                        help='comma separated numbers of samples')
+
+
+def roundtrip():
+    from pyspedas import get_data, store_data
+    d = get_data('pos')
+    store_data('position', data={'x': d[0], 'y': d[1] / 1000.0})
+    d = get_data('pos')
+    store_data('z', data={'x': d[0], 'y': d[1][:, 2]})
+
+
+def view():
+    from pyspedas_examples.utilities.derived import store_view
+    store_view('position', 'pos', scale=1e-3)
+    store_view('z', 'pos', component=2)
+
+
+def view_materialize():
+    from pyspedas_examples.utilities.derived import materialize
+    view()
+    materialize(['position', 'z'])
+
+
+def run_all(args):
+    from pyspedas import del_data, store_data
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        print('Running {} samples'.format(length), file=sys.stderr)
+        del_data()
+        rng = np.random.default_rng(0)
+        store_data('pos', data={'x': 1e9 + np.arange(length) * 0.25,
+                                'y': rng.standard_normal((length, 3))})
+        for key, func in [('roundtrip', roundtrip), ('view', view),
+                          ('materialize', view_materialize)]:
+            results['{}@{}'.format(key, length)] = harness.measure(
+                func, repeat=args.repeat)
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(harness.main(__doc__, run_all, baseline_path,
+                          add_arguments=add_arguments))
@@ -0,0 +1,122 @@
+"""
+Benchmark wavelet_fft against pyspedas.wavelet.
+
+The wavelet power of ex_wavelet (wavename 'cmorl0.5-1.0', the default
+scales) is computed for a series of each length, each case in a fresh
+interpreter:
+
+- current: pyspedas.wavelet, as ex_wavelet.
+- fft: wavelet_fft, with the power of every sample in float64.
+- fft32: wavelet_fft in float32, with the power averaged over --decimate
+  samples (1 s of 128 Hz data by default).
+
+The current and fft cases keep a float64 power of every sample and scale
+(about 9 GB for 1e7 samples), so they are skipped above
+--max-full-samples samples.
+
+Run it with:
+    python -m benchmarks.bench_wavelet [--lengths 1e4,1e6,1e7]
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from benchmarks import harness
+
+baseline_path = os.path.join(os.path.dirname(__file__), 'baselines',
+                             'wavelet.json')
+
+name = 'fgm'
+wavename = 'cmorl0.5-1.0'
+
+
+def make_variable(length):
+    from pyspedas import store_data
+    t = np.arange(length, dtype=np.float64)
+    rng = np.random.default_rng(0)
+    y = np.sin(2 * np.pi * t / 32.0) + 0.1 * rng.standard_normal(length)
+    # The default scales of wavelet are in seconds, so the samples are 1 s
+    # apart, for scales in samples.
+    store_data(name, data={'x': 1262304000.0 + t, 'y': y})
+
+
+def run_case(case, length, decimate, workers, repeat):
+    """Run one case in this process and return its metrics."""
+    from pyspedas.analysis.wavelet import wavelet
+    from pyspedas_examples.analysis.wavelet_fft import wavelet_fft
+    make_variable(length)
+    if case == 'current':
+        def func():
+            wavelet(name, wavename=wavename)
+    elif case == 'fft':
+        def func():
+            wavelet_fft(name, wavename=wavename, workers=workers)
+    else:
+        def func():
+            wavelet_fft(name, wavename=wavename, dtype=np.float32,
+                        decimate=decimate, workers=workers)
+    return harness.measure(func, repeat=repeat)
+
+
+def add_arguments(parser):
+    parser.add_argument('--lengths', default='1e4,1e6,1e7',
+                        help='comma separated numbers of samples')
+    parser.add_argument('--decimate', type=int, default=128,
+                        help='samples averaged in the fft32 case')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='threads of wavelet_fft (default: CPUs)')
+    parser.add_argument('--max-full-samples', type=float, default=2e6,
+                        help='largest length of the current and fft cases')
+
+
+def run_all(args):
+    results = {}
+    for length in [int(float(n)) for n in args.lengths.split(',')]:
+        for case in ['current', 'fft', 'fft32']:
+            if case != 'fft32' and length > args.max_full_samples:
+                continue
+            key = '{}@{:g}'.format(case, length)
+            print('Running ' + key, file=sys.stderr)
+            options = ['--case', case, '--length', str(length),
+                       '--decimate', str(args.decimate),
+                       '--repeat', str(args.repeat)]
+            if args.workers is not None:
+                options += ['--workers', str(args.workers)]
+            results[key] = harness.run_isolated('benchmarks.bench_wavelet',
+                                                options)
+
+    for key in sorted(results):
+        if not key.startswith('current@'):
+            continue
+        c = results[key]
+        for case in ['fft', 'fft32']:
+            r = results.get(case + key[7:], {})
+            if 'error' not in c and 'time' in r:
+                print('{:<14} {:6.2f}x faster, {:8.1f} MB less RSS'.format(
+                    case + key[7:], c['time'] / r['time'],
+                    harness.megabytes(c['peak_rss'])
+                    - harness.megabytes(r['peak_rss'])))
+    return results
+
+
+if __name__ == '__main__':
+    if '--output' in sys.argv:
+        # A single case, started by run_all.
+        parser = argparse.ArgumentParser()
+        parser.add_argument('--output')
+        parser.add_argument('--case')
+        parser.add_argument('--length', type=int)
+        parser.add_argument('--decimate', type=int)
+        parser.add_argument('--workers', type=int, default=None)
+        parser.add_argument('--repeat', type=int)
+        args = parser.parse_args()
+        metrics = run_case(args.case, args.length, args.decimate,
+                           args.workers, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(metrics, f)
+    else:
+        sys.exit(harness.main(__doc__, run_all, baseline_path,
+                              add_arguments=add_arguments))
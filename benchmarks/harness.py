@@ -0,0 +1,362 @@
+"""
+Benchmark harness: timing, memory and JSON baselines.
+
+Each benchmark case runs in a fresh interpreter, so that the peak RSS
+measured for a case is not inflated by the cases that ran before it.
+
+The results of a run are a dictionary of cases, each a dictionary of
+metrics. They can be saved as a JSON baseline and compared against it;
+a metric that grows by more than a threshold is a regression.
+"""
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows.
+    resource = None
+
+# Functions counted as plot preparation, when called by an example.
+plot_names = {'tplot', 'tplot_options', 'options', 'ylim', 'zlim',
+              'timebar', 'tlimit'}
+
+# Metrics compared against the baseline, with the smallest absolute change
+# that counts as a regression (to ignore noise in very fast cases).
+compared_metrics = {
+    'time': 0.01,
+    'peak_rss': 8 * 2**20,
+    'alloc_peak': 2**20,
+}
+
+
+def peak_rss():
+    """
+    Peak resident set size of this process, in bytes.
+
+    On Windows, this is the peak working set given by psutil, or None if
+    psutil is not installed.
+    """
+    if resource is None:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def megabytes(nbytes):
+    """Bytes in MB, or NaN for a memory that was not measured."""
+    return float('nan') if nbytes is None else nbytes / 2**20
+
+
+class _Timed:
+    """Callable that adds its run time to a stage total."""
+
+    def __init__(self, func, stage, totals):
+        self.func = func
+        self.stage = stage
+        self.totals = totals
+
+    def __call__(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self.totals[self.stage] += time.perf_counter() - t0
+
+
+class _TimedModule:
+    """Module proxy that times the functions of a stage."""
+
+    def __init__(self, module, stage_of, totals):
+        self._module = module
+        self._stage_of = stage_of
+        self._totals = totals
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        stage = self._stage_of(name, attr)
+        if stage is not None and callable(attr):
+            return _Timed(attr, stage, self._totals)
+        return attr
+
+
+def _stage(name, obj):
+    """Stage of a function called by an example: load, plot or None."""
+    if getattr(obj, '__module__', None) == 'pyspedas_examples.utilities.load':
+        return 'load'
+    if name in plot_names:
+        return 'plot'
+    return None
+
+
+@contextlib.contextmanager
+def stage_timers(module):
+    """
+    Time the load and plot functions called by an example module.
+
+    The load functions are the ones in pyspedas_examples.utilities.load,
+    the plot functions are the ones in plot_names and everything in
+    matplotlib.pyplot. While the context is active, these names in the
+    module namespace are replaced by timed wrappers.
+
+    Parameters
+    ----------
+    module: module
+        Example module.
+
+    Yields
+    ------
+    dict
+        Total seconds spent in the 'load' and 'plot' stages.
+    """
+    totals = {'load': 0.0, 'plot': 0.0}
+    saved = dict(vars(module))
+    for name, obj in saved.items():
+        if isinstance(obj, type(sys)):
+            if obj.__name__ == 'matplotlib.pyplot':
+                setattr(module, name,
+                        _TimedModule(obj, lambda n, a: 'plot', totals))
+            elif obj.__name__ == 'pyspedas':
+                setattr(module, name, _TimedModule(obj, _stage, totals))
+        elif callable(obj):
+            stage = _stage(name, obj)
+            if stage is not None:
+                setattr(module, name, _Timed(obj, stage, totals))
+    try:
+        yield totals
+    finally:
+        for name, obj in saved.items():
+            setattr(module, name, obj)
+
+
+def measure(func, repeat=3, module=None):
+    """
+    Time a function and measure its memory use.
+
+    The function is called once to warm up, then repeat times for timing,
+    and once more with tracemalloc for the allocations.
+
+    Parameters
+    ----------
+    func: callable
+        Function without arguments.
+    repeat: int, optional
+        Number of timed calls. The fastest one is reported.
+    module: module, optional
+        If given, the time spent in the load and plot functions called
+        from this module is reported separately (see stage_timers).
+
+    Returns
+    -------
+    dict
+        time: seconds of the fastest call.
+        load, transform, plot: seconds in each stage of the fastest call.
+        peak_rss: peak RSS of the process, in bytes, or None if it
+            cannot be measured (see peak_rss).
+        peak_rss_delta: peak RSS minus the RSS before the first call,
+            or None.
+        alloc_peak: peak traced memory during a call, in bytes.
+        alloc_blocks: memory blocks still allocated after a call.
+    """
+    rss0 = peak_rss()
+    func()
+
+    best = None
+    for _ in range(repeat):
+        with (stage_timers(module) if module is not None
+              else contextlib.nullcontext({'load': 0.0, 'plot': 0.0})) as st:
+            t0 = time.perf_counter()
+            func()
+            total = time.perf_counter() - t0
+        if best is None or total < best['time']:
+            best = {'time': total, 'load': st['load'], 'plot': st['plot'],
+                    'transform': total - st['load'] - st['plot']}
+
+    tracemalloc.start()
+    snapshot0 = tracemalloc.take_snapshot()
+    func()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    snapshot1 = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(s.count_diff for s in
+                 snapshot1.compare_to(snapshot0, 'filename'))
+
+    rss1 = peak_rss()
+    best.update({'peak_rss': rss1,
+                 'peak_rss_delta': None if rss1 is None else rss1 - rss0,
+                 'alloc_peak': alloc_peak, 'alloc_blocks': blocks})
+    return best
+
+
+def run_isolated(module, args):
+    """
+    Run a benchmark module in a fresh interpreter.
+
+    Parameters
+    ----------
+    module: str
+        Module name, e.g. 'benchmarks.bench_examples'.
+        It must accept '--output FILE' and write a JSON dictionary there.
+    args: list of str
+        Other command line arguments.
+
+    Returns
+    -------
+    dict
+        The JSON results, or {'error': message} if the run failed.
+    """
+    fd, output = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    env = dict(os.environ, MPLBACKEND='Agg')
+    try:
+        res = subprocess.run([sys.executable, '-m', module, '--output', output]
+                             + list(args), capture_output=True, text=True,
+                             env=env)
+        if res.returncode != 0:
+            lines = res.stderr.strip().splitlines()
+            return {'error': lines[-1] if lines else 'failed'}
+        with open(output) as f:
+            return json.load(f)
+    finally:
+        os.remove(output)
+
+
+def load_baseline(path):
+    """Load a JSON baseline, or return None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    """Save results as a JSON baseline."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Compare results to a baseline.
+
+    Parameters
+    ----------
+    results: dict
+        Metrics for each case.
+    baseline: dict
+        Metrics for each case, from a previous run.
+    threshold: float, optional
+        Largest allowed relative increase of a metric. Default is 0.25.
+
+    Returns
+    -------
+    list of str
+        Description of each regression.
+    """
+    failures = []
+    for case, metrics in sorted(results.items()):
+        base = baseline.get(case)
+        if base is None or 'error' in base:
+            continue
+        if 'error' in metrics:
+            failures.append(case + ': ' + metrics['error'])
+            continue
+        for metric, min_delta in compared_metrics.items():
+            new, old = metrics.get(metric), base.get(metric)
+            # Metrics not measured on this platform are skipped.
+            if new is None or old is None:
+                continue
+            if new - old > min_delta and new > old * (1.0 + threshold):
+                failures.append('{}: {} {:.4g} -> {:.4g} (+{:.0%})'.format(
+                    case, metric, old, new, new / old - 1.0))
+    return failures
+
+
+def report(results):
+    """Print a table of results."""
+    print('{:<28} {:>9} {:>9} {:>9} {:>9} {:>10} {:>10}'.format(
+        'case', 'time [s]', 'load', 'transform', 'plot', 'rss [MB]',
+        'alloc [MB]'))
+    for case, m in sorted(results.items()):
+        if 'error' in m:
+            print('{:<28} ERROR {}'.format(case, m['error']))
+            continue
+        print('{:<28} {:9.4f} {:9.4f} {:9.4f} {:9.4f} {:10.1f} {:10.1f}'.format(
+            case, m['time'], m.get('load', 0.0), m.get('transform', 0.0),
+            m.get('plot', 0.0), megabytes(m['peak_rss']),
+            m['alloc_peak'] / 2**20))
+        if 'cache_hits' in m:
+            print('{:<28} load cache: {} hits, {} misses'.format(
+                '', m['cache_hits'], m['cache_misses']))
+
+
+def main(description, run_all, baseline_path, argv=None, add_arguments=None):
+    """
+    Command line interface shared by the benchmark modules.
+
+    Parameters
+    ----------
+    description: str
+        Description shown by --help.
+    run_all: callable
+        Called with the parsed arguments, returns the results dict.
+    baseline_path: str
+        Default baseline file.
+    argv: list of str, optional
+        Command line arguments. Default is sys.argv[1:].
+    add_arguments: callable, optional
+        Called with the argparse parser, to add more arguments.
+
+    Returns
+    -------
+    int
+        Exit status: 1 if there are regressions, otherwise 0.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--baseline', default=baseline_path,
+                        help='baseline JSON file')
+    parser.add_argument('--save', action='store_true',
+                        help='save the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed relative increase (default 0.25)')
+    parser.add_argument('--sizes', default='1,2,4',
+                        help='comma separated data size factors')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed calls per case')
+    parser.add_argument('--cases', default='',
+                        help='comma separated case names (default: all)')
+    if add_arguments is not None:
+        add_arguments(parser)
+    args = parser.parse_args(argv)
+    args.sizes = [float(s) for s in args.sizes.split(',')]
+    args.cases = [c for c in args.cases.split(',') if c]
+
+    results = run_all(args)
+    report(results)
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print('Baseline saved to ' + args.baseline)
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print('No baseline at ' + args.baseline + ', use --save to create it.')
+        return 0
+    failures = compare(results, baseline, args.threshold)
+    for f in failures:
+        print('REGRESSION ' + f)
+    return 1 if failures else 0
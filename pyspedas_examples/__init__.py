@@ -1,17 +1,51 @@
+"""
+PySPEDAS examples.
+
+The example functions are loaded on first access, so that importing the
+package (or a single example) does not import the dependencies of every
+other example.
+"""
+from importlib import import_module
+
 from .version import version
-from .examples.ex_analysis import ex_analysis
-from .examples.ex_avg import ex_avg, ex_avg2
-from .examples.ex_basic import ex_basic
-from .examples.ex_cdagui import ex_cdagui
-from .examples.ex_cdasws import ex_cdasws
-from .examples.ex_colors import ex_colors
-from .examples.ex_cotrans import ex_cotrans, ex_cotrans1
-from .examples.ex_deriv import ex_deriv, ex_deriv1
-from .examples.ex_dsl2gse import ex_dsl2gse
-from .examples.ex_gmag import ex_gmag
-from .examples.ex_mpause_2 import ex_mpause_2
-from .examples.ex_mpause_t96 import ex_mpause_t96
-from .examples.ex_smooth import ex_smooth
-from .examples.ex_spectra import ex_spectra
-from .examples.ex_spikes import ex_spikes
-from .examples.ex_wavelet import ex_wavelet
+
+# Map each public example function to the module in .examples defining it.
+_registry = {
+    'ex_analysis': 'ex_analysis',
+    'ex_avg': 'ex_avg',
+    'ex_avg2': 'ex_avg',
+    'ex_basic': 'ex_basic',
+    'ex_cdagui': 'ex_cdagui',
+    'ex_cdasws': 'ex_cdasws',
+    'ex_colors': 'ex_colors',
+    'ex_cotrans': 'ex_cotrans',
+    'ex_cotrans1': 'ex_cotrans',
+    'ex_deriv': 'ex_deriv',
+    'ex_deriv1': 'ex_deriv',
+    'ex_dsl2gse': 'ex_dsl2gse',
+    'ex_gmag': 'ex_gmag',
+    'ex_mpause_2': 'ex_mpause_2',
+    'ex_mpause_t96': 'ex_mpause_t96',
+    'ex_smooth': 'ex_smooth',
+    'ex_spectra': 'ex_spectra',
+    'ex_spikes': 'ex_spikes',
+    'ex_wavelet': 'ex_wavelet',
+}
+
+__all__ = ['version'] + list(_registry)
+
+
+def __getattr__(name):
+    """Import an example function the first time it is requested."""
+    module = _registry.get(name)
+    if module is None:
+        raise AttributeError("module " + repr(__name__)
+                             + " has no attribute " + repr(name))
+    func = getattr(import_module('.examples.' + module, __name__), name)
+    # Cache it, so that __getattr__ is only called once per name.
+    globals()[name] = func
+    return func
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_registry))
@@ -0,0 +1,313 @@
+"""
+Streaming time average, in fixed-size chunks.
+
+Gives the same results as pyspedas.avg_data, bit for bit, but reads the
+data in chunks and keeps only the samples of the current (incomplete)
+averaging bin between chunks. The cost is linear in the number of samples,
+and the memory does not depend on the length of the series.
+
+Notes
+-----
+Each bin is averaged with numpy.mean over the same contiguous values as
+avg_data, so the floating point results are identical.
+"""
+import logging
+
+import numpy as np
+
+from pyspedas_examples.utilities.names import new_names
+
+
+def bin_mean(a):
+    """Average of the samples of a bin, as avg_data (NaN if empty)."""
+    if len(a) == 0:
+        return np.nan
+    if a.ndim == 1:
+        return np.mean(a)
+    # Each column is averaged as a contiguous 1-D array.
+    return np.ascontiguousarray(a.T).mean(axis=-1)
+
+
+class StreamingAverage:
+    """
+    Average chunks of data into time bins, as avg_data does.
+
+    Parameters
+    ----------
+    time_start, time_end: float
+        Start and end time of the averaged interval.
+    res: float, optional
+        Time resolution in seconds. Default is 60 sec.
+    width: int, optional
+        Number of values for the averaging window.
+        If res is set, then width is ignored.
+    count: int, optional
+        Number of samples between time_start and time_end.
+        Required with width.
+
+    Attributes
+    ----------
+    dt: float
+        Bin duration in seconds.
+    nbins: int
+        Number of bins.
+    """
+
+    def __init__(self, time_start, time_end, res=None, width=None,
+                 count=None):
+        duration = time_end - time_start
+        if res is None and width is None:
+            res = 60
+
+        if res is not None:
+            self.dt = res
+            bin_count = int(duration / self.dt)
+            self.width = None
+        else:
+            if count is None:
+                raise ValueError('count is required with width')
+            bin_count = int(count / width)
+            self.dt = duration / bin_count if bin_count > 0 else duration
+            self.width = width
+        if bin_count < 2:
+            raise ValueError('too few bins: ' + str(bin_count))
+
+        mdt = duration / self.dt
+        if mdt - int(mdt) >= 0.5:
+            self.nbins = int(np.ceil(mdt))
+        else:
+            self.nbins = int(np.floor(mdt))
+
+        self.time_start = time_start
+        self.count = count
+        self._seen = 0  # samples received so far (for width)
+        self._next_bin = 0  # first bin not yet returned
+        self._carry = None  # samples of bins not yet complete
+
+    def _bins(self, t, first):
+        """Bin index of each sample, -1 outside of the bins."""
+        if self.width is None:
+            ind = np.floor((t - self.time_start) / self.dt)
+        else:
+            k = np.arange(first, first + len(t))
+            ind = np.floor(k / self.width)
+            ind[k >= self.count] = -1
+        ind[(ind < 0) | (ind >= self.nbins)] = -1
+        return ind
+
+    def update(self, t, *arrays, final=False):
+        """
+        Add a chunk of samples.
+
+        Parameters
+        ----------
+        t: array of float
+            Times, increasing.
+        *arrays: arrays
+            Data with the same first dimension as t.
+        final: bool, optional
+            True for the last chunk. All remaining bins are returned.
+
+        Returns
+        -------
+        times: array of float
+            Center times of the bins completed by this chunk.
+        averages: list of arrays
+            Averages of each input array for these bins.
+        """
+        t = np.asarray(t)
+        arrays = [np.asarray(a) for a in arrays]
+        ind = self._bins(t, self._seen)
+        self._seen += len(t)
+
+        if self._carry is not None:
+            cind, ct, carrays = self._carry
+            ind = np.concatenate((cind, ind))
+            t = np.concatenate((ct, t))
+            arrays = [np.concatenate((c, a)) for c, a in zip(carrays, arrays)]
+
+        valid = np.flatnonzero(ind >= 0)
+        if len(valid) > 0:
+            v0, v1 = valid[0], valid[-1] + 1
+        else:
+            v0 = v1 = 0
+        if final:
+            last = self.nbins
+        elif v1 > v0:
+            # The bin of the last valid sample may continue in the next chunk,
+            # unless there are samples after it that are past the last bin.
+            last = int(ind[v1 - 1]) + (1 if v1 < len(ind) else 0)
+        else:
+            last = self._next_bin
+
+        bins = np.arange(self._next_bin, last)
+        vind = ind[v0:v1]
+        starts = v0 + np.searchsorted(vind, bins, side='left')
+        ends = v0 + np.searchsorted(vind, bins, side='right')
+
+        averages = []
+        for a in arrays:
+            # numpy.mean keeps floating point types, and uses float64
+            # for the others.
+            dtype = a.dtype if a.dtype.kind == 'f' else np.float64
+            out = np.empty((len(bins),) + a.shape[1:], dtype=dtype)
+            for i, (s, e) in enumerate(zip(starts, ends)):
+                out[i] = bin_mean(a[s:e])
+            averages.append(out)
+
+        # Keep the samples of the incomplete bin for the next chunk.
+        keep = ends[-1] if len(bins) > 0 else v0
+        keep = max(keep, v0)
+        if not final and v1 > keep:
+            self._carry = (ind[keep:v1], t[keep:v1],
+                           [a[keep:v1] for a in arrays])
+        else:
+            self._carry = None
+        self._next_bin = last
+
+        times = (bins + 0.5) * self.dt + self.time_start
+        return times, averages
+
+
+def stream_avg(chunks, time_start, time_end, res=None, width=None,
+               count=None):
+    """
+    Average an iterable of chunks.
+
+    Parameters
+    ----------
+    chunks: iterable
+        Tuples (times, data, ...) with increasing times.
+    time_start, time_end: float
+        Start and end time of the averaged interval.
+    res: float, optional
+        Time resolution in seconds. Default is 60 sec.
+    width: int, optional
+        Number of values for the averaging window.
+    count: int, optional
+        Number of samples between time_start and time_end.
+        Required with width.
+
+    Yields
+    ------
+    times: array of float
+        Center times of completed bins.
+    averages: list of arrays
+        Averages for these bins, for each data array of the chunks.
+    """
+    avg = StreamingAverage(time_start, time_end, res=res, width=width,
+                           count=count)
+    pending = None
+    for chunk in chunks:
+        if pending is not None:
+            yield avg.update(*pending)
+        pending = chunk
+    if pending is not None:
+        yield avg.update(*pending, final=True)
+
+
+def avg_data_stream(names, trange=[], res=None, width=None, newname=None,
+                    suffix=None, overwrite=False, chunk_size=2**18):
+    """
+    Get a new tplot variable with averaged data, in chunks.
+
+    Same parameters and results as pyspedas.avg_data.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names.
+    trange: list of float, optional
+        Start time, end time.
+        If empty, the data start and end time will be used.
+    res: float, optional
+        Time resolution in seconds for averaging data.
+        Default is 60 sec.
+    width: int, optional
+        Number of values for the averaging window.
+        If res is set, then width is ignored.
+    newname: str/list of str, optional
+        List of new names for tplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '-avg'.
+    overwrite: bool, optional
+        Replace the existing tplot name.
+    chunk_size: int, optional
+        Number of samples processed at a time.
+
+    Returns
+    -------
+    n_names: list of str
+        List of new pytplot names.
+    """
+    from pyspedas import get_data, store_data, time_float, tnames
+
+    old_names = tnames(names)
+    if names is None or len(old_names) < 1:
+        logging.error('avg_data_stream: No valid tplot names were provided.')
+        return
+
+    if suffix is None:
+        suffix = '-avg'
+    # As avg_data, overwrite=False does not overwrite.
+    n_names = new_names(old_names, newname, suffix, overwrite or None)
+
+    for old, new in zip(old_names, n_names):
+        d = get_data(old)
+        metadata = get_data(old, metadata=True)
+        time = np.asarray(time_float(d[0]), dtype=np.float64)
+        if len(d[1]) != len(time):
+            logging.error('avg_data_stream: Data and time length mismatch.')
+            continue
+
+        # Arrays with one value per time are averaged, others are kept.
+        fields = [i for i in range(1, len(d))
+                  if i == 1 or len(d[i]) == len(time)]
+
+        if trange is not None and len(trange) == 2:
+            tr = time_float(trange)
+        else:
+            tr = []
+        if len(tr) == 2 and tr[0] < tr[1]:
+            time_start, time_end = tr
+        else:
+            time_start, time_end = time[0], time[-1]
+        time_start = max(time_start, time[0])
+        time_end = min(time_end, time[-1])
+        count = int(np.count_nonzero((time >= time_start)
+                                     & (time <= time_end)))
+        if time_end <= time_start or count < 2:
+            logging.error('avg_data_stream: No time values in provided '
+                          'time range.')
+            continue
+
+        try:
+            avg = StreamingAverage(time_start, time_end, res=res,
+                                   width=width, count=count)
+        except ValueError as err:
+            logging.error('avg_data_stream: ' + str(err))
+            continue
+
+        new_times = []
+        new_data = [[] for _ in fields]
+        for i0 in range(0, len(time), chunk_size):
+            i1 = min(i0 + chunk_size, len(time))
+            t, averages = avg.update(time[i0:i1],
+                                     *[d[f][i0:i1] for f in fields],
+                                     final=(i1 == len(time)))
+            new_times.append(t)
+            for out, a in zip(new_data, averages):
+                out.append(a)
+
+        data_dict = {'x': np.concatenate(new_times)}
+        for f, out in zip(fields, new_data):
+            data_dict['y' if f == 1 else d._fields[f]] = np.concatenate(out)
+        for i in range(2, len(d)):
+            if i not in fields:
+                data_dict[d._fields[i]] = d[i]
+
+        store_data(new, data=data_dict, attr_dict=metadata)
+        logging.info('avg_data_stream was applied to: ' + new)
+
+    return n_names
@@ -0,0 +1,274 @@
+"""
+Remove spikes from many tplot variables at once.
+
+Same results as pyspedas.clean_spikes, but all the components of a
+variable are processed together with NumPy, and the spikes are set to NaN
+in place, in the array of the tplot variable.
+
+clean_spikes_store does the same for the variables of a ColumnStore,
+one window of samples at a time, so that variables larger than the
+memory can be cleaned.
+
+Notes
+-----
+The boxcar average of tsmooth is computed by adding the shifted arrays
+in the same order as the loop of pyspedas.smooth, so the smoothed values,
+and the spikes found, are identical.
+"""
+import logging
+import math
+
+import numpy as np
+
+from pyspedas_examples.analysis.median import subtract_average_data
+from pyspedas_examples.utilities.names import new_names
+
+
+def smooth_data(data, width=10):
+    """
+    Boxcar average of each component, as pyspedas.smooth.
+
+    Parameters
+    ----------
+    data: array
+        Data, with shape (n,) or (n, components).
+    width: int, optional
+        Number of points of the average. Default is 10.
+
+    Returns
+    -------
+    array
+        Smoothed data, with the type of data. The first and last points,
+        where the window is incomplete, are copied from data.
+    """
+    data = np.asarray(data)
+    result = data.copy()
+    n = len(data)
+    if n <= width:
+        logging.error('smooth_data: Not enough points.')
+        return result
+
+    # Points averaged by smooth, and offset of their first value.
+    i0 = math.ceil((width - 1) / 2)
+    i1 = math.floor(n - (width + 1) / 2) + 1
+    offset = math.ceil(-width / 2)
+    if i1 <= i0:
+        return result
+
+    m = i1 - i0
+    start = i0 + offset
+    dtype = np.result_type(data.dtype, 0.0)
+    tsum = data[start:start + m].astype(dtype)
+    for j in range(1, int(width)):
+        tsum += data[start + j:start + j + m]
+    tsum *= 1 / width
+    result[i0:i1] = tsum
+    return result
+
+
+def spike_mask(data, nsmooth=10, thresh=0.3):
+    """
+    Find the spikes of each component.
+
+    Parameters
+    ----------
+    data: array
+        Data, with shape (n,) or (n, components).
+    nsmooth: int, optional
+        Number of points for smoothing. Default is 10.
+    thresh: float, optional
+        Threshold of the relative difference from the smoothed values.
+        Default is 0.3.
+
+    Returns
+    -------
+    array of bool
+        True for the spikes, with the shape of data.
+    """
+    data = np.asarray(data)
+    ds = smooth_data(data, width=nsmooth)
+    diff = np.abs(data - ds)
+    np.abs(ds, out=ds)
+    ds *= thresh
+    return diff > ds
+
+
+def clean_spikes_batch(names, nsmooth=10, thresh=0.3, sub_avg=False,
+                       newname=None, suffix=None, overwrite=None):
+    """
+    Clean spikes from a list of tplot variables.
+
+    Same parameters and results as pyspedas.clean_spikes.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names (wildcards accepted).
+    nsmooth: int, optional
+        The number of data points for smoothing.
+    thresh: float, optional
+        Threshold value.
+    sub_avg: bool, optional
+        If set, subtract the average value of the data
+        prior to checking for spikes.
+    newname: str/list of str, optional
+        List of new names for tplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '-despike'.
+    overwrite: bool, optional
+        Replace the existing tplot name. The data are then changed in
+        place, without a copy.
+
+    Returns
+    -------
+    n_names: list of str
+        List of new pytplot names.
+    """
+    from pyspedas import data_quants, tnames, tplot_copy, tplot_utilities
+
+    old_names = tnames(names)
+    if len(old_names) < 1:
+        logging.error('clean_spikes_batch: No valid tplot names were '
+                      'provided.')
+        return
+
+    if suffix is None:
+        suffix = '-despike'
+    n_names = new_names(old_names, newname, suffix, overwrite)
+
+    for old, new in zip(old_names, n_names):
+        if old != new:
+            tplot_copy(old, new)
+        quant = data_quants[new]
+        data = quant.values
+        if sub_avg:
+            # As clean_spikes, the result keeps the average subtracted.
+            data = subtract_average_data(data, copy=False)
+        mask = spike_mask(data, nsmooth=nsmooth, thresh=thresh)
+        if data.dtype.kind != 'f':
+            data = np.float64(data)
+        data[mask] = np.nan
+        quant.values = data
+        quant.attrs['plot_options']['yaxis_opt']['y_range'] = (
+            tplot_utilities.get_y_range(quant))
+        logging.info('clean_spikes_batch was applied to: ' + new)
+
+    return n_names
+
+
+def _store_average(store, name, chunk_size):
+    """Average of each component of a stored variable, ignoring NaN."""
+    total = count = 0
+    for start in range(0, store.length(name), chunk_size):
+        _, y = store.window(name, start, start + chunk_size)
+        y = np.asarray(y, dtype=np.float64)
+        total = total + np.nansum(y, axis=0)
+        count = count + np.sum(~np.isnan(y), axis=0)
+        del y
+    # As subtract_average, components that are all NaN are not changed.
+    return np.where(count > 0, total / np.maximum(count, 1), 0.0)
+
+
+def clean_spikes_store(store, names, nsmooth=10, thresh=0.3, sub_avg=False,
+                       newname=None, suffix=None, overwrite=None,
+                       chunk_size=2**20):
+    """
+    Clean spikes from variables of a ColumnStore, chunk by chunk.
+
+    Same parameters and results as clean_spikes_batch, for variables of
+    a ColumnStore. Only chunk_size samples (and nsmooth samples on each
+    side) of a variable are in memory at a time.
+
+    The average of sub_avg is summed in float64, chunk by chunk, so for
+    float32 data it can differ from the one of clean_spikes by the
+    float32 rounding (and change the spikes found at the threshold).
+
+    Parameters
+    ----------
+    store: ColumnStore
+        Store of the variables.
+    names: str/list of str
+        Names of the variables in the store.
+    nsmooth: int, optional
+        The number of data points for smoothing.
+    thresh: float, optional
+        Threshold value.
+    sub_avg: bool, optional
+        If set, subtract the average value of the data
+        prior to checking for spikes.
+    newname: str/list of str, optional
+        List of new names for the variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '-despike'.
+    overwrite: bool, optional
+        Replace the data of the variables in place. Only variables with
+        floating point values can be replaced.
+    chunk_size: int, optional
+        Number of samples processed at a time, at least nsmooth.
+        Default is 2**20.
+
+    Returns
+    -------
+    n_names: list of str
+        List of new variable names.
+    """
+    if isinstance(names, str):
+        names = [names]
+    old_names = [n for n in names if n in store]
+    if len(old_names) < 1:
+        logging.error('clean_spikes_store: No valid names were provided.')
+        return
+
+    if suffix is None:
+        suffix = '-despike'
+    n_names = new_names(old_names, newname, suffix, overwrite)
+
+    halo = int(nsmooth)
+    # A window must not reach into chunks already written back.
+    chunk_size = max(int(chunk_size), halo, 1)
+    for old, new in zip(old_names, n_names):
+        _, y = store.window(old, 0, 0)
+        n = store.length(old)
+        dtype = y.dtype if y.dtype.kind == 'f' else np.dtype(np.float64)
+        if old == new and dtype != y.dtype:
+            logging.error('clean_spikes_store: ' + old + ' does not have '
+                          'floating point values.')
+            continue
+        if old != new:
+            store.create(new, n, y.shape[1:], dtype, store.coords(old))
+        average = None
+        if sub_avg:
+            average = _store_average(store, old, chunk_size).astype(dtype)
+
+        # A window is read before the previous chunk is written, as the
+        # chunks change the samples that the next window needs.
+        pending = None
+        for start in range(0, n, chunk_size):
+            stop = min(start + chunk_size, n)
+            lo, hi = max(start - halo, 0), min(stop + halo, n)
+            xw, yw = store.window(old, lo, hi)
+            data = np.array(yw, dtype=dtype)
+            times = np.array(xw[start - lo:stop - lo])
+            del xw, yw
+            if pending is not None:
+                _write_chunk(store, new, *pending)
+            if average is not None:
+                data -= average
+            mask = spike_mask(data, nsmooth=nsmooth, thresh=thresh)
+            data[mask] = np.nan
+            pending = (start, times, data[start - lo:stop - lo])
+        if pending is not None:
+            _write_chunk(store, new, *pending)
+        logging.info('clean_spikes_store was applied to: ' + new)
+
+    return n_names
+
+
+def _write_chunk(store, name, start, times, values):
+    xs, ys = store.window(name, start, start + len(values), mode='r+')
+    xs[:] = times
+    ys[:] = values
+    xs.flush()
+    ys.flush()
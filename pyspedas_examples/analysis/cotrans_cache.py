@@ -0,0 +1,531 @@
+"""
+Coordinate transformations with cached rotation matrices.
+
+pyspedas.cotrans rotates one variable at a time, and computes the
+direction of the sun and of the dipole again for every call and every
+step of the transformation (e.g. GEI -> GSE -> GSM). Here, the rotation
+matrices for a time array are built once and kept in an LRU cache, keyed
+on a fingerprint of the times and the two coordinate systems. Any number
+of vectors on the same times are then rotated with one numpy.einsum.
+
+Notes
+-----
+The matrices use the same formulas as pyspedas.cotrans_tools.cotrans_lib,
+so the results agree with cotrans to rounding errors.
+"""
+import copy
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from pyspedas_examples.utilities.lru import LRUCache, time_fingerprint
+
+coord_systems = ['gse', 'gsm', 'sm', 'gei', 'geo', 'mag', 'j2000']
+
+
+def time_parts(time_in):
+    """
+    Split times into year, day of year, hours, minutes and seconds.
+
+    Vectorized version of cotrans_lib.get_time_parts.
+
+    Parameters
+    ----------
+    time_in: array of float
+        Unix times.
+
+    Returns
+    -------
+    iyear, idoy, ih, im: arrays of int
+    isec: array of float
+    """
+    t = np.asarray(time_in, dtype=np.float64)
+    # Times are rounded to microseconds, as by datetime.
+    days = np.floor(t / 86400.0)
+    sec = np.round((t - days * 86400.0) * 1e6) / 1e6
+    day = days.astype('datetime64[D]')
+    year = day.astype('datetime64[Y]')
+    iyear = year.astype(np.int64) + 1970
+    idoy = (day - year).astype(np.int64) + 1
+    ih = (sec // 3600).astype(np.int64)
+    im = (sec % 3600 // 60).astype(np.int64)
+    isec = sec - ih * 3600.0 - im * 60.0
+    return iyear, idoy, ih, im, isec
+
+
+class _Angles:
+    """Direction of the sun and of the dipole, computed when needed."""
+
+    def __init__(self, time_in):
+        self.time = np.asarray(time_in, dtype=np.float64)
+        self._parts = None
+        self._sun = None
+        self._dipole = None
+
+    @property
+    def parts(self):
+        if self._parts is None:
+            self._parts = time_parts(self.time)
+        return self._parts
+
+    @property
+    def sun(self):
+        """gst, slong, sra, sdec, obliq, as cotrans_lib.csundir_vect."""
+        if self._sun is None:
+            iyear, idoy, ih, im, isec = self.parts
+            pisd = np.pi / 180.0
+            fday = (ih * 3600.0 + im * 60.0 + isec) / 86400.0
+            jj = 365 * (iyear - 1900) + np.fix((iyear - 1901) / 4) + idoy
+            dj = jj - 0.5 + fday
+            gst = np.mod(279.690983 + 0.9856473354 * dj + 360.0 * fday
+                         + 180.0, 360.0) * pisd
+            vl = np.mod(279.696678 + 0.9856473354 * dj, 360.0)
+            t = dj / 36525.0
+            g = np.mod(358.475845 + 0.985600267 * dj, 360.0) * pisd
+            slong = (vl + (1.91946 - 0.004789 * t) * np.sin(g)
+                     + 0.020094 * np.sin(2.0 * g)) * pisd
+            obliq = (23.45229 - 0.0130125 * t) * pisd
+            sob = np.sin(obliq)
+            cob = np.cos(obliq)
+            pre = (0.005686 - 0.025e-4 * t) * pisd
+            slp = slong - pre
+            sind = sob * np.sin(slp)
+            cosd = np.sqrt(1.0 - sind**2)
+            sc = sind / cosd
+            sdec = np.arctan(sc)
+            sra = np.pi - np.arctan2((cob / sob) * sc, -np.cos(slp) / cosd)
+            self._sun = gst, slong, sra, sdec, obliq
+        return self._sun
+
+    @property
+    def dipole(self):
+        """Dipole direction in GEO, as cotrans_lib.cdipdir_vect."""
+        if self._dipole is None:
+            from pyspedas.cotrans_tools.cotrans_lib import cdipdir
+            iyear, idoy = self.parts[:2]
+            # The direction only depends on the day.
+            days, inverse = np.unique(iyear * 1000 + idoy,
+                                      return_inverse=True)
+            d = np.array([cdipdir(None, int(k // 1000), int(k % 1000))
+                          for k in days])
+            self._dipole = tuple(d[inverse.ravel(), i] for i in range(3))
+        return self._dipole
+
+    def sun_gei(self):
+        """Unit vector of the sun direction in GEI."""
+        gst, slong, sra, sdec, obliq = self.sun
+        return (np.cos(sra) * np.cos(sdec), np.sin(sra) * np.cos(sdec),
+                np.sin(sdec))
+
+
+def _matrices(rows):
+    """Stack 3x3 rows of arrays (or scalars) into an (n, 3, 3) array."""
+    n = max(np.size(v) for row in rows for v in row)
+    m = np.empty((n, 3, 3))
+    for i, row in enumerate(rows):
+        for j, v in enumerate(row):
+            m[:, i, j] = v
+    return m
+
+
+def _gei2gse(a):
+    gs1, gs2, gs3 = a.sun_gei()
+    obliq = a.sun[4]
+    ge1, ge2, ge3 = 0.0, -np.sin(obliq), np.cos(obliq)
+    return _matrices([[gs1, gs2, gs3],
+                      [ge2 * gs3 - ge3 * gs2, ge3 * gs1 - ge1 * gs3,
+                       ge1 * gs2 - ge2 * gs1],
+                      [ge1, ge2, ge3]])
+
+
+def _gse2gsm(a):
+    gd1, gd2, gd3 = a.dipole
+    gst, obliq = a.sun[0], a.sun[4]
+    gs1, gs2, gs3 = a.sun_gei()
+    sgst, cgst = np.sin(gst), np.cos(gst)
+    ge1, ge2, ge3 = 0.0, -np.sin(obliq), np.cos(obliq)
+    gm1 = gd1 * cgst - gd2 * sgst
+    gm2 = gd1 * sgst + gd2 * cgst
+    gm3 = gd3
+    gmgs1 = gm2 * gs3 - gm3 * gs2
+    gmgs2 = gm3 * gs1 - gm1 * gs3
+    gmgs3 = gm1 * gs2 - gm2 * gs1
+    rgmgs = np.sqrt(gmgs1**2 + gmgs2**2 + gmgs3**2)
+    cdze = (ge1 * gm1 + ge2 * gm2 + ge3 * gm3) / rgmgs
+    sdze = (ge1 * gmgs1 + ge2 * gmgs2 + ge3 * gmgs3) / rgmgs
+    return _matrices([[1.0, 0.0, 0.0],
+                      [0.0, cdze, sdze],
+                      [0.0, -sdze, cdze]])
+
+
+def _gsm2sm(a):
+    gd1, gd2, gd3 = a.dipole
+    gst = a.sun[0]
+    gs1, gs2, gs3 = a.sun_gei()
+    sgst, cgst = np.sin(gst), np.cos(gst)
+    ps1 = gs1 * cgst + gs2 * sgst
+    ps2 = -gs1 * sgst + gs2 * cgst
+    ps3 = gs3
+    smu = ps1 * gd1 + ps2 * gd2 + ps3 * gd3
+    cmu = np.sqrt(1.0 - smu * smu)
+    return _matrices([[cmu, 0.0, -smu],
+                      [0.0, 1.0, 0.0],
+                      [smu, 0.0, cmu]])
+
+
+def _gei2geo(a):
+    gst = a.sun[0]
+    sgst, cgst = np.sin(gst), np.cos(gst)
+    return _matrices([[cgst, sgst, 0.0],
+                      [-sgst, cgst, 0.0],
+                      [0.0, 0.0, 1.0]])
+
+
+def _gei2j2000(a):
+    from pyspedas.cotrans_tools.cotrans_lib import j2000_matrix_vec
+    # ctv_mx_vec_rot multiplies by the transposed matrices.
+    return np.transpose(j2000_matrix_vec(a.time), (2, 1, 0))
+
+
+def _geo2mag(a):
+    # Direction of the SM z axis in GEO.
+    sm2geo = np.matmul(_gei2geo(a), np.matmul(
+        np.transpose(_gei2gse(a), (0, 2, 1)), np.matmul(
+            np.transpose(_gse2gsm(a), (0, 2, 1)),
+            np.transpose(_gsm2sm(a), (0, 2, 1)))))
+    z = sm2geo[:, :, 2]
+    theta = np.arctan2(z[:, 2], np.sqrt(z[:, 0]**2 + z[:, 1]**2))
+    phi = np.arctan2(z[:, 1], z[:, 0])
+    colat = np.pi / 2.0 - theta
+    mlong = _matrices([[np.cos(phi), np.sin(phi), 0.0],
+                       [-np.sin(phi), np.cos(phi), 0.0],
+                       [0.0, 0.0, 1.0]])
+    mlat = _matrices([[np.cos(colat), 0.0, -np.sin(colat)],
+                      [0.0, 1.0, 0.0],
+                      [np.sin(colat), 0.0, np.cos(colat)]])
+    return np.matmul(mlat, mlong)
+
+
+# Transformations computed directly. The inverse ones are transposed.
+_elementary = {('gei', 'gse'): _gei2gse,
+               ('gse', 'gsm'): _gse2gsm,
+               ('gsm', 'sm'): _gsm2sm,
+               ('gei', 'geo'): _gei2geo,
+               ('gei', 'j2000'): _gei2j2000,
+               ('geo', 'mag'): _geo2mag}
+
+
+def transform_path(coord_in, coord_out):
+    """
+    Coordinate systems from coord_in to coord_out, as used by cotrans.
+
+    Parameters
+    ----------
+    coord_in, coord_out: str
+        Coordinate systems (lower case).
+
+    Returns
+    -------
+    list of str
+    """
+    from pyspedas.cotrans_tools.cotrans_lib import (find_path_t1_t2,
+                                                    shorten_path_t1_t2)
+    p = find_path_t1_t2(coord_in, coord_out)
+    p = shorten_path_t1_t2(p)
+    return shorten_path_t1_t2(p)
+
+
+class CotransCache(LRUCache):
+    """
+    LRU cache of rotation matrices.
+
+    Parameters
+    ----------
+    max_entries: int, optional
+        Maximum number of matrix arrays kept. Default is 32.
+    max_bytes: int, optional
+        Maximum memory of the matrix arrays kept, in bytes.
+        Default is 256 MB. Larger arrays are not cached.
+
+    Attributes
+    ----------
+    hits, misses, evictions: int
+        Cache statistics.
+    nbytes: int
+        Memory of the cached matrices, in bytes.
+    """
+
+
+# Cache used when none is given.
+cotrans_cache = CotransCache()
+
+
+def cotrans_matrices(time_in, coord_in, coord_out, cache=None):
+    """
+    Rotation matrices from coord_in to coord_out.
+
+    Parameters
+    ----------
+    time_in: array of float
+        Unix times.
+    coord_in, coord_out: str
+        One of GSE, GSM, SM, GEI, GEO, MAG, J2000.
+    cache: CotransCache, optional
+        Cache of matrices. Default is cotrans_cache.
+
+    Returns
+    -------
+    array of float
+        Matrices with shape (n, 3, 3). Vector i in coord_out is
+        matrices[i] @ vector i in coord_in.
+    """
+    if cache is None:
+        cache = cotrans_cache
+    coord_in = coord_in.lower()
+    coord_out = coord_out.lower()
+    fingerprint = time_fingerprint(time_in)
+    angles = _Angles(time_in)
+
+    def matrices(c1, c2):
+        key = (fingerprint, c1, c2)
+        m = cache.get(key)
+        if m is not None:
+            return m
+        if (c1, c2) in _elementary:
+            m = _elementary[(c1, c2)](angles)
+        elif (c2, c1) in _elementary:
+            m = np.ascontiguousarray(np.transpose(matrices(c2, c1),
+                                                  (0, 2, 1)))
+        else:
+            # Each step is cached, to be reused by other transformations.
+            path = transform_path(c1, c2)
+            m = matrices(path[0], path[1])
+            for p1, p2 in zip(path[1:-1], path[2:]):
+                m = np.matmul(matrices(p1, p2), m)
+        cache.put(key, m)
+        return m
+
+    if coord_in == coord_out:
+        return np.broadcast_to(np.eye(3), (len(angles.time), 3, 3))
+    return matrices(coord_in, coord_out)
+
+
+def rotate(matrices, vectors):
+    """
+    Rotate several arrays of vectors with one numpy.einsum.
+
+    Parameters
+    ----------
+    matrices: array of float
+        Matrices with shape (n, 3, 3).
+    vectors: list of arrays
+        Vectors, each with shape (n, 3).
+
+    Returns
+    -------
+    list of arrays
+        Rotated vectors.
+    """
+    v = np.stack([np.asarray(d, dtype=np.float64) for d in vectors])
+    out = np.einsum('nij,knj->kni', matrices, v, optimize=True)
+    return list(out)
+
+
+def cotrans_cached(name_in=None, name_out=None, time_in=None, data_in=None,
+                   coord_in=None, coord_out=None, cache=None):
+    """
+    Transform data between coordinate systems, with cached matrices.
+
+    Same parameters and results as pyspedas.cotrans.
+
+    Parameters
+    ----------
+    name_in: str, optional
+        Name of the input tplot variable.
+    name_out: str, optional
+        Name of the output tplot variable.
+    time_in: list of float, optional
+        Times, if name_in is not given.
+    data_in: list of float, optional
+        Data, if name_in is not given.
+    coord_in: str, optional
+        Input coordinate system. Default is the one of name_in.
+    coord_out: str
+        One of GSE, GSM, SM, GEI, GEO, MAG, J2000.
+    cache: CotransCache, optional
+        Cache of matrices. Default is cotrans_cache.
+
+    Returns
+    -------
+    int or array
+        1 if a tplot variable was created, the data if neither name_in
+        nor name_out were given, 0 for errors.
+    """
+    from pyspedas import get_coords, get_data, set_coords, store_data
+    from pyspedas import tplot_copy, data_quants
+
+    if coord_out is None:
+        logging.error('cotrans_cached: No output coordinates were provided.')
+        return 0
+    var_coord_in = get_coords(name_in) if name_in is not None else None
+    if var_coord_in is not None and coord_in is not None:
+        if var_coord_in.lower() != coord_in.lower():
+            logging.error('cotrans_cached: ' + name_in + ' has '
+                          + var_coord_in.lower() + ' coordinates, but '
+                          'transform from ' + coord_in.lower()
+                          + ' was requested.')
+            return 0
+    if coord_in is None:
+        coord_in = var_coord_in
+        if coord_in is None:
+            logging.error('cotrans_cached: No input coordinates were '
+                          'provided.')
+            return 0
+    coord_in = coord_in.lower()
+    coord_out = coord_out.lower()
+    for c in (coord_in, coord_out):
+        if c not in coord_systems:
+            logging.error('cotrans_cached: Requested coordinate system '
+                          + c + ' not supported.')
+            return 0
+
+    if name_in is not None:
+        d = get_data(name_in)
+        if d is None:
+            logging.error('cotrans_cached: Variable ' + name_in
+                          + ' does not exist.')
+            return 0
+        time_in, data_in = d[0], d[1]
+    else:
+        store_data('cotranstemp', data={'x': list(time_in),
+                                        'y': list(data_in)})
+    if len(data_in[:]) < 1:
+        logging.error('cotrans_cached: Data is empty.')
+        return 0
+
+    m = cotrans_matrices(time_in, coord_in, coord_out, cache=cache)
+    data_out = rotate(m, [data_in])[0]
+
+    if name_in is None and name_out is None:
+        return data_out
+    if name_in is None:
+        name_in = 'cotranstemp'
+    if name_out is None:
+        name_out = name_in + '_' + coord_out
+    tplot_copy(name_in, name_out)
+    data_quants[name_out].data = data_out
+    set_coords(name_out, coord_out.upper())
+    logging.info('Output variable: ' + name_out)
+    return 1
+
+
+def _interpolate(t, time_in, data_in):
+    """Linear interpolation of each component at the times t."""
+    data_in = np.asarray(data_in, dtype=np.float64)
+    out = np.empty((len(t), data_in.shape[1]))
+    for i in range(data_in.shape[1]):
+        out[:, i] = np.interp(t, time_in, data_in[:, i], left=np.nan,
+                              right=np.nan)
+    return out
+
+
+def cotrans_batch(names, coord_in=None, coord_out=None, time_base=None,
+                  cache=None):
+    """
+    Transform many tplot variables to the same coordinate system.
+
+    The variables are grouped by time array. For each group, the rotation
+    matrices are computed (or taken from the cache) once, and all the
+    vectors are rotated with one numpy.einsum. If time_base is given,
+    all the variables are first interpolated to these times, so there is
+    a single group.
+
+    Parameters
+    ----------
+    names: list of tuple
+        Pairs (name_in, name_out) of tplot variables. If name_out is
+        None, it is name_in + '_' + coord_out.
+    coord_in: str, optional
+        Input coordinate system. Default is the one of each variable.
+    coord_out: str
+        One of GSE, GSM, SM, GEI, GEO, MAG, J2000.
+    time_base: str or array of float, optional
+        tplot variable or Unix times to interpolate all the variables to.
+    cache: CotransCache, optional
+        Cache of matrices. Default is cotrans_cache.
+
+    Returns
+    -------
+    list of str
+        Names of the variables created.
+    """
+    from pyspedas import get_coords, get_data, set_coords, store_data
+
+    if coord_out is None:
+        logging.error('cotrans_batch: No output coordinates were provided.')
+        return []
+    coord_out = coord_out.lower()
+    if coord_out not in coord_systems:
+        logging.error('cotrans_batch: Requested output coordinate system '
+                      + coord_out + ' not supported.')
+        return []
+    if isinstance(time_base, str):
+        d = get_data(time_base)
+        if d is None:
+            logging.error('cotrans_batch: ' + time_base + ' not found.')
+            return []
+        time_base = d[0]
+    if time_base is not None:
+        time_base = np.asarray(time_base, dtype=np.float64)
+
+    # Read the variables and group them by times and input coordinates.
+    groups = OrderedDict()
+    for name_in, name_out in names:
+        var_coord = get_coords(name_in)
+        c = coord_in if coord_in is not None else var_coord
+        if c is None:
+            logging.error('cotrans_batch: No input coordinates for '
+                          + name_in + '.')
+            continue
+        c = c.lower()
+        if var_coord is not None and var_coord.lower() != c:
+            logging.error('cotrans_batch: ' + name_in + ' has '
+                          + var_coord.lower() + ' coordinates, but '
+                          'transform from ' + c + ' was requested.')
+            continue
+        if c not in coord_systems:
+            logging.error('cotrans_batch: Requested input coordinate system '
+                          + c + ' not supported.')
+            continue
+        d = get_data(name_in)
+        if d is None or len(d[1]) < 1:
+            logging.error('cotrans_batch: ' + name_in + ' is empty.')
+            continue
+        t, y = np.asarray(d[0], dtype=np.float64), d[1]
+        if time_base is not None:
+            y = _interpolate(time_base, t, y)
+            t = time_base
+        key = (time_fingerprint(t), c)
+        if key not in groups:
+            groups[key] = (t, c, [])
+        if name_out is None:
+            name_out = name_in + '_' + coord_out
+        groups[key][2].append((name_in, name_out, y))
+
+    created = set()
+    for t, c, variables in groups.values():
+        m = cotrans_matrices(t, c, coord_out, cache=cache)
+        out = rotate(m, [y for _, _, y in variables])
+        for (name_in, name_out, _), y in zip(variables, out):
+            metadata = copy.deepcopy(get_data(name_in, metadata=True))
+            store_data(name_out, data={'x': t, 'y': y}, attr_dict=metadata)
+            set_coords(name_out, coord_out.upper())
+            created.add(name_out)
+
+    # In the order of the input variables.
+    n_names = [n_out if n_out is not None else n_in + '_' + coord_out
+               for n_in, n_out in names]
+    n_names = [n for n in n_names if n in created]
+    logging.info('cotrans_batch: Output variables: ' + ', '.join(n_names))
+    return n_names
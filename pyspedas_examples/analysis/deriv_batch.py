@@ -0,0 +1,323 @@
+"""
+Derivatives of many tplot variables, with gaps, in chunks.
+
+pyspedas.deriv_data calls numpy.gradient for each variable, over the
+whole series, so the derivative is also taken across data gaps. Here:
+
+- The times are split into segments where the time step is larger than
+  gap, and the derivative of each segment is found on its own, as
+  numpy.gradient of the segment (a single sample has no derivative,
+  and is NaN).
+- The formulas of numpy.gradient are evaluated for all the samples and
+  components of a chunk at once, so the cost does not depend on the
+  number of segments. The variables with the same times are done
+  together, with the coefficients of the times found once.
+- The series is processed in chunks of chunk_size samples, with the 2
+  samples on each side needed by the formulas, so the memory used
+  besides the results does not depend on the length.
+- Optionally, the derivative is found with a Savitzky-Golay filter
+  (scipy.signal.savgol_filter), which smooths the data, in the segments
+  with a regular cadence.
+
+Without gaps, the results are the same as deriv_data, bit for bit.
+"""
+import logging
+
+import numpy as np
+
+from pyspedas_examples.utilities.names import new_names
+
+
+class Segments:
+    """
+    Segments of a series of times, split at the gaps.
+
+    Parameters
+    ----------
+    time: array
+        Increasing times, with shape (n,).
+    gap: float, optional
+        Largest time step inside a segment. Default is None (no gaps).
+    chunk_size: int, optional
+        Number of time steps read at once. Default is 2**16.
+
+    Attributes
+    ----------
+    starts, ends: array
+        First and last samples of each segment.
+    min_step, max_step: array
+        Smallest and largest time step of each segment (NaN for a single
+        sample).
+    """
+
+    def __init__(self, time, gap=None, chunk_size=2**16):
+        n = len(time)
+        chunk_size = max(int(chunk_size), 1)
+        breaks, pieces = [], []
+        count = 0
+        for start in range(0, max(n - 1, 0), chunk_size):
+            steps = np.diff(time[start:min(start + chunk_size + 1, n)])
+            is_break = None if gap is None else steps > gap
+            if is_break is None or not is_break.any():
+                pieces.append(([count], [steps.min()], [steps.max()]))
+                continue
+            seg = count + np.cumsum(is_break) - is_break
+            breaks.append(np.flatnonzero(is_break) + start)
+            count = seg[-1] + is_break[-1]
+            steps, seg = steps[~is_break], seg[~is_break]
+            if len(steps) > 0:
+                bounds = np.concatenate(
+                    ([0], np.flatnonzero(np.diff(seg)) + 1))
+                pieces.append((seg[bounds],
+                               np.minimum.reduceat(steps, bounds),
+                               np.maximum.reduceat(steps, bounds)))
+        breaks = (np.concatenate(breaks) if breaks
+                  else np.zeros(0, dtype=np.int64))
+        self.starts = np.concatenate(([0], breaks + 1)).astype(np.int64)
+        self.ends = np.append(breaks, n - 1).astype(np.int64)
+        self.min_step = np.full(len(self.starts), np.nan)
+        self.max_step = np.full(len(self.starts), np.nan)
+        for seg, low, high in pieces:
+            np.fmin.at(self.min_step, seg, low)
+            np.fmax.at(self.max_step, seg, high)
+
+    @property
+    def uniform(self):
+        """True for the segments with a constant time step."""
+        return ~(self.min_step < self.max_step)
+
+    def chunk(self, start, stop):
+        """First and last segments with samples from start to stop."""
+        first, last = np.searchsorted(self.starts, [start, stop - 1],
+                                      side='right') - 1
+        return first, last
+
+
+def _gradient(t, arrays, outputs, segments, start, stop, edge_order):
+    """
+    Write the derivatives of the samples start to stop in outputs.
+
+    t are the times of the samples start - 2 to stop + 2, or less at the
+    ends of the series. The coefficients of the formulas of
+    numpy.gradient are found once for all the arrays.
+    """
+    lo, hi = max(start - 2, 0), min(stop + 2, segments.ends[-1] + 1)
+    dx = np.diff(t)
+    s0, s1 = segments.chunk(start, stop)
+    uniform = segments.uniform[s0:s1 + 1]
+    starts = segments.starts[s0:s1 + 1]
+    ends = segments.ends[s0:s1 + 1]
+
+    # All the samples as inside their segment; the first and last samples
+    # of the segments are replaced below.
+    j0 = start - lo
+    inner = slice(max(j0, 1), min(stop - lo, len(t) - 1))
+    before = slice(inner.start - 1, inner.stop - 1)
+    after = slice(inner.start + 1, inner.stop + 1)
+    rows = slice(inner.start - j0, inner.stop - j0)
+    dx1, dx2 = dx[before], dx[inner]
+    two_dx = (2. * dx1)[:, None]
+    u = None
+    if not uniform.all():
+        a = (-(dx2) / (dx1 * (dx1 + dx2)))[:, None]
+        b = ((dx2 - dx1) / (dx1 * dx2))[:, None]
+        c = (dx1 / (dx2 * (dx1 + dx2)))[:, None]
+        bounds = np.concatenate(([start], starts[1:], [stop]))
+        u = np.repeat(uniform, np.diff(bounds))[rows]
+
+    # First and last samples of the segments: the formula of first order,
+    # or of second order if there are enough samples, NaN for a single
+    # sample.
+    length = ends - starts + 1
+    second = (length >= 3) & (edge_order == 2)
+    edges = []
+    for at_start, m in [(True, starts >= start), (False, ends < stop)]:
+        pos = starts[m] if at_start else ends[m]
+        k, r = pos - lo, pos - start
+        single = length[m] == 1
+        one = ~single & ~second[m]
+        k1, r1 = k[one], r[one]
+        if at_start:
+            edge = [r[single], (r1, k1 + 1, k1, dx[k1][:, None])]
+        else:
+            edge = [r[single], (r1, k1, k1 - 1, dx[k1 - 1][:, None])]
+        m2 = second[m]
+        if m2.any():
+            k, r, u2 = k[m2], r[m2], uniform[m][m2]
+            if at_start:
+                e1, e2 = dx[k], dx[k + 1]
+                ea = -(2. * e1 + e2) / (e1 * (e1 + e2))
+                eb = (e1 + e2) / (e1 * e2)
+                ec = - e1 / (e2 * (e1 + e2))
+                ea[u2], eb[u2], ec[u2] = (-1.5 / e1[u2], 2. / e1[u2],
+                                          -0.5 / e1[u2])
+                ks = k, k + 1, k + 2
+            else:
+                e1, e2 = dx[k - 2], dx[k - 1]
+                ea = (e2) / (e1 * (e1 + e2))
+                eb = - (e2 + e1) / (e1 * e2)
+                ec = (2. * e2 + e1) / (e2 * (e1 + e2))
+                ea[u2], eb[u2], ec[u2] = (0.5 / e2[u2], -2. / e2[u2],
+                                          1.5 / e2[u2])
+                ks = k - 2, k - 1, k
+            edge.append((r, ks, (ea[:, None], eb[:, None], ec[:, None])))
+        edges.append(edge)
+
+    for data, output in zip(arrays, outputs):
+        f = data[lo:hi].reshape(hi - lo, -1)
+        out = output[start:stop].reshape(stop - start, -1)
+        if u is None:
+            out[rows] = (f[after] - f[before]) / two_dx
+        else:
+            out[rows] = a * f[before] + b * f[inner] + c * f[after]
+            if u.any():
+                out[rows][u] = (f[after][u] - f[before][u]) / two_dx[u]
+        for edge in edges:
+            out[edge[0]] = np.nan
+            r, k1, k0, step = edge[1]
+            out[r] = (f[k1] - f[k0]) / step
+            for r, ks, coefs in edge[2:]:
+                out[r] = (coefs[0] * f[ks[0]] + coefs[1] * f[ks[1]]
+                          + coefs[2] * f[ks[2]])
+
+
+def derivative(time, data, gap=None, edge_order=1, savgol=None,
+               chunk_size=2**16):
+    """
+    Derivative along the first axis, as numpy.gradient, with gaps.
+
+    Parameters
+    ----------
+    time: array
+        Increasing times, with shape (n,).
+    data: array/list of array
+        Data, with shape (n,) or (n, components), or a list of them.
+    gap: float, optional
+        Time steps larger than gap split the series, and the derivative
+        of each part is found on its own. Default is None (no gaps).
+    edge_order: int, optional
+        1 or 2, as numpy.gradient. Parts of 2 samples use 1.
+        Default is 1.
+    savgol: tuple of int, optional
+        Window length and polynomial order of a Savitzky-Golay filter,
+        used for the parts that are at least as long as the window, and
+        with time steps within 1% of their mean. Default is None.
+    chunk_size: int, optional
+        Number of samples processed at once. Default is 2**16.
+
+    Returns
+    -------
+    array/list of array
+        Derivatives, with the shapes and types of numpy.gradient. Samples
+        alone in their part are NaN.
+    """
+    single = not isinstance(data, (list, tuple))
+    arrays = [np.asarray(a) for a in ([data] if single else data)]
+    n = len(time)
+    chunk_size = max(int(chunk_size), 1)
+    segments = Segments(time, gap=gap, chunk_size=chunk_size)
+    outputs = [np.empty(a.shape, dtype=a.dtype if a.dtype.kind in 'fc'
+                        else np.float64) for a in arrays]
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        _gradient(time[max(start - 2, 0):min(stop + 2, n)], arrays, outputs,
+                  segments, start, stop, edge_order)
+
+    if savgol is not None:
+        _savgol(time, arrays, outputs, segments, savgol, chunk_size)
+    return outputs[0] if single else outputs
+
+
+def _savgol(time, arrays, outputs, segments, savgol, chunk_size):
+    """Replace the derivatives of the regular segments."""
+    from scipy.signal import savgol_filter
+    window_length, polyorder = [int(v) for v in savgol]
+    half = window_length // 2
+    length = segments.ends - segments.starts + 1
+    mean = np.full(len(length), np.nan)
+    ok = length >= 2
+    mean[ok] = ((time[segments.ends[ok]] - time[segments.starts[ok]])
+                / (length[ok] - 1))
+    regular = ((length >= window_length)
+               & (segments.max_step - segments.min_step <= 0.01 * mean))
+    for s, e, delta in zip(segments.starts[regular], segments.ends[regular],
+                           mean[regular]):
+        for start in range(s, e + 1, chunk_size):
+            stop = min(start + chunk_size, e + 1)
+            # Enough samples on both sides for the filter, and at least
+            # window_length samples.
+            lo, hi = max(start - half, s), min(stop + half, e + 1)
+            if hi - lo < window_length:
+                lo = max(hi - window_length, s)
+                hi = min(lo + window_length, e + 1)
+            for data, out in zip(arrays, outputs):
+                block = savgol_filter(data[lo:hi], window_length, polyorder,
+                                      deriv=1, delta=delta, axis=0,
+                                      mode='interp')
+                out[start:stop] = block[start - lo:stop - lo]
+
+
+def deriv_batch(names, newname=None, suffix=None, overwrite=None, gap=None,
+                edge_order=1, savgol=None, chunk_size=2**16):
+    """
+    Find the derivatives of tplot variables, as deriv_data.
+
+    The variables with the same times are done together.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names.
+    newname: str/list of str, optional
+        List of new names for pytplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '-der'.
+    overwrite: bool, optional
+        Replace the existing tplot name.
+    gap: float, optional
+        Time steps (in seconds) larger than gap split the series, and
+        the derivative of each part is found on its own.
+        Default is None (no gaps).
+    edge_order: int, optional
+        1 or 2, as numpy.gradient. Default is 1.
+    savgol: tuple of int, optional
+        Window length and polynomial order of a Savitzky-Golay filter,
+        for the parts with a regular cadence. Default is None.
+    chunk_size: int, optional
+        Number of samples processed at once. Default is 2**16.
+
+    Returns
+    -------
+    list of str
+        Names of the tplot variables created.
+    """
+    from pyspedas import get_data, store_data, tnames
+    old_names = tnames(names)
+    if len(old_names) < 1:
+        logging.error('deriv_batch: No pytplot names were provided.')
+        return
+    if suffix is None:
+        suffix = '-der'
+    n_names = new_names(old_names, newname, suffix, overwrite)
+
+    # Variables with the same times.
+    groups = []
+    for old, new in zip(old_names, n_names):
+        time, data = get_data(old)[:2]
+        for group in groups:
+            if len(group[0]) == len(time) and np.array_equal(group[0], time):
+                group[1].append(data)
+                group[2].append(new)
+                break
+        else:
+            groups.append((time, [data], [new]))
+
+    for time, arrays, news in groups:
+        results = derivative(time, arrays, gap=gap, edge_order=edge_order,
+                             savgol=savgol, chunk_size=chunk_size)
+        for new, result in zip(news, results):
+            store_data(new, data={'x': time, 'y': result})
+            logging.info('deriv_batch was applied to: ' + new)
+    return n_names
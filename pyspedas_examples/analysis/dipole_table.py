@@ -0,0 +1,153 @@
+"""
+MAG to GEO transformation of large arrays, with a table of dipole axes.
+
+submag2geo computes the direction of the dipole for every point (going
+through SM, GSM, GSE and GEI) and rotates the points one at a time. The
+dipole axis in GEO only depends on the day (the IGRF coefficients are
+interpolated by day of year), so here it is computed at the nodes of a
+table, at a given cadence, and looked up or interpolated for each point.
+The rotation is then applied to all the points with array operations.
+
+Notes
+-----
+With the default cadence of one day and the 'previous' method, the table
+holds exactly the dipole axes used by submag2geo, and the results agree
+to rounding errors.
+"""
+import numpy as np
+
+from pyspedas_examples.analysis.cotrans_cache import time_parts
+
+
+class DipoleTable:
+    """
+    Dipole axis in GEO, tabulated at a fixed cadence.
+
+    Parameters
+    ----------
+    time_start, time_end: float
+        Unix times covered by the table.
+    cadence: float, optional
+        Seconds between the nodes of the table. The nodes start at
+        00:00 UTC of the first day. Default is one day.
+
+    Attributes
+    ----------
+    times: array of float
+        Times of the nodes.
+    axes: array of float
+        Unit dipole axis in GEO at each node, with shape (n, 3).
+    """
+
+    def __init__(self, time_start, time_end, cadence=86400.0):
+        from pyspedas.cotrans_tools.cotrans_lib import cdipdir
+        if cadence <= 0:
+            raise ValueError('cadence must be positive')
+        self.cadence = float(cadence)
+        self.time_start = np.floor(time_start / 86400.0) * 86400.0
+        count = int(np.floor((time_end - self.time_start) / self.cadence)) + 2
+        self.times = self.time_start + self.cadence * np.arange(count)
+        iyear, idoy = time_parts(self.times)[:2]
+        self.axes = np.array([cdipdir(None, int(y), int(d))
+                              for y, d in zip(iyear, idoy)])
+
+    def covers(self, time_in):
+        """True if the times are within the table."""
+        return (np.min(time_in) >= self.times[0]
+                and np.max(time_in) < self.times[-1])
+
+    def axis(self, time_in, method='previous'):
+        """
+        Dipole axis at the given times.
+
+        Parameters
+        ----------
+        time_in: array of float
+            Unix times, within the table.
+        method: str, optional
+            'previous' for the value of the last node before each time
+            (exact for a daily table), or 'linear' for a linear
+            interpolation between the nodes, normalized.
+
+        Returns
+        -------
+        array of float
+            Unit vectors with shape (n, 3).
+        """
+        x = (np.asarray(time_in, dtype=np.float64)
+             - self.time_start) / self.cadence
+        i = np.clip(np.floor(x).astype(np.int64), 0, len(self.times) - 2)
+        if method == 'previous':
+            return self.axes[i]
+        if method != 'linear':
+            raise ValueError('unknown method: ' + str(method))
+        f = (x - i)[:, None]
+        d = self.axes[i] * (1.0 - f) + self.axes[i + 1] * f
+        d /= np.linalg.norm(d, axis=1)[:, None]
+        return d
+
+
+def _rotate_mag(time_in, data_in, inverse, cadence, method, table):
+    t = np.asarray(time_in, dtype=np.float64).ravel()
+    d = np.asarray(data_in, dtype=np.float64).reshape(-1, 3)
+    if table is None or not table.covers(t):
+        table = DipoleTable(np.min(t), np.max(t), cadence=cadence)
+    axis = table.axis(t, method=method)
+
+    # Latitude and longitude of the dipole axis, as in submag2geo.
+    # cos(colatitude) = sin(latitude) = z, and so on.
+    rho = np.hypot(axis[:, 0], axis[:, 1])
+    cos_a, sin_a = axis[:, 2], rho
+    cos_p = np.divide(axis[:, 0], rho, out=np.ones_like(rho), where=rho > 0)
+    sin_p = np.divide(axis[:, 1], rho, out=np.zeros_like(rho), where=rho > 0)
+    x, y, z = d[:, 0], d[:, 1], d[:, 2]
+    out = np.empty_like(d)
+    if not inverse:
+        # GEO = glong @ glat @ MAG
+        u = cos_a * x + sin_a * z
+        out[:, 0] = cos_p * u - sin_p * y
+        out[:, 1] = sin_p * u + cos_p * y
+        out[:, 2] = cos_a * z - sin_a * x
+    else:
+        # MAG = mlat @ mlong @ GEO
+        u = cos_p * x + sin_p * y
+        out[:, 0] = cos_a * u - sin_a * z
+        out[:, 1] = cos_p * y - sin_p * x
+        out[:, 2] = sin_a * u + cos_a * z
+    return out
+
+
+def submag2geo_table(time_in, data_in, cadence=86400.0, method='previous',
+                     table=None):
+    """
+    Transform data from MAG to GEO, with a table of dipole axes.
+
+    Parameters
+    ----------
+    time_in: array of float
+        Unix times.
+    data_in: array of float
+        Coordinates in MAG, with shape (n, 3).
+    cadence: float, optional
+        Seconds between the nodes of the table. Default is one day.
+    method: str, optional
+        'previous' (default) or 'linear', see DipoleTable.axis.
+    table: DipoleTable, optional
+        Table to use, if it covers the times. Otherwise a table is made.
+
+    Returns
+    -------
+    array of float
+        Coordinates in GEO, with shape (n, 3).
+    """
+    return _rotate_mag(time_in, data_in, False, cadence, method, table)
+
+
+def subgeo2mag_table(time_in, data_in, cadence=86400.0, method='previous',
+                     table=None):
+    """
+    Transform data from GEO to MAG, with a table of dipole axes.
+
+    Same parameters as submag2geo_table.
+    """
+    return _rotate_mag(time_in, data_in, True, cadence, method, table)
@@ -0,0 +1,230 @@
+"""
+THEMIS DSL to GSE transformation of many variables, with cached attitude.
+
+pyspedas dsl2gse interpolates the spin axis attitude to the times of the
+variable, and builds the rotation, for every call. Here, the direction of
+the spin axis in GSE is computed once per probe and time array, kept in a
+CotransCache, and the rotation matrices are rebuilt from it chunk by
+chunk and applied to all the variables on these times with one
+numpy.einsum. The cached directions are 3/9 of the size of the matrices,
+so the matrices of a whole day of 128 Hz data are never in memory at once.
+
+Notes
+-----
+Same computation as pyspedas.projects.themis.cotrans.dsl2gse, so the
+results agree to rounding errors.
+"""
+import logging
+
+import numpy as np
+
+from pyspedas_examples.analysis.cotrans_cache import (CotransCache, _Angles,
+                                                      _gei2gse, rotate)
+from pyspedas_examples.utilities.lru import time_fingerprint
+
+# Cache used when none is given. The spin axis directions of a day of
+# 128 Hz data take 265 MB.
+dsl_cache = CotransCache(max_bytes=512 * 2**20)
+
+
+def spin_axis_names(probe, use_spinaxis_corrections=True):
+    """Names of the spin axis right ascension and declination variables."""
+    suffix = '_corrected' if use_spinaxis_corrections else ''
+    return ('th' + probe + '_spinras' + suffix,
+            'th' + probe + '_spindec' + suffix)
+
+
+def _spin_axis_gse(t, attitude):
+    """Unit vectors along the spin axis in GSE, at the times t."""
+    att_t, ras, dec = attitude
+    ras = np.interp(t, att_t, ras, left=np.nan, right=np.nan)
+    dec = np.interp(t, att_t, dec, left=np.nan, right=np.nan)
+
+    # Unit vector along the spin axis, in GEI and in GSE.
+    spla = (90.0 - dec) * np.pi / 180.0
+    splo = ras * np.pi / 180.0
+    zscs = np.column_stack((np.sin(spla) * np.cos(splo),
+                            np.sin(spla) * np.sin(splo), np.cos(spla)))
+    zscs /= np.linalg.norm(zscs, axis=1)[:, None]
+    # The GEI to GSE matrices of a chunk are not reused, so not cached.
+    return rotate(_gei2gse(_Angles(t)), [zscs])[0]
+
+
+def spin_axis_gse(time_in, attitude, chunk_size=2**18, cache=None):
+    """
+    Direction of the spin axis in GSE.
+
+    The directions are computed chunk by chunk, and cached for the whole
+    time array, unless they are larger than the cache.
+
+    Parameters
+    ----------
+    time_in: array of float
+        Unix times.
+    attitude: tuple
+        Times, right ascension and declination (degrees) of the spin axis.
+    chunk_size: int, optional
+        Number of samples computed at a time.
+    cache: CotransCache, optional
+        Cache of directions. Default is dsl_cache.
+
+    Returns
+    -------
+    array of float
+        Unit vectors with shape (n, 3).
+    """
+    if cache is None:
+        cache = dsl_cache
+    t = np.asarray(time_in, dtype=np.float64)
+    # Directions that cannot be cached are not looked up either.
+    fits = len(t) * 3 * 8 <= cache.max_bytes
+    key = (time_fingerprint(t), 'spinaxis',
+           time_fingerprint(np.concatenate(attitude)), 'gse')
+    if fits:
+        z = cache.get(key)
+        if z is not None:
+            return z
+
+    z = np.empty((len(t), 3))
+    for i0 in range(0, len(t), chunk_size):
+        i1 = min(i0 + chunk_size, len(t))
+        z[i0:i1] = _spin_axis_gse(t[i0:i1], attitude)
+    if fits:
+        cache.put(key, z)
+    return z
+
+
+def dsl_matrices(zgse):
+    """
+    Rotation matrices from DSL to GSE.
+
+    Parameters
+    ----------
+    zgse: array of float
+        Direction of the spin axis in GSE, with shape (n, 3).
+
+    Returns
+    -------
+    array of float
+        Matrices with shape (n, 3, 3). Their columns are the DSL axes in
+        GSE; the transposed matrices give the GSE to DSL transformation.
+    """
+    sun = [1.0, 0.0, 0.0]
+    y = np.cross(zgse, sun)
+    y /= np.linalg.norm(y, axis=1)[:, None]
+    x = np.cross(y, zgse)
+    x /= np.linalg.norm(x, axis=1)[:, None]
+    return np.stack((x, y, zgse), axis=2)
+
+
+def dsl2gse_batch(names_in, names_out=None, isgsetodsl=False,
+                  ignore_input_coord=False, probe=None,
+                  use_spinaxis_corrections=True, chunk_size=2**18,
+                  cache=None):
+    """
+    Transform THEMIS variables from DSL to GSE (or GSE to DSL).
+
+    Variables of the same probe on the same times share the rotation
+    matrices, which are built from the spin axis direction computed once
+    (or taken from the cache).
+
+    Parameters
+    ----------
+    names_in: str/list of str
+        Input tplot variables.
+    names_out: str/list of str, optional
+        Output tplot variables. Default is the input names with 'dsl'
+        replaced by 'gse' (or the opposite), or with '_gse' appended.
+    isgsetodsl: bool, optional
+        Transform from GSE to DSL instead.
+    ignore_input_coord: bool, optional
+        Do not check the coordinate system of the input variables.
+    probe: str, optional
+        THEMIS probe. Default is the third letter of each name.
+    use_spinaxis_corrections: bool, optional
+        Use the corrected spin axis variables. Default is True.
+    chunk_size: int, optional
+        Number of samples rotated at a time.
+    cache: CotransCache, optional
+        Cache of spin axis directions. Default is dsl_cache.
+
+    Returns
+    -------
+    list of str
+        Names of the variables created.
+    """
+    from pyspedas import data_exists, data_quants, get_coords, get_data
+    from pyspedas import set_coords, tplot_copy, tplot_utilities
+    from pyspedas.projects.themis import autoload_support
+
+    if isinstance(names_in, str):
+        names_in = [names_in]
+    c_in, c_out = ('gse', 'dsl') if isgsetodsl else ('dsl', 'gse')
+    if names_out is None:
+        names_out = [n.replace(c_in, c_out) if c_in in n else n + '_' + c_out
+                     for n in names_in]
+    elif isinstance(names_out, str):
+        names_out = [names_out]
+    if len(names_out) != len(names_in):
+        logging.error('dsl2gse_batch: names_in and names_out have different '
+                      'lengths.')
+        return []
+
+    # Group the variables by probe and times.
+    groups = {}
+    for name_in, name_out in zip(names_in, names_out):
+        if not data_exists(name_in):
+            logging.error('dsl2gse_batch: Variable missing: ' + name_in)
+            continue
+        if not ignore_input_coord:
+            coord = get_coords(name_in)
+            if coord is None or coord.lower() != c_in:
+                logging.error('dsl2gse_batch: ' + c_in.upper()
+                              + ' input required, but ' + name_in + ' is '
+                              + str(coord))
+                continue
+        p = probe if probe is not None else name_in[2]
+        autoload_support(varname=name_in, probe=p, spinaxis=True)
+        d = get_data(name_in)
+        key = (p, time_fingerprint(d[0]))
+        if key not in groups:
+            groups[key] = (p, np.asarray(d[0], dtype=np.float64), [])
+        groups[key][2].append((name_in, name_out, d[1]))
+
+    created = []
+    for p, t, variables in groups.values():
+        ras, dec = [get_data(n) for n in
+                    spin_axis_names(p, use_spinaxis_corrections)]
+        if ras is None or dec is None:
+            logging.error('dsl2gse_batch: No spin axis data for probe ' + p)
+            continue
+        attitude = (np.asarray(ras[0], dtype=np.float64), ras[1], dec[1])
+
+        # The results are written in place in the copies of the inputs.
+        outputs = []
+        for name_in, name_out, y in variables:
+            tplot_copy(name_in, name_out)
+            quant = data_quants[name_out]
+            if quant.values.dtype != np.float64:
+                quant.values = np.float64(quant.values)
+            outputs.append(quant.values)
+
+        zgse = spin_axis_gse(t, attitude, chunk_size=chunk_size,
+                             cache=cache)
+        for i0 in range(0, len(t), chunk_size):
+            i1 = min(i0 + chunk_size, len(t))
+            m = dsl_matrices(zgse[i0:i1])
+            if isgsetodsl:
+                m = np.transpose(m, (0, 2, 1))
+            out = rotate(m, [y[i0:i1] for _, _, y in variables])
+            for o, chunk in zip(outputs, out):
+                o[i0:i1] = chunk
+
+        for _, name_out, _ in variables:
+            quant = data_quants[name_out]
+            quant.attrs['plot_options']['yaxis_opt']['y_range'] = (
+                tplot_utilities.get_y_range(quant))
+            set_coords(name_out, c_out.upper())
+            created.append(name_out)
+
+    return [n for n in names_out if n in created]
@@ -0,0 +1,363 @@
+"""
+Dynamic power spectra of long time series, in blocks of windows.
+
+pyspedas.tdpwrspc splits a vector into tplot variables, and dpwrspc
+computes the spectrum of each window in a Python loop, with a polyfit
+and a complex FFT of the window. Here:
+
+- The windows are taken in blocks of about chunk_size samples, so the
+  memory used besides the input and the spectrogram does not depend on
+  the length of the series. The line is subtracted from all the windows
+  of a block at once (least squares, in closed form) and their FFTs are
+  computed together (scipy.fft.rfft).
+- The blocks of all the components are processed in a pool of threads.
+  The times and frequencies are found first, so that the spectrogram
+  tplot variable is created before the power is computed, and the power
+  of each block is written directly in it.
+
+The results are the same as pyspedas.tdpwrspc, up to rounding. The times
+and frequencies are the same, bit for bit.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class _Spectra:
+    """Windows of the finite samples of one component, as dpwrspc."""
+
+    def __init__(self, name, time, data, t00, nboxpoints, nshiftpoints, bin,
+                 nohanning, noline, notperhz, notmvariance, tm_sensitivity,
+                 chunk_size):
+        self.name = name
+        self.time = time
+        self.data = data
+        self.t00 = t00
+        finite = np.isfinite(data)
+        self.index = None if finite.all() else np.flatnonzero(finite)
+        self.total = len(data) if self.index is None else len(self.index)
+        self.nbox = int(nboxpoints)
+        nspectra = int((self.total - self.nbox / 2.0) / nshiftpoints)
+        begins = np.array(nshiftpoints * np.arange(max(nspectra, 0)),
+                          dtype=np.int64)
+        self.begins = begins[begins + self.nbox <= self.total - 1]
+        self.nspectra = len(self.begins)
+        self.bin = bin
+        self.nfreqs = int(int(self.nbox / 2) / bin)
+        # An odd window loses its last point.
+        self.bign = self.nbox - self.nbox % 2
+        if nohanning:
+            self.window = np.ones(self.nbox)
+            self.scale = 1.0
+        else:
+            self.window = np.hanning(self.nbox)
+            self.scale = self.bign / np.sum(self.window**2)
+        self.noline = noline
+        self.notperhz = notperhz
+        self.notmvariance = notmvariance
+        self.tm_sensitivity = tm_sensitivity or 100.0
+        self.step = max(int(chunk_size) // self.nbox, 1)
+
+    def check(self):
+        """Log an error and return False if there are no spectra."""
+        if self.total - 1 < self.nbox or self.nspectra == 0:
+            logging.error('dynamic_power: Not enough points for a '
+                          'calculation for ' + self.name)
+            return False
+        if self.nfreqs <= 1:
+            logging.error('dynamic_power: Not enough frequencies for a '
+                          'calculation for ' + self.name)
+            return False
+        return True
+
+    def blocks(self):
+        return [(self, start, min(start + self.step, self.nspectra))
+                for start in range(0, self.nspectra, self.step)]
+
+    def _windows(self, values, start, stop):
+        """Samples of the windows start to stop, with shape (k, nbox)."""
+        idx = self.begins[start:stop, None] + np.arange(self.nbox)
+        if self.index is not None:
+            idx = self.index[idx]
+        return values[idx]
+
+    def _times(self, start, stop):
+        """Times of the windows, from their first time."""
+        t = self._windows(self.time, start, stop) - self.t00
+        return t - t[:, :1]
+
+    def times(self, start, stop):
+        """
+        Center times, resolutions and valid windows of a block.
+
+        The resolution is the median time between the samples of each
+        window. With notmvariance, windows with a variable cadence are
+        not valid.
+        """
+        t = self._windows(self.time, start, stop)[:, [0, -1]] - self.t00
+        center = (t[:, 0] + t[:, 1]) / 2.0
+        tdiff = np.diff(self._times(start, stop)[:, :self.bign], axis=-1)
+        tres = np.median(tdiff, axis=-1)
+        if self.notmvariance and self.bign > 1:
+            valid = ~np.any(np.abs(tdiff / tres[:, None] - 1)
+                            > 1.0 / self.tm_sensitivity, axis=-1)
+        else:
+            valid = np.ones(len(tres), dtype=bool)
+        return center, tres, valid
+
+    def frequencies(self, tres, valid):
+        """Center frequencies of the bins, NaN for windows not valid."""
+        k = np.arange(int(self.bign / 2) + 1)
+        fk = k / (self.bign * tres[:, None])
+        i = np.arange(self.nfreqs) * self.bin
+        freqs = (fk[:, i + 1] + fk[:, i + self.bin]) / 2.0
+        freqs[~valid] = np.nan
+        return freqs
+
+    def power(self, start, stop, tres, valid, out):
+        """Write the power of the windows start to stop in out."""
+        import scipy.fft
+        x = self._windows(self.data, start, stop).astype(np.float64)
+        if not self.noline:
+            t = self._times(start, stop)
+            t -= t.mean(axis=-1, keepdims=True)
+            x_mean = x.mean(axis=-1, keepdims=True)
+            slope = (np.sum(t * (x - x_mean), axis=-1, keepdims=True)
+                     / np.sum(t * t, axis=-1, keepdims=True))
+            x -= slope * t + x_mean
+        x *= self.window
+        bign = self.bign
+        xs = scipy.fft.rfft(x[:, :bign], axis=-1)
+        pwr = xs.real * xs.real + xs.imag * xs.imag
+        # The power of the negative frequencies is added.
+        pwr[:, 1:bign // 2] *= 2.0
+        pwr *= self.scale / bign**2
+        power = out[start:stop]
+        power[:] = 0.0
+        i = np.arange(self.nfreqs) * self.bin
+        for j in range(self.bin):
+            power += pwr[:, i + j + 1]
+        if not self.notperhz:
+            power /= (self.bin * (1 / (bign * tres)))[:, None]
+        power[~valid] = np.nan
+
+
+def _compute(spectra, workers, create):
+    """
+    Find the spectra, in blocks processed by a pool of threads.
+
+    create(s, times, freqs) is called for each item s of spectra, with
+    its times and frequencies, and returns the array of its power.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    blocks = [b for s in spectra for b in s.blocks()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resolutions = list(pool.map(lambda b: b[0].times(b[1], b[2]),
+                                    blocks))
+        outputs = {}
+        k = 0
+        for s in spectra:
+            n = len(s.blocks())
+            center, tres, valid = [np.concatenate(r) for r in
+                                   zip(*resolutions[k:k + n])]
+            k += n
+            outputs[id(s)] = (create(s, center, s.frequencies(tres, valid)),
+                              tres, valid)
+
+        def power(block):
+            s, start, stop = block
+            out, tres, valid = outputs[id(s)]
+            s.power(start, stop, tres[start:stop], valid[start:stop], out)
+
+        list(pool.map(power, blocks))
+
+
+def dynamic_power_data(time, data, nboxpoints=256, nshiftpoints=128, bin=3,
+                       nohanning=False, noline=False, notperhz=False,
+                       notmvariance=False, tm_sensitivity=None,
+                       chunk_size=2**20, workers=None):
+    """
+    Dynamic power spectrum of a series, as pyspedas.dpwrspc.
+
+    Parameters
+    ----------
+    time: array
+        Times, with shape (n,).
+    data: array
+        Data, with shape (n,). NaN are skipped. Memory-mapped arrays are
+        read one block of windows at a time.
+    nboxpoints: int, optional
+        Number of points of each window. Default is 256.
+    nshiftpoints: float, optional
+        Number of points between the windows. Default is 128.
+    bin: int, optional
+        Number of frequencies added in each bin. Default is 3.
+    nohanning: bool, optional
+        If True, no Hanning window is applied. Default is False.
+    noline: bool, optional
+        If True, no straight line is subtracted. Default is False.
+    notperhz: bool, optional
+        If True, the power is in units of the square of the data.
+        Default is False.
+    notmvariance: bool, optional
+        If True, the spectra of windows with a variable cadence are NaN.
+        Default is False.
+    tm_sensitivity: float, optional
+        Variation of the cadence accepted with notmvariance, as a
+        fraction (1 / tm_sensitivity) of the median. Default is 100.
+    chunk_size: int, optional
+        Approximate number of samples of the windows of a block.
+        Default is 2**20.
+    workers: int, optional
+        Number of threads. Default is the number of CPUs.
+
+    Returns
+    -------
+    tdps: array
+        Center times of the windows.
+    fdps: array
+        Frequencies, with shape (number of windows, number of bins).
+    dps: array
+        Power, with shape (number of windows, number of bins).
+        None if there are not enough points.
+    """
+    s = _Spectra('data', time, data, 0.0, nboxpoints, nshiftpoints, bin,
+                 nohanning, noline, notperhz, notmvariance, tm_sensitivity,
+                 chunk_size)
+    if not s.check():
+        return None
+    result = []
+
+    def create(s, times, freqs):
+        result.extend([times, freqs, np.empty((len(times), s.nfreqs))])
+        return result[-1]
+
+    _compute([s], workers, create)
+    return tuple(result)
+
+
+def dynamic_power(names, newname=None, suffix='_dpwrspc', trange=None,
+                  nboxpoints=None, nshiftpoints=None, bin=3, nohanning=False,
+                  noline=False, notperhz=False, notmvariance=False,
+                  tm_sensitivity=None, chunk_size=2**20, workers=None):
+    """
+    Find the dynamic power spectra of tplot variables, as tdpwrspc.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names.
+    newname: str/list of str, optional
+        List of new names for the variables with one component. If not
+        given, then a suffix is applied. The spectra of the components
+        of vectors are named as by tdpwrspc (name_x_dpwrspc).
+    suffix: str, optional
+        A suffix to apply. Default is '_dpwrspc'.
+    trange: list of str/float, optional
+        Time range of the samples used. Default is all the samples.
+    nboxpoints: int, optional
+        Number of points of each window. Default is as tdpwrspc:
+        the number of samples / 32, as a power of 2, and at least 8.
+    nshiftpoints: float, optional
+        Number of points between the windows.
+        Default is nboxpoints / 2.
+    bin: int, optional
+        Number of frequencies added in each bin. Default is 3.
+    nohanning: bool, optional
+        If True, no Hanning window is applied. Default is False.
+    noline: bool, optional
+        If True, no straight line is subtracted. Default is False.
+    notperhz: bool, optional
+        If True, the power is in units of the square of the data.
+        Default is False.
+    notmvariance: bool, optional
+        If True, the spectra of windows with a variable cadence are NaN.
+        Default is False.
+    tm_sensitivity: float, optional
+        Variation of the cadence accepted with notmvariance, as a
+        fraction (1 / tm_sensitivity) of the median. Default is 100.
+    chunk_size: int, optional
+        Approximate number of samples of the windows of a block.
+        Default is 2**20.
+    workers: int, optional
+        Number of threads, for the blocks of all the components.
+        Default is the number of CPUs.
+
+    Returns
+    -------
+    list of str
+        Names of the spectrogram tplot variables.
+    """
+    from pyspedas import (data_quants, get_data, options, set_units,
+                          store_data, time_double, tnames)
+    old_names = tnames(names)
+    if len(old_names) < 1:
+        logging.error('dynamic_power: No pytplot names were provided.')
+        return
+    if isinstance(newname, str):
+        newname = [newname]
+    if newname is not None and len(newname) != len(old_names):
+        newname = None
+
+    spectra, outputs = [], []
+    for i, old in enumerate(old_names):
+        time, data = get_data(old)[:2]
+        metadata = get_data(old, metadata=True)
+        units = metadata.get('data_att', {}).get('units')
+        t00 = time[0]
+        if trange is not None and len(trange) == 2:
+            tr = time_double(trange)
+            if tr[1] > tr[0]:
+                start, stop = np.searchsorted(time, tr)
+                if stop == start:
+                    logging.error('dynamic_power: No data in time range '
+                                  'for ' + old)
+                    continue
+                time, data = time[start:stop], data[start:stop]
+        nbp = nboxpoints
+        if nbp is None:
+            nbp = max(2**(np.floor(np.log(len(data)) / np.log(2)) - 5), 8)
+        nsp = nbp / 2.0 if nshiftpoints is None else nshiftpoints
+        if len(data) <= nbp:
+            logging.error('dynamic_power: Not enough data in time range '
+                          'for ' + old)
+            continue
+        if data.ndim == 1:
+            components = [(data, old + suffix if newname is None
+                           else newname[i])]
+        else:
+            labels = (['_x', '_y', '_z'] if data.shape[1] == 3 else
+                      ['_' + str(c) for c in range(data.shape[1])])
+            components = [(data[:, c], old + label + suffix)
+                          for c, label in enumerate(labels)]
+        for y, new in components:
+            s = _Spectra(new, time, y, t00, nbp, nsp, bin, nohanning, noline,
+                         notperhz, notmvariance, tm_sensitivity, chunk_size)
+            if s.check():
+                spectra.append(s)
+                outputs.append((new, units))
+
+    def create(s, times, freqs):
+        store_data(s.name, data={'x': times + s.t00,
+                                 'y': np.zeros((len(times), s.nfreqs)),
+                                 'v': freqs})
+        return data_quants[s.name].values
+
+    _compute(spectra, workers, create)
+
+    for new, units in outputs:
+        options(new, 'ysubtitle', '[Hz]')
+        options(new, 'spec', True)
+        options(new, 'ylog', True)
+        options(new, 'zlog', True)
+        options(new, 'Colormap', 'spedas')
+        if units is not None:
+            set_units(new, '(' + units + ')^2'
+                      + ('' if notperhz else '/Hz'))
+        options(new, 'ztitle', '(' + (units or '#') + ')^2'
+                + ('' if notperhz else '/Hz'))
+        logging.info('dynamic_power was applied to: ' + new)
+    return [new for new, units in outputs]
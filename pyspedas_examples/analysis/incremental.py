@@ -0,0 +1,511 @@
+"""
+Incremental analysis of time series that grow, for near-real-time feeds.
+
+A dashboard that refreshes a day of GMAG data every minute can append
+the new samples to these objects instead of running subtract_average,
+avg_data, deriv_data and clean_spikes on the whole day again:
+
+- IncrementalMedian keeps the median of each component with two heaps.
+- IncrementalAverage keeps the averages of the completed bins, and the
+  samples of the open bin.
+- IncrementalDerivative keeps the derivatives of the interior samples,
+  which do not change when samples are appended.
+- IncrementalSpikes returns the cleaned samples whose smoothing window
+  is complete, and only keeps the samples after them.
+
+Appending N samples costs O(N) (O(N log n) for the median), and
+result() (or the samples of IncrementalSpikes.update, then pending())
+gives the same values, bit for bit, as the batch function on all the
+samples so far. Only the samples near the end, which depend on the
+samples still to come, are computed again by result() or pending().
+
+Notes
+-----
+The median of the data changes when samples are appended, so the
+median subtracted data change too. The averages and derivatives of
+median subtracted data are the averages and derivatives of the data
+minus the median (equal up to rounding), and the spikes are found in
+the data minus a fixed offset.
+"""
+import heapq
+import logging
+import math
+
+import numpy as np
+
+from .avg_data_stream import bin_mean
+from .clean_spikes_batch import spike_mask
+
+
+def gradient(f, dx, edge_order=1):
+    """
+    Derivative along the first axis, as numpy.gradient.
+
+    numpy.gradient uses a simpler formula when the times are evenly
+    spaced. Here the spacing is given, so that parts of a series give
+    the same values as the whole series.
+
+    Parameters
+    ----------
+    f: array
+        Data, with at least edge_order + 1 samples.
+    dx: float/array
+        Time step (for evenly spaced times), or differences of the times.
+    edge_order: int, optional
+        1 or 2, as numpy.gradient. Default is 1.
+
+    Returns
+    -------
+    array
+        Derivative, with the type of numpy.gradient.
+    """
+    f = np.asarray(f)
+    otype = f.dtype if f.dtype.kind in 'fc' else np.dtype(np.float64)
+    out = np.empty_like(f, dtype=otype)
+    shape = (-1,) + (1,) * (f.ndim - 1)
+    uniform = np.ndim(dx) == 0
+    if uniform:
+        out[1:-1] = (f[2:] - f[:-2]) / (2. * dx)
+    else:
+        dx1 = dx[0:-1]
+        dx2 = dx[1:]
+        a = (-(dx2) / (dx1 * (dx1 + dx2))).reshape(shape)
+        b = ((dx2 - dx1) / (dx1 * dx2)).reshape(shape)
+        c = (dx1 / (dx2 * (dx1 + dx2))).reshape(shape)
+        out[1:-1] = a * f[:-2] + b * f[1:-1] + c * f[2:]
+    if edge_order == 1:
+        out[0] = (f[1] - f[0]) / (dx if uniform else dx[0])
+        out[-1] = (f[-1] - f[-2]) / (dx if uniform else dx[-1])
+    else:
+        if uniform:
+            a, b, c = -1.5 / dx, 2. / dx, -0.5 / dx
+        else:
+            dx1, dx2 = dx[0], dx[1]
+            a = -(2. * dx1 + dx2) / (dx1 * (dx1 + dx2))
+            b = (dx1 + dx2) / (dx1 * dx2)
+            c = - dx1 / (dx2 * (dx1 + dx2))
+        out[0] = a * f[0] + b * f[1] + c * f[2]
+        if uniform:
+            a, b, c = 0.5 / dx, -2. / dx, 1.5 / dx
+        else:
+            dx1, dx2 = dx[-2], dx[-1]
+            a = (dx2) / (dx1 * (dx1 + dx2))
+            b = - (dx2 + dx1) / (dx1 * dx2)
+            c = (2. * dx2 + dx1) / (dx2 * (dx1 + dx2))
+        out[-1] = a * f[-3] + b * f[-2] + c * f[-1]
+    return out
+
+
+class _Buffer:
+    """Array that grows at the end, with amortized O(1) appends."""
+
+    def __init__(self):
+        self.data = None
+        self.size = 0
+
+    def append(self, values):
+        values = np.asarray(values)
+        if self.data is None:
+            self.data = np.empty((max(len(values), 1024),) + values.shape[1:],
+                                 dtype=values.dtype)
+        if self.size + len(values) > len(self.data):
+            capacity = max(2 * len(self.data), self.size + len(values))
+            data = np.empty((capacity,) + self.data.shape[1:],
+                            dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+        self.data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def view(self):
+        return self.data[:self.size]
+
+
+class RunningMedian:
+    """
+    Median of a growing series of values, as numpy.nanmedian.
+
+    The lower half of the values is in a max-heap, and the upper half in
+    a min-heap. NaN values are ignored.
+
+    Parameters
+    ----------
+    dtype: numpy dtype, optional
+        Type of the values, and of the median. Default is float64.
+    """
+
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self._low = []  # negated values
+        self._high = []
+
+    def __len__(self):
+        return len(self._low) + len(self._high)
+
+    def add(self, values):
+        """Add values."""
+        low, high = self._low, self._high
+        for v in np.asarray(values, dtype=self.dtype).ravel().tolist():
+            if v != v:
+                continue
+            if low and v > -low[0]:
+                heapq.heappush(high, v)
+                if len(high) > len(low):
+                    heapq.heappush(low, -heapq.heappop(high))
+            else:
+                heapq.heappush(low, -v)
+                if len(low) > len(high) + 1:
+                    heapq.heappush(high, -heapq.heappop(low))
+
+    def median(self):
+        """Return the median, or NaN if there are no values."""
+        if not self._low:
+            return self.dtype.type(np.nan)
+        a = self.dtype.type(-self._low[0])
+        if len(self._low) > len(self._high):
+            return a
+        # As numpy.median, the mean of the two middle values.
+        return (a + self.dtype.type(self._high[0])) / 2
+
+
+class IncrementalMedian:
+    """
+    Median of each component, as subtract_average(median=True).
+
+    Parameters
+    ----------
+    dtype: numpy dtype, optional
+        Type of the data. Default is float64.
+    """
+
+    def __init__(self, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        if self.dtype.kind != 'f':
+            self.dtype = np.dtype(np.float64)
+        self._medians = None
+        self._ndim = None
+
+    def update(self, y):
+        """Add samples, with shape (n,) or (n, components)."""
+        y = np.asarray(y)
+        if self._medians is None:
+            self._ndim = y.ndim
+            count = 1 if y.ndim == 1 else y.shape[1]
+            self._medians = [RunningMedian(self.dtype) for _ in range(count)]
+        if y.ndim == 1:
+            self._medians[0].add(y)
+        else:
+            for i, m in enumerate(self._medians):
+                m.add(y[:, i])
+
+    @property
+    def median(self):
+        """
+        Median of each component (0 for components that are all NaN,
+        which subtract_average does not change).
+        """
+        if self._medians is None:
+            return None
+        stat = np.array([m.median() if len(m) else 0.0
+                         for m in self._medians], dtype=self.dtype)
+        return stat[0] if self._ndim == 1 else stat
+
+    def subtract(self, y):
+        """Return samples minus the median, as subtract_average."""
+        y = np.array(y, dtype=self.dtype)
+        y -= self.median
+        return y
+
+
+class IncrementalAverage:
+    """
+    Averages over time bins of a growing series, as avg_data.
+
+    Parameters
+    ----------
+    res: float, optional
+        Time resolution in seconds. Default is 60 sec.
+    width: int, optional
+        Number of values for the averaging window.
+        If res is set, then width is ignored.
+    """
+
+    def __init__(self, res=None, width=None):
+        if res is None and width is None:
+            res = 60
+        self.res = res
+        self.width = None if res is not None else width
+        self._t0 = None
+        self._t_last = None
+        self._count = 0
+        self._averages = _Buffer()
+        self._carry_t = None
+        self._carry_y = None
+        self._carry_bin = 0
+
+    def _bin(self, t, first):
+        if self.width is None:
+            return np.floor((t - self._t0) / self.res)
+        return np.floor(np.arange(first, first + len(t)) / self.width)
+
+    def update(self, t, y):
+        """Add samples, with increasing times."""
+        t = np.asarray(t, dtype=np.float64)
+        y = np.asarray(y)
+        if len(t) == 0:
+            return
+        if self._t0 is None:
+            self._t0 = t[0]
+            self._carry_t, self._carry_y = t[:0], y[:0]
+        ind = self._bin(t, self._count)
+        self._count += len(t)
+        self._t_last = t[-1]
+        t = np.concatenate((self._carry_t, t))
+        y = np.concatenate((self._carry_y, y))
+        ind = np.concatenate((np.full(len(self._carry_t), self._carry_bin,
+                                      dtype=ind.dtype), ind))
+        # The bins before the bin of the last sample are complete.
+        last = int(ind[-1])
+        bins = np.arange(self._carry_bin, last)
+        starts = np.searchsorted(ind, bins, side='left')
+        ends = np.searchsorted(ind, bins, side='right')
+        if len(bins) > 0:
+            dtype = y.dtype if y.dtype.kind == 'f' else np.float64
+            out = np.empty((len(bins),) + y.shape[1:], dtype=dtype)
+            for i, (s, e) in enumerate(zip(starts, ends)):
+                out[i] = bin_mean(y[s:e])
+            self._averages.append(out)
+        keep = ends[-1] if len(bins) > 0 else 0
+        self._carry_t, self._carry_y = t[keep:], y[keep:]
+        self._carry_bin = last
+
+    def result(self):
+        """
+        Return the times and averages of all the samples so far.
+
+        Returns
+        -------
+        tuple of arrays
+            Times and averages, as avg_data, or None if there are too
+            few samples for two bins.
+        """
+        if self._t0 is None:
+            return None
+        duration = self._t_last - self._t0
+        if self.width is None:
+            dt = self.res
+            bin_count = int(duration / dt)
+        else:
+            bin_count = int(self._count / self.width)
+            dt = duration / bin_count if bin_count > 0 else duration
+        if bin_count < 2 or duration <= 0:
+            logging.error('IncrementalAverage: too few bins: '
+                          + str(bin_count))
+            return None
+        mdt = duration / dt
+        if mdt - int(mdt) >= 0.5:
+            nbins = int(np.ceil(mdt))
+        else:
+            nbins = int(np.floor(mdt))
+
+        done = self._averages.size
+        averages = self._averages.view()[:nbins]
+        if nbins > done:
+            # The open bin, and empty bins (NaN) before it.
+            values = [averages]
+            for b in range(done, nbins):
+                if b == self._carry_bin:
+                    values.append([bin_mean(self._carry_y)])
+                else:
+                    values.append(np.full((1,) + averages.shape[1:], np.nan,
+                                          dtype=averages.dtype))
+            averages = np.concatenate(values)
+        times = (np.arange(nbins) + 0.5) * dt + self._t0
+        return times, averages
+
+
+class IncrementalDerivative:
+    """
+    Time derivative of a growing series, as deriv_data.
+
+    Parameters
+    ----------
+    edge_order: int, optional
+        1 or 2, as numpy.gradient. Default is 1.
+
+    Notes
+    -----
+    numpy.gradient uses a different formula when all the times are
+    evenly spaced. If a sample breaks the even spacing, the derivatives
+    are computed again, once.
+    """
+
+    def __init__(self, edge_order=1):
+        self.edge_order = edge_order
+        self._t = _Buffer()
+        self._y = _Buffer()
+        self._out = _Buffer()
+        self._dx = None
+        self._uniform = True
+        self._done = 1  # samples with a final derivative
+
+    def update(self, t, y):
+        """Add samples, with increasing times."""
+        t = np.asarray(t, dtype=np.float64)
+        if len(t) == 0:
+            return
+        n_old = self._t.size
+        self._t.append(t)
+        self._y.append(y)
+        times = self._t.view()
+        steps = np.diff(times[max(n_old - 1, 0):])
+        if self._dx is None and len(steps) > 0:
+            self._dx = steps[0]
+        if self._uniform and not (steps == self._dx).all():
+            self._uniform = False
+            self._done = 1
+        n = self._t.size
+        f = self._y.view()
+        if self._out.data is None or len(self._out.data) < n:
+            self._out.append(np.empty((n - self._out.size,) + f.shape[1:],
+                                      dtype=gradient(f[:2], 1.0).dtype))
+        self._out.size = n
+        # The derivative at i only depends on the samples i - 1 to i + 1.
+        start, stop = self._done, n - 1
+        if stop > start:
+            out = gradient(f[start - 1:stop + 1], self._step(start - 1,
+                                                             stop + 1))
+            self._out.data[start:stop] = out[1:-1]
+            self._done = stop
+
+    def _step(self, lo, hi):
+        if self._uniform:
+            return self._dx
+        return np.diff(self._t.view()[lo:hi])
+
+    def result(self):
+        """
+        Return the times and derivatives of all the samples so far.
+
+        Returns
+        -------
+        tuple of arrays
+            Times and derivatives, as deriv_data, or None if there are
+            fewer than edge_order + 1 samples.
+        """
+        n = self._t.size
+        if n < self.edge_order + 1:
+            logging.error('IncrementalDerivative: too few samples.')
+            return None
+        f = self._y.view()
+        out = self._out.view()
+        k = min(n, 3)
+        out[0] = gradient(f[:k], self._step(0, k), self.edge_order)[0]
+        out[-1] = gradient(f[-k:], self._step(n - k, n), self.edge_order)[-1]
+        return self._t.view(), out
+
+
+class IncrementalSpikes:
+    """
+    Clean spikes from a growing series, as clean_spikes_batch.
+
+    Only the samples whose smoothing window is not complete are kept:
+    update returns the samples that are final, and pending the others,
+    cleaned as if the series ended there.
+
+    Parameters
+    ----------
+    nsmooth: int, optional
+        The number of data points for smoothing. Default is 10.
+    thresh: float, optional
+        Threshold value. Default is 0.3.
+    offset: float/array, optional
+        Value subtracted from the data before finding the spikes, in the
+        place of the average of sub_avg (which changes as samples are
+        appended), e.g. the median of the previous day. Default is 0.
+    """
+
+    def __init__(self, nsmooth=10, thresh=0.3, offset=0.0):
+        self.nsmooth = int(nsmooth)
+        self.thresh = thresh
+        self.offset = offset
+        # Trailing samples, from the sample number self._start.
+        self._t = None
+        self._y = None
+        self._start = 0
+        self._done = 0  # samples returned by update
+
+    def __len__(self):
+        """Number of samples so far."""
+        return 0 if self._y is None else self._start + len(self._y)
+
+    def _final(self, n):
+        """Number of samples whose smoothing window is complete."""
+        w = self.nsmooth
+        if n <= w:
+            return 0
+        return math.floor(n - (w + 1) / 2) + 1
+
+    def _clean(self, stop):
+        """Cleaned samples from the last final sample to stop."""
+        n = len(self)
+        done = self._done - self._start
+        if n <= self.nsmooth:
+            return np.array(self._y[done:stop - self._start])
+        # The smoothing window of a sample starts at most nsmooth samples
+        # before it.
+        lo = max(done - self.nsmooth, 0)
+        f = self._y[lo:]
+        mask = spike_mask(f, nsmooth=self.nsmooth, thresh=self.thresh)
+        return np.where(mask, np.nan, f)[done - lo:stop - self._start - lo]
+
+    def update(self, t, y):
+        """
+        Add samples, with increasing times.
+
+        Returns
+        -------
+        tuple of arrays
+            Times and data minus offset, with NaN for the spikes, of the
+            samples that became final, as clean_spikes_batch on the data
+            minus offset. They are not kept.
+        """
+        t = np.asarray(t, dtype=np.float64)
+        y = np.asarray(y)
+        dtype = y.dtype if y.dtype.kind == 'f' else np.float64
+        y = np.array(y, dtype=dtype)
+        y -= np.asarray(self.offset, dtype=dtype)
+        if self._y is None:
+            self._t, self._y = t, y
+        elif len(y) > 0:
+            self._t = np.concatenate((self._t, t))
+            self._y = np.concatenate((self._y, y))
+        final = self._final(len(self))
+        if final <= self._done:
+            return self._t[:0], self._y[:0]
+        times = self._t[self._done - self._start:final - self._start]
+        out = self._clean(final)
+        self._done = final
+        # Keep the samples that are not final, and the smoothing window
+        # before them.
+        drop = max(final - self.nsmooth, 0) - self._start
+        if drop > 0:
+            self._t = self._t[drop:].copy()
+            self._y = self._y[drop:].copy()
+            self._start += drop
+        return times, out
+
+    def pending(self):
+        """
+        Return the samples that are not final yet.
+
+        Returns
+        -------
+        tuple of arrays
+            Times and data minus offset, with NaN for the spikes, of the
+            samples after those returned by update, as if there were no
+            more samples, or None if there are no samples.
+        """
+        if self._y is None:
+            return None
+        return self._t[self._done - self._start:], self._clean(len(self))
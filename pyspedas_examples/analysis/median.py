@@ -0,0 +1,332 @@
+"""
+Medians of tplot variables, for detrending.
+
+pyspedas.subtract_average(median=1) calls numpy.nanmedian on each
+component, which checks for NaN twice and copies the component before
+it sorts it partially. Here:
+
+- medians() finds the medians of all the components at once, with one
+  copy and one selection (numpy.partition) per component. The two middle
+  values of an even number of samples, or of the values that are not
+  NaN, are found with the same selection.
+- medians_many() does the same for many variables, with the components
+  of all the variables of the same length in one array.
+- subtract_average_data() subtracts the average or the median of each
+  component of an array, as subtract_average.
+- subtract_median() subtracts them from tplot variables, as
+  subtract_average(median=1).
+- sliding_median() is the median of a window of samples around each
+  sample, for detrending with a moving baseline.
+
+The medians are the same, bit for bit, as numpy.nanmedian.
+
+Notes
+-----
+sliding_median uses the median_filter of scipy.ndimage for the windows
+without NaN. It keeps the window in two heaps, O(log width) per sample,
+only with scipy 1.15 or later (Python 3.10 or later); older versions
+select the median of each window again, O(width) per sample. The windows
+with NaN are done in Python, with the same heaps.
+"""
+import heapq
+import logging
+
+import numpy as np
+
+from pyspedas_examples.utilities.names import new_names
+
+
+def _medians_rows(a):
+    """Medians of the rows of a, which is changed."""
+    n = a.shape[1]
+    if n == 0:
+        return np.full(len(a), np.nan, dtype=a.dtype)
+    m = n // 2
+    a.partition(m, axis=-1)
+    result = a[:, m].copy()
+    if n % 2 == 0:
+        # The lower middle value is the largest of the lower half.
+        result += a[:, :m].max(axis=-1)
+        result /= 2
+    # NaN are sorted after all the numbers, so rows with NaN have some in
+    # the upper half, and the middle values of the other numbers are in
+    # the lower half.
+    nan_rows = np.flatnonzero(np.isnan(a[:, m:]).any(axis=-1))
+    for i, count in zip(nan_rows, np.isnan(a[nan_rows]).sum(axis=-1)):
+        valid = n - count
+        k = valid // 2
+        if valid == 0:
+            result[i] = np.nan
+            continue
+        if k < m:
+            a[i, :m].partition(k)
+        value = a[i, k]
+        if valid % 2 == 0:
+            value = (a[i, :k].max() + value) / 2
+        result[i] = value
+    return result
+
+
+def _rows(y):
+    """Type and number of components of y, with a floating point type."""
+    y = np.asarray(y)
+    dtype = y.dtype if y.dtype.kind == 'f' else np.dtype(np.float64)
+    return dtype, 1 if y.ndim == 1 else y.shape[1]
+
+
+def medians(y):
+    """
+    Median of each component, as numpy.nanmedian(y, axis=0).
+
+    Parameters
+    ----------
+    y: array
+        Data, with shape (n,) or (n, components).
+
+    Returns
+    -------
+    float/array
+        Median of each component (NaN if it is all NaN), with the type of
+        y (float64 for integers).
+    """
+    return medians_many([y])[0]
+
+
+def medians_many(arrays):
+    """
+    Medians of the components of many arrays.
+
+    The components of arrays of the same length and type are copied in
+    one array, and their medians are found together.
+
+    Parameters
+    ----------
+    arrays: list of arrays
+        Data, each with shape (n,) or (n, components).
+
+    Returns
+    -------
+    list
+        Median of each component of each array, as medians().
+    """
+    groups = {}
+    for i, y in enumerate(arrays):
+        dtype, _ = _rows(y)
+        groups.setdefault((len(y), dtype), []).append(i)
+
+    results = [None] * len(arrays)
+    for (n, dtype), indices in groups.items():
+        sizes = [_rows(arrays[i])[1] for i in indices]
+        # One row for each component.
+        a = np.empty((sum(sizes), n), dtype=dtype)
+        start = 0
+        for i, size in zip(indices, sizes):
+            y = np.asarray(arrays[i])
+            a[start:start + size] = y if y.ndim == 1 else y.T
+            start += size
+        stat = _medians_rows(a)
+        del a
+        start = 0
+        for i, size in zip(indices, sizes):
+            results[i] = (stat[start] if np.ndim(arrays[i]) == 1
+                          else stat[start:start + size])
+            start += size
+    return results
+
+
+def subtract_average_data(y, median=False, copy=True):
+    """
+    Subtract the average or median of each component.
+
+    Same computation as pyspedas.subtract_average, on an array.
+
+    Parameters
+    ----------
+    y: array
+        Data, with shape (n,) or (n, components).
+    median: bool, optional
+        Subtract the median instead of the mean.
+    copy: bool, optional
+        If False, floating point data are changed in place.
+        Default is True.
+
+    Returns
+    -------
+    array
+        The data with the average subtracted.
+    """
+    data = np.array(y) if copy else np.asarray(y)
+    if data.dtype.kind != 'f':
+        data = np.float64(data)
+    if median:
+        # Components that are all NaN are not changed.
+        stat = medians(data)
+        data -= np.where(np.isnan(stat), 0, stat).astype(data.dtype)
+    elif data.ndim == 1:
+        if not np.isnan(data).all():
+            data -= np.nanmean(data, axis=0)
+    else:
+        for i in range(data.shape[1]):
+            if not np.isnan(data[:, i]).all():
+                data[:, i] -= np.nanmean(data[:, i], axis=0)
+    return data
+
+
+def subtract_median(names, newname=None, suffix=None, overwrite=None):
+    """
+    Subtract the median of each component, as subtract_average(median=1).
+
+    The medians of all the variables are found together.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names.
+    newname: str/list of str, optional
+        List of new names for pytplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '-m'.
+    overwrite: bool, optional
+        Replace the existing tplot name.
+
+    Returns
+    -------
+    list of str
+        Names of the tplot variables created.
+    """
+    from pyspedas import data_quants, tnames, tplot_copy
+    old_names = tnames(names)
+    if len(old_names) < 1:
+        logging.error('subtract_median: No pytplot names were provided.')
+        return
+    if suffix is None:
+        suffix = '-m'
+    n_names = new_names(old_names, newname, suffix, overwrite)
+
+    data = []
+    for old, new in zip(old_names, n_names):
+        if new != old:
+            tplot_copy(old, new)
+        values = data_quants[new].values
+        if values.dtype.kind != 'f':
+            values = np.float64(values)
+        data.append(values)
+    for new, values, stat in zip(n_names, data, medians_many(data)):
+        # Components that are all NaN are not changed.
+        values -= np.where(np.isnan(stat), 0, stat).astype(values.dtype)
+        data_quants[new].values = values
+        logging.info('Subtract Median was applied to: ' + new)
+    return n_names
+
+
+def sliding_median(y, width):
+    """
+    Median of the width samples around each sample.
+
+    Parameters
+    ----------
+    y: array
+        Data, with shape (n,) or (n, components).
+    width: int
+        Odd number of samples of the window, centered on each sample.
+        The first and last samples are repeated to fill the windows at
+        the ends.
+
+    Returns
+    -------
+    array
+        Medians of the non NaN values of each window (NaN if there are
+        none), with the shape of y. None if width is not an odd number.
+
+    Notes
+    -----
+    O(log width) per sample needs scipy 1.15 or later, for the windows
+    without NaN; with older versions, O(width).
+    """
+    from scipy.ndimage import median_filter
+    width = int(width)
+    if width < 1 or width % 2 == 0:
+        logging.error('sliding_median: width must be an odd number.')
+        return None
+    y = np.asarray(y)
+    rows = np.atleast_2d(y if y.ndim == 1 else y.T)
+    rows = rows.astype(_rows(y)[0], order='C')
+    result = np.empty_like(rows)
+    half = width // 2
+    for i, row in enumerate(rows):
+        nan = np.isnan(row)
+        if not nan.any():
+            median_filter(row, size=width, mode='nearest', output=result[i])
+            continue
+        median_filter(np.where(nan, 0, row), size=width, mode='nearest',
+                      output=result[i])
+        # Windows with NaN, found from the number of NaN before each
+        # sample of the padded component, are done again in Python.
+        x = np.concatenate((np.repeat(row[:1], half), row,
+                            np.repeat(row[-1:], half)))
+        count = np.concatenate(([0], np.cumsum(np.isnan(x))))
+        bad = np.concatenate(([False], count[width:] > count[:-width],
+                              [False]))
+        edges = np.flatnonzero(bad[1:] != bad[:-1])
+        for start, stop in zip(edges[::2], edges[1::2]):
+            result[i, start:stop] = _sliding_nanmedian(
+                x[start:stop + width - 1], width)
+    return result[0] if np.ndim(y) == 1 else result.T
+
+
+def _sliding_nanmedian(x, width):
+    """Medians of the windows of width samples of x, with two heaps."""
+    values = x.tolist()
+    # Max-heap (negated values) and min-heap of (value, index). Values that
+    # left the window are removed when they reach the top.
+    low, high = [], []
+    side = np.zeros(len(values), dtype=np.int8)  # 0: low, 1: high
+    sizes = [0, 0]  # values of the window in each heap
+    result = np.empty(len(x) - width + 1, dtype=x.dtype)
+
+    def prune(start):
+        while low and low[0][1] < start:
+            heapq.heappop(low)
+        while high and high[0][1] < start:
+            heapq.heappop(high)
+
+    for k, v in enumerate(values):
+        start = k - width + 1
+        if v == v:
+            prune(start)
+            if low and v <= -low[0][0]:
+                heapq.heappush(low, (-v, k))
+                side[k] = 0
+            else:
+                heapq.heappush(high, (v, k))
+                side[k] = 1
+            sizes[side[k]] += 1
+        old = start - 1
+        if old >= 0 and values[old] == values[old]:
+            sizes[side[old]] -= 1
+        prune(start)
+        while sizes[0] > sizes[1] + 1 or sizes[1] > sizes[0]:
+            if sizes[0] > sizes[1]:
+                v, j = heapq.heappop(low)
+                heapq.heappush(high, (-v, j))
+                side[j] = 1
+                sizes[0] -= 1
+                sizes[1] += 1
+            else:
+                v, j = heapq.heappop(high)
+                heapq.heappush(low, (-v, j))
+                side[j] = 0
+                sizes[0] += 1
+                sizes[1] -= 1
+            prune(start)
+        if start < 0:
+            continue
+        if sizes[0] == 0:
+            result[start] = np.nan
+        elif sizes[0] > sizes[1]:
+            result[start] = -low[0][0]
+        else:
+            result[start] = (x.dtype.type(-low[0][0])
+                             + x.dtype.type(high[0][0])) / 2
+    return result
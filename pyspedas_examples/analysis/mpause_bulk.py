@@ -0,0 +1,119 @@
+"""
+T96 magnetopause flags for long position arrays.
+
+pyspedas.mpause_t96 takes one solar wind pressure for all the points. Here
+the pressure can be an array (e.g. solar wind data interpolated to the
+times of the positions), and the points are processed in chunks of fixed
+size, without the selection of the points inside and outside the tail.
+
+Notes
+-----
+The distance to the boundary is computed from the distance to the x axis,
+as the nearest boundary point is in the same plane through the x axis. So
+the angle of the point around the x axis is only computed when the
+boundary points are requested. The results agree with mpause_t96 to
+rounding errors, and the flags are identical.
+"""
+import logging
+
+import numpy as np
+
+# Constants of the T96 magnetopause.
+a0 = 70.0
+s00 = 1.08
+x00 = 5.48
+pd0 = 2.0
+
+
+def _mpause_chunk(pd, x, y, z, boundary):
+    """Flags, distances and boundary points of one chunk."""
+    rat16 = (pd / pd0) ** 0.14
+    a = a0 / rat16
+    x0 = x00 / rat16
+    xm = x0 - a
+    rho = np.sqrt(y**2 + z**2)
+
+    # Sunward of xm, ellipsoidal coordinates of the points.
+    xksi = (x - x0) / a + 1.0
+    xdzt = rho / a
+    sq1 = np.sqrt((1.0 + xksi)**2 + xdzt**2)
+    sq2 = np.sqrt((1.0 - xksi)**2 + xdzt**2)
+    sigma = 0.5 * (sq1 + sq2)
+    tau = 0.5 * (sq1 - sq2)
+    rhomgnp = a * np.sqrt(np.maximum((s00**2 - 1.0) * (1.0 - tau**2), 0.0))
+    xmp = x0 - a * (1.0 - s00 * tau)
+    flag = np.where(sigma >= s00, -1.0, 1.0)
+
+    # Tailward of xm, the boundary is a cylinder.
+    tail = x < xm
+    rho_tail = a * np.sqrt(s00**2 - 1.0)
+    rhomgnp = np.where(tail, rho_tail, rhomgnp)
+    xmp = np.where(tail, x, xmp)
+    flag = np.where(tail, np.where(rho <= rho_tail, 1.0, -1.0), flag)
+
+    # Points with NaN are not checked.
+    checked = tail | (x >= xm)
+    flag[~checked] = np.nan
+    distan = np.sqrt((x - xmp)**2 + (rho - rhomgnp)**2)
+    distan[~checked] = np.nan
+    if not boundary:
+        return flag, distan
+    phi = np.arctan2(y, z)
+    ymp = rhomgnp * np.sin(phi)
+    zmp = rhomgnp * np.cos(phi)
+    xmp[~checked] = np.nan
+    ymp[~checked] = np.nan
+    zmp[~checked] = np.nan
+    return flag, distan, xmp, ymp, zmp
+
+
+def mpause_t96_bulk(pd, xgsm, ygsm, zgsm, boundary=False,
+                    chunk_size=2**16):
+    """
+    Check if many points are inside the T96 magnetopause.
+
+    Parameters
+    ----------
+    pd: float/array of float
+        Solar wind ram pressure in nPa, one value or one per point.
+    xgsm, ygsm, zgsm: array of float
+        Coordinates of the points in Earth radii.
+    boundary: bool, optional
+        Also return the nearest points of the boundary. Default is False.
+    chunk_size: int, optional
+        Number of points processed at a time. Small chunks stay in the
+        processor cache.
+
+    Returns
+    -------
+    id: array of float
+        1 inside, -1 outside, NaN if not checked (NaN inputs).
+    distan: array of float
+        Distance to the nearest point of the boundary.
+    xmp, ymp, zmp: array of float
+        Nearest points of the boundary, only if boundary is True.
+    """
+    x = np.asarray(xgsm, dtype=np.float64).ravel()
+    y = np.asarray(ygsm, dtype=np.float64).ravel()
+    z = np.asarray(zgsm, dtype=np.float64).ravel()
+    if len(x) != len(y) or len(y) != len(z):
+        logging.error('mpause_t96_bulk: xgsm, ygsm and zgsm must have the '
+                      'same length.')
+        return None
+    pd = np.asarray(pd, dtype=np.float64)
+    if pd.ndim > 0 and pd.size != len(x):
+        logging.error('mpause_t96_bulk: pd must be a number or have one '
+                      'value per point.')
+        return None
+    scalar = pd.ndim == 0
+    pd = float(pd) if scalar else pd.ravel()
+
+    count = 5 if boundary else 2
+    out = [np.empty(len(x)) for _ in range(count)]
+    for i0 in range(0, len(x), chunk_size):
+        i1 = min(i0 + chunk_size, len(x))
+        res = _mpause_chunk(pd if scalar else pd[i0:i1], x[i0:i1],
+                            y[i0:i1], z[i0:i1], boundary)
+        for o, r in zip(out, res):
+            o[i0:i1] = r
+    return tuple(out)
@@ -0,0 +1,194 @@
+"""
+Memoized magnetopause model boundaries.
+
+Plots of the magnetopause compute the same model boundary (mpause_2,
+mpause_t96) for the same parameters again and again. The boundaries are
+kept here in an LRU cache, keyed by the model name and the parameters,
+and optionally in a directory, so that other processes (e.g. batch plot
+jobs) also skip the model evaluation.
+
+Notes
+-----
+The arrays returned from the cache are shared between the calls, so they
+are read only. Reading a file takes longer than computing the mpause_2 or
+mpause_t96 boundary, so the directory only pays off for slower models
+(e.g. with many points) or to share the exact outputs between jobs.
+"""
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from pyspedas_examples.utilities.lru import LRUCache, time_fingerprint
+
+
+def _param_key(value):
+    """Hashable key for a parameter value."""
+    if value is None or isinstance(value, (bool, str)):
+        return value
+    if np.ndim(value) == 0:
+        return float(value)
+    return ('array',) + time_fingerprint(np.asarray(value, dtype=np.float64))
+
+
+class ModelCache(LRUCache):
+    """
+    LRU cache of model outputs, with an optional directory.
+
+    Parameters
+    ----------
+    max_entries: int, optional
+        Maximum number of outputs kept in memory. Default is 64.
+    max_bytes: int, optional
+        Maximum memory of the outputs kept, in bytes. Default is 64 MB.
+    directory: str, optional
+        Directory where the outputs are also saved, and looked up when
+        they are not in memory. Default is no directory.
+
+    Attributes
+    ----------
+    hits, misses, evictions: int
+        Cache statistics. A lookup found in the directory counts as a
+        hit, and also as a disk hit.
+    disk_hits: int
+        Lookups found in the directory.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=64 * 2**20, directory=None):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+        self.directory = directory
+        self.disk_hits = 0
+
+    def stats(self):
+        """Dictionary of the cache statistics."""
+        stats = super().stats()
+        stats['disk_hits'] = self.disk_hits
+        return stats
+
+    def clear(self):
+        """Remove the outputs from memory and reset the statistics."""
+        super().clear()
+        self.disk_hits = 0
+
+    def path(self, key):
+        """File of a key in the directory."""
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16)
+        return os.path.join(self.directory, name.hexdigest() + '.npy')
+
+    def get(self, key):
+        """Output for a key, or None. Counts a hit or a miss."""
+        out = super().get(key)
+        if out is not None or self.directory is None:
+            return out
+        try:
+            out = np.load(self.path(key))
+        except (OSError, ValueError):
+            return None
+        out.setflags(write=False)
+        # Found in the directory: a hit, not a miss.
+        self.misses -= 1
+        self.hits += 1
+        self.disk_hits += 1
+        # Outputs larger than max_bytes are not kept in memory.
+        super().put(key, out)
+        return out
+
+    def put(self, key, output):
+        """Add an output, in memory and in the directory."""
+        output.setflags(write=False)
+        super().put(key, output)
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(key)
+            # Write a temporary file first, for concurrent readers.
+            tmp = path + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp, 'wb') as f:
+                np.save(f, output)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.error('ModelCache: cannot save to ' + self.directory
+                          + ': ' + str(e))
+
+
+# Cache used when none is given.
+mpause_cache = ModelCache()
+
+
+def cached_model(model, func, cache=None, **params):
+    """
+    Output of a model, from the cache or computed and cached.
+
+    Parameters
+    ----------
+    model: str
+        Name of the model, part of the key.
+    func: callable
+        Called with params if the output is not cached. Returns a tuple of
+        arrays of the same length.
+    cache: ModelCache, optional
+        Cache of outputs. Default is mpause_cache.
+    **params
+        Parameters of the model, part of the key.
+
+    Returns
+    -------
+    tuple of array
+        Output of the model (read only).
+    """
+    if cache is None:
+        cache = mpause_cache
+    key = (model,) + tuple((k, _param_key(v))
+                           for k, v in sorted(params.items()))
+    out = cache.get(key)
+    if out is None:
+        out = np.stack([np.asarray(a, dtype=np.float64)
+                        for a in func(**params)])
+        cache.put(key, out)
+    return tuple(out)
+
+
+def mpause_2_cached(xmp=None, short=False, xmp_max=10.78, cache=None):
+    """
+    Fairfield magnetopause, as pyspedas.mpause_2, memoized.
+
+    Parameters
+    ----------
+    xmp, short, xmp_max:
+        Parameters of mpause_2.
+    cache: ModelCache, optional
+        Cache of outputs. Default is mpause_cache.
+
+    Returns
+    -------
+    xmp, ymp: array of float
+        Locations of the magnetopause (read only).
+    """
+    from pyspedas import mpause_2
+    return cached_model('mpause_2', mpause_2, cache=cache, xmp=xmp,
+                        short=short, xmp_max=xmp_max)
+
+
+def mpause_t96_boundary(pd, cache=None):
+    """
+    T96 magnetopause boundary, as pyspedas.mpause_t96, memoized.
+
+    Parameters
+    ----------
+    pd: float
+        Solar wind ram pressure in nPa.
+    cache: ModelCache, optional
+        Cache of outputs. Default is mpause_cache.
+
+    Returns
+    -------
+    xmgnp, ymgnp, zmgnp: array of float
+        Locations of the magnetopause boundary (read only).
+    """
+    from pyspedas import mpause_t96
+
+    def boundary(pd):
+        return mpause_t96(pd)[:3]
+    return cached_model('mpause_t96', boundary, cache=cache, pd=pd)
@@ -0,0 +1,302 @@
+"""
+Lazy pipelines of analysis steps on tplot variables.
+
+Chains like subtract_average -> avg_data or subtract_average ->
+deriv_data store every intermediate result as a tplot variable. A
+Pipeline only records the steps, and compute() stores the requested
+outputs:
+
+- An intermediate result used by several steps is computed once, as an
+  array, and is not stored as a tplot variable.
+- A subtract_average used by a single step is fused with it: the
+  average is subtracted from each chunk of the input while this step
+  reads it, so the result is never made as a full array.
+- avg_data and deriv_data read their input in chunks (avg_data with
+  StreamingAverage, deriv_data with two samples of overlap).
+
+The results are the same, bit for bit, as the pyspedas functions.
+
+Example
+-------
+    from pyspedas_examples.analysis.pipeline import Pipeline
+    p = Pipeline()
+    m = p.source('thg_mag_ccnv').subtract_average(median=True)
+    p.compute([m.avg_data(res=300.0), m.deriv_data()])
+
+Notes
+-----
+Only the times and the data ('y') of the variables are processed.
+"""
+import logging
+
+import numpy as np
+
+from .avg_data_stream import StreamingAverage
+from .incremental import gradient
+from .median import medians
+
+
+class Node:
+    """
+    A step of a Pipeline. Its methods add a step that uses its result.
+
+    Attributes
+    ----------
+    op: str
+        'source', 'subtract_average', 'avg_data' or 'deriv_data'.
+    name: str
+        Name of the tplot variable of the result.
+    """
+
+    def __init__(self, pipeline, op, inputs, params, name):
+        self.pipeline = pipeline
+        self.op = op
+        self.inputs = inputs
+        self.params = params
+        self.name = name
+
+    def __repr__(self):
+        return 'Node({}, {})'.format(self.op, self.name)
+
+    def subtract_average(self, median=False, newname=None):
+        """Subtract the average or median, as pyspedas.subtract_average."""
+        suffix = '-m' if median else '-d'
+        return Node(self.pipeline, 'subtract_average', [self],
+                    {'median': bool(median)},
+                    self.name + suffix if newname is None else newname)
+
+    def avg_data(self, res=None, width=None, newname=None):
+        """Average over time bins, as pyspedas.avg_data."""
+        return Node(self.pipeline, 'avg_data', [self],
+                    {'res': res, 'width': width},
+                    self.name + '-avg' if newname is None else newname)
+
+    def deriv_data(self, edge_order=1, newname=None):
+        """Time derivative, as pyspedas.deriv_data."""
+        return Node(self.pipeline, 'deriv_data', [self],
+                    {'edge_order': edge_order},
+                    self.name + '-der' if newname is None else newname)
+
+
+class Pipeline:
+    """
+    Record analysis steps, and compute the requested outputs.
+
+    Parameters
+    ----------
+    chunk_size: int, optional
+        Number of samples processed at a time. Default is 2**18.
+
+    Attributes
+    ----------
+    evaluated: list of str
+        Names of the results computed as full arrays by the last compute.
+    fused: list of str
+        Names of the results fused with the step that uses them.
+    """
+
+    def __init__(self, chunk_size=2**18):
+        self.chunk_size = chunk_size
+        self.evaluated = []
+        self.fused = []
+        self._arrays = {}
+        self._stats = {}
+        self._consumers = {}
+
+    def source(self, name):
+        """Return the node of a tplot variable."""
+        return Node(self, 'source', [], {}, name)
+
+    def compute(self, outputs):
+        """
+        Compute the outputs, and store them as tplot variables.
+
+        Parameters
+        ----------
+        outputs: Node/list of Node
+            Results to store.
+
+        Returns
+        -------
+        list of str
+            Names of the tplot variables created.
+        """
+        from pyspedas import get_data, store_data
+        if isinstance(outputs, Node):
+            outputs = [outputs]
+        self.evaluated = []
+        self.fused = []
+        self._arrays = {}
+        self._stats = {}
+        self._consumers = {}
+        seen = set()
+        stack = list(outputs)
+        for node in outputs:
+            self._consumers[node] = self._consumers.get(node, 0) + 1
+        while stack:
+            node = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            for i in node.inputs:
+                self._consumers[i] = self._consumers.get(i, 0) + 1
+                stack.append(i)
+
+        names = []
+        try:
+            for node in outputs:
+                if node.op == 'source':
+                    continue
+                if node.op == 'avg_data':
+                    data = self._average(node)
+                else:
+                    data = self._array(node)
+                if data is None:
+                    continue
+                metadata = {}
+                if node.op != 'deriv_data':
+                    # avg_data and subtract_average keep the metadata.
+                    metadata = get_data(self._root(node).name, metadata=True)
+                store_data(node.name, data={'x': data[0], 'y': data[1]},
+                           attr_dict=metadata)
+                names.append(node.name)
+        finally:
+            self._arrays = {}
+        return names
+
+    def _root(self, node):
+        while node.inputs:
+            node = node.inputs[0]
+        return node
+
+    def _array(self, node):
+        """Times and data of a node, computed once."""
+        from pyspedas import get_data
+        if node in self._arrays:
+            return self._arrays[node]
+        if node.op == 'source':
+            d = get_data(node.name)
+            if d is None:
+                logging.error('Pipeline: ' + node.name + ' does not exist.')
+                return None
+            data = (d[0], d[1])
+        elif node.op == 'subtract_average':
+            data = self._array(node.inputs[0])
+            if data is not None:
+                y = np.array(data[1], dtype=self._dtype(data[1]))
+                y -= self._stat(node)
+                data = (data[0], y)
+        elif node.op == 'deriv_data':
+            data = self._derivative(node)
+        else:
+            return self._average(node)
+        if node.op != 'source':
+            self.evaluated.append(node.name)
+        self._arrays[node] = data
+        return data
+
+    def _dtype(self, y):
+        return y.dtype if y.dtype.kind == 'f' else np.dtype(np.float64)
+
+    def _stat(self, node):
+        """Average or median of each component, as subtract_average."""
+        if node not in self._stats:
+            y = self._array(node.inputs[0])[1]
+            y = np.asarray(y, dtype=self._dtype(y))
+            if node.params['median']:
+                stat = np.atleast_1d(medians(y))
+            else:
+                columns = [y] if y.ndim == 1 else [y[:, i] for i in
+                                                   range(y.shape[1])]
+                stat = np.array([np.nan if np.isnan(c).all()
+                                 else np.nanmean(c, axis=0)
+                                 for c in columns], dtype=y.dtype)
+            # Components that are all NaN are not changed.
+            stat = np.where(np.isnan(stat), 0, stat).astype(y.dtype)
+            self._stats[node] = stat[0] if y.ndim == 1 else stat
+        return self._stats[node]
+
+    def _fused(self, node):
+        return (node.op == 'subtract_average'
+                and node not in self._arrays
+                and self._consumers.get(node, 0) == 1)
+
+    def _base(self, node):
+        """Node whose array is read by the chunks of node."""
+        return node.inputs[0] if self._fused(node) else node
+
+    def _chunks(self, node, halo=0):
+        """
+        Read the result of a node in windows.
+
+        Yields
+        ------
+        tuple
+            start, stop, lo, times and data of the samples lo to hi,
+            where lo, hi extend start, stop by halo samples.
+        """
+        source = self._base(node)
+        stat = None
+        if source is not node:
+            self.fused.append(node.name)
+            stat = self._stat(node)
+        data = self._array(source)
+        if data is None:
+            return
+        t, y = data
+        n = len(t)
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            lo, hi = max(start - halo, 0), min(stop + halo, n)
+            w = y[lo:hi]
+            if stat is not None:
+                w = np.array(w, dtype=self._dtype(y))
+                w -= stat
+            yield start, stop, lo, t[lo:hi], w
+
+    def _derivative(self, node):
+        data = self._array(self._base(node.inputs[0]))
+        if data is None:
+            return None
+        times = data[0]
+        edge_order = node.params['edge_order']
+        # numpy.gradient uses a simpler formula if all the times are evenly
+        # spaced, so this is decided for all the times, not per chunk.
+        steps = np.diff(times)
+        uniform = len(steps) > 0 and (steps == steps[0]).all()
+        result = None
+        for start, stop, lo, t, w in self._chunks(node.inputs[0], halo=2):
+            dx = steps[0] if uniform else np.diff(t)
+            grad = gradient(w, dx, edge_order=edge_order)
+            if result is None:
+                result = np.empty((len(times),) + grad.shape[1:],
+                                  dtype=grad.dtype)
+            result[start:stop] = grad[start - lo:stop - lo]
+        return None if result is None else (times, result)
+
+    def _average(self, node):
+        if node in self._arrays:
+            return self._arrays[node]
+        data = self._array(self._base(node.inputs[0]))
+        if data is None:
+            return None
+        time = data[0]
+        n = len(time)
+        if n < 2 or time[-1] <= time[0]:
+            logging.error('Pipeline: No time values for ' + node.name + '.')
+            return None
+        try:
+            avg = StreamingAverage(time[0], time[-1], res=node.params['res'],
+                                   width=node.params['width'], count=n)
+        except ValueError as err:
+            logging.error('Pipeline: ' + node.name + ': ' + str(err))
+            return None
+        times, values = [], []
+        for start, stop, lo, t, w in self._chunks(node.inputs[0]):
+            bt, averages = avg.update(t, w, final=(stop == n))
+            times.append(bt)
+            values.append(averages[0])
+        data = (np.concatenate(times), np.concatenate(values))
+        self._arrays[node] = data
+        self.evaluated.append(node.name)
+        return data
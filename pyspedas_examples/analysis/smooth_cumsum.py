@@ -0,0 +1,132 @@
+"""
+Boxcar smoothing with cumulative sums, as pyspedas.tsmooth.
+
+pyspedas.smooth adds the width samples of each window in a Python loop,
+one component at a time, so a window of thousands of samples over 10**7
+samples is out of reach. Here the sum of each window is the difference
+of two cumulative sums, and the number of samples that are not NaN is
+the difference of two cumulative counts, so the cost does not depend on
+the width. All the components are done together.
+
+The cumulative sums are restarted for each block of chunk_size samples,
+and are accumulated in float64, so the rounding does not grow with the
+length of the series.
+
+Notes
+-----
+pyspedas.smooth checks the samples with ``data[i] is np.nan``, which is
+never true for the values of NumPy arrays, so a NaN makes its whole
+window NaN. Here, as documented for tsmooth, NaN are skipped: the average
+is over the samples that are not NaN, and NaN samples are replaced by it
+unless preserve_nans is set. Without NaN, the results are the same as
+pyspedas.tsmooth, up to rounding.
+"""
+import logging
+
+import numpy as np
+
+from pyspedas_examples.utilities.names import new_names
+
+
+def smooth_cumsum(data, width=10, preserve_nans=None, chunk_size=2**16):
+    """
+    Boxcar average of each component, as pyspedas.smooth.
+
+    Parameters
+    ----------
+    data: array
+        Data, with shape (n,) or (n, components).
+    width: int, optional
+        Number of samples of the window. The default is 10.
+    preserve_nans: bool, optional
+        If None, then replace NaNs. The default is None.
+    chunk_size: int, optional
+        Number of samples of each block. The default is 2**16.
+
+    Returns
+    -------
+    array
+        Smoothed data, float64 unless data is float. The first and the
+        last width / 2 samples are not changed.
+    """
+    data = np.asarray(data)
+    n = len(data)
+    width = int(width)
+    dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+    result = data.astype(dtype)
+    if n <= width:
+        logging.error('smooth_cumsum: Not enough points.')
+        return result
+
+    # Samples lo - width // 2 to lo - width // 2 + width - 1 are averaged
+    # for each sample from (width - 1) / 2 to n - (width + 1) / 2.
+    half = width // 2
+    first = int(np.ceil((width - 1) / 2))
+    last = int(np.floor(n - (width + 1) / 2))
+    chunk_size = max(int(chunk_size), 1)
+    for start in range(first, last + 1, chunk_size):
+        stop = min(start + chunk_size, last + 1)
+        x = data[start - half:stop - half + width - 1].astype(np.float64)
+        nan = np.isnan(x)
+        counts = width
+        if nan.any():
+            x[nan] = 0.0
+            counts = np.zeros((len(x) + 1,) + x.shape[1:], dtype=np.int64)
+            np.cumsum(~nan, axis=0, out=counts[1:])
+            counts = counts[width:] - counts[:-width]
+        sums = np.zeros((len(x) + 1,) + x.shape[1:])
+        np.cumsum(x, axis=0, out=sums[1:])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = (sums[width:] - sums[:-width]) / counts
+        if preserve_nans is not None:
+            mean[np.isnan(data[start:stop])] = np.nan
+        result[start:stop] = mean
+    return result
+
+
+def tsmooth_cumsum(names, width=10, preserve_nans=None, newname=None,
+                   suffix=None, overwrite=None, chunk_size=2**16):
+    """
+    Smooth tplot variables, as pyspedas.tsmooth.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names.
+    width: int, optional
+        Number of samples of the window. The default is 10.
+    preserve_nans: bool, optional
+        If None, then replace NaNs. The default is None.
+    newname: str/list of str, optional
+        List of new names for pytplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '-s'.
+    overwrite: bool, optional
+        Replace the existing tplot name.
+    chunk_size: int, optional
+        Number of samples of each block. The default is 2**16.
+
+    Returns
+    -------
+    list of str
+        Names of the tplot variables created or changed.
+    """
+    from pyspedas import data_quants, tnames, tplot_copy
+    old_names = tnames(names)
+    if len(old_names) < 1:
+        logging.error('tsmooth_cumsum: No pytplot names were provided.')
+        return
+    if suffix is None:
+        suffix = '-s'
+    n_names = new_names(old_names, newname, suffix, overwrite)
+
+    for old, new in zip(old_names, n_names):
+        if new != old:
+            tplot_copy(old, new)
+        values = data_quants[new].values
+        data_quants[new].values = smooth_cumsum(
+            values, width=width, preserve_nans=preserve_nans,
+            chunk_size=chunk_size)
+        logging.info('tsmooth_cumsum was applied to: ' + new)
+    return n_names
@@ -0,0 +1,449 @@
+"""
+Spectrograms binned to the pixels of the plot.
+
+tplot gives all the times and energies of a spectrogram to pcolormesh,
+so millions of cells are rasterized for a panel about 1000 pixels wide.
+Here the spectrogram is binned beforehand to the pixel grid of the panel:
+one column per pixel in time, and one row per pixel in energy, log spaced
+if the y axis is log. Each cell is the maximum (or the mean) of the
+samples in it, NaN are skipped. A pixel row without an energy channel
+takes the channel which covers it, so the image looks the same.
+
+The binned spectrograms are kept in an LRU cache, keyed by the variable,
+a fingerprint of its times, values and bins, the time range and the
+pixel size, so that drawing the same plot again, or going back to a
+previous zoom, does not bin the data again. Data changed in place (e.g.
+by clean_spikes_batch with overwrite) are binned again.
+
+Notes
+-----
+Spectrograms with fewer samples than pixel columns in the time range are
+not binned in time, and those with fewer channels than pixel rows (and
+the same channels at all times) are not binned in energy. With channels
+which change with time, all the samples are binned to the same pixel
+rows, as tplot needs one set of rows.
+"""
+import copy
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+from pyspedas_examples.utilities.lru import LRUCache, time_fingerprint
+
+
+class Rendered(namedtuple('Rendered', ['times', 'v', 'image'])):
+    """Binned spectrogram: column times, row values and image."""
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.v.nbytes + self.image.nbytes
+
+
+class RenderCache(LRUCache):
+    """
+    LRU cache of binned spectrograms.
+
+    Parameters
+    ----------
+    max_entries: int, optional
+        Maximum number of spectrograms kept. Default is 64.
+    max_bytes: int, optional
+        Maximum memory of the spectrograms kept, in bytes.
+        Default is 256 MB.
+
+    Attributes
+    ----------
+    hits, misses, evictions: int
+        Cache statistics.
+    """
+
+    def __init__(self, max_entries=64, max_bytes=256 * 2**20):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes)
+
+    def put(self, key, rendered):
+        """Add a binned spectrogram, and evict the oldest ones."""
+        for a in rendered:
+            a.setflags(write=False)
+        super().put(key, rendered)
+
+
+# Cache used when none is given.
+render_cache = RenderCache()
+
+
+def panel_pixels(panels=1, xsize=None, ysize=None, dpi=None):
+    """
+    Size in pixels of a panel of tplot.
+
+    Parameters
+    ----------
+    panels: int, optional
+        Number of panels of the plot. Default is 1.
+    xsize, ysize: float, optional
+        Size of the figure in inches. Default is as tplot: the xsize and
+        ysize of tplot_options, or 12 inches wide, and 5 to 8 inches
+        high with the number of panels.
+    dpi: float, optional
+        Dots per inch. Default is matplotlib's figure.dpi.
+
+    Returns
+    -------
+    width, height: int
+        Size of a panel (including its axes) in pixels.
+    """
+    import matplotlib
+    from pyspedas import tplot_opt_glob
+    panels = max(int(panels), 1)
+    if xsize is None:
+        xsize = tplot_opt_glob.get('xsize')
+        if xsize is None:
+            xsize = 12
+    if ysize is None:
+        ysize = tplot_opt_glob.get('ysize')
+        if ysize is None:
+            ysize = 8 if panels > 4 else [5, 5, 6, 7, 8][panels]
+    if dpi is None:
+        dpi = matplotlib.rcParams['figure.dpi']
+    return (max(int(round(xsize * dpi)), 1),
+            max(int(round(ysize * dpi / panels)), 1))
+
+
+def _scale(v, ylog):
+    """Values on the y axis: log10 if ylog, NaN for v <= 0."""
+    v = np.asarray(v, dtype=np.float64)
+    if not ylog:
+        return v
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(v > 0, np.log10(np.where(v > 0, v, 1.0)), np.nan)
+
+
+def _bounds(f):
+    """Boundaries of the channels at f (sorted, finite)."""
+    if len(f) == 1:
+        return np.array([f[0] - 0.5, f[0] + 0.5])
+    mid = (f[1:] + f[:-1]) / 2
+    return np.concatenate(([2 * f[0] - mid[0]], mid, [2 * f[-1] - mid[-1]]))
+
+
+def _rows(v, ylog, lo, hi, height):
+    """
+    Channels of each pixel row between lo and hi (on the y axis).
+
+    Returns the channels in the order of the rows, the start of each row
+    in them (for ufunc.reduceat), and the rows which have channels. The
+    rows are those of the channels in them, or else the channel which
+    covers the center of the row.
+    """
+    f = _scale(v, ylog)
+    channels = np.flatnonzero(np.isfinite(f))
+    channels = channels[np.argsort(f[channels], kind='stable')]
+    f = f[channels]
+    if len(f) == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty
+    inside = np.floor((f - lo) / (hi - lo) * height).astype(np.intp)
+    inside[f == hi] = height - 1
+    keep = (inside >= 0) & (inside < height)
+    has = np.zeros(height, dtype=bool)
+    has[inside[keep]] = True
+
+    center = lo + (np.arange(height) + 0.5) * (hi - lo) / height
+    cover = np.searchsorted(_bounds(f), center, side='right') - 1
+    empty = ~has & (cover >= 0) & (cover < len(f))
+    row = np.concatenate((inside[keep], np.flatnonzero(empty)))
+    channel = np.concatenate((channels[keep], channels[cover[empty]]))
+    order = np.argsort(row, kind='stable')
+    row, channel = row[order], channel[order]
+    starts = np.flatnonzero(np.diff(row, prepend=-1))
+    return channel, starts, row[starts]
+
+
+def _reduce(x, starts, axis, method):
+    """
+    Max, or sums and counts, of the groups of samples or channels.
+
+    x is a tuple of arrays: the data, or the sums and counts. The groups
+    are from each start to the next one.
+    """
+    ufunc = np.fmax if method == 'max' else np.add
+    if axis == 1:
+        return tuple(ufunc.reduceat(a, starts, axis=1) for a in x)
+    # A loop over the groups of samples is much faster than reduceat
+    # along the first axis, and there are at most width groups.
+    stops = np.append(starts[1:], len(x[0]))
+    out = tuple(np.empty((len(starts),) + a.shape[1:], dtype=a.dtype)
+                for a in x)
+    for i, (start, stop) in enumerate(zip(starts, stops)):
+        for a, o in zip(x, out):
+            ufunc.reduce(a[start:stop], axis=0, out=o[i])
+    return out
+
+
+def bin_spectrogram(time, data, v, trange=None, width=1000, height=300,
+                    ylog=False, yrange=None, method='max', chunk_size=2**16):
+    """
+    Bin a spectrogram to a grid of pixels.
+
+    Parameters
+    ----------
+    time: array of float
+        Times of the samples, increasing.
+    data: array
+        Spectrogram, with shape (n, channels).
+    v: array
+        Values of the channels (e.g. energies), with shape (channels,)
+        or (n, channels).
+    trange: list of float, optional
+        Time range of the plot. Default is the times of the samples.
+    width, height: int, optional
+        Number of pixel columns and rows. Default is 1000 by 300.
+    ylog: bool, optional
+        If True, the pixel rows are log spaced. Default is False.
+    yrange: list of float, optional
+        Range of the y axis. Default is the range of the channels.
+    method: str, optional
+        'max' or 'mean' of the samples of each pixel. Default is 'max'.
+    chunk_size: int, optional
+        Approximate number of samples binned at once. Default is 2**16.
+
+    Returns
+    -------
+    Rendered
+        times: times of the columns (the middle of the pixel columns, or
+        the times of the samples if they are not binned in time).
+        v: values of the rows.
+        image: binned spectrogram, with shape (columns, rows).
+        The columns and rows without samples are left out.
+    """
+    if method not in ('max', 'mean'):
+        logging.error("bin_spectrogram: method must be 'max' or 'mean'.")
+        return None
+    time = np.asarray(time, dtype=np.float64)
+    data = np.asarray(data)
+    v = np.asarray(v)
+    width, height = max(int(width), 1), max(int(height), 1)
+    dtype = data.dtype if data.dtype.kind == 'f' else np.float64
+
+    # Samples of the time range, and the first sample of each column.
+    if trange is None:
+        t0, t1 = time[0], time[-1]
+    else:
+        t0, t1 = float(trange[0]), float(trange[1])
+    lo = np.searchsorted(time, t0, side='left')
+    hi = np.searchsorted(time, t1, side='right')
+    m = hi - lo
+    if m == 0:
+        logging.error('bin_spectrogram: No data in the time range.')
+        return None
+    if m <= width or t1 <= t0:
+        starts = np.arange(m)
+        times = time[lo:hi]
+    else:
+        edges = t0 + (t1 - t0) * np.arange(width + 1) / width
+        first = np.searchsorted(time[lo:hi], edges[:-1], side='left')
+        first[0] = 0
+        used = np.append(first[1:], m) > first
+        starts = first[used]
+        times = ((edges[:-1] + edges[1:]) / 2)[used]
+
+    # Pixel rows.
+    varying = False
+    if v.ndim == 2:
+        other = v[lo:hi] != v[lo]
+        if v.dtype.kind == 'f':
+            other &= ~(np.isnan(v[lo:hi]) & np.isnan(v[lo]))
+        varying = other.any()
+        if not varying:
+            v = v[lo]
+    if yrange is not None:
+        ylo, yhi = _scale(yrange, ylog)
+    else:
+        # The range of the channels of all the tables.
+        ylo, yhi = np.inf, -np.inf
+        for table in (np.unique(v[lo:hi], axis=0) if varying else [v]):
+            f = np.sort(_scale(table, ylog))
+            f = f[np.isfinite(f)]
+            if len(f) > 0:
+                b = _bounds(f)
+                ylo, yhi = min(ylo, b[0]), max(yhi, b[-1])
+    if not np.isfinite(ylo) or not np.isfinite(yhi) or yhi <= ylo:
+        logging.error('bin_spectrogram: No channel in the y range.')
+        return None
+    rows_v = ylo + (np.arange(height) + 0.5) * (yhi - ylo) / height
+    if ylog:
+        rows_v = 10**rows_v
+    if varying:
+        channel = None
+    elif np.isfinite(_scale(v, ylog)).sum() <= height:
+        # Not binned in energy.
+        channel = None
+        rows_v = v
+    else:
+        channel, estarts, rows = _rows(v, ylog, ylo, yhi, height)
+        rows_v = rows_v[rows]
+
+    image = np.empty((len(starts), len(rows_v)), dtype=dtype)
+    covered = np.full(len(rows_v), not varying)
+    ufunc = np.fmax if method == 'max' else np.add
+    chunk_size = max(int(chunk_size), 1)
+    c0 = 0
+    while c0 < len(starts):
+        c1 = max(np.searchsorted(starts, starts[c0] + chunk_size), c0 + 1)
+        s0 = starts[c0]
+        s1 = starts[c1] if c1 < len(starts) else m
+        x = data[lo + s0:lo + s1].astype(dtype, copy=False)
+        if method == 'mean':
+            # Sums in float64, for columns of many samples.
+            nan = np.isnan(x)
+            x = (np.where(nan, 0.0, x).astype(np.float64, copy=False),
+                 (~nan).astype(np.int64))
+        else:
+            x = (x,)
+        local = starts[c0:c1] - s0
+
+        # The samples are reduced in time first, then in energy, on
+        # fewer samples.
+        if not varying:
+            binned = _reduce(x, local, 0, method)
+            if channel is not None:
+                binned = _reduce(tuple(a[:, channel] for a in binned),
+                                 estarts, 1, method)
+        else:
+            # Each table of channels in the chunk is binned to the rows.
+            tables, inverse = np.unique(v[lo + s0:lo + s1], axis=0,
+                                        return_inverse=True)
+            inverse = inverse.ravel()
+            fill = np.nan if method == 'max' else 0
+            binned = tuple(np.full((c1 - c0, height), fill, dtype=a.dtype)
+                           for a in x)
+            for j, table in enumerate(tables):
+                channel, estarts, rows = _rows(table, ylog, ylo, yhi,
+                                               height)
+                if len(channel) == 0:
+                    continue
+                covered[rows] = True
+                select = np.flatnonzero(inverse == j)
+                first = np.searchsorted(select, local)
+                used = np.append(first[1:], len(select)) > first
+                part = _reduce(tuple(a[select] for a in x), first[used], 0,
+                               method)
+                part = _reduce(tuple(a[:, channel] for a in part), estarts,
+                               1, method)
+                for b, p in zip(binned, part):
+                    ufunc(b[np.ix_(used, rows)], p, out=p)
+                    b[np.ix_(used, rows)] = p
+
+        if method == 'mean':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                image[c0:c1] = binned[0] / binned[1]
+        else:
+            image[c0:c1] = binned[0]
+        c0 = c1
+
+    if not covered.all():
+        image, rows_v = image[:, covered], rows_v[covered]
+    return Rendered(times, np.asarray(rows_v), image)
+
+
+def spec_render(names, trange=None, width=None, height=None, panels=1,
+                method='max', newname=None, suffix='_render', cache=None,
+                chunk_size=2**16):
+    """
+    Bin spectrogram tplot variables to the pixels of their panels.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names. The variables without v values (e.g.
+        vectors) are not changed.
+    trange: list of str/float, optional
+        Time range of the plot. Default is the time range set by xlim or
+        tlimit, or all the samples.
+    width, height: int, optional
+        Size of a panel in pixels. Default is panel_pixels(panels).
+    panels: int, optional
+        Number of panels of the plot. Default is 1.
+    method: str, optional
+        'max' or 'mean' of the samples of each pixel. Default is 'max'.
+    newname: str/list of str, optional
+        List of new names for pytplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '_render'.
+    cache: RenderCache, optional
+        Cache of binned spectrograms. Default is render_cache.
+    chunk_size: int, optional
+        Approximate number of samples binned at once. Default is 2**16.
+
+    Returns
+    -------
+    list of str
+        Names to plot: the binned spectrograms, and the other variables.
+    """
+    from pyspedas import (data_quants, get_data, options, store_data,
+                          time_double, tnames, tplot_opt_glob)
+    old_names = tnames(names)
+    if len(old_names) < 1:
+        logging.error('spec_render: No pytplot names were provided.')
+        return
+    if isinstance(newname, str):
+        newname = [newname]
+    if newname is None or len(newname) != len(old_names):
+        newname = [s + suffix for s in old_names]
+    if cache is None:
+        cache = render_cache
+    if width is None or height is None:
+        size = panel_pixels(panels)
+        width = size[0] if width is None else width
+        height = size[1] if height is None else height
+    if trange is None:
+        trange = tplot_opt_glob.get('x_range')
+
+    n_names = []
+    for old, new in zip(old_names, newname):
+        quant = data_quants[old]
+        if quant.ndim != 2 or 'v' not in quant.coords:
+            n_names.append(old)
+            continue
+        time, data, v = get_data(old)[:3]
+        plot_options = quant.attrs['plot_options']
+        ylog = 'log' in plot_options['yaxis_opt'].get('y_axis_type',
+                                                      'linear')
+        yrange = plot_options['yaxis_opt'].get('y_range')
+        if (yrange is None or len(yrange) != 2 or yrange[0] is None
+                or yrange[1] is None or not np.isfinite(yrange).all()
+                or (ylog and min(yrange) <= 0)):
+            yrange = None
+        else:
+            yrange = (float(min(yrange)), float(max(yrange)))
+        tr = ((time[0], time[-1]) if trange is None
+              else tuple(float(t) for t in time_double(trange)))
+
+        key = (old, str(plot_options.get('create_time')),
+               time_fingerprint(time), time_fingerprint(data.ravel()),
+               time_fingerprint(np.ravel(v)), tr, int(width), int(height),
+               ylog, yrange, method)
+        rendered = cache.get(key)
+        if rendered is None:
+            rendered = bin_spectrogram(time, data, v, trange=tr,
+                                       width=width, height=height,
+                                       ylog=ylog, yrange=yrange,
+                                       method=method, chunk_size=chunk_size)
+            if rendered is None:
+                n_names.append(old)
+                continue
+            cache.put(key, rendered)
+
+        # tplot changes the arrays of the variables, so they are copied.
+        store_data(new, data={'x': rendered.times.copy(),
+                              'y': rendered.image.copy(),
+                              'v': rendered.v.copy()})
+        rendered_options = copy.deepcopy(plot_options)
+        rendered_options['create_time'] = data_quants[new].attrs[
+            'plot_options'].get('create_time')
+        data_quants[new].attrs['plot_options'] = rendered_options
+        options(new, 'spec', True)
+        n_names.append(new)
+        logging.info('spec_render was applied to: ' + new)
+    return n_names
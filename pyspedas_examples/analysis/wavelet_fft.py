@@ -0,0 +1,268 @@
+"""
+Wavelet power of long time series, with batched FFTs in threads.
+
+pyspedas.wavelet calls pywt.cwt, which computes the FFT of the whole
+series again for most scales, and returns all the complex coefficients
+(scales x samples) before the power is computed. For a day of 128 Hz
+data, this is more than 20 GB. wavelet_power computes the same power:
+
+- The scales are grouped by octave. The series is cut in chunks, which
+  overlap by the length of the longest wavelet of the group (its cone of
+  influence), so the coefficients are the same as for the whole series.
+  Small scales use short FFTs, and the FFT of a chunk is shared by the
+  scales of the group.
+- The chunks are processed in a pool of threads (scipy.fft releases the
+  GIL), and the power of each chunk is written in the output at once.
+- The power can be computed in single precision (float32), and averaged
+  over blocks of samples (decimate).
+
+The results are the same as pyspedas.wavelet, up to rounding.
+
+Notes
+-----
+The derivative of pywt.cwt (coefficients are -sqrt(scale) times the
+difference of the convolution) is included in the wavelet of each scale.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def _indices(x, size, scale):
+    """Samples of the integrated wavelet for a scale, as pywt.cwt."""
+    j = np.arange(scale * (x[-1] - x[0]) + 1) / (scale * (x[1] - x[0]))
+    j = j.astype(int)
+    return j[j < size]
+
+
+def _kernel(int_psi, x, scale):
+    """Wavelet of a scale, as pywt.cwt, with the difference."""
+    psi = int_psi[_indices(x, int_psi.size, scale)][::-1]
+    kernel = np.zeros(psi.size + 1, dtype=psi.dtype)
+    kernel[:-1] = psi
+    kernel[1:] -= psi
+    kernel *= -np.sqrt(scale)
+    return kernel
+
+
+def _groups(lengths, chunk_size, max_bytes, itemsize):
+    """Indices of the scales computed together, by octave."""
+    import scipy.fft
+    order = np.argsort(lengths)
+    groups = []
+    group = []
+    for i in order:
+        if group:
+            lengths_g = [lengths[k] for k in group + [i]]
+            size = scipy.fft.next_fast_len(max(chunk_size, 2 * lengths_g[-1])
+                                           + 2 * lengths_g[-1])
+            if (lengths_g[-1] > 2 * lengths_g[0]
+                    or len(lengths_g) * size * itemsize > max_bytes):
+                groups.append(group)
+                group = []
+        group.append(i)
+    if group:
+        groups.append(group)
+    return groups
+
+
+def wavelet_power(data, scales, wavename='morl', dtype=np.float64,
+                  decimate=1, chunk_size=2**13, workers=None, precision=12,
+                  max_bytes=2**27):
+    """
+    Wavelet power (squared absolute value of pywt.cwt) of a series.
+
+    Parameters
+    ----------
+    data: array
+        Data, with shape (n,).
+    scales: array
+        The wavelet scales to use.
+    wavename: str, optional
+        The name of the continuous wavelet function to apply.
+        Default is 'morl'.
+    dtype: numpy dtype, optional
+        Type of the power, float32 or float64. With float32 the FFTs are
+        computed in single precision. Default is float64.
+    decimate: int, optional
+        Number of samples averaged for each time of the power.
+        Default is 1.
+    chunk_size: int, optional
+        Smallest number of samples of the chunks. Default is 2**13.
+    workers: int, optional
+        Number of threads. Default is the number of CPUs.
+    precision: int, optional
+        Length of the wavelet (2**precision), as pywt.cwt. Default is 12.
+    max_bytes: int, optional
+        Approximate memory for the FFTs of a chunk. Default is 128 MB.
+
+    Returns
+    -------
+    power: array
+        Power, with shape (ceil(n / decimate), number of scales).
+    frequencies: array
+        Frequencies of the scales, as pywt.cwt with a sampling period of 1.
+    """
+    import pywt
+    import scipy.fft
+    dtype = np.dtype(dtype)
+    cdtype = np.result_type(dtype, np.complex64)
+    data = np.asarray(data, dtype=dtype)
+    n = len(data)
+    decimate = max(int(decimate), 1)
+    scales = np.atleast_1d(np.asarray(scales, dtype=np.float64))
+    wavelet = pywt.DiscreteContinuousWavelet(wavename)
+    complex_cwt = wavelet.complex_cwt
+    int_psi, x = pywt.integrate_wavelet(wavelet, precision=precision)
+    if complex_cwt:
+        int_psi = np.conj(int_psi)
+    # Lengths of the wavelets; they are made for each group of scales.
+    lengths = [len(_indices(x, int_psi.size, s)) + 1 for s in scales]
+    for scale, length in zip(scales, lengths):
+        if length < 3:
+            raise ValueError('Selected scale of {} too small.'.format(scale))
+
+    n_out = -(-n // decimate)
+    power = np.empty((n_out, len(scales)), dtype=dtype)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    groups = _groups(lengths, chunk_size, max_bytes,
+                     np.dtype(cdtype).itemsize)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for group in groups:
+            # The coefficient k of a scale is the convolution at k + f + 1
+            # (f is the offset of pywt.cwt), which uses the samples from
+            # k + f + 1 - (length - 1) to k + f + 1.
+            offsets = [(lengths[i] - 3) // 2 + 1 for i in group]
+            before = max(lengths[i] - 1 - f for i, f in zip(group, offsets))
+            after = max(offsets)
+            size = max(chunk_size, 2 * max(lengths[i] for i in group))
+            size = -(-size // decimate) * decimate
+            if size >= n:
+                size = n
+            nfft = scipy.fft.next_fast_len(size + before + after,
+                                           real=not complex_cwt)
+            stacked = np.zeros((len(group), nfft),
+                               dtype=cdtype if complex_cwt else dtype)
+            for row, i in enumerate(group):
+                stacked[row, :lengths[i]] = _kernel(int_psi, x, scales[i])
+            if complex_cwt:
+                fft_kernels = scipy.fft.fft(stacked, axis=-1)
+            else:
+                fft_kernels = scipy.fft.rfft(stacked, axis=-1)
+            del stacked
+            shifts = [before + f for f in offsets]
+
+            def chunk(start):
+                stop = min(start + size, n)
+                window = np.zeros(nfft, dtype=dtype)
+                lo = max(start - before, 0)
+                hi = min(stop + after, n)
+                window[lo - (start - before):hi - (start - before)] = \
+                    data[lo:hi]
+                if complex_cwt:
+                    conv = scipy.fft.ifft(fft_kernels
+                                          * scipy.fft.fft(window), axis=-1)
+                else:
+                    conv = scipy.fft.irfft(fft_kernels
+                                           * scipy.fft.rfft(window), nfft,
+                                           axis=-1)
+                p = np.empty((len(group), stop - start), dtype=dtype)
+                for row, shift in enumerate(shifts):
+                    coef = conv[row, shift:shift + stop - start]
+                    if complex_cwt:
+                        np.multiply(coef.real, coef.real, out=p[row])
+                        p[row] += coef.imag * coef.imag
+                    else:
+                        np.multiply(coef, coef, out=p[row])
+                if decimate > 1:
+                    blocks = np.arange(0, stop - start, decimate)
+                    p = np.add.reduceat(p, blocks, axis=-1)
+                    p /= np.diff(np.append(blocks, stop - start))
+                power[start // decimate:start // decimate + p.shape[1],
+                      group] = p.T
+
+            list(pool.map(chunk, range(0, n, size)))
+
+    frequencies = np.atleast_1d(pywt.scale2frequency(wavelet, scales,
+                                                     precision))
+    return power, frequencies
+
+
+def wavelet_fft(names, newname=None, suffix='_pow', wavename='morl',
+                scales=None, sampling_period=1.0, dtype=np.float64,
+                decimate=1, chunk_size=2**13, workers=None):
+    """
+    Find the wavelet power of tplot variables, as pyspedas.wavelet.
+
+    Parameters
+    ----------
+    names: str/list of str
+        List of pytplot names.
+    newname: str/list of str, optional
+        List of new names for tplot variables.
+        If not given, then a suffix is applied.
+    suffix: str, optional
+        A suffix to apply. Default is '_pow'.
+    wavename: str, optional
+        The name of the continuous wavelet function to apply.
+        Examples: 'gaus1', 'morl', 'cmorlB-C'. Default is 'morl'.
+    scales: list of float, optional
+        The wavelet scales to use. Default is the scales of
+        pyspedas.wavelet (idl_wavelet_scales).
+    sampling_period: float, optional
+        The sampling period for the frequencies output, with scales.
+        Default is 1.0.
+    dtype: numpy dtype, optional
+        Type of the power, float32 or float64. Default is float64.
+    decimate: int, optional
+        Number of samples averaged for each time of the power. The times
+        are the averages of their times. Default is 1.
+    chunk_size: int, optional
+        Smallest number of samples of the chunks. Default is 2**13.
+    workers: int, optional
+        Number of threads. Default is the number of CPUs.
+
+    Returns
+    -------
+    list of str
+        Names of the tplot variables that contain the wavelet power.
+    """
+    from pyspedas import get_data, options, split_vec, store_data
+    from pyspedas.analysis.wavelet import idl_wavelet_scales
+    varnames = split_vec(names)
+    if len(varnames) < 1:
+        logging.error('wavelet_fft: No pytplot names were provided.')
+        return
+    if isinstance(newname, str):
+        newname = [newname]
+
+    powervar = []
+    for i, old in enumerate(varnames):
+        if newname is not None and len(newname) == len(varnames):
+            new = newname[i]
+        else:
+            new = old + suffix
+        time, data = get_data(old)[:2]
+        if len(time) < 2:
+            logging.error('wavelet_fft: Not enough data points for ' + old)
+            continue
+        var_scales, period = scales, sampling_period
+        if var_scales is None:
+            var_scales = idl_wavelet_scales(len(time), time[1] - time[0])[0]
+            period = 1.0
+        power, freqs = wavelet_power(data, var_scales, wavename=wavename,
+                                     dtype=dtype, decimate=decimate,
+                                     chunk_size=chunk_size, workers=workers)
+        if decimate > 1:
+            blocks = np.arange(0, len(time), decimate)
+            time = (np.add.reduceat(time - time[0], blocks)
+                    / np.diff(np.append(blocks, len(time))) + time[0])
+        store_data(new, data={'x': time, 'y': power, 'v': freqs / period})
+        options(new, 'spec', 1)
+        powervar.append(new)
+        logging.info('wavelet_fft was applied to: ' + new)
+    return powervar
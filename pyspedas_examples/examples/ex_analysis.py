@@ -6,11 +6,17 @@ Download THEMIS data, subtract average, and plot it.
 """
 
 from pyspedas import del_data, subtract_average, subtract_median, tplot
-from pyspedas.projects.themis import state
+from pyspedas_examples.utilities.load import state
+from pyspedas_examples.analysis import median
 
 
-def ex_analysis(plot=True):
-    """Create a plot with THEMIS data."""
+def ex_analysis(plot=True, batch=False):
+    """Create a plot with THEMIS data.
+
+    If batch is True, use median.subtract_median, which finds the medians
+    of all the components with one selection each, and gives the same
+    results as subtract_median.
+    """
     # Delete any existing tplot variables
     del_data()
 
@@ -20,7 +26,10 @@ def ex_analysis(plot=True):
 
     # Use some analysis functions on tplot variables
     subtract_average('tha_pos')
-    subtract_median('tha_pos')
+    if batch:
+        median.subtract_median('tha_pos')
+    else:
+        subtract_median('tha_pos')
 
     # Plot
     if plot:
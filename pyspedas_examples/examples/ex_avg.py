@@ -7,11 +7,21 @@ Download GMAG data and average over 5 min.
 import random
 from pyspedas import del_data, get_data, store_data, tplot_options, tplot, subtract_average
 from pyspedas import avg_data
-from pyspedas.projects.themis import gmag
+from pyspedas_examples.utilities.load import gmag
+from pyspedas_examples.analysis.avg_data_stream import avg_data_stream
+from pyspedas_examples.analysis.pipeline import Pipeline
 
 
-def ex_avg(plot=True):
-    """Load GMAG data and average over 5 min intervals."""
+def ex_avg(plot=True, stream=False, lazy=False):
+    """Load GMAG data and average over 5 min intervals.
+
+    If stream is True, use avg_data_stream, which processes the data in
+    chunks and gives the same results as avg_data.
+
+    If lazy is True, the steps are recorded in a Pipeline, which
+    computes the median subtracted data once, and only stores them if
+    they are plotted. The results are the same.
+    """
     # Delete any existing tplot variables.
     del_data()
 
@@ -23,14 +33,28 @@ def ex_avg(plot=True):
     var = 'thg_mag_ccnv'
     gmag(sites=sites, trange=trange, varnames=[var])
     tplot_options('title', 'GMAG data, thg_mag_ccnv, 2007-03-23')
-    subtract_average(var, median=1)
-    var += '-m'
-
-    # Five minute average using time dt.
-    avg_data(var, res=5*60.)
-    # Five minute average using width (number of measurements).
-    # Each measurement is 0.5 sec.
-    avg_data(var, width=5*60.*2., new_names=var + '-avg2')
+    if lazy:
+        # The same steps, computed together. The median subtracted data
+        # are only stored to plot them.
+        p = Pipeline()
+        m = p.source(var).subtract_average(median=True)
+        outputs = [m.avg_data(res=5*60.),
+                   m.avg_data(width=5*60.*2., newname=m.name + '-avg2')]
+        p.compute(outputs + ([m] if plot else []))
+        var = m.name
+    else:
+        subtract_average(var, median=1)
+        var += '-m'
+
+        # Five minute average using time dt.
+        # Five minute average using width (number of measurements).
+        # Each measurement is 0.5 sec.
+        if stream:
+            avg_data_stream(var, res=5*60.)
+            avg_data_stream(var, width=5*60.*2., newname=var + '-avg2')
+        else:
+            avg_data(var, res=5*60.)
+            avg_data(var, width=5*60.*2., new_names=var + '-avg2')
 
     # Plot.
     if plot:
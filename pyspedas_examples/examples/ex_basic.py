@@ -5,11 +5,16 @@ Download THEMIS data and plot it.
 """
 
 from pyspedas import del_data, get_data, store_data, tplot, tplot_options, options, ylim
-from pyspedas.projects.themis import state
+from pyspedas_examples.utilities.load import state
+from pyspedas_examples.utilities.derived import store_view, tplot_views
 
 
-def ex_basic(plot=True):
-    """Download and plot THEMIS data."""
+def ex_basic(plot=True, lazy=False):
+    """Download and plot THEMIS data.
+
+    If lazy is True, tha_position is a view of tha_pos, which is only
+    computed and stored when it is plotted.
+    """
     # Delete any existing tplot variables
     del_data()
 
@@ -17,17 +22,22 @@ def ex_basic(plot=True):
     time_range = ['2015-12-31 00:00:00', '2016-01-01 12:00:00']
     state(probe='a', trange=time_range, time_clip=True)
 
-    # Get data into python variables
-    alldata = get_data("tha_pos")
-    time = alldata[0]
-    data = alldata[1]
+    if lazy:
+        # Record the conversion to km, without computing it
+        store_view("tha_position", "tha_pos", scale=1e-3,
+                   options={'ytitle': 'Position', 'ysubtitle': '[km]'})
+    else:
+        # Get data into python variables
+        alldata = get_data("tha_pos")
+        time = alldata[0]
+        data = alldata[1]
 
-    # Here we could work on the data before saving a new tplot variable.
-    # For example, we could convert the data to km:
-    data = data / 1000.0
+        # Here we could work on the data before saving a new tplot
+        # variable. For example, we could convert the data to km:
+        data = data / 1000.0
 
-    # Store a new tplot variable
-    store_data("tha_position", data={'x': time, 'y': data})
+        # Store a new tplot variable
+        store_data("tha_position", data={'x': time, 'y': data})
 
     # Define the y-axis limits
     options('tha_pos', 'yrange', [-100000.0, 100000.0])
@@ -37,12 +47,16 @@ def ex_basic(plot=True):
     tplot_options('title', 'tha position and velocity, 2015-12-31')
     options('tha_pos', 'ytitle', 'Position')
     options('tha_vel', 'ytitle', 'Velocity')
-    options('tha_position', 'ytitle', 'Position')
-    options('tha_position', 'ysubtitle', '[km]')
+    if not lazy:
+        options('tha_position', 'ytitle', 'Position')
+        options('tha_position', 'ysubtitle', '[km]')
 
     # Plot position and velocity using the matplotlib library
     if plot:
-        tplot(["tha_pos", "tha_position", "tha_vel"])
+        if lazy:
+            tplot_views(["tha_pos", "tha_position", "tha_vel"])
+        else:
+            tplot(["tha_pos", "tha_position", "tha_vel"])
 
     # Return 1 as indication that the example finished without problems.
     return 1
@@ -10,12 +10,22 @@ For more information on cdasws, see:
 
 from cdasws import CdasWs
 from pyspedas import CDAWeb
+from pyspedas_examples.utilities.cdas_cache import (cached_cdas,
+                                                    cached_cdaweb)
+from pyspedas_examples.utilities.cdas_fetch import fetch_datasets
 
 
-def ex_cdasws():
-    """Demonstrate how to use cdasws."""
+def ex_cdasws(cached=False, concurrent=False):
+    """Demonstrate how to use cdasws.
+
+    If cached is True, the catalog queries are served from (or added to)
+    the cache of cached_cdas, so the repeated queries do not go to the
+    server.
+    If concurrent is True, the files are found with fetch_datasets, which
+    resolves many datasets at the same time.
+    """
     # Create an cdasws instance
-    cdas = CdasWs()
+    cdas = cached_cdas() if cached else CdasWs()
     # Get a list of instrument types
     instr = cdas.get_instrument_types()
     # Print the list of instruments    print()
@@ -57,7 +67,7 @@ def ex_cdasws():
     del cdas
 
     # Now use the simplified functions from pyspedas
-    cdaw = CDAWeb()
+    cdaw = cached_cdaweb() if cached else CDAWeb()
     print()
     print("==========================================================")
     print()
@@ -80,7 +90,11 @@ def ex_cdasws():
     print()
     print("==========================================================")
     print()
-    f = cdaw.get_filenames(dataset, t0, t1)
+    if concurrent:
+        report = fetch_datasets(dataset, [t0, t1], download=False)
+        f = [url for d in dataset for url in report[d]['urls']]
+    else:
+        f = cdaw.get_filenames(dataset, t0, t1)
     print("Files: " + str(f))
     print()
     print("==========================================================")
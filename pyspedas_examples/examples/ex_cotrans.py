@@ -6,14 +6,21 @@ See also: http://spedas.org/wiki/index.php?title=Cotrans
 from pyspedas import options,   tplot_options, tplot
 from pyspedas import cotrans
 from pyspedas.cotrans_tools.cotrans_lib import submag2geo
-from pyspedas.projects.themis import state
+from pyspedas_examples.utilities.load import state
+from pyspedas_examples.analysis.cotrans_cache import (cotrans_batch,
+                                                      cotrans_cached)
+from pyspedas_examples.analysis.dipole_table import submag2geo_table
 
 
-def ex_cotrans(plot=True):
+def ex_cotrans(plot=True, cached=False, batch=False):
     """Transform state data for THEMIS from GEI to GSE.
 
     Load position and velocity from THEMIS.
     Transform the coordinates to GSE and plot.
+    If cached is True, use cotrans_cached: the rotation matrices are
+    computed for the position and reused for the velocity.
+    If batch is True, use cotrans_batch to transform both variables
+    in one call.
 
     Notes
     -----
@@ -29,8 +36,15 @@ def ex_cotrans(plot=True):
           varnames=[pos_in, vel_in])
 
     # Coordinate transformation.
-    cotrans(name_in=pos_in, name_out=pos_out, coord_in="gei", coord_out="gse")
-    cotrans(name_in=vel_in, name_out=vel_out, coord_in="gei", coord_out="gse")
+    if batch:
+        cotrans_batch([(pos_in, pos_out), (vel_in, vel_out)],
+                      coord_in="gei", coord_out="gse")
+    else:
+        transform = cotrans_cached if cached else cotrans
+        transform(name_in=pos_in, name_out=pos_out, coord_in="gei",
+                  coord_out="gse")
+        transform(name_in=vel_in, name_out=vel_out, coord_in="gei",
+                  coord_out="gse")
 
     # Plot.
     tplot_options('title', 'Themis pos and vel in GEI and GSE')
@@ -49,9 +63,12 @@ def ex_cotrans(plot=True):
     return 1
 
 
-def ex_cotrans1():
+def ex_cotrans1(table=False):
     """Define data and times and apply submag2geo.
 
+    If table is True, use submag2geo_table: the dipole axis is taken
+    from a daily table and all the points are rotated at once.
+
     Notes
     -----
     To compare with IDL SPEDAS, use the following IDL code:
@@ -74,7 +91,8 @@ def ex_cotrans1():
     print(d)
     t = [1577112800, 1577308800, 1577598800, 1577608800, 1577998800]
     # Coordinate transformation MAG to GEO.
-    geo = submag2geo(t, d)
+    transform = submag2geo_table if table else submag2geo
+    geo = transform(t, d)
     print("Input data (GEO):")
     print(geo)
 
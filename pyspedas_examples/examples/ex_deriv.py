@@ -8,10 +8,20 @@ import numpy as np
 import pyspedas
 import pyspedas
 from pyspedas.analysis.deriv_data import deriv_data
+from pyspedas_examples.utilities.load import gmag
+from pyspedas_examples.analysis.pipeline import Pipeline
+from pyspedas_examples.analysis.deriv_batch import deriv_batch
 
 
-def ex_deriv(plot=True):
-    """Find the derivative of a GMAG variable."""
+def ex_deriv(plot=True, lazy=False, batch=False):
+    """Find the derivative of a GMAG variable.
+
+    If lazy is True, the steps are recorded in a Pipeline, which
+    subtracts the median from each chunk while it finds the derivative,
+    and only stores the median subtracted data if they are plotted.
+    If batch is True, the derivative is found by deriv_batch, which
+    gives the same results.
+    """
     # Derivative of data
     pyspedas.del_data()
 
@@ -21,13 +31,22 @@ def ex_deriv(plot=True):
     # Download gmag files and load data into pyspedas variables
     sites = ['ccnv']
     var = 'thg_mag_ccnv'
-    pyspedas.projects.themis.gmag(sites=sites, trange=trange, varnames=[var])
+    gmag(sites=sites, trange=trange, varnames=[var])
     # pyspedas.tplot_options('title', 'GMAG data, thg_mag_ccnv 2007-03-23')
-    pyspedas.subtract_average(var, median=1)
-    var += '-m'
-
-    # Five minute average
-    deriv_data(var)
+    if lazy:
+        p = Pipeline()
+        m = p.source(var).subtract_average(median=True)
+        p.compute([m.deriv_data()] + ([m] if plot else []))
+        var = m.name
+    else:
+        pyspedas.subtract_average(var, median=1)
+        var += '-m'
+
+        # Five minute average
+        if batch:
+            deriv_batch(var)
+        else:
+            deriv_data(var)
     # pyspedas.options(var, 'ytitle', var)
     # pyspedas.options(var + '-der', 'ytitle', var + '-der')
     if plot:
@@ -37,26 +56,38 @@ def ex_deriv(plot=True):
     return 1
 
 
-def ex_deriv1(plot=True):
-    """Find the derivative of sinx."""
+def ex_deriv1(plot=True, batch=False):
+    """Find the derivative of sinx.
+
+    If batch is True, the sine is made with arrays, and the derivative
+    is found by deriv_batch, with the same results.
+    """
     # Delete any existing tplot variables
     pyspedas.del_data()
 
     # Create a sin wave plot
-    a = list(range(0, 101))
-    b = [2.0 / 100.0 * np.pi * s for s in a]
     c = pyspedas.time_float('2017-01-01')
-    x = list()
-    y = list()
-    for i in range(len(b)):
-        x.append(c + 60.0 / (2 * np.pi) * 60.0 * b[i])
-        y.append(1000.0 * np.sin(b[i]))
+    if batch:
+        b = 2.0 / 100.0 * np.pi * np.arange(101)
+        x = c + 60.0 / (2 * np.pi) * 60.0 * b
+        y = 1000.0 * np.sin(b)
+    else:
+        a = list(range(0, 101))
+        b = [2.0 / 100.0 * np.pi * s for s in a]
+        x = list()
+        y = list()
+        for i in range(len(b)):
+            x.append(c + 60.0 / (2 * np.pi) * 60.0 * b[i])
+            y.append(1000.0 * np.sin(b[i]))
 
     # Store data
     pyspedas.store_data('sinx', data={'x': x, 'y': y})
 
     var = 'sinx'
-    deriv_data(var)
+    if batch:
+        deriv_batch(var)
+    else:
+        deriv_data(var)
     if plot:
         pyspedas.tplot([var, var + '-der'])
 
@@ -30,27 +30,49 @@ Notes
 import pyspedas
 import pyspedas
 from pyspedas.projects.themis.cotrans.dsl2gse import dsl2gse
+from pyspedas_examples.utilities.load import state, fgm
+from pyspedas_examples.analysis.dsl2gse_cached import dsl2gse_batch
+from pyspedas_examples.utilities.derived import store_view, tplot_views
 
 
-def ex_dsl2gse(plot=True):
-    """Run dsl2gse."""
+def ex_dsl2gse(plot=True, cached=False, lazy=False):
+    """Run dsl2gse.
+
+    If cached is True, use dsl2gse_batch, which keeps the rotation
+    matrices for other variables on the same times.
+
+    If lazy is True, z_dsl and z_gse are views of the third components,
+    which are only stored when they are plotted.
+    """
     time_range = ['2017-03-23 00:00:00', '2017-03-23 23:59:59']
-    pyspedas.projects.themis.state(probe='a', trange=time_range, get_support_data=True,
-                          varnames=['tha_spinras', 'tha_spindec'])
-    pyspedas.projects.themis.fgm(probe='a', trange=time_range, varnames=['tha_fgl_dsl'])
+    state(probe='a', trange=time_range, get_support_data=True,
+          varnames=['tha_spinras', 'tha_spindec'])
+    fgm(probe='a', trange=time_range, varnames=['tha_fgl_dsl'])
 
-    dsl2gse('tha_fgl_dsl', 'tha_fgl_gse')
+    if cached:
+        dsl2gse_batch(['tha_fgl_dsl'], ['tha_fgl_gse'])
+    else:
+        dsl2gse('tha_fgl_dsl', 'tha_fgl_gse')
 
     # Get the third component only
-    d_in = pyspedas.get_data('tha_fgl_dsl')
-    pyspedas.store_data('z_dsl', data={'x': d_in[0], 'y': d_in[1][:, 2]})
-    d_out = pyspedas.get_data('tha_fgl_gse')
-    pyspedas.store_data('z_gse', data={'x': d_out[0], 'y': d_out[1][:, 2]})
+    if lazy:
+        store_view('z_dsl', 'tha_fgl_dsl', component=2)
+        store_view('z_gse', 'tha_fgl_gse', component=2)
+    else:
+        d_in = pyspedas.get_data('tha_fgl_dsl')
+        pyspedas.store_data('z_dsl', data={'x': d_in[0], 'y': d_in[1][:, 2]})
+        d_out = pyspedas.get_data('tha_fgl_gse')
+        pyspedas.store_data('z_gse', data={'x': d_out[0],
+                                           'y': d_out[1][:, 2]})
 
     # Plot
     pyspedas.tplot_options('title', 'tha_fgl DSL and GSE, 2017-03-23')
     if plot:
-        pyspedas.tplot(['tha_fgl_dsl', 'tha_fgl_gse', 'z_dsl', 'z_gse'])
+        names = ['tha_fgl_dsl', 'tha_fgl_gse', 'z_dsl', 'z_gse']
+        if lazy:
+            tplot_views(names)
+        else:
+            pyspedas.tplot(names)
 
     # Return 1 as indication that the example finished without problems.
     return 1
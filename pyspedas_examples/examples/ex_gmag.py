@@ -7,11 +7,21 @@ either from a single station or a GMAG group.
 """
 from pyspedas import del_data, tplot_options, tplot, tplot_names
 from pyspedas import subtract_average, tnames
-from pyspedas.projects.themis.ground.gmag import gmag, gmag_list
+from pyspedas_examples.utilities.load import gmag, gmag_list
+from pyspedas_examples.utilities.gmag_parallel import gmag_parallel
 
 
-def ex_gmag(plot=True):
-    """Demonstrate how to use gmag functions."""
+def ex_gmag(plot=True, workers=None):
+    """Demonstrate how to use gmag functions.
+
+    Parameters
+    ----------
+    plot: bool, optional
+        Plot the data.
+    workers: int, optional
+        If set, load and detrend the stations (and the AE index)
+        in parallel, using this number of worker threads.
+    """
     # Delete any existing tplot variables
     del_data()
 
@@ -21,18 +31,28 @@ def ex_gmag(plot=True):
     # Get a list of EPO gmag stations
     sites = gmag_list('epo')
 
-    # Download gmag files and load data into tplot variables
-    gmag(sites=sites, trange=trange)
+    if workers is None:
+        # Download gmag files and load data into tplot variables
+        gmag(sites=sites, trange=trange)
 
-    # Get a list of loaded sites
-    sites_loaded = tnames()
+        # Get a list of loaded sites
+        sites_loaded = tnames()
 
-    # Subtract mean values
-    subtract_average(sites_loaded, '')
+        # Subtract mean values
+        subtract_average(sites_loaded, '')
 
-    # Download AE index data
-    # pyspedas.load_data('gmag', time_list, ['idx'], '', '')
-    gmag(sites='idx', trange=trange)
+        # Download AE index data
+        # pyspedas.load_data('gmag', time_list, ['idx'], '', '')
+        gmag(sites='idx', trange=trange)
+    else:
+        # Load and subtract the mean values for all stations in parallel
+        report = gmag_parallel(sites + ['idx'], trange, workers=workers)
+        for site, r in report.items():
+            if r['error'] is None:
+                print('{}: load {:.3f} s, subtract {:.3f} s'.format(
+                    site, r['load_time'], r['subtract_time']))
+            else:
+                print(site + ': ' + r['error'])
 
     # Plot
     sites_loaded = tplot_names()
@@ -7,12 +7,18 @@ This is similar to the IDL example crib_magnetopause.pro (first part).
 
 import matplotlib.pyplot as plt
 from pyspedas import mpause_2
+from pyspedas_examples.analysis.mpause_cache import mpause_2_cached
 
 
-def ex_mpause_2(plot=True):
+def ex_mpause_2(plot=True, cached=False):
+    """Plot the Fairfield magnetopause.
+
+    If cached is True, the boundary is taken from (or added to) the
+    cache of mpause_2_cached.
+    """
 
     # Call the function without parameters to use default values
-    xmp, ymp = mpause_2()
+    xmp, ymp = mpause_2_cached() if cached else mpause_2()
 
     # Set the range for the axes
     x_limits = (-300, 100)
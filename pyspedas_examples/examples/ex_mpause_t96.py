@@ -7,12 +7,27 @@ This is similar to the IDL example crib_magnetopause.pro (second part).
 """
 
 import matplotlib.pyplot as plt
+import numpy as np
 from pyspedas import get_data
-from pyspedas.projects.themis import state
+from pyspedas_examples.utilities.load import state
 from pyspedas import cotrans, mpause_t96
+from pyspedas import store_data
+from pyspedas_examples.analysis.cotrans_cache import cotrans_cached
+from pyspedas_examples.analysis.mpause_bulk import mpause_t96_bulk
+from pyspedas_examples.analysis.mpause_cache import mpause_t96_boundary
 
 
-def ex_mpause_t96(plot=True):
+def ex_mpause_t96(plot=True, cached=False, bulk=False):
+    """Plot the T96 magnetopause for THEMIS D positions.
+
+    If cached is True, the GEI to GSM matrices are taken from (or added
+    to) the cache of cotrans_cached, and the boundary from the cache of
+    mpause_t96_boundary, and the flags and distances are computed
+    with mpause_t96_bulk.
+    If bulk is True, the flags and distances are computed with
+    mpause_t96_bulk, with one pressure per point, and stored in the
+    tplot variables thd_mpause_id and thd_mpause_distan.
+    """
 
     # Set the date and load one day of data
     date_start = '2019-01-05/00:00:00'
@@ -22,8 +37,9 @@ def ex_mpause_t96(plot=True):
     state(trange=[date_start, date_end], probe='d', get_support_data=True)
 
     # Transform the position data from GEI to GSM coordinates
-    cotrans(name_in='thd_pos', name_out='thd_pos_gsm',
-            coord_in='gei', coord_out='gsm')
+    transform = cotrans_cached if cached else cotrans
+    transform(name_in='thd_pos', name_out='thd_pos_gsm',
+              coord_in='gei', coord_out='gsm')
 
     # Get the position data in GSM coordinates
     pos_gsm_data = get_data('thd_pos_gsm')
@@ -34,9 +50,27 @@ def ex_mpause_t96(plot=True):
     # Define solar wind dynamic pressure
     dynp = 2.0
 
-    # Call the mpause_t96 function with the position data
-    xmgnp, ymgnp, zmgnp, id, distan = mpause_t96(
-        pd=dynp, xgsm=pos_gsm[:, 0], ygsm=pos_gsm[:, 1], zgsm=pos_gsm[:, 2])
+    if cached or bulk:
+        # Magnetopause boundary only, from the cache or from mpause_t96
+        if cached:
+            xmgnp, ymgnp, zmgnp = mpause_t96_boundary(dynp)
+        else:
+            xmgnp, ymgnp, zmgnp, _, _ = mpause_t96(pd=dynp)
+
+        # Flags and distances of the positions
+        pd = np.full(len(pos_gsm_data.times), dynp) if bulk else dynp
+        id, distan = mpause_t96_bulk(pd, pos_gsm[:, 0], pos_gsm[:, 1],
+                                     pos_gsm[:, 2])
+        if bulk:
+            store_data('thd_mpause_id',
+                       data={'x': pos_gsm_data.times, 'y': id})
+            store_data('thd_mpause_distan',
+                       data={'x': pos_gsm_data.times, 'y': distan})
+    else:
+        # Call the mpause_t96 function with the position data
+        xmgnp, ymgnp, zmgnp, id, distan = mpause_t96(
+            pd=dynp, xgsm=pos_gsm[:, 0], ygsm=pos_gsm[:, 1],
+            zgsm=pos_gsm[:, 2])
 
     # Plot xmgnp vs ymgnp
     plt.figure()
@@ -6,15 +6,23 @@ This can be compared to the similar IDL function.
 """
 
 from pyspedas import store_data, get_data, tplot, tsmooth, options
+from pyspedas_examples.analysis.smooth_cumsum import tsmooth_cumsum
 
 
-def ex_smooth(plot=True):
-    """Smooth data."""
+def ex_smooth(plot=True, cumsum=False):
+    """Smooth data.
+
+    If cumsum is set, use tsmooth_cumsum, which finds the averages with
+    cumulative sums, so that the cost does not depend on the width.
+    """
     t = [1., 2., 3., 4., 5., 6., 7., 8., 9., 10., 11., 12.]
     y = [3., 5., 8., 15., 20., 1., 2., 3., 4., 5., 6., 4.]
 
     store_data('original', data={'x': t, 'y': y})
-    tsmooth('original', width=5, new_names='smooth', preserve_nans=1)
+    if cumsum:
+        tsmooth_cumsum('original', width=5, newname='smooth', preserve_nans=1)
+    else:
+        tsmooth('original', width=5, new_names='smooth', preserve_nans=1)
     options('smooth', 'ytitle', 'smooth')
 
     if plot:
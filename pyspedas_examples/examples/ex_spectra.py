@@ -7,11 +7,27 @@ one with a spectrogram.
 """
 
 from pyspedas import del_data, options, tplot_options, ylim, tplot
-from pyspedas.projects.themis import state, sst
+from pyspedas_examples.utilities.load import state, sst, gmag
+from pyspedas_examples.analysis.dynamic_power import dynamic_power
+from pyspedas_examples.analysis.spec_render import spec_render
 
 
-def ex_spectra(plot=True):
-    """Download THEMIS data and create a plot."""
+def ex_spectra(plot=True, power=False, workers=None, render=False):
+    """Download THEMIS data and create a plot.
+
+    Parameters
+    ----------
+    plot: bool, optional
+        Plot the data.
+    power: bool, optional
+        Also download the GMAG data of CCNV for the same day, and plot
+        the dynamic power spectrum of its components (dynamic_power).
+    workers: int, optional
+        Number of threads of dynamic_power.
+    render: bool, optional
+        Plot the spectrograms binned to the pixels of their panels
+        (spec_render), instead of all their samples.
+    """
     # Delete any existing tplot variables
     del_data()
 
@@ -25,10 +41,22 @@ def ex_spectra(plot=True):
     ylim('tha_psif_en_eflux', 10000.0, 4000000.0)
     options('tha_psif_en_eflux', 'colormap', 'jet')
     tplot_options('title', 'tha 2015-12-31')
+    names = ['tha_pos', 'tha_psif_en_eflux']
+
+    if power:
+        # Dynamic power spectra of the magnetic field, 10 minute windows
+        gmag(sites=['ccnv'], trange=time_range, varnames=['thg_mag_ccnv'])
+        names += dynamic_power('thg_mag_ccnv', nboxpoints=1200,
+                               nshiftpoints=600, bin=4,
+                               workers=workers) or []
+
+    if render:
+        # Spectrograms binned to the pixels of the plot
+        names = spec_render(names, panels=len(names))
 
     # Plot line and spectrogram
     if plot:
-        tplot(['tha_pos', 'tha_psif_en_eflux'])
+        tplot(names)
 
     # Return 1 as indication that the example finished without problems.
     return 1
@@ -7,11 +7,23 @@ This module demonstrates how to use the function clean_spikes.
 import random
 import pyspedas
 from pyspedas import clean_spikes, del_data, tplot_options, data_quants, tplot, tplot_names
-from pyspedas.projects.themis import gmag
+from pyspedas_examples.utilities.load import gmag
+from pyspedas_examples.utilities.column_store import temporary_store
+from pyspedas_examples.analysis.clean_spikes_batch import (
+    clean_spikes_batch, clean_spikes_store)
 
 
-def ex_spikes(plot=True):
-    """Load GMAG data and show how to remove spikes."""
+def ex_spikes(plot=True, batch=False, mmap=False):
+    """Load GMAG data and show how to remove spikes.
+
+    If batch is True, use clean_spikes_batch, which processes all the
+    components with NumPy and gives the same results as clean_spikes.
+
+    If mmap is True, the data are kept in a memory-mapped ColumnStore:
+    they are written in the store one day at a time as they are loaded,
+    the spikes are added in place in the file, and clean_spikes_store
+    cleans them one chunk at a time. The stores are removed at exit.
+    """
     # Delete any existing tplot variables.
     del_data()
 
@@ -21,7 +33,12 @@ def ex_spikes(plot=True):
     # Download gmag files and load data into tplot variables.
     sites = ['ccnv']
     var = 'thg_mag_ccnv'
-    gmag(sites=sites, trange=trange, varnames=[var])
+    if mmap:
+        store = temporary_store()
+        store.append_days(var, gmag, trange, sites=sites)
+        store.store(var)
+    else:
+        gmag(sites=sites, trange=trange, varnames=[var])
     tplot_options('title', 'GMAG data, thg_mag_ccnv, 2007-03-23')
 
     # Add spikes to data.
@@ -37,7 +54,13 @@ def ex_spikes(plot=True):
     pyspedas.data_quants[var].values = data
 
     # Clean spikes.
-    clean_spikes(var, sub_avg=True)
+    if mmap:
+        clean_spikes_store(store, var, sub_avg=True)
+        store.store(var + '-despike')
+    elif batch:
+        clean_spikes_batch(var, sub_avg=True)
+    else:
+        clean_spikes(var, sub_avg=True)
 
     # Plot all variables.
     if plot:
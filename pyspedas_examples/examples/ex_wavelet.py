@@ -4,10 +4,16 @@ import numpy as np
 import pyspedas
 from pyspedas import time_float
 from pyspedas.analysis.wavelet import wavelet
+from pyspedas_examples.analysis.wavelet_fft import wavelet_fft
 
 
-def ex_wavelet(plot=True):
-    """Demonstrates how to use wavelets with pyspedas."""
+def ex_wavelet(plot=True, workers=None):
+    """Demonstrates how to use wavelets with pyspedas.
+
+    If workers is set, use wavelet_fft, which computes the power with
+    batched FFTs in this number of threads, and gives the same results
+    as wavelet, up to rounding.
+    """
     # Delete any existing tplot variables
     pyspedas.del_data()
 
@@ -21,7 +27,10 @@ def ex_wavelet(plot=True):
     pyspedas.store_data(var, data={'x': time, 'y': y})
 
     # Complex wavelet transformation.
-    powervar = wavelet(var, wavename='cmorl0.5-1.0')
+    if workers is None:
+        powervar = wavelet(var, wavename='cmorl0.5-1.0')
+    else:
+        powervar = wavelet_fft(var, wavename='cmorl0.5-1.0', workers=workers)
     # Also try the following and compare:
     # powervar = wavelet(var, wavename='gaus1')
     pvar = powervar[0]
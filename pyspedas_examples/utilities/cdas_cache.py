@@ -0,0 +1,330 @@
+"""
+Persistent cache of CDAWeb catalog queries.
+
+cdasws sends every catalog query (instrument types, observatory groups,
+datasets, ...) to the CDAS server, even when it was made a moment ago.
+The catalog rarely changes, so here the responses are kept in memory and
+optionally in a directory:
+
+- A response younger than the time to live (ttl) is served locally.
+- An older response is revalidated with a conditional request
+  (If-None-Match/If-Modified-Since). If the server answers 304 Not
+  Modified, the response is kept and its age is reset.
+- Identical requests made at the same time from several threads share
+  one request to the server.
+
+The cache is used by cdasws through a session wrapper, see cached_cdas
+and cached_cdaweb. Only GET requests without streaming (the catalog
+queries) are cached; data requests and downloads go to the server.
+
+Notes
+-----
+The directory of the default cache, catalog_cache, is the subdirectory
+cdas_catalog of the directory in the environment variable
+PYSPEDAS_EXAMPLES_CACHE. If this variable is not set, the default cache
+is only kept in memory.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+class CachedResponse:
+    """
+    Response served by a CatalogCache.
+
+    It has the attributes of requests.Response used by cdasws.
+
+    Parameters
+    ----------
+    entry: dict
+        Cache entry, with the status, text and headers of the response.
+    cached: bool, optional
+        True if the response was served without a full request.
+    """
+
+    def __init__(self, entry, cached=False):
+        self.status_code = entry['status']
+        self.text = entry['text']
+        self.headers = entry['headers']
+        self.url = entry['url']
+        self.cached = cached
+
+    @property
+    def content(self):
+        return self.text.encode('utf-8')
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class CatalogCache:
+    """
+    Cache of HTTP GET responses, with time to live and revalidation.
+
+    Parameters
+    ----------
+    directory: str, optional
+        Directory where the responses are saved, and looked up when they
+        are not in memory. Default is no directory.
+    ttl: float, optional
+        Seconds during which a response is served without asking the
+        server. Default is one day.
+    session: requests.Session, optional
+        Session used for the requests. Default is a new session.
+
+    Attributes
+    ----------
+    hits: int
+        Responses served without a request.
+    misses: int
+        Full requests to the server.
+    revalidations: int
+        Conditional requests answered with 304 Not Modified.
+    shared: int
+        Requests that waited for an identical request in progress.
+    """
+
+    def __init__(self, directory=None, ttl=86400.0, session=None):
+        self.directory = directory
+        self.ttl = ttl
+        self._session = session
+        self._entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.shared = 0
+
+    @property
+    def session(self):
+        """Session used for the requests."""
+        if self._session is None:
+            import requests
+            self._session = requests.Session()
+        return self._session
+
+    @property
+    def hit_rate(self):
+        """Fraction of the lookups served without a full request."""
+        total = self.hits + self.misses + self.revalidations
+        return (self.hits + self.revalidations) / total if total else 0.0
+
+    def stats(self):
+        """Dictionary of the cache statistics."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'revalidations': self.revalidations, 'shared': self.shared,
+                'hit_rate': self.hit_rate, 'entries': len(self._entries)}
+
+    def clear(self):
+        """Remove the responses from memory and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.revalidations = self.shared = 0
+
+    def path(self, key):
+        """File of a key in the directory."""
+        name = hashlib.blake2b(repr(key).encode(), digest_size=16)
+        return os.path.join(self.directory, name.hexdigest() + '.json')
+
+    def get(self, url, headers=None, timeout=None, session=None):
+        """
+        Response of a GET request, from the cache or from the server.
+
+        Parameters
+        ----------
+        url: str
+            URL of the request.
+        headers: dict, optional
+            Headers of the request. The Accept header is part of the key.
+        timeout: float, optional
+            Timeout of the request to the server.
+        session: requests.Session, optional
+            Session used for the request. Default is the cache session.
+
+        Returns
+        -------
+        CachedResponse
+        """
+        headers = dict(headers or {})
+        key = (url, headers.get('Accept'))
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None and time.time() - entry['time'] < self.ttl:
+                self.hits += 1
+                return CachedResponse(entry, cached=True)
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = Future()
+                owner = True
+            else:
+                self.shared += 1
+                owner = False
+
+        if not owner:
+            return CachedResponse(future.result(), cached=True)
+        try:
+            entry, cached = self._fetch(key, entry, headers, timeout,
+                                        session or self.session)
+            future.set_result(entry)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return CachedResponse(entry, cached=cached)
+
+    def _lookup(self, key):
+        """Entry of a key, from memory or from the directory."""
+        entry = self._entries.get(key)
+        if entry is None and self.directory is not None:
+            try:
+                with open(self.path(key)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                return None
+            self._entries[key] = entry
+        return entry
+
+    def _fetch(self, key, entry, headers, timeout, session):
+        """Request a URL, conditionally if a stale entry exists."""
+        if entry is not None:
+            if entry['headers'].get('ETag'):
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = entry['headers'][
+                    'Last-Modified']
+        response = session.get(key[0], headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry is not None:
+            entry = dict(entry, time=time.time())
+            with self._lock:
+                self.revalidations += 1
+            cached = True
+        else:
+            entry = {'url': key[0], 'status': response.status_code,
+                     'text': response.text, 'time': time.time(),
+                     'headers': {k: response.headers[k]
+                                 for k in ['ETag', 'Last-Modified',
+                                           'Content-Type']
+                                 if k in response.headers}}
+            with self._lock:
+                self.misses += 1
+            cached = False
+        if entry['status'] == 200:
+            with self._lock:
+                self._entries[key] = entry
+            self._save(key, entry)
+        return entry, cached
+
+    def _save(self, key, entry):
+        """Write an entry in the directory."""
+        if self.directory is None:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.path(key)
+            # Write a temporary file first, for concurrent readers.
+            tmp = path + '.' + str(os.getpid()) + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.error('CatalogCache: cannot save to ' + self.directory
+                          + ': ' + str(e))
+
+
+class CachedSession:
+    """
+    Session of cdasws that serves the catalog queries from a cache.
+
+    GET requests without streaming go through the cache; everything
+    else (POST requests, downloads, attributes) goes to the session.
+
+    Parameters
+    ----------
+    cache: CatalogCache
+        Cache of the responses.
+    session: requests.Session
+        Session used for the requests, with the headers of cdasws.
+    """
+
+    def __init__(self, cache, session):
+        self.cache = cache
+        self.session = session
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def get(self, url, stream=False, timeout=None, **kwargs):
+        if stream or set(kwargs) - {'headers'}:
+            return self.session.get(url, stream=stream, timeout=timeout,
+                                    **kwargs)
+        headers = dict(self.session.headers)
+        headers.update(kwargs.get('headers') or {})
+        return self.cache.get(url, headers=headers, timeout=timeout,
+                              session=self.session)
+
+
+def _default_directory():
+    root = os.environ.get('PYSPEDAS_EXAMPLES_CACHE')
+    return os.path.join(root, 'cdas_catalog') if root else None
+
+
+# Cache used when none is given.
+catalog_cache = CatalogCache(directory=_default_directory())
+
+
+def cached_cdas(endpoint=None, cache=None, **kwargs):
+    """
+    CdasWs instance that uses a CatalogCache for the catalog queries.
+
+    Parameters
+    ----------
+    endpoint: str, optional
+        URL of the CDAS web service. Default is the cdasws default.
+    cache: CatalogCache, optional
+        Cache of the responses. Default is catalog_cache.
+    **kwargs:
+        Other parameters of CdasWs.
+
+    Returns
+    -------
+    cdasws.CdasWs
+    """
+    from cdasws import CdasWs
+    if cache is None:
+        cache = catalog_cache
+    # The HTTP cache of cdasws (requests_cache) is replaced by ours.
+    cdas = CdasWs(endpoint=endpoint, disable_cache=True, **kwargs)
+    cdas._session = CachedSession(cache, cdas._session)
+    return cdas
+
+
+def cached_cdaweb(cache=None):
+    """
+    pyspedas CDAWeb instance that uses a CatalogCache.
+
+    Parameters
+    ----------
+    cache: CatalogCache, optional
+        Cache of the responses. Default is catalog_cache.
+
+    Returns
+    -------
+    pyspedas.CDAWeb
+    """
+    from pyspedas import CDAWeb
+    from pyspedas.cdagui_tools.config import CONFIG
+    cdaw = CDAWeb()
+    cdaw.cdas = cached_cdas(endpoint=CONFIG['cdas_endpoint'], cache=cache)
+    return cdaw
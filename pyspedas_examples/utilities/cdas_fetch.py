@@ -0,0 +1,284 @@
+"""
+Resolve and download the files of many CDAWeb datasets concurrently.
+
+pyspedas CDAWeb.get_filenames asks CDAS for the files of one dataset at
+a time, and cda_download downloads them one by one, so a request for
+many datasets spends most of its time waiting for the server. Here the
+file lists and the files are requested from a bounded pool of worker
+threads, sharing one session (with a connection pool of the same size):
+
+- Failed requests (errors, 429 and 5xx) are retried with an
+  exponential backoff.
+- A file is downloaded to a .part file first. A retry, or a later call,
+  continues a partial download with a Range request.
+- A completed file is recorded with its size, modification time and
+  SHA-256 in a .sha256 file next to it. A later call reuses the file if
+  it matches the server description and its checksum.
+
+Notes
+-----
+The CDAS description of a file has no checksum, so the checksum is the
+one computed when the file was downloaded; it detects files that were
+changed or truncated since then.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+# Status codes that are retried.
+retry_status = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """A request that failed after all the retries."""
+
+
+def _retry(func, retries, backoff, what):
+    """
+    Call func until it succeeds, with an exponential backoff.
+
+    Only IOError is retried: it includes the requests exceptions
+    (connection errors, timeouts) and the status codes of retry_status.
+    A FetchError, e.g. for a 404, is raised at once.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except FetchError:
+            raise
+        except IOError as err:
+            if attempt == retries:
+                raise FetchError(what + ': ' + str(err)) from err
+            logging.debug(what + ': ' + str(err) + ', retrying')
+            time.sleep(backoff * 2**attempt)
+
+
+def _check(response):
+    """Raise for the status codes that are retried."""
+    if response.status_code in retry_status:
+        raise IOError('HTTP status ' + str(response.status_code))
+
+
+def file_checksum(path, block_size=2**20):
+    """SHA-256 of a file, as a hex string."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _manifest(path):
+    return path + '.sha256'
+
+
+def reusable(path, description):
+    """
+    Check if a local file can be used instead of downloading it.
+
+    Parameters
+    ----------
+    path: str
+        Local file.
+    description: dict
+        CDAS FileDescription of the file (Length, LastModified).
+
+    Returns
+    -------
+    bool
+        True if the file and its manifest exist, the manifest matches
+        the description, and the file matches the manifest.
+    """
+    try:
+        with open(_manifest(path)) as f:
+            manifest = json.load(f)
+        if (manifest['length'] != description.get('Length')
+                or manifest['last_modified'] != description.get(
+                    'LastModified')
+                or os.path.getsize(path) != manifest['length']):
+            return False
+        return file_checksum(path) == manifest['sha256']
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def download_file(session, description, path, chunk_size=2**16,
+                  timeout=None):
+    """
+    Download a file, continuing a partial download.
+
+    Parameters
+    ----------
+    session: requests.Session
+        Session used for the request.
+    description: dict
+        CDAS FileDescription of the file (Name is the URL).
+    path: str
+        Local file. The data are written to path + '.part' first.
+    chunk_size: int, optional
+        Bytes read at a time.
+    timeout: float, optional
+        Timeout of the request.
+
+    Returns
+    -------
+    int
+        Number of bytes received.
+    """
+    part = path + '.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    length = description.get('Length') or 0
+    headers = {'Range': 'bytes={}-'.format(offset)} if offset else {}
+    received = 0
+    with session.get(description['Name'], headers=headers, stream=True,
+                     timeout=timeout) as response:
+        _check(response)
+        if response.status_code == 416 and offset == length:
+            pass
+        elif response.status_code not in (200, 206):
+            raise FetchError(description['Name'] + ': HTTP status '
+                             + str(response.status_code))
+        else:
+            mode = 'ab' if response.status_code == 206 else 'wb'
+            with open(part, mode) as f:
+                for block in response.iter_content(chunk_size=chunk_size):
+                    f.write(block)
+                    received += len(block)
+    size = os.path.getsize(part)
+    if length and size != length:
+        raise IOError('{}: {} bytes of {}'.format(
+            description['Name'], size, length))
+    manifest = {'url': description['Name'], 'length': size,
+                'last_modified': description.get('LastModified'),
+                'sha256': file_checksum(part)}
+    os.replace(part, path)
+    with open(_manifest(path), 'w') as f:
+        json.dump(manifest, f)
+    return received
+
+
+def _session(workers):
+    """Session with a connection pool for the workers."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _cdas_time(t, end=False):
+    """Time in the CDAS format, as CDAWeb.get_filenames."""
+    t = t.strip().replace(' ', 'T', 1)
+    if len(t) == 10:
+        return t + ('T23:59:59Z' if end else 'T00:00:00Z')
+    return t + 'Z'
+
+
+def fetch_datasets(datasets, trange, local_dir='cdaweb', workers=8,
+                   retries=3, backoff=0.5, endpoint=None, timeout=60.0,
+                   download=True):
+    """
+    Find and download the files of many CDAWeb datasets concurrently.
+
+    Parameters
+    ----------
+    datasets: str/list of str
+        Dataset identifiers, e.g. 'THB_L2_FIT'. Anything after a space
+        (as in the names returned by CDAWeb.get_datasets) is ignored.
+    trange: list of str
+        Time range, e.g. ['2020-01-01', '2020-01-31'].
+    local_dir: str, optional
+        Directory of the files, with one subdirectory per dataset.
+        Default is 'cdaweb'.
+    workers: int, optional
+        Maximum number of requests at the same time. Default is 8.
+    retries: int, optional
+        Number of retries of a failed request. Default is 3.
+    backoff: float, optional
+        Seconds before the first retry, doubled for each retry.
+    endpoint: str, optional
+        URL of the CDAS web services. Default is the pyspedas CDAWeb one.
+    timeout: float, optional
+        Timeout of each request, in seconds. Default is 60.
+    download: bool, optional
+        If False, only find the files. Default is True.
+
+    Returns
+    -------
+    dict
+        Report for each dataset, with the keys:
+        'urls' (list of file URLs), 'files' (list of local files),
+        'downloaded' and 'reused' (numbers of files),
+        'error' (None, or the error message if the dataset failed).
+    """
+    from cdasws import CdasWs
+    from pyspedas.cdagui_tools.config import CONFIG
+
+    if isinstance(datasets, str):
+        datasets = [datasets]
+    datasets = [d.split(' ')[0] for d in datasets]
+    t0, t1 = _cdas_time(trange[0]), _cdas_time(trange[1], end=True)
+    if endpoint is None:
+        endpoint = CONFIG['cdas_endpoint']
+    cdas = CdasWs(endpoint=endpoint, timeout=timeout, disable_cache=True)
+    session = _session(workers)
+    session.headers.update(cdas._session.headers)
+    session.auth = cdas._session.auth
+    cdas._session = session
+
+    def resolve(dataset):
+        def request():
+            status, result = cdas.get_data_file(dataset, [], t0, t1)
+            if status in retry_status:
+                raise IOError('HTTP status ' + str(status))
+            if status != 200:
+                raise FetchError(dataset + ': HTTP status ' + str(status))
+            return (result or {}).get('FileDescription', [])
+        return _retry(request, retries, backoff, dataset)
+
+    def fetch(dataset, description):
+        name = os.path.basename(urlparse(description['Name']).path)
+        path = os.path.join(local_dir, dataset.lower(), name)
+        if reusable(path, description):
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _retry(lambda: download_file(session, description, path,
+                                     timeout=timeout),
+               retries, backoff, description['Name'])
+        return path, True
+
+    report = {d: {'urls': [], 'files': [], 'downloaded': 0, 'reused': 0,
+                  'error': None} for d in datasets}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        resolved = [(d, pool.submit(resolve, d)) for d in datasets]
+        fetches = []
+        for dataset, future in resolved:
+            try:
+                descriptions = future.result()
+            except Exception as err:
+                logging.error('fetch_datasets: ' + dataset + ' failed: '
+                              + str(err))
+                report[dataset]['error'] = str(err)
+                continue
+            report[dataset]['urls'] = [f['Name'] for f in descriptions]
+            if download:
+                fetches += [(dataset, pool.submit(fetch, dataset, f))
+                            for f in descriptions]
+        for dataset, future in fetches:
+            try:
+                path, downloaded = future.result()
+            except Exception as err:
+                logging.error('fetch_datasets: ' + dataset + ' failed: '
+                              + str(err))
+                report[dataset]['error'] = str(err)
+                continue
+            report[dataset]['files'].append(path)
+            report[dataset]['downloaded' if downloaded else 'reused'] += 1
+    session.close()
+    return report
@@ -0,0 +1,416 @@
+"""
+Memory-mapped columnar store of tplot variables.
+
+A tplot variable holds all its data in memory, and the analysis
+functions make more copies of the same size, so data of many days at a
+high cadence can be larger than the memory. A ColumnStore keeps each
+variable in a directory, with one .npy file per column (times, values),
+and the columns are memory-mapped: reading a time range, or changing a
+few samples in place, only touches the pages of the files that are
+used, and long variables can be processed one window of rows at a time
+(see window() and analysis.clean_spikes_batch.clean_spikes_store).
+
+Example
+-------
+    from pyspedas_examples.utilities.column_store import ColumnStore
+    store = ColumnStore('/tmp/columns')
+    store.from_tplot('thg_mag_ccnv')
+    x, y = store.get_data('thg_mag_ccnv',
+                          trange=['2007-03-23/10:00', '2007-03-23/11:00'])
+    store.store('thg_mag_ccnv', trange=['2007-03-23/10:00',
+                                        '2007-03-23/11:00'])
+
+temporary_store() returns a store in a directory of the session, which is
+removed at exit, and append_days() loads a variable into a store one day
+at a time.
+
+Notes
+-----
+As in the local store of data_provider, only the times, the values and
+the coordinate system are kept. store() loads the times of the stored
+range in memory (pytplot converts them), but the values of the tplot
+variable are a view of the memory-mapped file.
+"""
+import atexit
+import gc
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+meta_name = 'meta.json'
+
+day = 86400.0
+
+# Directory of the temporary stores, removed at exit.
+_temporary_directory = None
+
+
+class ColumnStore:
+    """
+    Directory of memory-mapped tplot variables.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the store. It is created if it does not exist.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, column):
+        return os.path.join(self.directory, name, column + '.npy')
+
+    def __contains__(self, name):
+        return os.path.exists(os.path.join(self.directory, name, meta_name))
+
+    def names(self):
+        """Return the names of the variables in the store."""
+        return sorted(n for n in os.listdir(self.directory) if n in self)
+
+    def coords(self, name):
+        """Return the coordinate system of a variable, or None."""
+        with open(os.path.join(self.directory, name, meta_name)) as f:
+            return json.load(f).get('coords')
+
+    def _header(self, name, column):
+        """Shape, dtype and data offset of a column file."""
+        with open(self._path(name, column), 'rb') as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            return header[0], header[2], f.tell()
+
+    def length(self, name):
+        """Return the number of samples of a variable."""
+        return self._header(name, 'x')[0][0]
+
+    def create(self, name, length, shape=(), dtype=np.float64, coords=None):
+        """
+        Create a variable, with zero times and values.
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        length: int
+            Number of samples.
+        shape: tuple of int, optional
+            Shape of each sample, e.g. (3,) for vectors. Default is ().
+        dtype: numpy dtype, optional
+            Type of the values. Default is float64.
+        coords: str, optional
+            Coordinate system.
+
+        Notes
+        -----
+        The files are sparse until they are written, e.g. with
+        window(name, start, stop, mode='r+').
+        """
+        os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+        for column, column_dtype, column_shape in [
+                ('x', np.float64, (length,)),
+                ('y', dtype, (length,) + tuple(shape))]:
+            a = np.lib.format.open_memmap(self._path(name, column),
+                                          mode='w+', dtype=column_dtype,
+                                          shape=column_shape)
+            del a
+        with open(os.path.join(self.directory, name, meta_name), 'w') as f:
+            json.dump({'coords': coords}, f)
+
+    def window(self, name, start=0, stop=None, mode='r'):
+        """
+        Memory-map a range of samples of a variable.
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        start, stop: int, optional
+            Range of samples. Default is all the samples.
+        mode: str, optional
+            'r' to read, or 'r+' to change the values in place.
+            Default is 'r'.
+
+        Returns
+        -------
+        tuple of arrays
+            Times and values. Only the pages that are accessed are read,
+            and they are released when the arrays are deleted.
+        """
+        columns = []
+        for column in ['x', 'y']:
+            shape, dtype, offset = self._header(name, column)
+            lo = min(max(start, 0), shape[0])
+            hi = shape[0] if stop is None else min(max(stop, lo), shape[0])
+            row = dtype.itemsize * int(np.prod(shape[1:], dtype=int))
+            if hi == lo:
+                columns.append(np.empty((0,) + shape[1:], dtype=dtype))
+                continue
+            columns.append(np.memmap(self._path(name, column), dtype=dtype,
+                                     mode=mode, offset=offset + lo * row,
+                                     shape=(hi - lo,) + shape[1:]))
+        return tuple(columns)
+
+    def time_index(self, name, trange):
+        """
+        Return the range of samples in a time range.
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        trange: list of str/float
+            Time range. Both ends are included.
+
+        Returns
+        -------
+        tuple of int
+            start, stop.
+        """
+        from pyspedas import time_double
+        t0, t1 = time_double(trange)
+        x, _ = self.window(name)
+        return (int(np.searchsorted(x, t0, side='left')),
+                int(np.searchsorted(x, t1, side='right')))
+
+    def get_data(self, name, trange=None, mode='r'):
+        """
+        Return the times and values of a variable, as get_data.
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        trange: list of str/float, optional
+            Time range. Default is all the samples.
+        mode: str, optional
+            'r' to read, or 'r+' to change the values in place.
+
+        Returns
+        -------
+        tuple of arrays
+            Memory-mapped times and values.
+        """
+        if trange is None:
+            return self.window(name, mode=mode)
+        return self.window(name, *self.time_index(name, trange), mode=mode)
+
+    def save(self, name, x, y, coords=None, chunk_size=2**20):
+        """
+        Save times and values as a variable.
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        x: array
+            Times, in seconds since 1970.
+        y: array
+            Values, with the length of x.
+        coords: str, optional
+            Coordinate system.
+        chunk_size: int, optional
+            Samples written at a time.
+        """
+        y = np.asarray(y)
+        self.create(name, len(x), y.shape[1:], y.dtype, coords=coords)
+        for start in range(0, len(x), chunk_size):
+            stop = start + chunk_size
+            xs, ys = self.window(name, start, stop, mode='r+')
+            xs[:] = x[start:stop]
+            ys[:] = y[start:stop]
+            xs.flush()
+            ys.flush()
+            del xs, ys
+
+    def append(self, name, x, y, coords=None):
+        """
+        Add samples at the end of a variable, or create it.
+
+        The samples are written at the end of the column files and their
+        lengths are updated, so a variable can be saved one file (e.g.
+        one day) at a time, while the data are loaded.
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        x: array
+            Times, in seconds since 1970.
+        y: array
+            Values, with the length of x.
+        coords: str, optional
+            Coordinate system, if the variable is created.
+        """
+        y = np.asarray(y)
+        if name not in self:
+            self.save(name, x, y, coords=coords)
+            return
+        columns = [('x', np.asarray(x)), ('y', y)]
+        for column, values in columns:
+            shape, dtype, offset = self._header(name, column)
+            if values.shape[1:] != tuple(shape[1:]):
+                logging.error('append: the samples of ' + name
+                              + ' have another shape.')
+                return
+        for column, values in columns:
+            shape, dtype, offset = self._header(name, column)
+            header = {'descr': np.lib.format.dtype_to_descr(dtype),
+                      'fortran_order': False,
+                      'shape': (shape[0] + len(values),) + tuple(shape[1:])}
+            with open(self._path(name, column), 'r+b') as f:
+                version = np.lib.format.read_magic(f)
+                buffer = io.BytesIO()
+                if version == (1, 0):
+                    np.lib.format.write_array_header_1_0(buffer, header)
+                else:
+                    np.lib.format.write_array_header_2_0(buffer, header)
+                if buffer.tell() != offset:
+                    # The headers written by NumPy have room for longer
+                    # shapes, so this only happens for other files.
+                    raise ValueError('append: cannot grow ' + name)
+                f.seek(0, os.SEEK_END)
+                f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+                f.seek(0)
+                f.write(buffer.getvalue())
+
+    def append_days(self, name, loader, trange, **kwargs):
+        """
+        Load a variable into the store one day at a time.
+
+        Each day is loaded with notplot=True, appended, and released
+        before the next one, so only one day is in memory at a time.
+
+        Parameters
+        ----------
+        name: str
+            Name of the variable, loaded and stored.
+        loader: callable
+            Loader, e.g. utilities.load.gmag. It is called with trange,
+            varnames=[name], notplot=True and kwargs, and returns a
+            dictionary of data dictionaries.
+        trange: list of str/float
+            Time range. All the days that it contains are loaded.
+        **kwargs:
+            Other parameters of the loader, like sites=['ccnv'].
+
+        Returns
+        -------
+        str
+            Name of the variable, or None if no data were loaded.
+        """
+        from pyspedas import time_double
+        t0, t1 = time_double(trange)
+        t0 = np.floor(t0 / day) * day
+        t1 = max(np.ceil(t1 / day) * day, t0 + day)
+        for start in np.arange(t0, t1, day):
+            loaded = loader(trange=[start, start + day], varnames=[name],
+                            notplot=True, **kwargs)
+            if loaded and name in loaded:
+                self.append(name, loaded[name]['x'], loaded[name]['y'])
+            del loaded
+        return name if name in self else None
+
+    def from_tplot(self, name, newname=None):
+        """
+        Save a tplot variable in the store.
+
+        Parameters
+        ----------
+        name: str
+            Name of the tplot variable.
+        newname: str, optional
+            Name in the store. Default is name.
+
+        Returns
+        -------
+        str
+            Name in the store, or None if the tplot variable does not
+            exist.
+        """
+        from pyspedas import get_coords, get_data
+        d = get_data(name)
+        if d is None:
+            logging.error('from_tplot: ' + name + ' does not exist.')
+            return None
+        newname = name if newname is None else newname
+        self.save(newname, d.times, d.y, coords=get_coords(name))
+        return newname
+
+    def store(self, name, trange=None, newname=None, mode='r+'):
+        """
+        Create a tplot variable with a view of the stored values.
+
+        store_data makes temporary copies of the data, so for long
+        variables a time range should be stored (e.g. the range to plot).
+
+        Parameters
+        ----------
+        name: str
+            Variable name.
+        trange: list of str/float, optional
+            Time range. Default is all the samples.
+        newname: str, optional
+            Name of the tplot variable. Default is name.
+        mode: str, optional
+            'r+' (the default) to write the changes of the values of the
+            tplot variable to the store, or 'r' for read-only values.
+
+        Returns
+        -------
+        str
+            Name of the tplot variable.
+        """
+        from pyspedas import data_quants, set_coords, store_data
+        from pyspedas import tplot_utilities
+        x, y = self.get_data(name, trange=trange, mode=mode)
+        newname = name if newname is None else newname
+        # store_data copies the values: give it zeros, and replace them
+        # by the view.
+        store_data(newname, data={'x': np.array(x),
+                                  'y': np.zeros(y.shape, dtype=y.dtype)})
+        quant = data_quants[newname]
+        quant.values = y
+        quant.attrs['plot_options']['yaxis_opt']['y_range'] = (
+            tplot_utilities.get_y_range(quant))
+        coords = self.coords(name)
+        if coords is not None:
+            set_coords(newname, coords)
+        return newname
+
+
+def _remove_temporary_stores():
+    """Delete the tplot variables mapping the stores, then the stores."""
+    from pyspedas import del_data
+    # Mapped files cannot be removed on Windows.
+    del_data()
+    gc.collect()
+    shutil.rmtree(_temporary_directory, ignore_errors=True)
+
+
+def temporary_store():
+    """
+    Return an empty ColumnStore, removed at exit.
+
+    The stores are in a temporary directory of the session. At exit, all
+    the tplot variables are deleted, as they can map the files, and the
+    directory is removed.
+
+    Returns
+    -------
+    ColumnStore
+    """
+    global _temporary_directory
+    if _temporary_directory is None:
+        _temporary_directory = tempfile.mkdtemp(prefix='column_store')
+        atexit.register(_remove_temporary_stores)
+    return ColumnStore(tempfile.mkdtemp(dir=_temporary_directory))
@@ -0,0 +1,311 @@
+"""
+Local data provider for running the examples without network access.
+
+A provider serves tplot variables from a directory containing one
+compressed .npz file per variable and a catalog.json file describing them.
+When a provider is active, the loaders in pyspedas_examples.utilities.load
+read from it instead of downloading CDF files.
+
+A provider can be activated with set_data_provider(), or by pointing the
+environment variable PYSPEDAS_EXAMPLES_DATA to a store directory.
+
+Notes
+-----
+The catalog maps each variable name to its loader (e.g. 'state', 'gmag')
+and to optional selection keys ('probe', 'site', 'datatype'), the
+coordinate system, and whether it is support data.
+"""
+import json
+import os
+
+import numpy as np
+
+catalog_name = 'catalog.json'
+
+_provider = None
+
+
+class LocalProvider:
+    """
+    Serve tplot variables from a local store directory.
+
+    Parameters
+    ----------
+    path: str
+        Directory containing catalog.json and the .npz variable files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, catalog_name)) as f:
+            self.catalog = json.load(f)
+
+    def variables(self):
+        """Return the names of all variables in the store."""
+        return sorted(self.catalog['variables'])
+
+    def gmag_list(self, group='all'):
+        """Return the GMAG sites of a group, as gmag_list does."""
+        groups = self.catalog.get('gmag_groups', {})
+        group = group.lower()
+        if group in ['all', '*', '']:
+            sites = set()
+            for s in groups.values():
+                sites.update(s)
+            return sorted(sites)
+        return list(groups.get(group, []))
+
+    def select(self, loader, varnames=None, get_support_data=False, **keys):
+        """
+        Find the catalog variables requested from a loader.
+
+        Parameters
+        ----------
+        loader: str
+            Loader name, e.g. 'state', 'gmag', 'fgm'.
+        varnames: list of str, optional
+            Load only these variables.
+        get_support_data: bool, optional
+            Include support data if varnames is not given.
+        **keys:
+            Selection keys, like probe='a' or sites=['ccnv'].
+            A key matches if it is None or '*', or if it contains the
+            value stored in the catalog.
+
+        Returns
+        -------
+        list of str
+            Names of the matching variables.
+        """
+        names = []
+        for name, entry in sorted(self.catalog['variables'].items()):
+            if entry.get('loader') != loader:
+                continue
+            if varnames:
+                if name not in varnames:
+                    # The state loader also creates the corrected spin axis
+                    # variables when the uncorrected ones are loaded.
+                    if not (name.endswith('_corrected')
+                            and name[:-10] in varnames):
+                        continue
+            elif entry.get('support', False) and not get_support_data:
+                continue
+            if not all(_key_match(value, entry.get(key))
+                       for key, value in keys.items()):
+                continue
+            names.append(name)
+        return names
+
+    def load(self, loader, trange, varnames=None, get_support_data=False,
+             time_clip=False, notplot=False, **keys):
+        """
+        Load variables into pytplot.
+
+        Parameters
+        ----------
+        loader: str
+            Loader name, e.g. 'state', 'gmag', 'fgm'.
+        trange: list of str/float
+            Time range. Whole days are loaded unless time_clip is set,
+            in the same way as the pyspedas loaders load daily files.
+        varnames: list of str, optional
+            Load only these variables.
+        get_support_data: bool, optional
+            Include support data if varnames is not given.
+        time_clip: bool, optional
+            Clip the data to trange.
+        notplot: bool, optional
+            Return the data in a dictionary instead of
+            storing them in tplot variables.
+        **keys:
+            Selection keys, like probe='a' or site=['ccnv'].
+
+        Returns
+        -------
+        list of str
+            Names of the loaded tplot variables.
+            If notplot is set, a dictionary of data dictionaries
+            ({'x': times, 'y': data, ...}) for each variable.
+        """
+        from pyspedas import store_data, set_coords, time_double
+
+        t0, t1 = time_double(trange)
+        if not time_clip:
+            day = 86400.0
+            t0 = np.floor(t0 / day) * day
+            t1 = np.ceil(t1 / day) * day
+            if t1 <= t0:
+                t1 = t0 + day
+
+        loaded = {} if notplot else []
+        for name in self.select(loader, varnames=varnames,
+                                get_support_data=get_support_data, **keys):
+            entry = self.catalog['variables'][name]
+            with np.load(os.path.join(self.path, name + '.npz')) as f:
+                x = f['x']
+                i0, i1 = np.searchsorted(x, [t0, t1], side='left')
+                if time_clip:
+                    i1 = np.searchsorted(x, t1, side='right')
+                if i1 <= i0:
+                    continue
+                data = {'x': x[i0:i1], 'y': f['y'][i0:i1]}
+                if 'v' in f:
+                    v = f['v']
+                    data['v'] = v[i0:i1] if v.ndim > 1 else v
+            if notplot:
+                loaded[name] = data
+                continue
+            store_data(name, data=data)
+            if entry.get('coord') is not None:
+                set_coords(name, entry['coord'])
+            loaded.append(name)
+
+        return loaded
+
+
+def _key_match(requested, stored):
+    """Check a selection key against the value stored in the catalog."""
+    if requested is None or stored is None:
+        return True
+    if isinstance(requested, str):
+        requested = [requested]
+    requested = [str(r).lower() for r in requested]
+    return '*' in requested or str(stored).lower() in requested
+
+
+def save_variable(path, name, x, y, v=None, loader=None, coord=None,
+                  support=False, dtype=None, compressed=True, **keys):
+    """
+    Add a variable to a local store.
+
+    Parameters
+    ----------
+    path: str
+        Store directory. It is created if it does not exist.
+    name: str
+        Name of the tplot variable.
+    x: array of float
+        Unix times.
+    y: array
+        Data values.
+    v: array, optional
+        Spectrogram bins.
+    loader: str, optional
+        Loader that serves the variable, e.g. 'state'.
+    coord: str, optional
+        Coordinate system.
+    support: bool, optional
+        True for support data.
+    dtype: numpy dtype, optional
+        Store the data values with this type, e.g. np.float32,
+        to make the store smaller.
+    compressed: bool, optional
+        Compress the .npz file. Default is True.
+    **keys:
+        Selection keys, like probe='a' or site='ccnv'.
+    """
+    arrays = {'x': np.asarray(x, dtype=np.float64),
+              'y': np.asarray(y, dtype=dtype)}
+    if v is not None:
+        arrays['v'] = np.asarray(v, dtype=dtype)
+    os.makedirs(path, exist_ok=True)
+    save = np.savez_compressed if compressed else np.savez
+    save(os.path.join(path, name + '.npz'), **arrays)
+
+    entry = {'loader': loader, 'coord': coord, 'support': support}
+    entry.update(keys)
+    catalog = _read_catalog(path)
+    catalog['variables'][name] = entry
+    _write_catalog(path, catalog)
+
+
+def save_gmag_group(path, group, sites):
+    """Add a GMAG group, used by gmag_list, to a local store."""
+    catalog = _read_catalog(path)
+    catalog.setdefault('gmag_groups', {})[group.lower()] = list(sites)
+    _write_catalog(path, catalog)
+
+
+def save_generator(path, generator):
+    """Record what created a local store, e.g. a version of its data."""
+    catalog = _read_catalog(path)
+    catalog['generator'] = generator
+    _write_catalog(path, catalog)
+
+
+def store_generator(path):
+    """Return the generator recorded in a local store, or None."""
+    try:
+        return _read_catalog(path).get('generator')
+    except (OSError, ValueError):
+        return None
+
+
+def record(names, path, loader, **keys):
+    """
+    Save tplot variables that are currently loaded to a local store.
+
+    Parameters
+    ----------
+    names: str/list of str
+        Names of tplot variables.
+    path: str
+        Store directory.
+    loader: str
+        Loader that serves the variables, e.g. 'state'.
+    **keys:
+        Selection keys, like probe='a'.
+    """
+    from pyspedas import get_data, get_coords, tnames
+
+    for name in tnames(names):
+        d = get_data(name)
+        v = d.v if 'v' in d._fields else None
+        save_variable(path, name, d.times, d.y, v=v, loader=loader,
+                      coord=get_coords(name), **keys)
+
+
+def _read_catalog(path):
+    fname = os.path.join(path, catalog_name)
+    if not os.path.exists(fname):
+        return {'variables': {}}
+    with open(fname) as f:
+        return json.load(f)
+
+
+def _write_catalog(path, catalog):
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, catalog_name), 'w') as f:
+        json.dump(catalog, f, indent=1, sort_keys=True)
+
+
+def set_data_provider(provider):
+    """
+    Set the provider used by the loaders.
+
+    Parameters
+    ----------
+    provider: LocalProvider/str/None
+        A provider, the path of a store directory,
+        or None to download data from the remote servers.
+    """
+    global _provider
+    if isinstance(provider, str):
+        provider = LocalProvider(provider)
+    _provider = provider
+
+
+def get_data_provider():
+    """
+    Return the active provider.
+
+    Returns
+    -------
+    LocalProvider/None
+        The provider set by set_data_provider, or a provider for the
+        directory in PYSPEDAS_EXAMPLES_DATA, or None if neither is set.
+    """
+    global _provider
+    if _provider is None and os.environ.get('PYSPEDAS_EXAMPLES_DATA'):
+        _provider = LocalProvider(os.environ['PYSPEDAS_EXAMPLES_DATA'])
+    return _provider
@@ -0,0 +1,244 @@
+"""
+Lazy views of tplot variables, for derived panels.
+
+A derived variable, like a component of a vector or a change of units,
+is usually made with get_data, a NumPy operation and store_data, which
+create several new arrays of the size of the data, and a new xarray
+object, even if the variable is never plotted. store_view only records
+the parent variable, the component and the scaling: the values are a
+view of the parent's buffer (for a component) or are computed (for a
+scaling) when they are asked for with view_data, and the tplot variable
+is only created by materialize, or by tplot_views before a plot.
+
+Example
+-------
+    from pyspedas_examples.utilities.derived import store_view, tplot_views
+    store_view('tha_position', 'tha_pos', scale=1e-3,
+               options={'ysubtitle': '[km]'})
+    store_view('tha_pos_z', 'tha_pos', component=2)
+    tplot_views(['tha_pos', 'tha_position', 'tha_pos_z'])
+
+Notes
+-----
+The views read the parent when they are used, so changes of the parent
+data are seen until the view is materialized. A materialized view is a
+normal tplot variable, and is removed from the views. A view is also
+dropped when its parent is deleted or replaced (e.g. loaded again), or
+when a tplot variable of the same name is stored, so that it does not
+overwrite newer data. clear_views removes views.
+"""
+import logging
+
+_views = {}
+
+
+def _create_time(name):
+    """Creation time of a tplot variable, or None if it does not exist."""
+    from pyspedas import data_quants
+    quant = data_quants.get(name)
+    if quant is None:
+        return None
+    return quant.attrs['plot_options'].get('create_time')
+
+
+class DerivedView:
+    """
+    Component and scaling of a tplot variable: y[:, component] * scale
+    + offset.
+
+    Parameters
+    ----------
+    parent: str
+        Name of the parent tplot variable.
+    component: int, optional
+        Component of the parent values. Default is all of them.
+    scale: float, optional
+        Factor applied to the values. Default is 1.
+    offset: float, optional
+        Value added after the scaling. Default is 0.
+    options: dict, optional
+        tplot options of the variable, set when it is materialized.
+    name: str, optional
+        Name of the view. A tplot variable of this name that is created
+        after the view makes it stale.
+    """
+
+    def __init__(self, parent, component=None, scale=1.0, offset=0.0,
+                 options=None, name=None):
+        self.parent = parent
+        self.component = component
+        self.scale = scale
+        self.offset = offset
+        self.options = dict(options or {})
+        self.name = name
+        self._parent_time = _create_time(parent)
+        self._time = None if name is None else _create_time(name)
+
+    def stale(self):
+        """
+        Return True if the parent was deleted or replaced, or if a tplot
+        variable of the name of the view was stored, since the view was
+        made.
+        """
+        if _create_time(self.parent) != self._parent_time:
+            return True
+        return (self.name is not None
+                and _create_time(self.name) != self._time)
+
+    def get_data(self):
+        """
+        Return the times and values of the view, as get_data.
+
+        Returns
+        -------
+        tuple of arrays
+            Times and values, or None if the parent does not exist.
+            Without scaling, the values are a view of the parent buffer.
+        """
+        from pyspedas import get_data
+        d = get_data(self.parent)
+        if d is None:
+            return None
+        y = d[1]
+        if self.component is not None:
+            y = y[:, self.component]
+        if self.scale != 1.0:
+            y = y * self.scale
+        if self.offset != 0.0:
+            y = y + self.offset
+        return d[0], y
+
+
+def store_view(name, parent, component=None, scale=1.0, offset=0.0,
+               options=None):
+    """
+    Record a derived variable, without creating it.
+
+    Parameters
+    ----------
+    name: str
+        Name of the derived variable.
+    parent: str
+        Name of the parent tplot variable.
+    component: int, optional
+        Component of the parent values. Default is all of them.
+    scale: float, optional
+        Factor applied to the values. Default is 1.
+    offset: float, optional
+        Value added after the scaling. Default is 0.
+    options: dict, optional
+        tplot options of the variable, like {'ytitle': 'Position'}.
+
+    Returns
+    -------
+    str
+        Name of the derived variable.
+    """
+    _views[name] = DerivedView(parent, component=component, scale=scale,
+                               offset=offset, options=options, name=name)
+    return name
+
+
+def _drop_stale():
+    """Remove the views whose parent or name was stored again."""
+    for name in [n for n, view in _views.items() if view.stale()]:
+        del _views[name]
+
+
+def clear_views(names=None):
+    """
+    Remove views, without creating their tplot variables.
+
+    Parameters
+    ----------
+    names: str/list of str, optional
+        Names of the views. Default is all the views.
+    """
+    if names is None:
+        _views.clear()
+        return
+    if isinstance(names, str):
+        names = [names]
+    for name in names:
+        _views.pop(name, None)
+
+
+def views():
+    """Return the names of the views that are not materialized."""
+    _drop_stale()
+    return sorted(_views)
+
+
+def view_data(name):
+    """
+    Return the times and values of a view, or of a tplot variable.
+
+    Parameters
+    ----------
+    name: str
+        Name of a view, or of a tplot variable.
+
+    Returns
+    -------
+    tuple of arrays
+        Times and values, as get_data, or None.
+    """
+    from pyspedas import get_data
+    _drop_stale()
+    if name in _views:
+        return _views[name].get_data()
+    return get_data(name)
+
+
+def materialize(names=None):
+    """
+    Create the tplot variables of views.
+
+    Parameters
+    ----------
+    names: str/list of str, optional
+        Names of the views. Other names are ignored.
+        Default is all the views.
+
+    Returns
+    -------
+    list of str
+        Names of the tplot variables created.
+    """
+    from pyspedas import options, store_data
+    _drop_stale()
+    if names is None:
+        names = views()
+    elif isinstance(names, str):
+        names = [names]
+    created = []
+    for name in names:
+        view = _views.get(name)
+        if view is None:
+            continue
+        d = view.get_data()
+        if d is None:
+            logging.error('materialize: ' + view.parent + ' does not exist.')
+            continue
+        store_data(name, data={'x': d[0], 'y': d[1]})
+        for option, value in view.options.items():
+            options(name, option, value)
+        del _views[name]
+        created.append(name)
+    return created
+
+
+def tplot_views(names, **kwargs):
+    """
+    Plot tplot variables, after materializing the views among them.
+
+    Parameters
+    ----------
+    names: str/list of str
+        Names of tplot variables and views.
+    **kwargs:
+        Other parameters of tplot.
+    """
+    from pyspedas import tplot
+    materialize(names)
+    return tplot(names, **kwargs)
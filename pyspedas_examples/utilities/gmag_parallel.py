@@ -0,0 +1,109 @@
+"""
+Load and detrend many GMAG stations in parallel.
+
+Each station is loaded (with notplot=True) and detrended in a bounded
+pool of worker threads. Downloading and reading the files of different
+stations overlap, and the NumPy work releases the GIL. The results are
+stored in tplot variables by the calling thread, in the order of the
+requested sites, so the tplot store is never modified concurrently.
+
+Notes
+-----
+Variables loaded with notplot=True do not keep the CDF metadata.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pyspedas_examples.analysis.median import subtract_average_data
+
+from .load import gmag
+
+
+def _load_site(site, trange, subtract, median, suffix):
+    """Load and detrend one station, in a worker thread."""
+    t0 = time.perf_counter()
+    tables = gmag(sites=site, trange=trange, notplot=True)
+    t1 = time.perf_counter()
+    if not tables:
+        raise RuntimeError('No data loaded for site ' + site)
+    detrended = {}
+    if subtract:
+        for name, data in tables.items():
+            detrended[name + suffix] = dict(data)
+            detrended[name + suffix]['y'] = subtract_average_data(
+                data['y'], median=median)
+    t2 = time.perf_counter()
+    return tables, detrended, t1 - t0, t2 - t1
+
+
+def gmag_parallel(sites, trange, workers=8, subtract=True, median=False,
+                  suffix=None, no_subtract=['idx']):
+    """
+    Load GMAG stations in parallel and subtract their average.
+
+    Parameters
+    ----------
+    sites: str/list of str
+        GMAG sites, e.g. gmag_list('epo'), or 'idx' for the AE indices.
+    trange: list of str
+        Time range.
+    workers: int, optional
+        Maximum number of stations processed at the same time.
+        Default is 8.
+    subtract: bool, optional
+        Store a copy of each variable with the average subtracted,
+        like pyspedas.subtract_average. Default is True.
+    median: bool, optional
+        Subtract the median instead of the mean.
+    suffix: str, optional
+        Suffix of the detrended variables.
+        Default is '-m' for the median and '-d' for the mean.
+    no_subtract: list of str, optional
+        Sites that are loaded but not detrended. Default is ['idx'].
+
+    Returns
+    -------
+    dict
+        Report for each site, with the keys:
+        'variables' (list of tplot variables created),
+        'load_time' and 'subtract_time' (seconds in the worker),
+        'error' (None, or the error message if the site failed).
+    """
+    if isinstance(sites, str):
+        sites = [sites]
+    if suffix is None:
+        suffix = '-m' if median else '-d'
+
+    from pyspedas import store_data
+
+    report = {}
+    loaded = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(site, pool.submit(_load_site, site, trange,
+                                      subtract and site not in no_subtract,
+                                      median, suffix))
+                   for site in sites]
+        for site, future in futures:
+            try:
+                tables, detrended, load_time, subtract_time = future.result()
+            except Exception as err:
+                logging.error('gmag_parallel: ' + site + ' failed: '
+                              + str(err))
+                report[site] = {'variables': [], 'load_time': None,
+                                'subtract_time': None, 'error': str(err)}
+                continue
+            loaded.append((tables, detrended))
+            report[site] = {'variables': list(tables) + list(detrended),
+                            'load_time': load_time,
+                            'subtract_time': subtract_time, 'error': None}
+
+    # Same order as loading all sites and then calling subtract_average.
+    for tables, _ in loaded:
+        for name, data in tables.items():
+            store_data(name, data=data)
+    for _, detrended in loaded:
+        for name, data in detrended.items():
+            store_data(name, data=data)
+
+    return report
@@ -0,0 +1,100 @@
+"""
+Data loaders used by the examples.
+
+Each loader calls the pyspedas loader with the same name, unless a local
+data provider is active (see data_provider.py), in which case the data
+are loaded from the local store. If a load cache is active (see
+load_cache.py), the THEMIS state, FGM and SST loads are served from it.
+"""
+from .data_provider import get_data_provider
+from .load_cache import cached_loader
+
+
+@cached_loader('state')
+def state(trange=['2007-03-23', '2007-03-24'], probe='c', varnames=[],
+          get_support_data=False, time_clip=False, **kwargs):
+    """Load THEMIS state data, see pyspedas.projects.themis.state."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.themis import state as load
+        return load(trange=trange, probe=probe, varnames=varnames,
+                    get_support_data=get_support_data, time_clip=time_clip,
+                    **kwargs)
+    return provider.load('state', trange, varnames=varnames,
+                         get_support_data=get_support_data,
+                         time_clip=time_clip, probe=probe)
+
+
+@cached_loader('fgm')
+def fgm(trange=['2007-03-23', '2007-03-24'], probe='c', varnames=[],
+        get_support_data=False, time_clip=False, **kwargs):
+    """Load THEMIS FGM data, see pyspedas.projects.themis.fgm."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.themis import fgm as load
+        return load(trange=trange, probe=probe, varnames=varnames,
+                    get_support_data=get_support_data, time_clip=time_clip,
+                    **kwargs)
+    return provider.load('fgm', trange, varnames=varnames,
+                         get_support_data=get_support_data,
+                         time_clip=time_clip, probe=probe)
+
+
+@cached_loader('sst')
+def sst(trange=['2007-03-23', '2007-03-24'], probe='c', varnames=[],
+        get_support_data=False, time_clip=False, **kwargs):
+    """Load THEMIS SST data, see pyspedas.projects.themis.sst."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.themis import sst as load
+        return load(trange=trange, probe=probe, varnames=varnames,
+                    get_support_data=get_support_data, time_clip=time_clip,
+                    **kwargs)
+    return provider.load('sst', trange, varnames=varnames,
+                         get_support_data=get_support_data,
+                         time_clip=time_clip, probe=probe)
+
+
+def gmag(trange=['2007-03-23', '2007-03-24'], sites=None, varnames=[],
+         time_clip=False, notplot=False, **kwargs):
+    """Load THEMIS GMAG data, see pyspedas.projects.themis.gmag."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.themis import gmag as load
+        return load(trange=trange, sites=sites, varnames=varnames,
+                    time_clip=time_clip, notplot=notplot, **kwargs)
+    return provider.load('gmag', trange, varnames=varnames,
+                         time_clip=time_clip, notplot=notplot, site=sites)
+
+
+def gmag_list(group='all'):
+    """Return GMAG station names, see pyspedas gmag_list."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.themis.ground.gmag import gmag_list as glist
+        return glist(group)
+    return provider.gmag_list(group)
+
+
+def mms_fpi(trange=['2015-10-16', '2015-10-17'], probe='1', datatype='*',
+            varnames=[], time_clip=False, **kwargs):
+    """Load MMS FPI data, see pyspedas.projects.mms.fpi."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.mms import fpi as load
+        return load(trange=trange, probe=probe, datatype=datatype,
+                    varnames=varnames, time_clip=time_clip, **kwargs)
+    return provider.load('mms_fpi', trange, varnames=varnames,
+                         time_clip=time_clip, probe=probe, datatype=datatype)
+
+
+def mms_edp(trange=['2015-10-16', '2015-10-17'], probe='1', datatype='*',
+            varnames=[], time_clip=False, **kwargs):
+    """Load MMS EDP data, see pyspedas.projects.mms.edp."""
+    provider = get_data_provider()
+    if provider is None:
+        from pyspedas.projects.mms import edp as load
+        return load(trange=trange, probe=probe, datatype=datatype,
+                    varnames=varnames, time_clip=time_clip, **kwargs)
+    return provider.load('mms_edp', trange, varnames=varnames,
+                         time_clip=time_clip, probe=probe, datatype=datatype)
@@ -0,0 +1,416 @@
+"""
+Local-first cache of the tplot variables loaded by the examples.
+
+The examples load the same THEMIS data (often the same days) again and
+again, and each load decodes the CDF files (or the .npz files of the
+local store). With a LoadCache, the variables of each load are saved in
+a directory, one .npy file per column (times, values, bins), and a later
+load of the same variables for the same days, or for a part of them, is
+served from these files without decoding anything. The days saved by
+separate loads (e.g. one day at a time) are combined. Several processes
+can share the directory.
+
+A cache can be activated with set_load_cache(), or by pointing the
+environment variable PYSPEDAS_EXAMPLES_CACHE to a directory (the cache
+is then in its loads subdirectory).
+
+Notes
+-----
+Whole days are loaded and cached, as the loaders load daily files, and
+the requested time range is cut from them with the rules of the local
+data provider. The metadata of the variables (plot options, units, CDF
+attributes) are saved with each segment, in a pickle file, and restored
+with the data. On a miss, the variables made by the loader are kept, and
+only cut to the requested times.
+
+The cache keys include the source of the data: the local store and the
+generator of its data if a data provider is active, else 'online'. The
+synthetic data of the tests are never served to an online load.
+
+Loads that return no variables (e.g. offline) are not cached. Cached
+data do not expire: use LoadCache.invalidate() to delete the segments of
+a load (e.g. after the files were reprocessed), or clear().
+A load of days that are only partly cached loads all the days again.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+import numpy as np
+
+from .data_provider import get_data_provider
+
+day = 86400.0
+
+_cache = None
+_cache_set = False
+
+
+def _day_range(trange, time_clip):
+    """Requested times, and the whole days that contain them."""
+    from pyspedas import time_double
+    t0, t1 = time_double(trange)
+    d0 = np.floor(t0 / day) * day
+    d1 = np.ceil(t1 / day) * day
+    if d1 <= d0:
+        d1 = d0 + day
+    if not time_clip:
+        t0, t1 = d0, d1
+    return t0, t1, d0, d1
+
+
+def _bounds(x, lo, hi, time_clip, t1):
+    """Indices of the times x in [lo, hi), or [lo, hi] if hi is t1."""
+    i0, i1 = np.searchsorted(x, [lo, hi], side='left')
+    if time_clip and hi == t1:
+        i1 = np.searchsorted(x, hi, side='right')
+    return i0, i1
+
+
+def _source():
+    """Source of the loads: the active local store, or 'online'."""
+    provider = get_data_provider()
+    if provider is None:
+        return 'online'
+    return {'store': os.path.abspath(provider.path),
+            'generator': provider.catalog.get('generator')}
+
+
+def _key(loader, varnames, get_support_data, keys):
+    """Cache key of a load."""
+    key = {'loader': loader, 'source': _source(),
+           'varnames': sorted(varnames or []),
+           'get_support_data': bool(get_support_data),
+           'keys': {k: v for k, v in keys.items() if v is not None}}
+    return json.loads(json.dumps(key, default=str))
+
+
+class LoadCache:
+    """
+    Cache of loaded tplot variables in a directory.
+
+    Parameters
+    ----------
+    directory: str
+        Directory of the cache. It is created if it does not exist.
+
+    Attributes
+    ----------
+    hits, misses: int
+        Loads served from the cache, and loads that were not.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """Dictionary of the cache statistics."""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self):
+        """Delete the cached variables and reset the statistics."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.hits = self.misses = 0
+
+    def _key_dir(self, loader, key):
+        name = hashlib.blake2b(json.dumps(key, sort_keys=True).encode(),
+                               digest_size=16).hexdigest()
+        return os.path.join(self.directory, loader, name)
+
+    def _segments(self, key_dir):
+        """Cached segments of a key: (start day, end day, path)."""
+        if not os.path.isdir(key_dir):
+            return []
+        segments = []
+        for segment in sorted(os.listdir(key_dir)):
+            try:
+                s0, s1 = [float(s) for s in segment.split('_')]
+            except ValueError:
+                continue
+            segments.append((s0, s1, os.path.join(key_dir, segment)))
+        return segments
+
+    def _find(self, key_dir, d0, d1):
+        """
+        Cached segments that cover the days, or None.
+
+        Segments saved separately (e.g. adjacent days) are combined.
+        Returns a list of (path, start, end): the part of each segment
+        that is used.
+        """
+        segments = self._segments(key_dir)
+        chain = []
+        cursor = d0
+        while cursor < d1:
+            # The segment that covers the cursor and goes the furthest.
+            best = None
+            for s0, s1, path in segments:
+                if s0 <= cursor < s1 and (best is None or s1 > best[1]):
+                    best = (s0, s1, path)
+            if best is None:
+                return None
+            end = min(best[1], d1)
+            chain.append((best[2], cursor, end))
+            cursor = end
+        return chain
+
+    def _save(self, key_dir, d0, d1, names, key):
+        """Save loaded tplot variables as a segment."""
+        from pyspedas import get_coords, get_data
+        os.makedirs(key_dir, exist_ok=True)
+        # Write a temporary directory first, for concurrent readers.
+        tmp = tempfile.mkdtemp(dir=key_dir, prefix='.tmp')
+        coords = {}
+        attrs = {}
+        for name in names:
+            d = get_data(name)
+            if d is None:
+                continue
+            attrs[name] = get_data(name, metadata=True)
+            np.save(os.path.join(tmp, name + '.x.npy'),
+                    np.asarray(d.times, dtype=np.float64))
+            np.save(os.path.join(tmp, name + '.y.npy'), np.asarray(d.y))
+            if 'v' in d._fields:
+                np.save(os.path.join(tmp, name + '.v.npy'), np.asarray(d.v))
+            coords[name] = get_coords(name)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'key': key, 'names': list(coords), 'coords': coords},
+                      f, indent=1)
+        with open(os.path.join(tmp, 'attrs.pkl'), 'wb') as f:
+            pickle.dump(attrs, f)
+        segment = os.path.join(key_dir, '{:.0f}_{:.0f}'.format(d0, d1))
+        try:
+            os.rename(tmp, segment)
+        except OSError:
+            # Saved by another process in the meantime.
+            shutil.rmtree(tmp, ignore_errors=True)
+        return segment
+
+    def _serve(self, chain, t0, t1, time_clip, notplot):
+        """Store (or return) the variables of segments, cut to t0, t1."""
+        from pyspedas import set_coords, store_data
+        parts = {}
+        coords = {}
+        attrs = {}
+        for segment, start, end in chain:
+            with open(os.path.join(segment, 'meta.json')) as f:
+                meta = json.load(f)
+            try:
+                with open(os.path.join(segment, 'attrs.pkl'), 'rb') as f:
+                    segment_attrs = pickle.load(f)
+            except OSError:
+                # Segments saved without their metadata.
+                segment_attrs = {}
+            lo, hi = max(t0, start), min(t1, end)
+            for name in meta['names']:
+                path = os.path.join(segment, name)
+                x = np.load(path + '.x.npy', mmap_mode='r')
+                i0, i1 = _bounds(x, lo, hi, time_clip, t1)
+                if i1 <= i0:
+                    continue
+                y = np.load(path + '.y.npy', mmap_mode='r')
+                data = {'x': np.array(x[i0:i1]), 'y': np.array(y[i0:i1])}
+                if os.path.exists(path + '.v.npy'):
+                    v = np.load(path + '.v.npy')
+                    data['v'] = v[i0:i1] if v.ndim > 1 else v
+                parts.setdefault(name, []).append(data)
+                if coords.get(name) is None:
+                    coords[name] = meta['coords'].get(name)
+                if name not in attrs and name in segment_attrs:
+                    attrs[name] = segment_attrs[name]
+
+        loaded = {} if notplot else []
+        for name, datas in parts.items():
+            data = datas[0]
+            if len(datas) > 1:
+                data = {'x': np.concatenate([d['x'] for d in datas]),
+                        'y': np.concatenate([d['y'] for d in datas])}
+                if 'v' in datas[0]:
+                    v = datas[0]['v']
+                    data['v'] = (np.concatenate([d['v'] for d in datas])
+                                 if v.ndim > 1 else v)
+            if notplot:
+                loaded[name] = data
+                continue
+            store_data(name, data=data, attr_dict=attrs.get(name, {}))
+            if coords[name] is not None:
+                set_coords(name, coords[name])
+            loaded.append(name)
+        return loaded
+
+    def _clip(self, names, t0, t1, time_clip):
+        """Cut the variables made by the loader to t0, t1, as _serve."""
+        from pyspedas import del_data, get_data, store_data
+        loaded = []
+        for name in names:
+            d = get_data(name)
+            if d is None:
+                continue
+            x = np.asarray(d.times, dtype=np.float64)
+            i0, i1 = _bounds(x, t0, t1, time_clip, t1)
+            if i1 <= i0:
+                # As _serve, variables without data in t0, t1 are left out.
+                del_data(name)
+                continue
+            if i0 > 0 or i1 < len(x):
+                data = {'x': x[i0:i1], 'y': d.y[i0:i1]}
+                if 'v' in d._fields:
+                    data['v'] = d.v[i0:i1] if np.ndim(d.v) > 1 else d.v
+                store_data(name, data=data,
+                           attr_dict=get_data(name, metadata=True))
+            loaded.append(name)
+        return loaded
+
+    def invalidate(self, loader, trange=None, varnames=[],
+                   get_support_data=False, **keys):
+        """
+        Delete the cached segments of a load.
+
+        Parameters
+        ----------
+        loader: str
+            Loader name, e.g. 'state'.
+        trange: list of str/float, optional
+            Delete only the segments with days in this time range.
+            Default is all the segments of the load.
+        varnames, get_support_data, **keys:
+            Parameters of the load, as for load.
+
+        Returns
+        -------
+        int
+            Number of segments deleted.
+        """
+        key_dir = self._key_dir(loader, _key(loader, varnames,
+                                             get_support_data, keys))
+        deleted = 0
+        for s0, s1, path in self._segments(key_dir):
+            if trange is not None:
+                _, _, d0, d1 = _day_range(trange, False)
+                if s1 <= d0 or d1 <= s0:
+                    continue
+            shutil.rmtree(path, ignore_errors=True)
+            deleted += 1
+        return deleted
+
+    def load(self, loader, func, trange, varnames=[], get_support_data=False,
+             time_clip=False, notplot=False, **keys):
+        """
+        Load variables from the cache, or with func and cache them.
+
+        Parameters
+        ----------
+        loader: str
+            Loader name, e.g. 'state'.
+        func: callable
+            Loader, called with trange (whole days), varnames,
+            get_support_data, time_clip=False and keys on a miss.
+        trange: list of str/float
+            Time range.
+        varnames: list of str, optional
+            Load only these variables.
+        get_support_data: bool, optional
+            Include support data.
+        time_clip: bool, optional
+            Clip the data to trange.
+        notplot: bool, optional
+            Return the data in a dictionary instead of storing them.
+        **keys:
+            Other parameters of the loader, like probe='a'.
+
+        Returns
+        -------
+        list of str
+            Names of the loaded tplot variables, or a dictionary of data
+            dictionaries if notplot is set.
+        """
+        t0, t1, d0, d1 = _day_range(trange, time_clip)
+        key = _key(loader, varnames, get_support_data, keys)
+        key_dir = self._key_dir(loader, key)
+        chain = self._find(key_dir, d0, d1)
+        if chain is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            from pyspedas import time_string
+            names = func(trange=time_string([d0, d1]), varnames=varnames,
+                         get_support_data=get_support_data,
+                         time_clip=False, **keys)
+            if not names:
+                # A failed (e.g. offline) load is not cached.
+                return {} if notplot else []
+            chain = [(self._save(key_dir, d0, d1, names, key), d0, d1)]
+            if not notplot:
+                return self._clip(names, t0, t1, time_clip)
+        return self._serve(chain, t0, t1, time_clip, notplot)
+
+
+def cached_loader(name):
+    """
+    Decorator of a loader, to use the active LoadCache.
+
+    Parameters
+    ----------
+    name: str
+        Loader name, part of the cache key.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_load_cache()
+            if cache is None or kwargs.get('notplot'):
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            keys = dict(bound.arguments)
+            keys.update(keys.pop('kwargs', {}))
+            trange = keys.pop('trange')
+            return cache.load(name, func, trange, **keys)
+        return wrapper
+    return decorator
+
+
+def set_load_cache(cache):
+    """
+    Set the cache used by the loaders.
+
+    Parameters
+    ----------
+    cache: LoadCache/str/None
+        A cache, the path of a cache directory, or None for no cache.
+    """
+    global _cache, _cache_set
+    if isinstance(cache, str):
+        cache = LoadCache(cache)
+    _cache = cache
+    _cache_set = True
+
+
+def get_load_cache():
+    """
+    Return the active cache.
+
+    Returns
+    -------
+    LoadCache/None
+        The cache set by set_load_cache, or a cache in the directory of
+        PYSPEDAS_EXAMPLES_CACHE, or None.
+    """
+    global _cache, _cache_set
+    if not _cache_set:
+        _cache_set = True
+        root = os.environ.get('PYSPEDAS_EXAMPLES_CACHE')
+        if root:
+            _cache = LoadCache(os.path.join(root, 'loads'))
+    return _cache
@@ -0,0 +1,106 @@
+"""
+Least recently used cache of arrays, bounded in entries and in memory.
+
+The caches of the analysis functions (rotation matrices, model outputs,
+binned spectrograms) are subclasses of LRUCache, which only need to
+choose the limits and, if needed, what is done when a value is added.
+Their keys use time_fingerprint() for the arrays they depend on.
+"""
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    """
+    LRU cache of values with an nbytes attribute (e.g. numpy arrays).
+
+    Parameters
+    ----------
+    max_entries: int, optional
+        Maximum number of values kept. Default is 32.
+    max_bytes: int, optional
+        Maximum memory of the values kept, in bytes. Default is 256 MB.
+        Larger values are not cached.
+
+    Attributes
+    ----------
+    hits, misses, evictions: int
+        Cache statistics.
+    nbytes: int
+        Memory of the cached values, in bytes.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        """Fraction of the lookups found in the cache."""
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self):
+        """Dictionary of the cache statistics."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'hit_rate': self.hit_rate,
+                'entries': len(self), 'nbytes': self.nbytes}
+
+    def clear(self):
+        """Remove all the values and reset the statistics."""
+        self._entries.clear()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key):
+        """Value for a key, or None. Counts a hit or a miss."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Add a value, and evict the least recently used ones."""
+        if value.nbytes > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._entries[key] = value
+        self.nbytes += value.nbytes
+        while (len(self._entries) > self.max_entries
+               or self.nbytes > self.max_bytes):
+            _, old = self._entries.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+
+def time_fingerprint(time_in):
+    """
+    Fingerprint of a time array, used as a cache key.
+
+    Parameters
+    ----------
+    time_in: array of float
+        Unix times.
+
+    Returns
+    -------
+    tuple
+        Number of times and a hash of their values.
+    """
+    t = np.ascontiguousarray(time_in, dtype=np.float64)
+    return len(t), hashlib.blake2b(t.tobytes(), digest_size=16).hexdigest()
@@ -0,0 +1,39 @@
+"""
+Names of the tplot variables created by the analysis functions.
+
+The analysis functions take newname, suffix and overwrite parameters, as
+the pyspedas analysis functions, and resolve them with new_names().
+"""
+
+
+def new_names(old_names, newname=None, suffix='', overwrite=None):
+    """
+    Names of the variables created from old_names.
+
+    Parameters
+    ----------
+    old_names: list of str
+        Names of the input variables.
+    newname: str/list of str, optional
+        New names. They are ignored if there is not one for each input.
+    suffix: str, optional
+        Appended to the input names if newname is not given.
+    overwrite: optional
+        If not None, the input variables are replaced.
+
+    Returns
+    -------
+    list of str
+        One name for each input variable.
+    """
+    if overwrite is not None:
+        n_names = old_names
+    elif newname is None:
+        n_names = [s + suffix for s in old_names]
+    else:
+        n_names = newname
+    if isinstance(n_names, str):
+        n_names = [n_names]
+    if len(n_names) != len(old_names):
+        n_names = [s + suffix for s in old_names]
+    return n_names
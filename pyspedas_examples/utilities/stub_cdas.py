@@ -0,0 +1,209 @@
+"""
+Local HTTP server standing in for the CDAS web services.
+
+It serves a small catalog (observatory groups and instrument types) with
+an ETag, answers conditional requests with 304 Not Modified, and waits a
+configurable time before each answer, to test and benchmark the CDAWeb
+clients without network access.
+
+Data requests (POST to datasets, as sent by CdasWs.get_data_file) get
+one fake CDF file per day of the time interval. The files are served
+under files/, with Range requests, and their content only depends on
+their name (see file_content). Failures can be injected: the first
+requests of each file can get 503, or be cut after some bytes.
+
+Example
+-------
+    from pyspedas_examples.utilities.stub_cdas import start_stub_cdas
+    from pyspedas_examples.utilities.cdas_cache import cached_cdas
+    server = start_stub_cdas(delay=0.05)
+    cdas = cached_cdas(endpoint=server.url)
+    print(cdas.get_observatory_groups())
+    server.shutdown()
+"""
+import hashlib
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+catalog = {
+    'observatoryGroups': '<ObservatoryGroupDescription><Name>ARTEMIS'
+                         '</Name><ObservatoryId>THB</ObservatoryId>'
+                         '</ObservatoryGroupDescription>',
+    'instrumentTypes': '<InstrumentTypeDescription><Name>Electric Fields '
+                       '(space)</Name></InstrumentTypeDescription>'}
+
+etag = '"v1"'
+
+last_modified = '2020-01-02T00:00:00.000Z'
+
+
+def file_names(dataset, start, end):
+    """Names of the daily files of a dataset between two ISO times."""
+    day = datetime.strptime(start[:10], '%Y-%m-%d')
+    last = datetime.strptime(end[:10], '%Y-%m-%d')
+    names = []
+    while day <= last:
+        names.append(dataset.lower() + '_' + day.strftime('%Y%m%d')
+                     + '_v01.cdf')
+        day += timedelta(days=1)
+    return names
+
+
+def file_content(name, size):
+    """Content of a fake file: bytes derived from its name."""
+    block = hashlib.sha512(name.encode()).digest()
+    return (block * (size // len(block) + 1))[:size]
+
+
+class StubCdasHandler(BaseHTTPRequestHandler):
+    """Answer the catalog, data and file requests."""
+
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are written separately.
+    disable_nagle_algorithm = True
+
+    def _send(self, status, body=b'', headers={}):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self):
+        """Record the request, and return how many times it was made."""
+        server = self.server
+        with server.lock:
+            server.requests.append(self.command + ' ' + self.path)
+            server.counts[self.path] = server.counts.get(self.path, 0) + 1
+            return server.counts[self.path]
+
+    def do_GET(self):
+        server = self.server
+        count = self._count()
+        time.sleep(server.delay)
+        if self.path.startswith('/files/'):
+            self._send_file(self.path[len('/files/'):], count)
+            return
+        name = self.path.strip('/').split('?')[0]
+        if name not in catalog:
+            self._send(404)
+            return
+        if self.headers.get('If-None-Match') == etag:
+            self._send(304)
+            return
+        text = ('<Response xmlns="http://cdaweb.gsfc.nasa.gov/schema">'
+                + catalog[name] + '</Response>').encode()
+        self._send(200, text, {'Content-Type': 'application/xml',
+                               'ETag': etag})
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._count()
+        time.sleep(server.delay)
+        text = body.decode()
+        dataset = re.search('<DatasetId>(.*?)</DatasetId>', text)
+        start = re.search('<Start>(.*?)</Start>', text)
+        end = re.search('<End>(.*?)</End>', text)
+        if not self.path.endswith('/datasets') or None in (dataset, start,
+                                                           end):
+            self._send(400)
+            return
+        files = ''
+        for name in file_names(dataset.group(1), start.group(1),
+                               end.group(1)):
+            files += ('<FileDescription><Name>' + server.url + 'files/'
+                      + name + '</Name><MimeType>application/x-cdf'
+                      '</MimeType><StartTime>' + start.group(1)
+                      + '</StartTime><EndTime>' + end.group(1)
+                      + '</EndTime><Length>' + str(server.file_size)
+                      + '</Length><LastModified>' + last_modified
+                      + '</LastModified></FileDescription>')
+        self._send(200, ('<DataResult xmlns="http://cdaweb.gsfc.nasa.gov/'
+                         'schema">' + files + '</DataResult>').encode(),
+                   {'Content-Type': 'application/xml'})
+
+    def _send_file(self, name, count):
+        server = self.server
+        if count <= server.fail_first:
+            self._send(503)
+            return
+        content = file_content(name, server.file_size)
+        start = 0
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+        if start >= len(content) and start > 0:
+            self._send(416)
+            return
+        body = content[start:]
+        self.send_response(206 if start else 200)
+        self.send_header('Content-Type', 'application/x-cdf')
+        self.send_header('Content-Length', str(len(body)))
+        if start:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(
+                start, len(content) - 1, len(content)))
+        self.end_headers()
+        if count <= server.fail_first + server.cut_first:
+            # Cut the connection in the middle of the file.
+            self.wfile.write(body[:server.cut_after])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubCdasServer(ThreadingHTTPServer):
+    """Threaded server, accepting many connections at the same time."""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def start_stub_cdas(delay=0.0, file_size=4096, fail_first=0, cut_first=0,
+                    cut_after=1000, handler=StubCdasHandler):
+    """
+    Start a stub CDAS server in a background thread.
+
+    Parameters
+    ----------
+    delay: float, optional
+        Seconds to wait before each answer. Default is 0.
+    file_size: int, optional
+        Size of the fake CDF files, in bytes. Default is 4096.
+    fail_first: int, optional
+        Number of requests of each file answered with 503. Default is 0.
+    cut_first: int, optional
+        Number of the next requests of each file cut after cut_after
+        bytes. Default is 0.
+    cut_after: int, optional
+        Bytes sent before cutting a request. Default is 1000.
+    handler: class, optional
+        Request handler. Default is StubCdasHandler.
+
+    Returns
+    -------
+    StubCdasServer
+        The server. Its url attribute is the endpoint to give to the
+        clients, and its requests attribute lists the requests (method
+        and path). Stop it with shutdown() and server_close().
+    """
+    server = StubCdasServer(('127.0.0.1', 0), handler)
+    server.delay = delay
+    server.file_size = file_size
+    server.fail_first = fail_first
+    server.cut_first = cut_first
+    server.cut_after = cut_after
+    server.requests = []
+    server.counts = {}
+    server.lock = threading.Lock()
+    server.url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
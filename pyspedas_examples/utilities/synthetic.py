@@ -0,0 +1,287 @@
+"""
+Create a local store with synthetic data for the examples.
+
+The store contains every tplot variable that the examples load,
+for the days that the examples use, so that they can run without network
+access. The values are synthetic but have realistic cadence, shape and
+magnitude.
+
+Example
+-------
+    from pyspedas_examples.utilities.synthetic import make_synthetic_store
+    from pyspedas_examples.utilities.data_provider import set_data_provider
+    make_synthetic_store('/tmp/pyspedas_examples_data')
+    set_data_provider('/tmp/pyspedas_examples_data')
+"""
+import os
+import shutil
+import tempfile
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .data_provider import (save_generator, save_gmag_group, save_variable,
+                            store_generator)
+
+# Version of the synthetic data. Increase it when the data generated by
+# the add_* functions change, so that older stores are created again.
+generator_version = 1
+
+day = 86400.0
+earth_radius = 6378.0
+
+# GMAG sites of the EPO group (as returned by gmag_list('epo')).
+epo_sites = ['bmls', 'ccnv', 'drby', 'fyts', 'hots', 'loys', 'pgeo', 'pine',
+             'ptrs', 'rmus', 'swno', 'ukia']
+
+
+def day_times(date, cadence):
+    """Return the times of one day, starting at 00:00 UTC of date."""
+    t0 = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return t0.timestamp() + np.arange(0.0, day, cadence)
+
+
+def _rng(name, date):
+    """Random generator with a fixed seed for each variable and day."""
+    return np.random.default_rng(zlib.crc32((name + date).encode()))
+
+
+def orbit(t, perigee=1.5, apogee=12.0, period=day, phase=0.0):
+    """
+    Position (km) and velocity (km/s) on an inclined elliptical orbit.
+
+    The orbital angle grows uniformly with time, which is enough for
+    synthetic data.
+    """
+    a = (perigee + apogee) / 2.0 * earth_radius
+    e = (apogee - perigee) / (apogee + perigee)
+    b = a * np.sqrt(1.0 - e * e)
+    w = 2.0 * np.pi / period
+    th = w * t + phase
+    x = a * (np.cos(th) - e)
+    y = b * np.sin(th)
+    vx = -a * w * np.sin(th)
+    vy = b * w * np.cos(th)
+    inc = np.radians(10.0)
+    pos = np.column_stack((x, y * np.cos(inc), y * np.sin(inc)))
+    vel = np.column_stack((vx, vy * np.cos(inc), vy * np.sin(inc)))
+    return pos, vel
+
+
+def add_state(store, probe, dates, phase=0.0, cadence=60.0):
+    """Position, velocity and spin axis for a THEMIS probe."""
+    for date in dates:
+        t = day_times(date, cadence)
+        prefix = 'th' + probe + '_'
+        pos, vel = orbit(t, phase=phase)
+        keys = {'loader': 'state', 'probe': probe}
+        _save(store, prefix + 'pos', t, pos, coord='gei', **keys)
+        _save(store, prefix + 'vel', t, vel, coord='gei', **keys)
+        # The spin axis points close to the ecliptic pole.
+        rng = _rng(prefix + 'spin', date)
+        ras = 270.0 + 0.5 * np.sin(2 * np.pi * t / day)
+        dec = 66.5 + 0.1 * rng.standard_normal(len(t)).cumsum() / len(t)
+        for name, y in [('spinras', ras), ('spindec', dec)]:
+            _save(store, prefix + name, t, y, support=True, **keys)
+            _save(store, prefix + name + '_corrected', t, y,
+                  support=True, **keys)
+
+
+def add_fgm(store, probe, dates, cadence=0.25):
+    """Low resolution FGM data (DSL) for a THEMIS probe."""
+    name = 'th' + probe + '_fgl_dsl'
+    for date in dates:
+        t = day_times(date, cadence)
+        rng = _rng(name, date)
+        phase = 2 * np.pi * t / 3.0
+        amp = 20.0 + 10.0 * np.sin(2 * np.pi * t / day)
+        y = np.column_stack((amp * np.cos(phase / 100.0),
+                             amp * np.sin(phase / 100.0),
+                             5.0 + 2.0 * np.sin(2 * np.pi * t / 600.0)))
+        y += rng.standard_normal(y.shape)
+        _save(store, name, t, y, coord='dsl', dtype=np.float32,
+              loader='fgm', probe=probe)
+
+
+def add_sst(store, probe, dates, cadence=3.0):
+    """SST ion energy flux spectrogram for a THEMIS probe."""
+    name = 'th' + probe + '_psif_en_eflux'
+    energies = np.geomspace(2.6e4, 7.2e5, 16)
+    for date in dates:
+        t = day_times(date, cadence)
+        rng = _rng(name, date)
+        level = 1.0 + 0.8 * np.sin(2 * np.pi * t / day)[:, None]
+        y = 1e9 * level * (energies / energies[0]) ** -2.0
+        y *= rng.lognormal(0.0, 0.3, y.shape)
+        _save(store, name, t, y, v=energies, dtype=np.float32,
+              loader='sst', probe=probe)
+
+
+def add_gmag(store, sites, dates, cadence=0.5):
+    """Ground magnetometer data (H, D, Z) in nT."""
+    for site in sites:
+        name = 'thg_mag_' + site
+        for date in dates:
+            t = day_times(date, cadence)
+            rng = _rng(name, date)
+            base = np.array([15000.0, 500.0, 55000.0])
+            base *= 1.0 + 0.05 * rng.standard_normal(3)
+            diurnal = 30.0 * np.sin(2 * np.pi * t / day)
+            wave = 5.0 * np.sin(2 * np.pi * t / 300.0)
+            y = base + (diurnal + wave)[:, None]
+            y += 0.5 * rng.standard_normal((len(t), 3)).cumsum(axis=0) / 50.0
+            _save(store, name, t, y, dtype=np.float32,
+                  loader='gmag', site=site)
+
+
+def add_gmag_index(store, dates, cadence=60.0):
+    """AE, AL and AU indices."""
+    for date in dates:
+        t = day_times(date, cadence)
+        rng = _rng('thg_idx', date)
+        al = -np.abs(300.0 * rng.standard_normal(len(t)).cumsum()
+                     / np.sqrt(len(t)))
+        au = np.abs(100.0 * rng.standard_normal(len(t)).cumsum()
+                    / np.sqrt(len(t)))
+        for name, y in [('thg_idx_al', al), ('thg_idx_au', au),
+                        ('thg_idx_ae', au - al)]:
+            _save(store, name, t, y, dtype=np.float32,
+                  loader='gmag', site='idx')
+
+
+def add_mms(store, dates, cadence=4.5):
+    """FPI electron omni spectrogram and EDP spacecraft potential."""
+    energies = np.geomspace(6.5, 2.8e4, 32)
+    for date in dates:
+        t = day_times(date, cadence)
+        rng = _rng('mms1_des', date)
+        y = 1e8 * (energies / energies[0]) ** -1.5
+        y = y * rng.lognormal(0.0, 0.5, (len(t), len(energies)))
+        _save(store, 'mms1_des_energyspectr_omni_fast', t, y,
+              v=energies, dtype=np.float32, loader='mms_fpi', probe='1',
+              datatype='des-moms')
+        t = day_times(date, cadence / 4.5)
+        y = 20.0 + 10.0 * np.sin(2 * np.pi * t / day)
+        y += rng.standard_normal(len(t))
+        _save(store, 'mms1_edp_scpot_fast_l2', t, y, dtype=np.float32,
+              loader='mms_edp', probe='1', datatype='scpot')
+
+
+def _save(store, name, t, y, **kwargs):
+    """Add a day of data to the days already generated for a variable."""
+    days = store.setdefault(name, {'x': [], 'y': [], 'kwargs': kwargs})
+    days['x'].append(t)
+    days['y'].append(y)
+
+
+def store_path(scale=1.0):
+    """Default store directory, in the temporary directory."""
+    name = 'pyspedas_examples_data'
+    if scale != 1.0:
+        name += '_x' + str(scale)
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def make_synthetic_store(path=None, compressed=False, scale=1.0):
+    """
+    Create a store with all variables used by the examples.
+
+    If the store already exists, it is not created again, unless it was
+    made by another version of the generator or with other parameters
+    (recorded in its catalog). The store is written to a temporary
+    directory first and then renamed, so several processes (e.g.
+    pytest-xdist workers) can call this at the same time.
+
+    Parameters
+    ----------
+    path: str, optional
+        Store directory. Default is store_path(scale).
+    compressed: bool, optional
+        Compress the variable files. The synthetic data can always be
+        created again, so by default they are not compressed,
+        which is faster to write and to read.
+    scale: float, optional
+        Multiply the number of samples of every variable by this factor,
+        by dividing the cadence. Default is 1.0.
+
+    Returns
+    -------
+    path: str
+        The store directory.
+    """
+    if path is None:
+        path = store_path(scale)
+    generator = {'name': 'synthetic', 'version': generator_version,
+                 'scale': scale, 'compressed': compressed}
+    if store_generator(path) == generator:
+        return path
+
+    store = {}
+    add_state(store, 'a', ['2007-06-23', '2015-12-31', '2016-01-01',
+                           '2017-03-23', '2017-06-23'], cadence=60.0 / scale)
+    add_state(store, 'd', ['2019-01-05'], phase=2.0, cadence=60.0 / scale)
+    add_fgm(store, 'a', ['2017-03-23'], cadence=0.25 / scale)
+    add_sst(store, 'a', ['2015-12-31'], cadence=3.0 / scale)
+    add_gmag(store, ['ccnv'], ['2007-03-23'], cadence=0.5 / scale)
+    add_gmag(store, epo_sites, ['2015-12-31'], cadence=0.5 / scale)
+    add_gmag_index(store, ['2015-12-31'], cadence=60.0 / scale)
+    add_mms(store, ['2015-10-16'], cadence=4.5 / scale)
+    return write_store(path, store, compressed=compressed,
+                       gmag_groups={'epo': epo_sites}, generator=generator)
+
+
+def write_store(path, store, compressed=False, gmag_groups={},
+                generator=None):
+    """
+    Write the variables generated by the add_* functions to a store.
+
+    Parameters
+    ----------
+    path: str
+        Store directory. If it already exists, it is not modified, unless
+        generator is given and differs from the one of the store.
+    store: dict
+        Generated variables.
+    compressed: bool, optional
+        Compress the variable files.
+    gmag_groups: dict, optional
+        GMAG group names and their sites.
+    generator: dict, optional
+        Description of the generator, recorded in the catalog.
+
+    Returns
+    -------
+    path: str
+        The store directory.
+    """
+    tmp_path = path + '.tmp' + str(os.getpid())
+    for group, sites in gmag_groups.items():
+        save_gmag_group(tmp_path, group, sites)
+    for name, days in store.items():
+        x = np.concatenate(days['x'])
+        y = np.concatenate(days['y'])
+        order = np.argsort(x, kind='stable')
+        save_variable(tmp_path, name, x[order], y[order],
+                      compressed=compressed, **days['kwargs'])
+    if generator is not None:
+        save_generator(tmp_path, generator)
+
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if generator is None or store_generator(path) == generator:
+            # Another process created the store first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return path
+        # Replace the store of another generator.
+        old_path = path + '.old' + str(os.getpid())
+        try:
+            os.rename(path, old_path)
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another process replaced it first.
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    return path
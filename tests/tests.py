@@ -1,8 +1,25 @@
-"""Test the examples."""
+"""Test the examples.
 
+By default, the examples load synthetic data from a local store, so the
+tests do not need network access. Set the environment variable
+PYSPEDAS_EXAMPLES_ONLINE=1 to download the data from the remote servers.
+"""
+
+import os
+import tempfile
 import unittest
 
 global_display=False
+online = bool(os.environ.get('PYSPEDAS_EXAMPLES_ONLINE'))
+
+
+def setUpModule():
+    """Use a local store with synthetic data, unless testing online."""
+    if online:
+        return
+    from pyspedas_examples.utilities.data_provider import set_data_provider
+    from pyspedas_examples.utilities.synthetic import make_synthetic_store
+    set_data_provider(make_synthetic_store())
 
 class LoadTestCases(unittest.TestCase):
     """Run tests on examples."""
@@ -12,18 +29,254 @@ class LoadTestCases(unittest.TestCase):
         from pyspedas_examples.version import version
         self.assertFalse(version())
 
+    def test_lazy_import(self):
+        """Test that importing the package does not import pyspedas."""
+        import subprocess
+        import sys
+        code = ("import sys, pyspedas_examples; "
+                "assert 'pyspedas' not in sys.modules; "
+                "pyspedas_examples.ex_cdagui; "
+                "assert 'pyspedas' not in sys.modules")
+        subprocess.run([sys.executable, '-c', code], check=True)
+
+    def test_lazy_attribute(self):
+        """Test that examples are loaded on attribute access."""
+        import pyspedas_examples
+        from pyspedas_examples.examples.ex_avg import ex_avg2
+        self.assertIs(pyspedas_examples.ex_avg2, ex_avg2)
+        self.assertIn('ex_wavelet', dir(pyspedas_examples))
+        with self.assertRaises(AttributeError):
+            pyspedas_examples.ex_does_not_exist
+
     def test_ex_analysis(self):
         """Test ex_analysis."""
         from pyspedas_examples.examples.ex_analysis import ex_analysis
         ex = ex_analysis(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_analysis_batch(self):
+        """Test that the median engine gives the same results."""
+        import numpy as np
+        from pyspedas import get_data
+        from pyspedas_examples.examples.ex_analysis import ex_analysis
+        ex_analysis(plot=global_display)
+        expected = get_data('tha_pos-m')[1]
+        ex = ex_analysis(plot=global_display, batch=True)
+        self.assertEqual(ex, 1)
+        self.assertTrue(np.array_equal(get_data('tha_pos-m')[1], expected))
+
+    def test_median(self):
+        """Test the medians and the sliding median against NumPy."""
+        import warnings
+        import numpy as np
+        from numpy.lib.stride_tricks import sliding_window_view
+        from pyspedas_examples.analysis.median import (medians, medians_many,
+                                                       sliding_median)
+        rng = np.random.default_rng(0)
+        arrays = []
+        for n, dtype in [(1000, np.float32), (1001, np.float64),
+                         (1000, np.float32), (7, np.int64)]:
+            y = rng.integers(-20, 20, (n, 3)).astype(dtype)
+            if dtype != np.int64:
+                y[rng.random((n, 3)) < 0.1] = np.nan
+            arrays.append(y)
+        arrays[2][:, 1] = np.nan
+        arrays[2][100:, 2] = np.nan
+        arrays.append(arrays[0][:, 0])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            expected = [np.nanmedian(y, axis=0) for y in arrays]
+        for m, e in zip(medians_many(arrays), expected):
+            self.assertEqual(np.asarray(m).dtype, e.dtype)
+            self.assertTrue(np.array_equal(m, e, equal_nan=True))
+        self.assertTrue(np.array_equal(medians(arrays[1]), expected[1]))
+        # With NaN (done in Python), without (done by scipy) and with a
+        # few NaN (done by both).
+        few = np.nan_to_num(arrays[1])
+        few[[0, 500, 501, 1000], 0] = np.nan
+        few[600:700, 1] = np.nan
+        for y in arrays[:3] + [np.nan_to_num(y) for y in arrays[:2]] + [few]:
+            for width in [1, 5, 31]:
+                h = width // 2
+                windows = sliding_window_view(
+                    np.pad(y, ((h, h), (0, 0)), mode='edge'), width, axis=0)
+                expected = np.nanmedian(windows, axis=-1)
+                self.assertTrue(np.array_equal(sliding_median(y, width),
+                                               expected, equal_nan=True))
+        self.assertIsNone(sliding_median(arrays[0], 4))
+
+    def test_synthetic_store_version(self):
+        """Test that a store of another generator is created again."""
+        from pyspedas_examples.utilities.data_provider import (
+            save_generator, store_generator)
+        from pyspedas_examples.utilities.synthetic import (
+            generator_version, make_synthetic_store)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'store')
+            make_synthetic_store(path, scale=0.01)
+            generator = store_generator(path)
+            self.assertEqual(generator['version'], generator_version)
+            save_generator(path, dict(generator, version=0))
+            os.remove(os.path.join(path, 'tha_pos.npz'))
+            make_synthetic_store(path, scale=0.01)
+            self.assertEqual(store_generator(path), generator)
+            self.assertTrue(os.path.exists(os.path.join(path,
+                                                        'tha_pos.npz')))
+            self.assertEqual(sorted(os.listdir(directory)), ['store'])
+
+    def test_load_cache(self):
+        """Test that the load cache serves the same data as the store."""
+        import numpy as np
+        from pyspedas import get_coords, get_data
+        from pyspedas_examples.examples.ex_analysis import ex_analysis
+        from pyspedas_examples.utilities.load import state
+        from pyspedas_examples.utilities.data_provider import (
+            get_data_provider, set_data_provider)
+        from pyspedas_examples.utilities.load_cache import (LoadCache, _key,
+                                                            set_load_cache)
+        names = ['tha_pos', 'tha_vel']
+        ex_analysis(plot=global_display)
+        expected = [get_data(n) for n in names]
+        with tempfile.TemporaryDirectory() as path:
+            cache = LoadCache(path)
+            set_load_cache(cache)
+            try:
+                for _ in range(2):
+                    ex = ex_analysis(plot=global_display)
+                    self.assertEqual(ex, 1)
+                    for name, d in zip(names, expected):
+                        self.assertTrue(np.array_equal(get_data(name)[0],
+                                                       d[0]))
+                        self.assertTrue(np.array_equal(get_data(name)[1],
+                                                       d[1]))
+                        self.assertEqual(get_coords(name).upper(), 'GEI')
+                self.assertEqual((cache.hits, cache.misses), (1, 1))
+                # A part of a cached day is served from the cache.
+                t = expected[0][0]
+                state(probe='a', trange=[t[10], t[20]], time_clip=True)
+                self.assertTrue(np.array_equal(get_data('tha_pos')[0],
+                                               t[10:21]))
+                self.assertEqual((cache.hits, cache.misses), (2, 1))
+            finally:
+                set_load_cache(None)
+        if online:
+            return
+        # Loads from the store and online loads have different keys.
+        provider = get_data_provider()
+        key = _key('state', [], False, {'probe': 'a'})
+        set_data_provider(None)
+        try:
+            self.assertEqual(_key('state', [], False, {'probe': 'a'})
+                             ['source'], 'online')
+            self.assertEqual(key['source']['generator']['name'], 'synthetic')
+        finally:
+            set_data_provider(provider)
+
+    def test_load_cache_segments(self):
+        """Test that the days of separate loads are combined."""
+        import numpy as np
+        from pyspedas import get_data, store_data, time_double
+        from pyspedas_examples.utilities.load_cache import LoadCache
+        calls = []
+
+        def func(trange, varnames, get_support_data, time_clip, fail=False):
+            calls.append(trange)
+            if fail:
+                return []
+            t0, t1 = time_double(trange)
+            t = np.arange(t0, t1, 3600.0)
+            store_data('v', data={'x': t, 'y': t - t0})
+            return ['v']
+
+        days = ['2020-01-01', '2020-01-02', '2020-01-03']
+        with tempfile.TemporaryDirectory() as path:
+            cache = LoadCache(path)
+            # Failed loads are not cached.
+            self.assertEqual(cache.load('v', func, days[:2], fail=True), [])
+            self.assertEqual(cache.load('v', func, days[:2], fail=True), [])
+            self.assertEqual(len(calls), 2)
+            cache.load('v', func, days[:2])
+            cache.load('v', func, days[1:])
+            self.assertEqual(cache.load('v', func, days[::2]), ['v'])
+            self.assertEqual(len(calls), 4)
+            t = get_data('v')[0]
+            self.assertEqual(len(t), 48)
+            self.assertTrue(np.all(np.diff(t) == 3600.0))
+            # After invalidate, the days are loaded again.
+            self.assertEqual(cache.invalidate('v', days[1:]), 1)
+            cache.load('v', func, days[::2])
+            self.assertEqual(len(calls), 5)
+
+    def test_load_cache_metadata(self):
+        """Test that the options of a spectrogram survive the cache."""
+        import numpy as np
+        from pyspedas import get_data, get_units, options, set_units
+        from pyspedas import store_data, time_double
+        from pyspedas_examples.utilities.load_cache import LoadCache
+
+        def func(trange, varnames, get_support_data, time_clip):
+            t0, t1 = time_double(trange)
+            t = np.arange(t0, t1, 600.0)
+            store_data('spec', data={'x': t, 'y': np.ones((len(t), 4)),
+                                     'v': [1.0, 10.0, 100.0, 1000.0]})
+            options('spec', 'spec', True)
+            options('spec', 'ylog', True)
+            options('spec', 'zlog', True)
+            options('spec', 'ysubtitle', '[eV]')
+            set_units('spec', 'eV/(cm^2-s-sr-eV)')
+            return ['spec']
+
+        trange = ['2020-01-01/01:00', '2020-01-01/02:00']
+        with tempfile.TemporaryDirectory() as path:
+            cache = LoadCache(path)
+            for _ in range(2):
+                self.assertEqual(cache.load('spec', func, trange,
+                                            time_clip=True), ['spec'])
+                t = get_data('spec')[0]
+                self.assertEqual((t[0], t[-1]), tuple(time_double(trange)))
+                opts = get_data('spec', metadata=True)['plot_options']
+                self.assertTrue(opts['extras']['spec'])
+                self.assertEqual(opts['yaxis_opt']['y_axis_type'], 'log')
+                self.assertEqual(opts['zaxis_opt']['z_axis_type'], 'log')
+                self.assertEqual(opts['yaxis_opt']['axis_subtitle'], '[eV]')
+                self.assertEqual(get_units('spec'), 'eV/(cm^2-s-sr-eV)')
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
     def test_ex_avg(self):
         """Test ex_avg."""
         from pyspedas_examples.examples.ex_avg import ex_avg
         ex = ex_avg(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_avg_stream(self):
+        """Test that avg_data_stream gives the same results as avg_data."""
+        import numpy as np
+        from pyspedas import get_data, store_data
+        from pyspedas_examples.examples.ex_avg import ex_avg
+        from pyspedas_examples.analysis.avg_data_stream import avg_data_stream
+        names = ['thg_mag_ccnv-m-avg', 'thg_mag_ccnv-m-avg2']
+        ex_avg(plot=global_display)
+        expected = [get_data(n) for n in names]
+        ex = ex_avg(plot=global_display, stream=True)
+        self.assertEqual(ex, 1)
+        for name, d in zip(names, expected):
+            self.assertEqual(get_data(name)[1].dtype, d[1].dtype)
+            self.assertTrue(np.array_equal(get_data(name)[0], d[0]))
+            self.assertTrue(np.array_equal(get_data(name)[1], d[1]))
+
+        # Small chunks, with a gap
+        t = np.arange(1000.0)
+        y = np.sin(t / 10.0)
+        y[300:400] = np.nan
+        store_data('test', data={'x': np.delete(t, range(500, 600)),
+                                 'y': np.delete(y, range(500, 600))})
+        avg_data_stream('test', res=20.0, chunk_size=7)
+        d = get_data('test-avg')
+        self.assertEqual(len(d[0]), 50)
+        self.assertAlmostEqual(d[1][0], np.mean(y[0:20]))
+        self.assertTrue(np.isnan(d[1][15]))
+        self.assertTrue(np.isnan(d[1][26]))
+
     def test_ex_avg2(self):
         """Test ex_avg."""
         from pyspedas_examples.examples.ex_avg import ex_avg2
@@ -36,24 +289,410 @@ class LoadTestCases(unittest.TestCase):
         ex = ex_basic(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_basic_lazy(self):
+        """Test the lazy views of ex_basic and ex_dsl2gse."""
+        import numpy as np
+        from pyspedas import data_quants, del_data, get_data, store_data
+        from pyspedas import tnames
+        from pyspedas_examples.examples.ex_basic import ex_basic
+        from pyspedas_examples.examples.ex_dsl2gse import ex_dsl2gse
+        from pyspedas_examples.utilities.derived import (
+            clear_views, materialize, store_view, view_data, views)
+        ex_basic(plot=global_display)
+        expected = get_data('tha_position')
+        ex = ex_basic(plot=global_display, lazy=True)
+        self.assertEqual(ex, 1)
+        if not global_display:
+            self.assertEqual(tnames('tha_position'), [])
+            self.assertIn('tha_position', views())
+        d = view_data('tha_position')
+        self.assertTrue(np.array_equal(d[0], expected[0]))
+        self.assertTrue(np.allclose(d[1], expected[1], rtol=1e-15))
+        self.assertEqual(materialize('tha_position') if not global_display
+                         else ['tha_position'], ['tha_position'])
+        self.assertTrue(np.allclose(get_data('tha_position')[1],
+                                    expected[1], rtol=1e-15))
+        opts = data_quants['tha_position'].attrs['plot_options']
+        self.assertEqual(opts['yaxis_opt']['axis_subtitle'], '[km]')
+        self.assertNotIn('tha_position', views())
+
+        ex_dsl2gse(plot=global_display)
+        expected = get_data('z_gse')
+        ex = ex_dsl2gse(plot=global_display, lazy=True)
+        self.assertEqual(ex, 1)
+        # A component is a view of the parent buffer.
+        if not global_display:
+            parent = get_data('tha_fgl_dsl', xarray=True).values
+            self.assertTrue(np.shares_memory(view_data('z_dsl')[1], parent))
+            materialize()
+        self.assertTrue(np.array_equal(get_data('z_gse')[1], expected[1],
+                                       equal_nan=True))
+        self.assertEqual(views(), [])
+
+        # Views of replaced or deleted variables are dropped.
+        store_view('z_view', 'tha_fgl_gse', component=2)
+        store_data('z_view', data={'x': [1.0, 2.0], 'y': [3.0, 4.0]})
+        self.assertEqual(materialize('z_view'), [])
+        self.assertTrue(np.array_equal(get_data('z_view')[1], [3.0, 4.0]))
+        store_view('z_view', 'tha_fgl_gse', component=2)
+        store_view('x_view', 'tha_fgl_gse', component=0)
+        self.assertEqual(views(), ['x_view', 'z_view'])
+        del_data('tha_fgl_gse')
+        self.assertEqual(views(), [])
+        store_view('z_view', 'tha_fgl_dsl', component=2)
+        clear_views()
+        self.assertEqual(views(), [])
+
     def test_ex_cdagui(self):
         """Test ex_cdagui."""
         from pyspedas_examples.examples.ex_cdagui import ex_cdagui
         ex = ex_cdagui()
         self.assertEqual(ex, 1)
 
+    @unittest.skipUnless(online, 'cdasws needs network access')
     def test_ex_cdasws(self):
         """Test ex_cdasws."""
         from pyspedas_examples.examples.ex_cdasws import ex_cdasws
         ex = ex_cdasws()
         self.assertEqual(ex, 1)
 
+    def test_cdas_cache(self):
+        """Test the CDAS catalog cache against a local server."""
+        from concurrent.futures import ThreadPoolExecutor
+        from pyspedas_examples.utilities.cdas_cache import (CatalogCache,
+                                                            cached_cdas)
+        from pyspedas_examples.utilities.stub_cdas import start_stub_cdas
+        server = start_stub_cdas(delay=0.2)
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                cache = CatalogCache(directory=directory)
+                cdas = cached_cdas(endpoint=server.url, cache=cache)
+                # Identical requests in flight share one request.
+                with ThreadPoolExecutor(max_workers=4) as pool:
+                    groups = list(pool.map(
+                        lambda _: cdas.get_observatory_groups(), range(4)))
+                self.assertEqual(groups[0], [{'Name': 'ARTEMIS',
+                                              'ObservatoryId': ['THB']}])
+                self.assertTrue(all(g == groups[0] for g in groups))
+                self.assertEqual(len(server.requests), 1)
+                self.assertEqual(cache.shared, 3)
+                self.assertEqual(cdas.get_instrument_types(),
+                                 [{'Name': 'Electric Fields (space)'}])
+                cdas.get_instrument_types()
+                self.assertEqual(len(server.requests), 2)
+                self.assertEqual(cdas.get_instruments(), [])
+                self.assertEqual(len(server.requests), 3)
+                # A new process finds the responses in the directory.
+                cache = CatalogCache(directory=directory)
+                cdas = cached_cdas(endpoint=server.url, cache=cache)
+                cdas.get_observatory_groups()
+                self.assertEqual(len(server.requests), 3)
+                # Stale responses are revalidated.
+                cache.ttl = 0.0
+                self.assertEqual(cdas.get_observatory_groups(), groups[0])
+                self.assertEqual(len(server.requests), 4)
+                self.assertEqual(cache.stats()['revalidations'], 1)
+                self.assertEqual(cache.hits, 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_cdas_fetch(self):
+        """Test the concurrent CDAWeb fetcher against a local server."""
+        from pyspedas_examples.utilities.cdas_fetch import fetch_datasets
+        from pyspedas_examples.utilities.stub_cdas import (file_content,
+                                                           start_stub_cdas)
+        # Each file fails once, then is cut after 1000 bytes.
+        server = start_stub_cdas(delay=0.01, file_size=5000, fail_first=1,
+                                 cut_first=1)
+        datasets = ['THA_L2_FGM', 'THB_L2_FIT (2007-02-26 to 2020-01-17)']
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                report = fetch_datasets(datasets, ['2020-01-01',
+                                                   '2020-01-02'],
+                                        local_dir=directory, workers=4,
+                                        backoff=0.01, endpoint=server.url)
+                self.assertEqual(list(report), ['THA_L2_FGM', 'THB_L2_FIT'])
+                files = report['THB_L2_FIT']['files']
+                self.assertEqual(report['THB_L2_FIT']['downloaded'], 2)
+                self.assertIsNone(report['THB_L2_FIT']['error'])
+                for path in files:
+                    with open(path, 'rb') as f:
+                        self.assertEqual(f.read(), file_content(
+                            os.path.basename(path), 5000))
+                # The cut downloads were continued with a Range request.
+                self.assertEqual(server.counts['/files/' + os.path.basename(
+                    files[0])], 3)
+                # Files are reused, unless they changed.
+                with open(files[0], 'r+b') as f:
+                    f.write(b'x')
+                report = fetch_datasets(datasets, ['2020-01-01',
+                                                   '2020-01-02'],
+                                        local_dir=directory,
+                                        endpoint=server.url)
+                self.assertEqual(report['THA_L2_FGM']['reused'], 2)
+                self.assertEqual(report['THB_L2_FIT']['reused'], 1)
+                self.assertEqual(report['THB_L2_FIT']['downloaded'], 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_cdas_fetch_retry(self):
+        """Test that only the transient errors are retried."""
+        from pyspedas_examples.utilities.cdas_fetch import FetchError, _retry
+        calls = []
+
+        def request(err):
+            def func():
+                calls.append(err)
+                raise err
+            return func
+
+        for err, count in [(IOError('HTTP status 503'), 3),
+                           (FetchError('HTTP status 404'), 1)]:
+            del calls[:]
+            with self.assertRaises(FetchError):
+                _retry(request(err), 2, 0.0, 'test')
+            self.assertEqual(len(calls), count)
+        del calls[:]
+        with self.assertRaises(KeyError):
+            _retry(request(KeyError('Name')), 2, 0.0, 'test')
+        self.assertEqual(len(calls), 1)
+
+    def test_ex_cotrans_cached(self):
+        """Test that cotrans_cached gives the same results as cotrans."""
+        import numpy as np
+        from pyspedas import get_coords, get_data
+        from pyspedas_examples.examples.ex_cotrans import ex_cotrans
+        from pyspedas_examples.analysis.cotrans_cache import (cotrans_cache,
+                                                              cotrans_cached)
+        names = ['tha_pos_gse', 'tha_vel_gse']
+        ex_cotrans(plot=global_display)
+        expected = [get_data(n) for n in names]
+        cotrans_cache.clear()
+        ex = ex_cotrans(plot=global_display, cached=True)
+        self.assertEqual(ex, 1)
+        for name, d in zip(names, expected):
+            self.assertEqual(get_coords(name), 'GSE')
+            self.assertTrue(np.array_equal(get_data(name)[0], d[0]))
+            self.assertTrue(np.allclose(get_data(name)[1], d[1],
+                                        rtol=1e-12, atol=1e-9))
+        # The velocity reuses the matrices of the position.
+        self.assertEqual(cotrans_cache.misses, 1)
+        self.assertEqual(cotrans_cache.hits, 1)
+        self.assertEqual(cotrans_cached('nope', 'x', coord_in='gei',
+                                        coord_out='gse'), 0)
+
+    def test_ex_cotrans_batch(self):
+        """Test that cotrans_batch gives the same results as cotrans."""
+        import numpy as np
+        from pyspedas import get_coords, get_data
+        from pyspedas_examples.examples.ex_cotrans import ex_cotrans
+        from pyspedas_examples.analysis.cotrans_cache import (CotransCache,
+                                                              cotrans_batch)
+        names = ['tha_pos_gse', 'tha_vel_gse']
+        ex_cotrans(plot=global_display)
+        expected = [get_data(n) for n in names]
+        ex = ex_cotrans(plot=global_display, batch=True)
+        self.assertEqual(ex, 1)
+        for name, d in zip(names, expected):
+            self.assertEqual(get_coords(name), 'GSE')
+            self.assertTrue(np.array_equal(get_data(name)[0], d[0]))
+            self.assertTrue(np.allclose(get_data(name)[1], d[1],
+                                        rtol=1e-12, atol=1e-9))
+        # Interpolated to common times: one group, one matrix build.
+        cache = CotransCache()
+        t = get_data('tha_pos')[0][::2]
+        out = cotrans_batch([('tha_pos', None), ('tha_vel', None)],
+                            coord_out='gsm', time_base=t, cache=cache)
+        self.assertEqual(out, ['tha_pos_gsm', 'tha_vel_gsm'])
+        self.assertTrue(np.array_equal(get_data('tha_vel_gsm')[0], t))
+        self.assertEqual(get_coords('tha_pos').upper(), 'GEI')
+        self.assertEqual(cotrans_batch([('tha_pos', 'x')], coord_in='gse',
+                                       coord_out='gsm', cache=cache), [])
+
+    def test_ex_cotrans1_table(self):
+        """Test that submag2geo_table gives the same results as submag2geo."""
+        import numpy as np
+        from pyspedas.cotrans_tools.cotrans_lib import submag2geo
+        from pyspedas_examples.examples.ex_cotrans import ex_cotrans1
+        from pyspedas_examples.analysis.dipole_table import (
+            DipoleTable, subgeo2mag_table, submag2geo_table)
+        ex = ex_cotrans1(table=True)
+        self.assertEqual(ex, 1)
+        d = [[245.0, -102.0, 251.0], [775.0, 10.0, -10],
+             [121.0, 545.0, -1.0], [304.65, -205.3, 856.1],
+             [464.34, -561.55, -356.22]]
+        t = [1577112800, 1577308800, 1577598800, 1577608800, 1577998800]
+        expected = submag2geo(t, d)
+        # A daily table holds the same dipole axes as submag2geo.
+        geo = submag2geo_table(t, d)
+        self.assertTrue(np.allclose(geo, expected, rtol=1e-12, atol=1e-9))
+        self.assertTrue(np.allclose(subgeo2mag_table(t, geo), d,
+                                    rtol=1e-12, atol=1e-9))
+        # A coarse table, interpolated, is close.
+        table = DipoleTable(t[0], t[-1], cadence=10 * 86400.0)
+        geo = submag2geo_table(t, d, method='linear', table=table)
+        self.assertTrue(np.allclose(geo, expected, atol=0.01))
+
     def test_ex_deriv(self):
         """Test ex_basic."""
         from pyspedas_examples.examples.ex_deriv import ex_deriv
         ex = ex_deriv(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_deriv_batch(self):
+        """Test deriv_batch against deriv_data and the exact derivative."""
+        import numpy as np
+        from pyspedas import get_data, store_data
+        from pyspedas_examples.examples.ex_deriv import ex_deriv, ex_deriv1
+        from pyspedas_examples.analysis.deriv_batch import (deriv_batch,
+                                                            derivative)
+        var = 'thg_mag_ccnv-m-der'
+        ex_deriv(plot=global_display)
+        expected = get_data(var)[1]
+        ex = ex_deriv(plot=global_display, batch=True)
+        self.assertEqual(ex, 1)
+        self.assertEqual(get_data(var)[1].dtype, expected.dtype)
+        self.assertTrue(np.array_equal(get_data(var)[1], expected))
+        ex_deriv1(plot=global_display)
+        expected = get_data('sinx-der')
+        ex = ex_deriv1(plot=global_display, batch=True)
+        self.assertEqual(ex, 1)
+        self.assertTrue(np.array_equal(get_data('sinx-der')[1], expected[1]))
+        # The derivative of 1000 sin(b), with t = 3600 / (2 pi) b.
+        b = 2.0 / 100.0 * np.pi * np.arange(101)
+        exact = 1000.0 * np.cos(b) * 2 * np.pi / 3600.0
+        amplitude = 1000.0 * 2 * np.pi / 3600.0
+        for options, error in [({}, 1e-3), ({'edge_order': 2}, 2e-3),
+                               ({'savgol': (7, 3)}, 1e-4),
+                               ({'savgol': (11, 5)}, 2e-6)]:
+            deriv_batch('sinx', newname='d', **options)
+            self.assertLess(np.abs(get_data('d')[1] - exact).max(),
+                            error * amplitude)
+
+        # Two variables with a gap and a variable cadence, in small chunks.
+        t = np.concatenate((0.5 * np.arange(50), 40.0 + np.arange(30) ** 1.1,
+                            [100.0], 200.0 + 0.5 * np.arange(19)))
+        rng = np.random.default_rng(0)
+        store_data('a', data={'x': t, 'y': rng.standard_normal((100, 3))})
+        store_data('b', data={'x': t, 'y': rng.standard_normal(100)})
+        for edge_order in [1, 2]:
+            names = deriv_batch(['a', 'b'], gap=5.0, edge_order=edge_order,
+                                chunk_size=7)
+            self.assertEqual(names, ['a-der', 'b-der'])
+            for name in ['a', 'b']:
+                x, y = get_data(name)
+                d = get_data(name + '-der')[1]
+                for s, e in [(0, 50), (50, 80), (81, 100)]:
+                    self.assertTrue(np.array_equal(d[s:e], np.gradient(
+                        y[s:e], x[s:e], axis=0, edge_order=edge_order)))
+                self.assertTrue(np.isnan(d[80]).all())
+        # The irregular part keeps the gradient.
+        d = derivative(*get_data('b'), gap=5.0, edge_order=2, savgol=(7, 3))
+        self.assertTrue(np.array_equal(d[50:81], get_data('b-der')[1][50:81],
+                                       equal_nan=True))
+        self.assertFalse(np.allclose(d[:50], get_data('b-der')[1][:50]))
+
+    def test_ex_avg_deriv_lazy(self):
+        """Test that a Pipeline gives the same results as the steps."""
+        import numpy as np
+        from pyspedas import get_data, tnames
+        from pyspedas_examples.examples.ex_avg import ex_avg
+        from pyspedas_examples.examples.ex_deriv import ex_deriv
+        from pyspedas_examples.analysis.pipeline import Pipeline
+        var = 'thg_mag_ccnv-m'
+        names = [var, var + '-avg', var + '-avg2', var + '-der']
+        ex_deriv(plot=global_display)
+        expected = {names[3]: get_data(names[3])}
+        ex_avg(plot=global_display)
+        expected.update({n: get_data(n) for n in names[:3]})
+        ex = ex_avg(plot=global_display, lazy=True)
+        self.assertEqual(ex, 1)
+        self.assertEqual(tnames(var) != [], global_display)
+        for n in names[1:3]:
+            self.assertTrue(np.array_equal(get_data(n)[0], expected[n][0]))
+            self.assertTrue(np.array_equal(get_data(n)[1], expected[n][1],
+                                           equal_nan=True))
+        ex = ex_deriv(plot=global_display, lazy=True)
+        self.assertEqual(ex, 1)
+        self.assertTrue(np.array_equal(get_data(names[3])[1],
+                                       expected[names[3]][1]))
+        # The chain of both examples, with small chunks.
+        p = Pipeline(chunk_size=1000)
+        m = p.source('thg_mag_ccnv').subtract_average(median=True)
+        outputs = [m, m.avg_data(res=300.0),
+                   m.avg_data(width=600.0, newname=var + '-avg2'),
+                   m.deriv_data()]
+        self.assertEqual(p.compute(outputs[1:]), names[1:])
+        self.assertEqual(p.evaluated[0], var)
+        self.assertEqual(p.fused, [])
+        for n in names[1:]:
+            self.assertTrue(np.array_equal(get_data(n)[1], expected[n][1],
+                                           equal_nan=True))
+        self.assertEqual(p.compute(outputs[3]), [names[3]])
+        self.assertEqual((p.evaluated, p.fused), ([names[3]], [var]))
+        self.assertTrue(np.array_equal(get_data(names[3])[1],
+                                       expected[names[3]][1]))
+
+    def test_incremental(self):
+        """Test that appended samples give the same results as batch."""
+        import numpy as np
+        from pyspedas import avg_data, get_data, store_data
+        from pyspedas.analysis.deriv_data import deriv_data
+        from pyspedas_examples.analysis.clean_spikes_batch import spike_mask
+        from pyspedas_examples.analysis.incremental import (
+            IncrementalAverage, IncrementalDerivative, IncrementalMedian,
+            IncrementalSpikes)
+        from pyspedas_examples.utilities.load import gmag
+        var = 'thg_mag_ccnv'
+        gmag(sites=['ccnv'], trange=['2007-03-23', '2007-03-23'],
+             varnames=[var])
+        t, y = get_data(var)
+        y = y.copy()
+        y[5000::7919] += 1000.0
+        offset = np.float32(100.0)
+        for jitter in [False, True]:
+            if jitter:
+                # Times not evenly spaced after a while.
+                t = t.copy()
+                t[20000:] += 0.1
+            store_data(var, data={'x': t, 'y': y})
+            med = IncrementalMedian(y.dtype)
+            res = IncrementalAverage(res=300.0)
+            width = IncrementalAverage(width=600.0)
+            der = IncrementalDerivative()
+            spikes = IncrementalSpikes(offset=offset)
+            cleaned = []
+            for s in range(0, len(t), 997):
+                med.update(y[s:s + 997])
+                for i in [res, width, der]:
+                    i.update(t[s:s + 997], y[s:s + 997])
+                cleaned.append(spikes.update(t[s:s + 997], y[s:s + 997]))
+                # Only the samples that are not final are kept.
+                self.assertLessEqual(len(spikes.pending()[0]), spikes.nsmooth)
+            cleaned.append(spikes.pending())
+            self.assertTrue(np.array_equal(med.median,
+                                           np.nanmedian(y, axis=0)))
+            for i, kwargs in [(res, {'res': 300.0}),
+                              (width, {'width': 600.0})]:
+                avg_data(var, newname='avg', **kwargs)
+                d = get_data('avg')
+                r = i.result()
+                self.assertTrue(np.allclose(r[0], d[0], rtol=0, atol=1e-6))
+                self.assertTrue(np.array_equal(r[1], d[1], equal_nan=True))
+            deriv_data(var)
+            self.assertTrue(np.array_equal(der.result()[1],
+                                           get_data(var + '-der')[1]))
+            expected = y - offset
+            expected[spike_mask(expected)] = np.nan
+            self.assertTrue(np.isnan(expected).any())
+            self.assertTrue(np.array_equal(
+                np.concatenate([c[0] for c in cleaned]), t))
+            self.assertTrue(np.array_equal(
+                np.concatenate([c[1] for c in cleaned]), expected,
+                equal_nan=True))
+
 
     def test_ex_dsl2gse(self):
         """Test ex_dsl2gse."""
@@ -61,41 +700,480 @@ class LoadTestCases(unittest.TestCase):
         ex = ex_dsl2gse(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_dsl2gse_cached(self):
+        """Test that dsl2gse_batch gives the same results as dsl2gse."""
+        import numpy as np
+        from pyspedas import get_coords, get_data, set_coords, store_data
+        from pyspedas_examples.examples.ex_dsl2gse import ex_dsl2gse
+        from pyspedas_examples.analysis.cotrans_cache import CotransCache
+        from pyspedas_examples.analysis.dsl2gse_cached import dsl2gse_batch
+        ex_dsl2gse(plot=global_display)
+        expected = get_data('tha_fgl_gse')
+        ex = ex_dsl2gse(plot=global_display, cached=True)
+        self.assertEqual(ex, 1)
+        self.assertEqual(get_coords('tha_fgl_gse'), 'GSE')
+        self.assertTrue(np.allclose(get_data('tha_fgl_gse')[1], expected[1],
+                                    rtol=1e-12, atol=1e-9, equal_nan=True))
+        # A second variable on the same times reuses the matrices.
+        d = get_data('tha_fgl_dsl')
+        store_data('tha_efs_dsl', data={'x': d[0], 'y': 2 * d[1]})
+        set_coords('tha_efs_dsl', 'DSL')
+        cache = CotransCache()
+        names = dsl2gse_batch(['tha_fgl_dsl', 'tha_efs_dsl'], cache=cache,
+                              chunk_size=len(d[0]))
+        self.assertEqual(names, ['tha_fgl_gse', 'tha_efs_gse'])
+        self.assertEqual(cache.misses, 1)
+        self.assertTrue(np.allclose(get_data('tha_efs_gse')[1],
+                                    2 * expected[1], equal_nan=True))
+        # And back to DSL.
+        dsl2gse_batch('tha_efs_gse', 'tha_efs_dsl2', isgsetodsl=True,
+                      cache=cache, chunk_size=len(d[0]))
+        self.assertEqual(cache.hits, 1)
+        dsl = get_data('tha_efs_dsl2')[1]
+        valid = ~np.isnan(dsl)
+        self.assertTrue(valid.any())
+        self.assertTrue(np.allclose(dsl[valid], 2 * d[1][valid]))
+        # Directions larger than the cache are neither looked up nor kept.
+        small = CotransCache(max_bytes=1024)
+        dsl2gse_batch('tha_efs_dsl', 'tha_efs_gse2', cache=small,
+                      chunk_size=100)
+        self.assertEqual((small.hits, small.misses, len(small)), (0, 0, 0))
+        self.assertTrue(np.allclose(get_data('tha_efs_gse2')[1],
+                                    2 * expected[1], equal_nan=True))
+
     def test_ex_gmag(self):
         """Test ex_dsl2gse."""
         from pyspedas_examples.examples.ex_gmag import ex_gmag
         ex = ex_gmag(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_data_provider(self):
+        """Test loading from a local store."""
+        from pyspedas import get_data, get_coords
+        from pyspedas_examples.utilities.data_provider import (
+            LocalProvider, get_data_provider, save_variable)
+        provider = get_data_provider()
+        if provider is None:
+            self.skipTest('no local data provider')
+        # Whole days are loaded unless time_clip is set.
+        tr = ['2015-12-31 06:00', '2015-12-31 07:00']
+        names = provider.load('state', tr, probe='a')
+        self.assertEqual(names, ['tha_pos', 'tha_vel'])
+        self.assertEqual(len(get_data('tha_pos')[0]), 1440)
+        self.assertEqual(get_coords('tha_pos').lower(), 'gei')
+        provider.load('state', tr, probe='a', time_clip=True)
+        self.assertEqual(len(get_data('tha_pos')[0]), 61)
+        names = provider.load('state', tr, probe='a',
+                              varnames=['tha_spinras'])
+        self.assertEqual(names, ['tha_spinras', 'tha_spinras_corrected'])
+        self.assertEqual(provider.load('state', tr, probe='b'), [])
+        self.assertIn('ccnv', provider.gmag_list('epo'))
+
+        with tempfile.TemporaryDirectory() as path:
+            save_variable(path, 'test_var', [0.0, 1.0, 2.0], [1, 2, 3],
+                          loader='test', probe='x')
+            names = LocalProvider(path).load('test', [0.0, 86400.0])
+            self.assertEqual(names, ['test_var'])
+            self.assertEqual(list(get_data('test_var')[1]), [1, 2, 3])
+
+    def test_ex_gmag_parallel(self):
+        """Test ex_gmag with parallel loading."""
+        import numpy as np
+        from pyspedas import get_data, tplot_names
+        from pyspedas_examples.examples.ex_gmag import ex_gmag
+        from pyspedas_examples.utilities.gmag_parallel import gmag_parallel
+        ex_gmag(plot=global_display)
+        serial = {n: get_data(n) for n in tplot_names(quiet=True)}
+        ex = ex_gmag(plot=global_display, workers=4)
+        self.assertEqual(ex, 1)
+        self.assertEqual(sorted(tplot_names(quiet=True)), sorted(serial))
+        for name, d in serial.items():
+            self.assertTrue(np.array_equal(get_data(name)[1], d[1]))
+
+        report = gmag_parallel(['ccnv', 'nosite'], ['2015-12-31', '2015-12-31'],
+                               workers=2)
+        self.assertIsNone(report['ccnv']['error'])
+        self.assertEqual(report['ccnv']['variables'],
+                         ['thg_mag_ccnv', 'thg_mag_ccnv-d'])
+        self.assertIsNotNone(report['nosite']['error'])
+
+    def test_ex_mpause_cached(self):
+        """Test the cache of magnetopause boundaries."""
+        import numpy as np
+        from pyspedas import mpause_2, mpause_t96
+        from pyspedas_examples.examples.ex_mpause_2 import ex_mpause_2
+        from pyspedas_examples.analysis.mpause_cache import (
+            ModelCache, mpause_2_cached, mpause_cache, mpause_t96_boundary)
+        mpause_cache.clear()
+        ex_mpause_2(plot=global_display, cached=True)
+        ex_mpause_2(plot=global_display, cached=True)
+        self.assertEqual(mpause_cache.misses, 1)
+        self.assertEqual(mpause_cache.hits, 1)
+        for a, b in zip(mpause_2_cached(short=True), mpause_2(short=True)):
+            self.assertTrue(np.array_equal(a, b))
+        self.assertEqual(mpause_cache.misses, 2)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ModelCache(directory=directory)
+            expected = mpause_t96(3.0)[:3]
+            out = mpause_t96_boundary(3.0, cache=cache)
+            # A new process finds the boundary in the directory.
+            cache = ModelCache(directory=directory)
+            self.assertEqual(mpause_t96_boundary(3.0, cache=cache)[0][0],
+                             out[0][0])
+            mpause_t96_boundary(3.0, cache=cache)
+            mpause_t96_boundary(2.0, cache=cache)
+            self.assertEqual(cache.stats()['disk_hits'], 1)
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+            # Outputs larger than the memory limit are read, not kept.
+            small = ModelCache(max_bytes=100, directory=directory)
+            self.assertEqual(mpause_t96_boundary(3.0, cache=small)[0][0],
+                             out[0][0])
+            self.assertEqual((small.disk_hits, len(small)), (1, 0))
+        for a, b in zip(out, expected):
+            self.assertTrue(np.array_equal(a, b))
+        self.assertFalse(out[0].flags.writeable)
+
+    def test_ex_mpause_t96_bulk(self):
+        """Test that mpause_t96_bulk gives the same flags as mpause_t96."""
+        import numpy as np
+        from pyspedas import get_data, mpause_t96
+        from pyspedas_examples.examples.ex_mpause_t96 import ex_mpause_t96
+        from pyspedas_examples.analysis.mpause_bulk import mpause_t96_bulk
+        ex_mpause_t96(plot=global_display, cached=True)
+        for cached in [False, True]:
+            ex_mpause_t96(plot=global_display, cached=cached, bulk=True)
+            pos = get_data('thd_pos_gsm').y / 6378.0
+            _, _, _, id, distan = mpause_t96(2.0, pos[:, 0], pos[:, 1],
+                                             pos[:, 2])
+            self.assertTrue(np.array_equal(get_data('thd_mpause_id').y, id,
+                                           equal_nan=True))
+            self.assertTrue(np.allclose(get_data('thd_mpause_distan').y,
+                                        distan, rtol=1e-12, atol=1e-12,
+                                        equal_nan=True))
+        # One pressure per point, in small chunks, with boundary points.
+        pd = np.linspace(0.5, 10.0, len(pos))
+        out = mpause_t96_bulk(pd, pos[:, 0], pos[:, 1], pos[:, 2],
+                              boundary=True, chunk_size=100)
+        for i in [0, len(pos) // 2, len(pos) - 1]:
+            _, _, _, id, distan = mpause_t96(pd[i], pos[i:i + 1, 0],
+                                             pos[i:i + 1, 1], pos[i:i + 1, 2])
+            self.assertEqual(out[0][i], id[0])
+            self.assertAlmostEqual(out[1][i], distan[0], places=10)
+        self.assertTrue(np.allclose(
+            np.linalg.norm(pos - np.column_stack(out[2:]), axis=1), out[1]))
+
     def test_ex_smooth(self):
         """Test ex_dsl2gse."""
         from pyspedas_examples.examples.ex_smooth import ex_smooth
         ex = ex_smooth(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_smooth_cumsum(self):
+        """Test that tsmooth_cumsum gives the results of tsmooth."""
+        import warnings
+        import numpy as np
+        from pyspedas import get_data, store_data, tsmooth
+        from pyspedas_examples.examples.ex_smooth import ex_smooth
+        from pyspedas_examples.analysis.smooth_cumsum import (smooth_cumsum,
+                                                              tsmooth_cumsum)
+        ex = ex_smooth(plot=global_display, cumsum=True)
+        self.assertEqual(ex, 1)
+        self.assertTrue(np.array_equal(
+            get_data('smooth')[1],
+            [3, 5, 10.2, 9.8, 9.2, 8.2, 6, 3, 4, 4.4, 6, 4]))
+        # Components, odd and even widths, small blocks.
+        rng = np.random.default_rng(0)
+        y = 1000.0 + rng.standard_normal((301, 3))
+        store_data('a', data={'x': np.arange(301.0), 'y': y})
+        for width in [1, 4, 5, 50]:
+            tsmooth('a', width=width, newname='e')
+            tsmooth_cumsum('a', width=width, chunk_size=7)
+            self.assertTrue(np.allclose(get_data('a-s')[1],
+                                        get_data('e')[1], rtol=1e-12))
+        # The average of the samples that are not NaN.
+        y[rng.random(y.shape) < 0.3] = np.nan
+        y[100:110, 0] = np.nan
+        for preserve_nans in [None, 1]:
+            s = smooth_cumsum(y, width=5, preserve_nans=preserve_nans)
+            for i in [2, 50, 104, 298]:
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    expected = np.nanmean(y[i - 2:i + 3], axis=0)
+                if preserve_nans:
+                    expected[np.isnan(y[i])] = np.nan
+                self.assertTrue(np.allclose(s[i], expected, equal_nan=True))
+            self.assertTrue(np.array_equal(s[:2], y[:2], equal_nan=True))
+        self.assertTrue(np.isnan(s[104, 0]))
+
     def test_ex_spectra(self):
         """Test ex_spectra."""
         from pyspedas_examples.examples.ex_spectra import ex_spectra
         ex = ex_spectra(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_spectra_power(self):
+        """Test that dynamic_power gives the spectra of tdpwrspc."""
+        import numpy as np
+        import pyspedas
+        from pyspedas import get_data, store_data
+        from pyspedas_examples.examples.ex_spectra import ex_spectra
+        from pyspedas_examples.analysis.dynamic_power import (
+            dynamic_power, dynamic_power_data)
+        ex = ex_spectra(plot=global_display, power=True, workers=2)
+        self.assertEqual(ex, 1)
+        d = get_data('thg_mag_ccnv_x_dpwrspc')
+        self.assertEqual(d[1].shape, d[2].shape)
+        # NaN, a jump of the cadence, and small blocks.
+        t, y = get_data('thg_mag_ccnv')
+        y = y.copy()
+        y[100:130, 1] = np.nan
+        t = t.copy()
+        t[2000:] += 0.3
+        store_data('m', data={'x': t, 'y': y})
+        for options in [{}, {'nboxpoints': 129, 'nshiftpoints': 50.5,
+                             'bin': 4},
+                        {'nboxpoints': 64, 'notmvariance': True},
+                        {'nboxpoints': 100, 'nohanning': True,
+                         'noline': True, 'notperhz': True}]:
+            names = pyspedas.tdpwrspc('m', **options)
+            expected = [get_data(name) for name in names]
+            self.assertEqual(dynamic_power('m', chunk_size=1000, workers=2,
+                                           **options), names)
+            for name, e in zip(names, expected):
+                d = get_data(name)
+                self.assertTrue(np.array_equal(d[0], e[0]))
+                self.assertTrue(np.array_equal(d[2], e[2], equal_nan=True))
+                self.assertTrue(np.allclose(d[1], e[1], rtol=1e-7, atol=0,
+                                            equal_nan=True))
+                if 'notmvariance' in options:
+                    self.assertTrue(np.isnan(d[1]).any())
+        # The same options as the last ones, on a series.
+        tdps, fdps, dps = dynamic_power_data(
+            t - t[0], y[:, 0], nboxpoints=100, nshiftpoints=50.0,
+            nohanning=True, noline=True, notperhz=True)
+        d = get_data('m_x_dpwrspc')
+        self.assertTrue(np.allclose(tdps + t[0], d[0], rtol=0, atol=1e-6))
+        self.assertTrue(np.array_equal(fdps, d[2]))
+        self.assertTrue(np.allclose(dps, d[1], rtol=1e-7, atol=0))
+        self.assertIsNone(dynamic_power_data(t[:100], y[:100, 0]))
+
+    def test_ex_spectra_render(self):
+        """Test that spec_render bins spectrograms to the pixels."""
+        import numpy as np
+        from pyspedas import data_quants, get_data, store_data, tnames
+        from pyspedas_examples.examples.ex_spectra import ex_spectra
+        from pyspedas_examples.analysis.spec_render import (
+            RenderCache, bin_spectrogram, panel_pixels, spec_render)
+        ex = ex_spectra(plot=global_display, power=True, render=True)
+        self.assertEqual(ex, 1)
+        self.assertIn('tha_psif_en_eflux_render', tnames())
+        d = get_data('tha_psif_en_eflux_render')
+        self.assertEqual(len(d[0]), panel_pixels(5)[0])
+        self.assertTrue(np.array_equal(d[2], get_data('tha_psif_en_eflux')[2]))
+
+        # Against the samples of each pixel.
+        rng = np.random.default_rng(0)
+        t = np.sort(rng.uniform(0.0, 1000.0, 3000))
+        v = np.geomspace(10.0, 1e5, 40)[::-1]
+        y = rng.lognormal(0.0, 1.0, (3000, 40))
+        y[rng.random(y.shape) < 0.05] = np.nan
+        f = np.log10(v)
+        step = (f[0] - f[-1]) / 39
+        lo, hi = f[-1] - step / 2, f[0] + step / 2
+        column = np.floor((t - 100.0) / 800.0 * 30).astype(int)
+        row = np.floor((f - lo) / (hi - lo) * 12).astype(int)
+        for method, func in [('max', np.nanmax), ('mean', np.nanmean)]:
+            r = bin_spectrogram(t, y, v, trange=[100.0, 900.0], width=30,
+                                height=12, ylog=True, method=method,
+                                chunk_size=100)
+            self.assertTrue(np.allclose(r.times,
+                                        100.0 + 800.0 / 30 * (np.arange(30)
+                                                              + 0.5)))
+            self.assertTrue(np.allclose(np.log10(r.v),
+                                        lo + (hi - lo) / 12
+                                        * (np.arange(12) + 0.5)))
+            for c in range(30):
+                for k in range(12):
+                    self.assertAlmostEqual(
+                        r.image[c, k], func(y[column == c][:, row == k]))
+            # Channels which change with time, on the same rows.
+            v2 = np.tile(v, (3000, 1))
+            v2[::2] *= 1.0000001
+            r2 = bin_spectrogram(t, y, v2, trange=[100.0, 900.0], width=30,
+                                 height=12, ylog=True, method=method,
+                                 chunk_size=100)
+            self.assertTrue(np.allclose(r2.v, r.v))
+            self.assertTrue(np.allclose(r2.image, r.image))
+        v2[1500:] *= 1.1
+        r = bin_spectrogram(t, y, v2, width=30, height=12, ylog=True)
+        self.assertEqual(r.image.shape, (30, 12))
+        self.assertFalse(np.isnan(r.image).any())
+        # Fewer samples than columns: not binned.
+        r = bin_spectrogram(t[:20], y[:20], v, width=30, height=80)
+        self.assertTrue(np.array_equal(r.times, t[:20]))
+        self.assertTrue(np.array_equal(r.image, y[:20], equal_nan=True))
+
+        # Cached per variable, time range and size.
+        store_data('spec', data={'x': t, 'y': y, 'v': v})
+        cache = RenderCache()
+        names = spec_render(['spec', 'tha_pos'], width=30, height=12,
+                            cache=cache)
+        self.assertEqual(names, ['spec_render', 'tha_pos'])
+        image = get_data('spec_render')[1]
+        spec_render('spec', width=30, height=12, cache=cache)
+        self.assertTrue(np.array_equal(get_data('spec_render')[1], image,
+                                       equal_nan=True))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        spec_render('spec', width=30, height=12, trange=[100.0, 900.0],
+                    cache=cache)
+        spec_render('spec', width=60, height=12, cache=cache)
+        store_data('spec', data={'x': t, 'y': y, 'v': v})
+        spec_render('spec', width=30, height=12, cache=cache)
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        # Data changed in place are binned again.
+        y[1000, 5] = 1e6
+        store_data('spike', data={'x': t, 'y': y, 'v': v})
+        spec_render('spike', width=30, height=12, cache=cache)
+        self.assertEqual(np.nanmax(get_data('spike_render')[1]), 1e6)
+        data_quants['spike'].values[1000, 5] = 1.0
+        spec_render('spike', width=30, height=12, cache=cache)
+        self.assertLess(np.nanmax(get_data('spike_render')[1]), 1e6)
+
     def test_ex_spikes(self):
         """Test ex_spectra."""
         from pyspedas_examples.examples.ex_spikes import ex_spikes
         ex = ex_spikes(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_spikes_batch(self):
+        """Test that clean_spikes_batch gives the same results as clean_spikes."""
+        import random
+        import numpy as np
+        from pyspedas import get_data
+        from pyspedas_examples.examples.ex_spikes import ex_spikes
+        from pyspedas_examples.analysis.clean_spikes_batch import clean_spikes_batch
+        name = 'thg_mag_ccnv-despike'
+        random.seed(1)
+        ex_spikes(plot=global_display)
+        expected = get_data(name)[1]
+        random.seed(1)
+        ex = ex_spikes(plot=global_display, batch=True)
+        self.assertEqual(ex, 1)
+        self.assertTrue(np.array_equal(get_data(name)[1], expected,
+                                       equal_nan=True))
+        self.assertTrue(np.isnan(expected).any())
+        # Several variables, changed in place.
+        data = get_data('thg_mag_ccnv', xarray=True).values
+        names = clean_spikes_batch(['thg_mag_ccnv', name], overwrite=True)
+        self.assertEqual(names, ['thg_mag_ccnv', name])
+        self.assertIs(get_data('thg_mag_ccnv', xarray=True).values, data)
+
+    def test_ex_spikes_mmap(self):
+        """Test spike cleaning in a memory-mapped column store."""
+        import numpy as np
+        from pyspedas import del_data, get_data, store_data
+        from pyspedas_examples.examples.ex_spikes import ex_spikes
+        from pyspedas_examples.analysis.clean_spikes_batch import (
+            clean_spikes_batch, clean_spikes_store)
+        from pyspedas_examples.utilities.column_store import ColumnStore
+        ex = ex_spikes(plot=global_display, mmap=True)
+        self.assertEqual(ex, 1)
+        d = get_data('thg_mag_ccnv-despike')
+        self.assertTrue(np.isnan(d[1]).any())
+        # Same results as clean_spikes_batch, with small chunks.
+        t, y = get_data('thg_mag_ccnv')
+        store_data('mag', data={'x': t, 'y': y.astype(np.float64)})
+        clean_spikes_batch('mag', sub_avg=True)
+        expected = get_data('mag-despike')[1]
+        with tempfile.TemporaryDirectory() as path:
+            store = ColumnStore(path)
+            store.from_tplot('mag')
+            clean_spikes_store(store, 'mag', sub_avg=True, overwrite=True,
+                               chunk_size=1000)
+            x, y = store.get_data('mag')
+            self.assertTrue(np.array_equal(x, t))
+            self.assertTrue(np.array_equal(np.isnan(y), np.isnan(expected)))
+            self.assertTrue(np.allclose(y, expected, equal_nan=True))
+            # Time ranges, and changes in place.
+            x, y = store.get_data('mag', trange=[t[100], t[199]])
+            self.assertTrue(np.array_equal(x, t[100:200]))
+            store.store('mag', trange=[t[100], t[199]])
+            get_data('mag', xarray=True).values[0, 0] = 1.0
+            self.assertEqual(store.get_data('mag')[1][100, 0], 1.0)
+            # The mapped files cannot be removed on Windows.
+            del x, y
+            del_data('mag')
+        # Chunks smaller than the window.
+        raw = get_data('thg_mag_ccnv')[1][:2000].astype(np.float64)
+        raw[::97] += 1000.0
+        store_data('mag', data={'x': t[:2000], 'y': raw})
+        clean_spikes_batch('mag', sub_avg=True, overwrite=True)
+        expected_small = get_data('mag')[1]
+        store_data('mag', data={'x': t[:2000], 'y': raw})
+        with tempfile.TemporaryDirectory() as path:
+            store = ColumnStore(path)
+            store.from_tplot('mag')
+            clean_spikes_store(store, 'mag', sub_avg=True, overwrite=True,
+                               chunk_size=3)
+            ys = store.get_data('mag')[1]
+            self.assertTrue(np.isnan(ys).any())
+            self.assertTrue(np.array_equal(ys, expected_small,
+                                           equal_nan=True))
+            del ys
+            del_data('mag')
+        # Appended one part at a time.
+        with tempfile.TemporaryDirectory() as path:
+            store = ColumnStore(path)
+            store.append('mag', t[:1000], expected[:1000])
+            store.append('mag', t[1000:], expected[1000:])
+            x, y = store.get_data('mag')
+            self.assertTrue(np.array_equal(x, t))
+            self.assertTrue(np.array_equal(y, expected, equal_nan=True))
+            del x, y
+
     def test_ex_wavelet(self):
         """Test ex_spectra."""
         from pyspedas_examples.examples.ex_wavelet import ex_wavelet
         ex = ex_wavelet(plot=global_display)
         self.assertEqual(ex, 1)
 
+    def test_ex_wavelet_fft(self):
+        """Test that wavelet_fft gives the power of wavelet."""
+        import numpy as np
+        from pyspedas import get_data
+        from pyspedas_examples.examples.ex_wavelet import ex_wavelet
+        from pyspedas_examples.analysis.wavelet_fft import wavelet_fft
+        var = 'sin_wav_pow'
+        ex_wavelet(plot=global_display)
+        expected = get_data(var)
+        ex = ex_wavelet(plot=global_display, workers=2)
+        self.assertEqual(ex, 1)
+        d = get_data(var)
+        self.assertTrue(np.array_equal(d[0], expected[0]))
+        self.assertTrue(np.array_equal(d[2], expected[2]))
+        self.assertTrue(np.allclose(d[1], expected[1], rtol=1e-9,
+                                    atol=1e-12 * expected[1].max()))
+        # Small chunks, single precision and averages of 7 samples.
+        wavelet_fft('sin_wav', newname='p', wavename='morl',
+                    dtype=np.float32, decimate=7, chunk_size=100)
+        wavelet_fft('sin_wav', newname='p64', wavename='morl')
+        d, full = get_data('p'), get_data('p64')
+        blocks = np.arange(0, len(full[0]), 7)
+        counts = np.diff(np.append(blocks, len(full[0])))
+        self.assertEqual(d[1].dtype, np.float32)
+        self.assertTrue(np.allclose(
+            d[0], np.add.reduceat(full[0], blocks) / counts, rtol=0,
+            atol=1e-6))
+        self.assertTrue(np.allclose(
+            d[1], np.add.reduceat(full[1], blocks) / counts[:, None],
+            rtol=0, atol=1e-5 * full[1].max()))
+
     def test_pseudovar_right_axis(self):
         import pyspedas
         from pyspedas import store_data,options, tplot_options, tplot
-        pyspedas.projects.mms.fpi(datatype='des-moms', trange=['2015-10-16', '2015-10-17'])
-        pyspedas.projects.mms.edp(trange=['2015-10-16', '2015-10-17'], datatype='scpot')
+        from pyspedas_examples.utilities.load import mms_fpi, mms_edp
+        mms_fpi(datatype='des-moms', trange=['2015-10-16', '2015-10-17'])
+        mms_edp(trange=['2015-10-16', '2015-10-17'], datatype='scpot')
         options('mms1_edp_scpot_fast_l2', 'yrange', [10, 100])
         store_data('spec', data=['mms1_des_energyspectr_omni_fast', 'mms1_edp_scpot_fast_l2'])
         options('spec', 'right_axis', True)